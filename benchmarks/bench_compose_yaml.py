@@ -0,0 +1,134 @@
+"""
+Benchmark the YAML emitters used for generated docker-compose files.
+
+Renders the compose files of a multiproxy fleet with the pure Python emitter and with
+the libyaml C emitter, checks both produce the same bytes and reports the timings.
+
+Usage:
+    python benchmarks/bench_compose_yaml.py --instances 500
+"""
+import os
+import sys
+import time
+import argparse
+from typing import Any, Dict, List, Tuple
+from unittest.mock import patch
+
+import yaml
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils import generator  # noqa: E402
+
+APP_NAMES = ['EARNAPP', 'HONEYGAIN', 'PEER2PROFIT', 'PACKETSTREAM', 'TRAFFMONETIZER',
+             'REPOCKET', 'EARNFM', 'PROXYRACK', 'PROXYLITE', 'BITPING']
+
+
+def make_fleet_configs() -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """
+    Build base configurations shaped like the shipped ones with every app enabled.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]: The m4b, app and user configurations.
+    """
+    m4b_config = {
+        'system': {'default_docker_platform': 'linux/amd64'},
+        'project': {'compose_project_name': 'money4band'},
+        'network': {'subnet': '172.19.7.0', 'netmask': 27},
+    }
+    apps = []
+    user_apps = {}
+    for name in APP_NAMES:
+        lower = name.lower()
+        apps.append({
+            'name': name,
+            'flags': {'email': {}, 'password': {}},
+            'compose_config': {
+                'container_name': f"${{DEVICE_NAME}}_{lower}",
+                'hostname': f"${{DEVICE_NAME}}_{lower}",
+                'image': f"example/{lower}:latest",
+                'environment': [f"{name}_EMAIL=${{{name}_EMAIL}}", f"{name}_PASSWORD=${{{name}_PASSWORD}}"],
+                'ports': [f"${{{name}_PORT}}:8080"],
+                'restart': 'always',
+                'cpus': '${APP_CPU_LIMIT_LITTLE}',
+                'mem_reservation': '${APP_MEM_RESERV_LITTLE}',
+                'mem_limit': '${APP_MEM_LIMIT_LITTLE}',
+            },
+            'compose_config_proxy': {'network_mode': 'service:proxy', 'hostname': None},
+        })
+        user_apps[lower] = {'enabled': True, 'email': 'user@example.com',
+                            'password': 'secret', 'ports': 50000}
+    user_config = {
+        'apps': user_apps,
+        'proxies': {'url': '', 'enabled': True},
+        'device_info': {'device_name': 'swift_panther'},
+        'm4b_dashboard': {'enabled': False},
+        'compose_config_common': {
+            'network': {'driver': 'bridge', 'subnet': '${NETWORK_SUBNET}', 'netmask': '${NETWORK_NETMASK}'},
+            'proxy_service': {
+                'container_name': '${DEVICE_NAME}_tun2socks',
+                'image': 'xjasonlyu/tun2socks:latest',
+                'environment': ['LOGLEVEL=info', 'PROXY=${STACK_PROXY_URL}', 'EXTRA_COMMANDS=ip rule add iif lo ipproto udp dport 53 lookup main;'],
+                'cap_add': ['NET_ADMIN'],
+                'devices': ['/dev/net/tun:/dev/net/tun'],
+                'restart': 'always',
+            },
+        },
+    }
+    return m4b_config, {'apps': apps, 'extra-apps': []}, user_config
+
+
+def render_fleet(instances: int) -> List[Dict[str, Any]]:
+    """
+    Build the compose dictionaries of a fleet of proxy instances.
+
+    Args:
+        instances (int): The number of instances.
+
+    Returns:
+        List[Dict[str, Any]]: One compose dictionary per instance.
+    """
+    m4b_config, app_config, user_config = make_fleet_configs()
+    # Keep the benchmark offline, image resolution is not what is measured here
+    with patch.object(generator, 'index_images'), \
+            patch.object(generator, 'resolve_image_platform', lambda image, tag, platform, default: (tag, platform)):
+        resolved_images = generator.resolve_app_images(
+            m4b_config, app_config, user_config)
+        return [generator.build_compose_dict(
+            generator.merge_config(m4b_config, {'project': {'compose_project_name': f"money4band_{i}"}}),
+            app_config,
+            generator.merge_config(user_config, {'device_info': {'device_name': f"swift_panther_{i}"},
+                                                 'proxies': {'url': f"socks5://10.0.{i // 256}.{i % 256}:1080"}}),
+            resolved_images=resolved_images) for i in range(instances)]
+
+
+def time_dumper(compose_dicts: List[Dict[str, Any]], dumper: type) -> Tuple[float, List[str]]:
+    start = time.perf_counter()
+    documents = [generator.dump_compose_yaml(compose_dict, dumper)
+                 for compose_dict in compose_dicts]
+    return time.perf_counter() - start, documents
+
+
+def main(instances: int) -> None:
+    compose_dicts = render_fleet(instances)
+    python_time, python_documents = time_dumper(compose_dicts, yaml.Dumper)
+    print(f"pure Python emitter: {python_time:.3f}s for {instances} compose files")
+    if not hasattr(yaml, 'CDumper'):
+        print("libyaml emitter: not available in this PyYAML build")
+        return
+    c_time, c_documents = time_dumper(compose_dicts, yaml.CDumper)
+    print(f"libyaml emitter:     {c_time:.3f}s for {instances} compose files")
+    print(f"speedup: {python_time / c_time:.1f}x")
+    print(f"byte-identical output: {python_documents == c_documents}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the YAML emitters used for generated compose files')
+    parser.add_argument('--instances', type=int, default=500,
+                        help='Number of instance compose files to render')
+    args = parser.parse_args()
+    main(args.instances)
@@ -0,0 +1,119 @@
+"""
+Benchmark the per-instance latency of the docker compose CLI against the engine API stack driver.
+
+Creates the given number of small instance stacks (a network and one idle container each) with
+each driver in turn, one instance at a time, and reports the median and 95th percentile latency.
+Needs a running Docker engine and pulls the image once. --plan-only measures only the translation
+of compose files to engine API calls, which works without Docker.
+
+Usage:
+    python benchmarks/bench_stack_drivers.py --instances 50
+    python benchmarks/bench_stack_drivers.py --instances 1000 --plan-only
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.engine_driver import EngineStackDriver, plan_stack_files  # noqa: E402
+from utils.teardown import connect_docker, teardown_projects  # noqa: E402
+
+COMPOSE_FILE = """services:
+  app:
+    container_name: ${DEVICE_NAME}_app
+    image: IMAGE
+    command: ["sleep", "infinity"]
+    restart: always
+    mem_limit: ${APP_MEM_LIMIT}
+networks:
+  default:
+    driver: bridge
+"""
+
+
+def write_instances(base_dir: str, instances: int, image: str, prefix: str) -> list:
+    stacks = []
+    for i in range(instances):
+        instance_dir = os.path.join(base_dir, f"{prefix}_{i:04x}")
+        os.makedirs(instance_dir)
+        compose_file = os.path.join(instance_dir, 'docker-compose.yaml')
+        env_file = os.path.join(instance_dir, '.env')
+        with open(compose_file, 'w') as f:
+            f.write(COMPOSE_FILE.replace('IMAGE', image))
+        with open(env_file, 'w') as f:
+            f.write(f"COMPOSE_PROJECT_NAME={prefix}_{i:04x}\nDEVICE_NAME={prefix}_{i:04x}\nAPP_MEM_LIMIT=64m\n")
+        stacks.append((f"{prefix}_{i:04x}", compose_file, env_file))
+    return stacks
+
+
+def report(label: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{label:<8} median {statistics.median(latencies) * 1000:8.1f}ms  p95 {p95 * 1000:8.1f}ms  "
+          f"total {sum(latencies):7.2f}s")
+
+
+def main(instances: int, image: str, plan_only: bool) -> None:
+    with tempfile.TemporaryDirectory() as base_dir:
+        if plan_only:
+            stacks = write_instances(base_dir, instances, image, 'benchplan')
+            cache = {}
+            latencies = []
+            for _, compose_file, env_file in stacks:
+                start = time.perf_counter()
+                plan_stack_files(compose_file, env_file, cache=cache)
+                latencies.append(time.perf_counter() - start)
+            print(f"{instances} instances, planning only")
+            report('plan', latencies)
+            return
+
+        client = connect_docker(4)
+        if client is None:
+            sys.exit('The Docker engine is not reachable, use --plan-only to benchmark planning alone')
+        client.images.pull(image)
+        print(f"{instances} instances of one {image} container, started one at a time")
+
+        compose_stacks = write_instances(base_dir, instances, image, 'benchcompose')
+        latencies = []
+        try:
+            for _, compose_file, env_file in compose_stacks:
+                start = time.perf_counter()
+                subprocess.run(['docker', 'compose', '--env-file', env_file, '-f', compose_file, 'up', '-d'],
+                               check=True, capture_output=True)
+                latencies.append(time.perf_counter() - start)
+            report('compose', latencies)
+        finally:
+            teardown_projects(client, [name for name, _, _ in compose_stacks])
+
+        engine_stacks = write_instances(base_dir, instances, image, 'benchengine')
+        driver = EngineStackDriver(client)
+        latencies = []
+        try:
+            for _, compose_file, env_file in engine_stacks:
+                start = time.perf_counter()
+                driver.up(plan_stack_files(compose_file, env_file))
+                latencies.append(time.perf_counter() - start)
+            report('engine', latencies)
+        finally:
+            teardown_projects(client, [name for name, _, _ in engine_stacks])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark docker compose against the engine API stack driver')
+    parser.add_argument('--instances', type=int, default=50,
+                        help='Number of instance stacks to create with each driver')
+    parser.add_argument('--image', default='alpine:3',
+                        help='The image of the idle container')
+    parser.add_argument('--plan-only', action='store_true',
+                        help='Only measure the compose to engine API translation, no Docker needed')
+    args = parser.parse_args()
+    main(args.instances, args.image, args.plan_only)
@@ -0,0 +1,56 @@
+"""
+Benchmark the concurrent stack start engine.
+
+Runs one stand-in `docker compose up` per instance, a process that prints a few lines and
+sleeps for the given time, with increasing worker counts and reports the wall time of each run.
+
+Usage:
+    python benchmarks/bench_start_stacks.py --instances 200 --command-seconds 0.5
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.stack_runner import StackJob, run_stack_jobs  # noqa: E402
+
+STAND_IN_COMPOSE = (
+    "import sys, time\n"
+    "for service in ('proxy', 'earnapp', 'honeygain'):\n"
+    "    print(f' Container {sys.argv[1]}_{service}  Started', flush=True)\n"
+    "    time.sleep(float(sys.argv[2]) / 3)\n"
+)
+
+
+def main(instances: int, command_seconds: float, worker_counts: list) -> None:
+    with tempfile.TemporaryDirectory() as log_dir:
+        jobs = [StackJob(f"money4band_{i}", [sys.executable, '-c', STAND_IN_COMPOSE, f"money4band_{i}", str(command_seconds)],
+                         os.path.join(log_dir, f"money4band_{i}.log")) for i in range(instances)]
+        sequential = instances * (command_seconds + 2)
+        print(f"{instances} instances, {command_seconds}s per compose command")
+        print(f"previous sequential start with 2s sleeps: ~{sequential:.0f}s")
+        for workers in worker_counts:
+            start = time.perf_counter()
+            results = run_stack_jobs(jobs, workers=workers)
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for result in results if not result.ok)
+            print(f"workers={workers:<3} wall time {elapsed:6.2f}s  failed={failed}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the concurrent stack start engine')
+    parser.add_argument('--instances', type=int, default=200,
+                        help='Number of instances to start')
+    parser.add_argument('--command-seconds', type=float, default=0.5,
+                        help='How long each stand-in compose command runs')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help='Worker counts to compare')
+    args = parser.parse_args()
+    main(args.instances, args.command_seconds, args.workers)
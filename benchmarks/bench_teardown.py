@@ -0,0 +1,82 @@
+"""
+Benchmark the label-driven teardown engine.
+
+Tears down a stand-in Docker engine holding the given number of instance projects, where each
+stop call takes the given time to emulate containers exiting after SIGTERM, with increasing worker counts.
+
+Usage:
+    python benchmarks/bench_teardown.py --instances 300 --stop-seconds 0.5
+"""
+import os
+import sys
+import time
+import argparse
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.teardown import teardown_projects, COMPOSE_PROJECT_LABEL  # noqa: E402
+
+SERVICES = ('proxy', 'earnapp', 'honeygain')
+# Time of every other engine API call
+API_SECONDS = 0.01
+
+
+class StandInAPI:
+    def __init__(self, instances: int, stop_seconds: float):
+        self.stop_seconds = stop_seconds
+        self.containers_list = [{'Id': f"{i}_{service}", 'State': 'running',
+                                 'Labels': {COMPOSE_PROJECT_LABEL: f"money4band_{i:04x}"}}
+                                for i in range(instances) for service in SERVICES]
+        self.networks_list = [{'Id': f"net_{i}", 'Labels': {COMPOSE_PROJECT_LABEL: f"money4band_{i:04x}"}}
+                              for i in range(instances)]
+
+    def containers(self, all=False, filters=None):
+        time.sleep(API_SECONDS)
+        return self.containers_list
+
+    def networks(self, filters=None):
+        time.sleep(API_SECONDS)
+        return self.networks_list
+
+    def stop(self, container_id, timeout=None):
+        time.sleep(self.stop_seconds)
+
+    def remove_container(self, container_id, force=False):
+        time.sleep(API_SECONDS)
+
+    def remove_network(self, network_id):
+        time.sleep(API_SECONDS)
+
+
+class StandInClient:
+    def __init__(self, instances: int, stop_seconds: float):
+        self.api = StandInAPI(instances, stop_seconds)
+
+
+def main(instances: int, stop_seconds: float, worker_counts: list) -> None:
+    client = StandInClient(instances, stop_seconds)
+    calls = len(client.api.containers_list) * (stop_seconds + API_SECONDS) + instances * API_SECONDS
+    print(f"{instances} instances, {len(SERVICES)} containers each, {stop_seconds}s per container stop")
+    print(f"serial engine calls: ~{calls:.0f}s, previous serial compose down adds a process per instance on top")
+    for workers in worker_counts:
+        start = time.perf_counter()
+        results = teardown_projects(client, [], instance_prefix='money4band', workers=workers)
+        elapsed = time.perf_counter() - start
+        removed = sum(result.containers for result in results)
+        print(f"workers={workers:<3} wall time {elapsed:6.2f}s  containers={removed}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the label-driven teardown engine')
+    parser.add_argument('--instances', type=int, default=300,
+                        help='Number of instance projects to tear down')
+    parser.add_argument('--stop-seconds', type=float, default=0.5,
+                        help='How long each container takes to stop')
+    parser.add_argument('--workers', type=int, nargs='+', default=[8, 32, 64, 128],
+                        help='Worker counts to compare')
+    args = parser.parse_args()
+    main(args.instances, args.stop_seconds, args.workers)
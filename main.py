@@ -15,6 +15,9 @@ import logging
 from datetime import datetime
 import secrets
 import re
+from utils.engine_driver import EngineStackDriver, plan_stack_files
+from utils.image_prepull import prepull_stacks
+from utils.registry import open_registry
 
 # Initialize colorama for cross-platform colored output
 init(autoreset=True)
@@ -268,6 +271,10 @@ class EarnAppManager:
 </body>
 </html>""")
 
+            with open_registry(self.instances_dir, sync=False) as registry:
+                registry.record([(instance_name, os.path.join(instance_dir, ".env"),
+                                  os.path.join(instance_dir, "docker-compose.yml"))])
+
             logging.info(f"Created instance {instance_name} with UUID {instance_uuid}")
             print(f"{Fore.GREEN}Successfully created instance {instance_name} with UUID {instance_uuid}")
             return True
@@ -310,42 +317,32 @@ class EarnAppManager:
                 print(f"{Fore.RED}Error: docker-compose.yml not found in instance directory.")
                 return False
 
-            # Pull Docker images first
+            # Pull the images of the compose file, skipping the ones already up to date
             try:
                 print(f"{Fore.YELLOW}Pulling required Docker images...")
-                os.chdir(instance_dir)
-                
-                # Pull each image individually to better handle errors
-                images = ["fr3nd/earnapp:latest", "nginx:alpine", "containrrr/watchtower:latest", "nginx:alpine-slim"]
-                for image in images:
-                    print(f"{Fore.YELLOW}Pulling {image}...")
-                    result = os.system(f"docker pull {image}")
-                    if result != 0:
-                        logging.error(f"Failed to pull Docker image {image} with exit code {result}")
-                        print(f"{Fore.RED}Failed to pull Docker image {image}. Check logs for details.")
-                        return False
-                    print(f"{Fore.GREEN}Successfully pulled {image}")
-                
-                print(f"{Fore.GREEN}Successfully pulled all Docker images")
+                results = prepull_stacks([(docker_compose_path, os.path.join(instance_dir, ".env"))],
+                                         client=self.docker_client)
+                failed = [result.image for result in results or [] if result.status == 'failed']
+                if failed:
+                    logging.error(f"Failed to pull Docker images: {', '.join(failed)}")
+                    print(f"{Fore.RED}Failed to pull Docker images {', '.join(failed)}. Check logs for details.")
+                    return False
             except Exception as e:
                 logging.error(f"Error pulling Docker images: {str(e)}")
                 print(f"{Fore.RED}Error pulling Docker images: {str(e)}")
                 return False
 
-            # Start the instance using docker-compose
+            # Start the instance through the engine API on the shared client, no docker-compose process per instance
             try:
                 print(f"{Fore.YELLOW}Starting instance {instance_name}...")
-                result = os.system("docker-compose up -d")
-                if result != 0:
-                    logging.error(f"Failed to start instance {instance_name} with exit code {result}")
-                    print(f"{Fore.RED}Failed to start instance {instance_name}. Check logs for details.")
-                    return False
-                logging.info(f"Started instance {instance_name}")
+                plan = plan_stack_files(docker_compose_path, os.path.join(instance_dir, ".env"), project=instance_name)
+                actions = EngineStackDriver(self.docker_client).up(plan)
+                logging.info(f"Started instance {instance_name}: {actions}")
                 print(f"{Fore.GREEN}Successfully started instance {instance_name}")
                 return True
             except Exception as e:
-                logging.error(f"Error running docker-compose: {str(e)}")
-                print(f"{Fore.RED}Error running docker-compose: {str(e)}")
+                logging.error(f"Failed to start instance {instance_name}: {str(e)}")
+                print(f"{Fore.RED}Failed to start instance {instance_name}: {str(e)}")
                 return False
 
         except Exception as e:
@@ -362,8 +359,9 @@ class EarnAppManager:
                 logging.error(f"Instance directory not found: {instance_dir}")
                 return False
 
-            os.chdir(instance_dir)
-            os.system("docker-compose down")
+            if not EngineStackDriver(self.docker_client).down(instance_name):
+                logging.error(f"Some containers or networks of instance {instance_name} could not be removed")
+                return False
             logging.info(f"Stopped instance {instance_name}")
             return True
 
@@ -394,22 +392,19 @@ class EarnAppManager:
     def show_links(self):
         """Display EarnApp links for all instances"""
         try:
-            instances = [d for d in os.listdir(self.instances_dir) 
-                        if os.path.isdir(os.path.join(self.instances_dir, d))]
-            
-            if not instances:
+            # The registry only reads the .env files changed since they were recorded
+            with open_registry(self.instances_dir) as registry:
+                records = registry.instances()
+
+            if not records:
                 print(f"{Fore.YELLOW}No instances found. Please create an instance first.{Style.RESET_ALL}")
                 return
 
             print(f"\n{Fore.CYAN}EarnApp Links:{Style.RESET_ALL}")
-            for instance in instances:
-                env_file = os.path.join(self.instances_dir, instance, ".env")
-                if os.path.exists(env_file):
-                    with open(env_file, "r") as f:
-                        for line in f:
-                            if line.startswith("INSTANCE_UUID="):
-                                uuid = line.strip().split("=")[1]
-                                print(f"{Fore.GREEN}{instance}:{Style.RESET_ALL} https://earnapp.com/r/{uuid}")
+            for record in records:
+                uuid = record.app_ids.get("INSTANCE_UUID")
+                if uuid:
+                    print(f"{Fore.GREEN}{record.name}:{Style.RESET_ALL} https://earnapp.com/r/{uuid}")
 
         except Exception as e:
             logging.error(f"Error showing links: {e}")
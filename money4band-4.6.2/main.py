@@ -3,11 +3,13 @@ from utils.fn_reset_config import main as reset_main
 from utils.cls import cls
 from utils import detector, loader, dumper
 import os
+import io
 import argparse
 import logging
 from logging.handlers import RotatingFileHandler
 import locale
 import time
+from contextlib import redirect_stdout
 from typing import Dict, Any
 from colorama import Fore, Back, Style, just_fix_windows_console
 
@@ -39,6 +41,7 @@ def mainmenu(m4b_config_path: str, apps_config_path: str, user_config_path: str,
         logging.error(f"Error initializing colorama: {str(e)}")
         raise
 
+    update_notice = None
     while True:
         try:
             logging.info("Loading configurations")
@@ -74,24 +77,30 @@ def mainmenu(m4b_config_path: str, apps_config_path: str, user_config_path: str,
                 app_config = user_config["apps"].setdefault(app_name, {})
                 app_config["docker_platform"] = f"linux/{device_info['detected_docker_arch']}"
 
-            dumper.write_json(user_config, user_config_path)
-            logging.info(
-                f"System info and default platform stored: {device_info}")
+            # Both updates land in one write, skipped entirely when nothing changed since the last loop
+            with dumper.batched_writes():
+                dumper.write_json(user_config, user_config_path)
+                logging.info(
+                    f"System info and default platform stored: {device_info}")
 
-            logging.debug("Calculating resources limits based on system")
-            detector.calculate_resource_limits(
-                user_config_path_or_dict=user_config_path)
+                logging.debug("Calculating resources limits based on system")
+                detector.calculate_resource_limits(
+                    user_config_path_or_dict=user_config, user_config_path=user_config_path)
 
-            # Load the functions from the passed tools dir
-            logging.debug(f"Loading modules from {utils_dir_path}")
-            m4b_tools_modules = loader.load_modules_from_directory(
-                utils_dir_path)
-            logging.info(f"Successfully loaded modules from {utils_dir_path}")
+            # Map the menu entries to the tools dir, modules are only imported once chosen
+            logging.debug(f"Registering menu commands from {utils_dir_path}")
+            command_registry = loader.build_command_registry(
+                m4b_config["menu"], utils_dir_path)
             cls()
             print(f"{Fore.GREEN}----------------------------------------------")
             print(
                 f"{Fore.GREEN}MONEY4BAND AUTOMATIC GUIDED SETUP v{m4b_config.get('project')['project_version']}{Style.RESET_ALL}")
-            check_update_available(m4b_config)
+            # Query GitHub once per session and show the same notice on every redraw
+            if update_notice is None:
+                with redirect_stdout(io.StringIO()) as update_output:
+                    check_update_available(m4b_config)
+                update_notice = update_output.getvalue()
+            print(update_notice, end='')
             print(
                 f"{Fore.GREEN}----------------------------------------------{Style.RESET_ALL}")
             print(f"{Fore.YELLOW}Support the M4B development <3 check the donation options in the README, on GitHub or in our Discord. Every bit helps!")
@@ -129,7 +138,7 @@ def mainmenu(m4b_config_path: str, apps_config_path: str, user_config_path: str,
                 function_name = menu_options[choice - 1]["function"]
                 logging.info(
                     f"User selected menu option number {choice} that corresponds to menu item {function_label}")
-                m4b_tools_modules[function_name].main(
+                loader.load_command(command_registry, function_name)(
                     apps_config_path, m4b_config_path, user_config_path)
             else:
                 print(
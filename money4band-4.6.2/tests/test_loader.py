@@ -2,7 +2,10 @@ import unittest
 from unittest.mock import patch, mock_open, MagicMock, call
 import json
 import os
-from utils.loader import load_json_config, load_module_from_file, load_modules_from_directory
+import shutil
+import tempfile
+from utils import loader
+from utils.loader import load_json_config, load_module_from_file, load_modules_from_directory, parse_command, build_command_registry, load_command
 
 class TestModuleLoader(unittest.TestCase):
     @patch('builtins.open', new_callable=mock_open, read_data='{"key": "value"}')
@@ -70,5 +73,36 @@ class TestModuleLoader(unittest.TestCase):
         }
         self.assertEqual(modules, expected_modules)
 
+    def test_parse_command(self):
+        """
+        Test splitting menu commands into module and function names.
+        """
+        self.assertEqual(parse_command('fn_setupApps'), ('fn_setupApps', 'main'))
+        self.assertEqual(parse_command('fn_startStack:start_all_stacks'), ('fn_startStack', 'start_all_stacks'))
+
+    def test_load_command_lazily_and_once(self):
+        """
+        Test that menu modules are only loaded when chosen and then reused.
+        """
+        tools_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tools_dir)
+        self.addCleanup(loader._command_modules.clear)
+        for name in ['fn_one', 'fn_two']:
+            with open(os.path.join(tools_dir, f"{name}.py"), 'w') as f:
+                f.write("LOADS = []\nLOADS.append(1)\ndef main(*args):\n    return len(LOADS)\ndef other():\n    return 'other'\n")
+        menu = [{'label': 'One', 'function': 'fn_one'}, {'label': 'Two', 'function': 'fn_two:other'}]
+
+        with patch('utils.loader.load_module_from_file', wraps=load_module_from_file) as mock_load:
+            registry = build_command_registry(menu, tools_dir)
+            mock_load.assert_not_called()
+            self.assertEqual(load_command(registry, 'fn_one')(), 1)
+            self.assertEqual(load_command(registry, 'fn_one')(), 1)
+            self.assertEqual(mock_load.call_count, 1)
+            self.assertEqual(load_command(registry, 'fn_two:other')(), 'other')
+            self.assertEqual(mock_load.call_count, 2)
+
+        with self.assertRaises(KeyError):
+            load_command(registry, 'fn_missing')
+
 if __name__ == '__main__':
     unittest.main()
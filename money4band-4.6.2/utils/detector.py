@@ -6,7 +6,7 @@ import logging
 import json
 import platform
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import psutil
 
 # Ensure the parent directory is in the sys.path
@@ -34,7 +34,8 @@ def detect_os(m4b_config_path_or_dict: Any) -> Dict[str, str]:
         Exception: If an error occurs during OS detection or if the OS is not recognized.
     """
     try:
-        m4b_config = load_json_config(m4b_config_path_or_dict)
+        m4b_config = load_json_config(
+            m4b_config_path_or_dict, readonly=True)
 
         logging.debug("Detecting OS type")
         os_map = m4b_config.get("system", {}).get("os_map", {})
@@ -75,7 +76,8 @@ def detect_architecture(m4b_config_path_or_dict: Any) -> Dict[str, str]:
         Exception: If an error occurs during architecture detection.
     """
     try:
-        m4b_config = load_json_config(m4b_config_path_or_dict)
+        m4b_config = load_json_config(
+            m4b_config_path_or_dict, readonly=True)
 
         logging.debug("Detecting system architecture")
         arch_map = m4b_config.get("system", {}).get("arch_map", {})
@@ -98,9 +100,18 @@ def get_system_memory_and_cores():
     return total_memory, cores
 
 
-def calculate_resource_limits(user_config_path_or_dict: Any) -> None:
+def calculate_resource_limits(user_config_path_or_dict: Any, user_config_path: Optional[str] = None) -> None:
+    """
+    Calculate the app resource limits from the system memory and cores and store them in the user config.
+
+    Args:
+        user_config_path_or_dict (Any): The path to the user config file or the config dictionary, which is updated in place.
+        user_config_path (str, optional): Where to save the updated config. Defaults to the config file path if one was given.
+    """
     logging.debug("Determining resource limits")
     user_config = load_json_config(user_config_path_or_dict)
+    if user_config_path is None and isinstance(user_config_path_or_dict, str):
+        user_config_path = user_config_path_or_dict
     total_memory, cores = get_system_memory_and_cores()
     memory_cap = user_config.get(
         "resource_limits", {}).get("ram_cap_mb_default")
@@ -125,5 +136,6 @@ def calculate_resource_limits(user_config_path_or_dict: Any) -> None:
     resource_limits['app_cpu_limit_huge'] = round(max(cores * 0.8, 1.0), 1)
 
     user_config.get("resource_limits", {}).update(resource_limits)
-    write_json(user_config, user_config_path_or_dict)
+    if user_config_path:
+        write_json(user_config, user_config_path)
     logging.debug("Resource limits updated")
@@ -3,15 +3,108 @@ import argparse
 import logging
 import json
 import importlib.util
-from typing import Dict, Any
+from types import ModuleType
+from typing import Dict, Any, Callable, List, Optional, Tuple
 
 
-def load_json_config(config_path_or_dict: Any) -> Dict[str, Any]:
+class ReadOnlyDict(dict):
+    """
+    A dict that refuses modification, returned by load_json_config(readonly=True).
+    Copies (copy.copy, copy.deepcopy) are plain mutable dicts.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError(
+            "Config loaded read-only, use load_json_config(path) for a mutable copy")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce__(self):
+        return (ReadOnlyDict, (dict(self),))
+
+
+class ReadOnlyList(list):
+    """
+    A list that refuses modification, used for the lists inside a ReadOnlyDict.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError(
+            "Config loaded read-only, use load_json_config(path) for a mutable copy")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce__(self):
+        return (ReadOnlyList, (list(self),))
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return ReadOnlyDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return ReadOnlyList(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    # JSON only nests dicts and lists, so this is a much cheaper deep copy than copy.deepcopy
+    if isinstance(value, dict):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_thaw(item) for item in value]
+    return value
+
+
+# Parsed config files keyed by real path, with the (mtime_ns, size, inode) of the file they were parsed from
+_config_cache: Dict[str, Tuple[Tuple[int, int, int], Any]] = {}
+_config_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def invalidate_config_cache(config_path: Optional[str] = None) -> None:
+    """
+    Drop a config file, or every config file, from the load_json_config cache.
+
+    Arguments:
+    config_path -- the config file path, None to clear the whole cache
+    """
+    if config_path is None:
+        _config_cache.clear()
+    else:
+        _config_cache.pop(os.path.realpath(config_path), None)
+
+
+def get_config_cache_stats() -> Dict[str, int]:
+    """
+    Get the load_json_config cache hit and miss counters.
+
+    Returns:
+    Dict[str, int] -- The 'hits' and 'misses' counts and the number of cached 'files'.
+    """
+    return {**_config_cache_stats, 'files': len(_config_cache)}
+
+
+def load_json_config(config_path_or_dict: Any, readonly: bool = False) -> Dict[str, Any]:
     """
     Load JSON config variables from a file or dictionary.
+    Files are parsed once and served from a cache until their modification time, size or inode changes.
 
     Arguments:
     config_path_or_dict -- the config file path or dictionary
+    readonly -- return the shared cached config, which raises TypeError on modification, instead of a private mutable copy
 
     Returns:
     Dict[str, Any] -- The loaded configuration dictionary.
@@ -24,10 +117,31 @@ def load_json_config(config_path_or_dict: Any) -> Dict[str, Any]:
     if isinstance(config_path_or_dict, str):
         # If config is a string, assume it's a file path and load the JSON file
         try:
-            with open(config_path_or_dict, 'r') as f:
+            try:
+                real_path = os.path.realpath(config_path_or_dict)
+                stat = os.stat(real_path)
+            except OSError:
+                # Let open() report missing or unreadable files
+                with open(config_path_or_dict, 'r') as f:
+                    return json.load(f)
+
+            signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            cached = _config_cache.get(real_path)
+            if cached is not None and cached[0] == signature:
+                _config_cache_stats['hits'] += 1
+                config = cached[1]
+                logging.debug(
+                    f"Config cache hit for {config_path_or_dict} (hits: {_config_cache_stats['hits']}, misses: {_config_cache_stats['misses']})")
+            else:
+                with open(config_path_or_dict, 'r') as f:
+                    logging.debug(
+                        f"Loading config from file: {config_path_or_dict}")
+                    config = _freeze(json.load(f))
+                _config_cache[real_path] = (signature, config)
+                _config_cache_stats['misses'] += 1
                 logging.debug(
-                    f"Loading config from file: {config_path_or_dict}")
-                return json.load(f)
+                    f"Config cache miss for {config_path_or_dict} (hits: {_config_cache_stats['hits']}, misses: {_config_cache_stats['misses']})")
+            return config if readonly else _thaw(config)
         except FileNotFoundError:
             logging.error(f"Config file {config_path_or_dict} not found.")
             raise
@@ -97,6 +211,72 @@ def load_modules_from_directory(directory_path: str):
     return modules
 
 
+# Modules loaded by load_command, keyed by their real file path
+_command_modules: Dict[str, ModuleType] = {}
+
+
+def parse_command(command: str) -> Tuple[str, str]:
+    """
+    Split a menu command into its module and function names.
+
+    Arguments:
+    command -- 'module:function', or just 'module' to call its main function
+
+    Returns:
+    Tuple[str, str] -- The module name and the function name.
+    """
+    module_name, _, function_name = command.partition(':')
+    return module_name, function_name or 'main'
+
+
+def build_command_registry(menu_options: List[Dict[str, Any]], directory_path: str) -> Dict[str, Tuple[str, str]]:
+    """
+    Map every menu entry to the module file and function it runs, without importing anything.
+
+    Arguments:
+    menu_options -- the menu entries, each with a 'function' command (see parse_command)
+    directory_path -- the directory containing the modules
+
+    Returns:
+    Dict[str, Tuple[str, str]] -- The command mapped to its module file path and function name.
+    """
+    registry = {}
+    for option in menu_options:
+        module_name, function_name = parse_command(option['function'])
+        path = os.path.join(directory_path, f"{module_name}.py")
+        if not os.path.isfile(path):
+            logging.error(
+                f"Module {module_name} for menu item {option.get('label')} not found in {directory_path}")
+        registry[option['function']] = (path, function_name)
+    return registry
+
+
+def load_command(registry: Dict[str, Tuple[str, str]], command: str) -> Callable:
+    """
+    Get the function of a registered command, loading its module on first use only.
+
+    Arguments:
+    registry -- the registry returned by build_command_registry
+    command -- the command to load
+
+    Returns:
+    Callable -- The command function.
+
+    Raises:
+    KeyError -- If the command is not registered.
+    AttributeError -- If the module has no such function.
+    """
+    path, function_name = registry[command]
+    cache_key = os.path.realpath(path)
+    module = _command_modules.get(cache_key)
+    if module is None:
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        module = load_module_from_file(module_name, path)
+        _command_modules[cache_key] = module
+        logging.info(f'Successfully loaded module: {module_name}')
+    return getattr(module, function_name)
+
+
 def main(config_path_or_dict: Any, module_dir_path: str) -> None:
     """
     Main function to run the load module standalone.
@@ -8,6 +8,10 @@ import docker
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from utils.image_prepull import prepull_stacks
+from utils.registry import open_registry
+
+
 class Money4BandWrapper:
     def __init__(self, config_path: str = "config/app-config.json"):
         self.config_path = config_path
@@ -111,6 +115,9 @@ PROXY_PASSWORD={proxy_config.get('password', '')}
                      open(instance_dir / "docker-compose.yml", "w") as dst:
                     dst.write(src.read())
 
+            with open_registry("instances", sync=False) as registry:
+                registry.record([(name, str(instance_dir / ".env"), str(instance_dir / "docker-compose.yml"))])
+
             self.logger.info(f"Successfully created instance {name} with UUID {instance_uuid}")
             return True
 
@@ -126,9 +133,14 @@ PROXY_PASSWORD={proxy_config.get('password', '')}
                 self.logger.error(f"Instance directory not found: {instance_dir}")
                 return False
 
-            # Pull required images
+            # Pull the required images, skipping the ones already up to date
             self.logger.info("Pulling required Docker images...")
-            subprocess.run(["docker-compose", "pull"], cwd=instance_dir, check=True)
+            results = prepull_stacks([(str(instance_dir / "docker-compose.yml"), str(instance_dir / ".env"))],
+                                     client=self.docker_client)
+            failed = [result.image for result in results or [] if result.status == 'failed']
+            if failed:
+                self.logger.error(f"Failed to pull images: {', '.join(failed)}")
+                return False
 
             # Start the instance
             self.logger.info(f"Starting instance {name}...")
@@ -180,17 +192,10 @@ PROXY_PASSWORD={proxy_config.get('password', '')}
         """Get the EarnApp link for an instance"""
         try:
             instance_dir = Path(f"instances/{name}")
-            env_file = instance_dir / ".env"
-            if not env_file.exists():
-                return None
-
-            with open(env_file, "r") as f:
-                for line in f:
-                    if line.startswith("INSTANCE_UUID="):
-                        uuid = line.split("=")[1].strip()
-                        return f"https://earnapp.com/r/{uuid}"
-
-            return None
+            with open_registry("instances", sync=False) as registry:
+                record = registry.get_current(name, str(instance_dir / ".env"), str(instance_dir / "docker-compose.yml"))
+            uuid = record.app_ids.get("INSTANCE_UUID") if record else None
+            return f"https://earnapp.com/r/{uuid}" if uuid else None
 
         except Exception as e:
             self.logger.error(f"Failed to get EarnApp link: {str(e)}")
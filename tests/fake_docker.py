@@ -0,0 +1,198 @@
+"""
+An in-memory stand-in for the docker SDK client, shared by the tests of the engine API code.
+Only the low level API (client.api) is faked, as that is all the utils use.
+"""
+import time
+import threading
+
+# Calls that only read state, left out of FakeAPI.changes()
+READ_CALLS = ('containers', 'networks', 'volumes', 'events', 'inspect_image', 'inspect_distribution')
+
+
+class FakeAPIError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _matches(labels, filters):
+    wanted = (filters or {}).get('label')
+    if not wanted:
+        return True
+    for label in ([wanted] if isinstance(wanted, str) else wanted):
+        key, separator, value = label.partition('=')
+        if key not in labels or (separator and labels[key] != value):
+            return False
+    return True
+
+
+class FakeAPI:
+    """
+    Keeps containers, networks, volumes and images in dictionaries, each call takes `latency` seconds.
+
+    Tests configure it through its attributes:
+        images: the local images by reference, see add_image.
+        remote: the registry digest of each image reference that can be pulled.
+        events_list: the events returned by events().
+        errors: (call, container id) pairs that fail with the given status code, 404 also removes the container.
+    """
+
+    def __init__(self, containers=(), networks=(), events=(), latency=0.0):
+        self.containers_by_id = {container['Id']: container for container in containers}
+        self.networks_by_id = {network['Id']: network for network in networks}
+        self.volumes_by_name = {}
+        self.events_list = list(events)
+        self.images = {}
+        self.remote = {}
+        self.errors = {}
+        self.latency = latency
+        self.calls = []
+        self.events_calls = []
+        self.pulls = []
+        self.tags = []
+        self.active = 0
+        self.max_active = 0
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def _call(self, name, *args):
+        with self.lock:
+            self.calls.append((name,) + args)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+        status_code = self.errors.get((name, args[0])) if args and isinstance(args[0], str) else None
+        if status_code == 404:
+            self.containers_by_id.pop(args[0], None)
+            raise FakeAPIError(f"No such container: {args[0]}", 404)
+        if status_code:
+            raise FakeAPIError(f"{name} of {args[0]} is already in progress", status_code)
+
+    def changes(self):
+        return [call for call in self.calls if call[0] not in READ_CALLS]
+
+    def add_image(self, image, digest):
+        self.images[image] = {'Id': f"sha256:id-{digest}", 'RepoDigests': [f"{image.rpartition(':')[0] or image}@{digest}"]}
+
+    # Containers
+
+    def containers(self, all=False, filters=None):
+        self._call('containers', all, filters)
+        return [container for container in list(self.containers_by_id.values())
+                if (all or container['State'] == 'running') and _matches(container.get('Labels') or {}, filters)]
+
+    def create_host_config(self, **kwargs):
+        return kwargs
+
+    def create_endpoint_config(self, **kwargs):
+        return kwargs
+
+    def create_networking_config(self, endpoints):
+        return endpoints
+
+    def create_container(self, image, **kwargs):
+        self._call('create_container', kwargs['name'])
+        if image not in self.images:
+            raise FakeAPIError(f"No such image: {image}", 404)
+        with self.lock:
+            self.next_id += 1
+            container_id = f"id{self.next_id}"
+        self.containers_by_id[container_id] = {
+            'Id': container_id, 'Names': [f"/{kwargs['name']}"], 'Image': image, 'ImageID': self.images[image]['Id'],
+            'State': 'created', 'Status': 'Created', 'Labels': kwargs.get('labels') or {},
+            'HostConfig': kwargs.get('host_config'), 'Config': kwargs}
+        return {'Id': container_id}
+
+    def start(self, container_id):
+        self._call('start', container_id)
+        self.containers_by_id[container_id].update(State='running', Status='Up 1 second')
+
+    def stop(self, container_id, timeout=None):
+        self._call('stop', container_id, timeout)
+        self.containers_by_id[container_id].update(State='exited', Status='Exited (0) 1 second ago')
+
+    def remove_container(self, container_id, force=False):
+        self._call('remove_container', container_id)
+        self.containers_by_id.pop(container_id, None)
+
+    def connect_container_to_network(self, container_id, network, **kwargs):
+        self._call('connect', container_id, network)
+
+    def events(self, **kwargs):
+        self._call('events')
+        self.events_calls.append(kwargs)
+        return iter(self.events_list)
+
+    # Networks and volumes
+
+    def networks(self, filters=None):
+        self._call('networks', filters)
+        return [network for network in list(self.networks_by_id.values())
+                if _matches(network.get('Labels') or {}, filters)]
+
+    def create_network(self, name, **kwargs):
+        self._call('create_network', name)
+        if name in self.networks_by_id:
+            raise FakeAPIError(f"network with name {name} already exists", 409)
+        self.networks_by_id[name] = {'Id': name, 'Name': name, 'Labels': kwargs.get('labels') or {},
+                                     'IPAM': kwargs.get('ipam')}
+
+    def remove_network(self, network_id):
+        self._call('remove_network', network_id)
+        self.networks_by_id.pop(network_id)
+
+    def volumes(self, filters=None):
+        self._call('volumes', filters)
+        return {'Volumes': [volume for volume in self.volumes_by_name.values()
+                            if _matches(volume.get('Labels') or {}, filters)]}
+
+    def create_volume(self, name, labels=None):
+        self._call('create_volume', name)
+        self.volumes_by_name[name] = {'Name': name, 'Labels': labels or {}}
+
+    # Images
+
+    def inspect_image(self, image):
+        self._call('inspect_image', image)
+        if image not in self.images:
+            raise FakeAPIError(f"No such image: {image}", 404)
+        return self.images[image]
+
+    def inspect_distribution(self, image):
+        self._call('inspect_distribution', image)
+        return {'Descriptor': {'digest': self.remote[image]}}
+
+    def pull(self, image, platform=None, stream=False, decode=False):
+        events = self._pull(image, platform)
+        if stream:
+            return events
+        for event in events:
+            if 'error' in event:
+                raise FakeAPIError(event['error'], 404)
+        return ''
+
+    def _pull(self, image, platform):
+        self._call('pull', image)
+        with self.lock:
+            self.pulls.append((image, platform))
+        if image not in self.remote:
+            yield {'error': f"manifest for {image} not found"}
+            return
+        yield {'status': 'Pulling fs layer', 'id': 'a'}
+        for current in (100, 1000):
+            yield {'status': 'Downloading', 'id': 'a', 'progressDetail': {'current': current, 'total': 1000}}
+            yield {'status': 'Downloading', 'id': 'b', 'progressDetail': {'current': current, 'total': 24}}
+        yield {'status': 'Already exists', 'id': 'c', 'progressDetail': {}}
+        self.add_image(image, self.remote[image])
+
+    def tag(self, image, repository, tag=None, force=False):
+        self._call('tag', image, repository, tag)
+        self.tags.append((image, repository, tag))
+        self.images[f"{repository}:{tag}"] = {'Id': image, 'RepoDigests': []}
+
+
+class FakeClient:
+    def __init__(self, containers=(), networks=(), events=(), latency=0.0):
+        self.api = FakeAPI(containers, networks, events, latency)
@@ -0,0 +1,317 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from utils import checker
+from utils.checker import RegistryCache, configure_registry_cache, fetch_docker_tags, check_img_arch_support, \
+    get_compatible_tag, crawl_docker_tags, build_tag_index, index_images, configure_image_resolver, \
+    resolve_image_platform
+
+TAGS_RESPONSE = {
+    "results": [
+        {"name": "latest", "images": [{"architecture": "amd64"}, {"architecture": "arm64"}]}
+    ]
+}
+
+
+def make_response(status_code=200, data=None, etag=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = data
+    response.headers = {'ETag': etag} if etag else {}
+    response.raise_for_status = MagicMock()
+    return response
+
+
+class TestRegistryCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, '.registry-cache.json')
+        self.original_cache = checker._registry_cache
+        configure_registry_cache(cache_path=self.cache_path, ttl=3600, refresh=False)
+        configure_image_resolver(offline=False, use_local_images=False)
+
+    def tearDown(self):
+        checker._registry_cache = self.original_cache
+        checker._tag_index.clear()
+        self.tmp_dir.cleanup()
+
+    @patch('utils.checker.http_client.get')
+    def test_fetch_docker_tags_uses_cache(self, mock_get):
+        """
+        Test that repeated lookups for the same image hit the registry only once.
+        """
+        mock_get.return_value = make_response(data=TAGS_RESPONSE, etag='"abc"')
+
+        self.assertEqual(fetch_docker_tags('test/image')['results'], TAGS_RESPONSE['results'])
+        self.assertTrue(check_img_arch_support('test/image', 'latest', 'linux/arm64'))
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertTrue(os.path.isfile(self.cache_path))
+
+    @patch('utils.checker.http_client.get')
+    def test_cache_shared_between_instances(self, mock_get):
+        """
+        Test that a second cache instance (another process) reads the persisted entry.
+        """
+        mock_get.return_value = make_response(data=TAGS_RESPONSE, etag='"abc"')
+        fetch_docker_tags('test/image')
+
+        other = RegistryCache(self.cache_path, ttl=3600)
+        self.assertEqual(other.get('test/image')['data']['results'], TAGS_RESPONSE['results'])
+
+    @patch('utils.checker.http_client.get')
+    def test_expired_entry_revalidated_with_etag(self, mock_get):
+        """
+        Test that an expired entry is revalidated with If-None-Match and reused on 304.
+        """
+        checker._registry_cache.store('test/image', TAGS_RESPONSE, '"abc"')
+        checker._registry_cache.ttl = 0
+        mock_get.return_value = make_response(status_code=304)
+
+        self.assertEqual(fetch_docker_tags('test/image'), TAGS_RESPONSE)
+        _, kwargs = mock_get.call_args
+        self.assertEqual(kwargs['headers'], {'If-None-Match': '"abc"'})
+
+    @patch('utils.checker.http_client.get')
+    def test_refresh_forces_unconditional_refetch_once(self, mock_get):
+        """
+        Test that --refresh-registry-cache refetches each image once per run.
+        """
+        checker._registry_cache.store('test/image', TAGS_RESPONSE, '"abc"')
+        configure_registry_cache(refresh=True)
+        mock_get.return_value = make_response(data=TAGS_RESPONSE, etag='"def"')
+
+        fetch_docker_tags('test/image')
+        fetch_docker_tags('test/image')
+        self.assertEqual(mock_get.call_count, 1)
+        _, kwargs = mock_get.call_args
+        self.assertEqual(kwargs['headers'], {})
+
+    @patch('utils.checker.http_client.get')
+    def test_stale_entry_used_when_registry_unreachable(self, mock_get):
+        """
+        Test that a stale entry is returned when the registry cannot be reached.
+        """
+        checker._registry_cache.store('test/image', TAGS_RESPONSE, None)
+        checker._registry_cache.ttl = 0
+        mock_get.side_effect = checker.requests.ConnectionError('offline')
+
+        self.assertEqual(fetch_docker_tags('test/image'), TAGS_RESPONSE)
+
+
+def make_paged_get(pages, etag='"p1"'):
+    """
+    Build a requests.get replacement serving numbered tag pages and recording the pages asked for.
+    """
+    requested = []
+    count = sum(len(page) for page in pages)
+
+    def fake_get(url, headers=None, timeout=None):
+        page = int(url.rsplit('page=', 1)[1])
+        requested.append(page)
+        next_url = url.rsplit('page=', 1)[0] + f"page={page + 1}" if page < len(pages) else None
+        return make_response(data={"count": count, "next": next_url, "results": pages[page - 1]}, etag=etag)
+    return fake_get, requested
+
+
+class TestRegistryCrawl(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_cache = checker._registry_cache
+        self.original_page_size = checker.REGISTRY_PAGE_SIZE
+        checker.REGISTRY_PAGE_SIZE = 2
+        configure_registry_cache(cache_path=os.path.join(
+            self.tmp_dir.name, '.registry-cache.json'), ttl=3600, refresh=False)
+        configure_image_resolver(offline=False, use_local_images=False)
+        self.pages = [
+            [{"name": "latest", "last_updated": "2024-05-01T00:00:00Z", "images": [{"architecture": "amd64"}]},
+             {"name": "1.0", "last_updated": "2024-01-01T00:00:00Z", "images": [{"architecture": "amd64"}]}],
+            [{"name": "0.9", "last_updated": "2023-06-01T00:00:00Z", "images": [{"architecture": "amd64"}]},
+             {"name": "0.8", "last_updated": "2023-05-01T00:00:00Z", "images": [{"architecture": "amd64"}]}],
+            [{"name": "arm-0.7", "last_updated": "2023-04-01T00:00:00Z", "images": [{"architecture": "arm64"}]},
+             {"name": "arm-0.8", "last_updated": "2023-07-01T00:00:00Z", "images": [{"architecture": "arm64"}]}],
+        ]
+
+    def tearDown(self):
+        checker._registry_cache = self.original_cache
+        checker.REGISTRY_PAGE_SIZE = self.original_page_size
+        checker._tag_index.clear()
+        self.tmp_dir.cleanup()
+
+    def test_full_crawl_reads_every_page(self):
+        """
+        Test that a full crawl merges all pages in page order.
+        """
+        fake_get, requested = make_paged_get(self.pages)
+        with patch('utils.checker.http_client.get', side_effect=fake_get):
+            tags_info = crawl_docker_tags('test/image')
+        self.assertTrue(tags_info['complete'])
+        self.assertEqual(sorted(requested), [1, 2, 3])
+        self.assertEqual([t['name'] for t in tags_info['results']],
+                         ['latest', '1.0', '0.9', '0.8', 'arm-0.7', 'arm-0.8'])
+
+    def test_crawl_stops_once_tag_resolved(self):
+        """
+        Test that a lookup for a tag on the first page does not fetch further pages.
+        """
+        fake_get, requested = make_paged_get(self.pages)
+        with patch('utils.checker.http_client.get', side_effect=fake_get):
+            tags_info = crawl_docker_tags('test/image', tag='latest')
+        self.assertFalse(tags_info['complete'])
+        self.assertEqual(requested, [1])
+
+    def test_compatible_tag_found_beyond_first_page(self):
+        """
+        Test that an arm64 tag on a later page is found, newest first.
+        """
+        fake_get, _ = make_paged_get(self.pages)
+        with patch('utils.checker.http_client.get', side_effect=fake_get), \
+                patch('utils.checker.ensure_service') as mock_ensure_service:
+            self.assertFalse(check_img_arch_support('test/image', 'latest', 'linux/arm64'))
+            self.assertEqual(get_compatible_tag('test/image', 'linux/arm64'), 'arm-0.8')
+        mock_ensure_service.assert_not_called()
+
+    def test_build_tag_index_orders_by_last_updated(self):
+        """
+        Test that the per-architecture index lists the newest tags first.
+        """
+        index = build_tag_index({"results": [t for page in self.pages for t in page]})
+        self.assertEqual(index['amd64'], ['latest', '1.0', '0.9', '0.8'])
+        self.assertEqual(index['arm64'], ['arm-0.8', 'arm-0.7'])
+
+    def test_index_images_crawls_each_image_once(self):
+        """
+        Test that indexing several images crawls them once and later lookups are served from the index.
+        """
+        fake_get, requested = make_paged_get(self.pages)
+        with patch('utils.checker.http_client.get', side_effect=fake_get):
+            index = index_images({'test/image': (None, None), 'test/other': (None, None)})
+            calls = len(requested)
+            self.assertTrue(check_img_arch_support('test/other', '0.9', 'linux/amd64'))
+        self.assertEqual(calls, 6)
+        self.assertEqual(len(requested), calls)
+        self.assertIn('test/image', index)
+
+
+class StandInRegistry:
+    """
+    Minimal local stand-in for the Docker Hub tags API, serving {image: [tag_info, ...]}.
+    """
+
+    def __init__(self, images, page_size=100):
+        self.images = images
+        self.page_size = page_size
+        self.requests = []
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                registry.requests.append(parsed.path)
+                image = parsed.path[len('/v2/repositories/'):-len('/tags')]
+                if image not in registry.images:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                page = int(parse_qs(parsed.query).get('page', ['1'])[0])
+                tags = registry.images[image]
+                start = (page - 1) * registry.page_size
+                has_next = start + registry.page_size < len(tags)
+                body = json.dumps({
+                    "count": len(tags),
+                    "next": f"http://{self.headers['Host']}{parsed.path}?page={page + 1}" if has_next else None,
+                    "results": tags[start:start + registry.page_size]
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v2/"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestImageResolver(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_cache = checker._registry_cache
+        self.original_base_url = checker.DOCKERHUB_BASE_URL
+        configure_registry_cache(cache_path=os.path.join(
+            self.tmp_dir.name, '.registry-cache.json'), ttl=3600, refresh=False)
+        configure_image_resolver(offline=False, use_local_images=False)
+        self.images = {
+            "test/image": [
+                {"name": "latest", "last_updated": "2024-05-01T00:00:00Z", "images": [{"architecture": "amd64"}]},
+                {"name": "arm", "last_updated": "2024-04-01T00:00:00Z", "images": [{"architecture": "arm64"}]},
+            ]
+        }
+
+    def tearDown(self):
+        checker._registry_cache = self.original_cache
+        checker.DOCKERHUB_BASE_URL = self.original_base_url
+        configure_image_resolver(offline=False, use_local_images=True)
+        self.tmp_dir.cleanup()
+
+    def test_stand_in_registry_resolution(self):
+        """
+        Test resolving a compatible tag against the local stand-in registry.
+        """
+        with StandInRegistry(self.images) as registry:
+            checker.DOCKERHUB_BASE_URL = registry.base_url
+            self.assertEqual(resolve_image_platform('test/image', 'latest', 'linux/arm64', 'linux/amd64'),
+                             ('arm', 'linux/arm64'))
+        self.assertEqual(len(registry.requests), 1)
+
+    def test_offline_mode_uses_cache_without_network(self):
+        """
+        Test that offline mode answers from the persisted cache and never contacts the registry.
+        """
+        with StandInRegistry(self.images) as registry:
+            checker.DOCKERHUB_BASE_URL = registry.base_url
+            crawl_docker_tags('test/image')
+            checker._registry_cache.ttl = 0  # Entry is stale, offline mode must still use it
+            configure_image_resolver(offline=True)
+            self.assertEqual(resolve_image_platform('test/image', 'latest', 'linux/arm64', 'linux/amd64'),
+                             ('arm', 'linux/arm64'))
+        self.assertEqual(len(registry.requests), 1)
+
+    def test_unknown_image_keeps_configured_tag(self):
+        """
+        Test that an image no source knows about keeps its configured tag instead of being dropped.
+        """
+        configure_image_resolver(offline=True)
+        self.assertEqual(resolve_image_platform('test/missing', 'latest', 'linux/arm64', 'linux/amd64'),
+                         ('latest', 'linux/arm64'))
+
+    @patch('utils.checker.get_local_image_tags', return_value={'latest': {'arm64'}})
+    def test_local_images_resolve_before_network(self, mock_local_tags):
+        """
+        Test that a matching local image answers the lookup without contacting the registry.
+        """
+        configure_image_resolver(use_local_images=True)
+        with StandInRegistry(self.images) as registry:
+            checker.DOCKERHUB_BASE_URL = registry.base_url
+            self.assertTrue(check_img_arch_support('test/image', 'latest', 'linux/arm64'))
+        self.assertEqual(registry.requests, [])
+        mock_local_tags.assert_called_once_with('test/image')
+
+
+if __name__ == '__main__':
+    unittest.main()
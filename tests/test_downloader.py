@@ -4,7 +4,7 @@ import requests
 from utils.downloader import download_file
 
 class TestDownloadFile(unittest.TestCase):
-    @patch('utils.downloader.requests.get')
+    @patch('utils.downloader.http_client.get')
     def test_download_file_success(self, mock_get):
         """
         Test successful download of a file.
@@ -22,7 +22,7 @@ class TestDownloadFile(unittest.TestCase):
             mocked_file().write.assert_called_once_with(b'test data')
 
     @patch('utils.downloader.logging.error')
-    @patch('utils.downloader.requests.get')
+    @patch('utils.downloader.http_client.get')
     def test_download_file_failure(self, mock_get, mock_logging_error):
         """
         Test download failure due to a request exception.
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import patch
+import json
+import os
+import shutil
+import stat
+import tempfile
+from utils import dumper
+from utils.dumper import write_json, batched_writes
+
+
+class TestWriteJson(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'user-config.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_write_and_skip_unchanged(self):
+        """
+        Test that identical data does not touch the file.
+        """
+        self.assertTrue(write_json({"key": "value"}, self.path))
+        self.assertEqual(self.read(), {"key": "value"})
+        with patch('utils.dumper.os.replace') as mock_replace:
+            self.assertFalse(write_json({"key": "value"}, self.path))
+            mock_replace.assert_not_called()
+        self.assertTrue(write_json({"key": "other"}, self.path))
+        self.assertEqual(self.read(), {"key": "other"})
+
+    def test_replace_keeps_mode_and_leaves_no_temp_files(self):
+        """
+        Test that the replaced file keeps its permissions.
+        """
+        write_json({"key": "value"}, self.path)
+        os.chmod(self.path, 0o640)
+        write_json({"key": "other"}, self.path)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        self.assertEqual(os.listdir(self.tmp_dir), ['user-config.json'])
+
+    def test_failed_write_keeps_original(self):
+        """
+        Test that a write failing midway leaves the previous content intact.
+        """
+        write_json({"key": "value"}, self.path)
+        with patch('utils.dumper.os.fsync', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                write_json({"key": "other"}, self.path)
+        self.assertEqual(self.read(), {"key": "value"})
+        self.assertEqual(os.listdir(self.tmp_dir), ['user-config.json'])
+
+    def test_batched_writes_coalesce(self):
+        """
+        Test that writes inside a batch become one write per file when the batch ends.
+        """
+        other_path = os.path.join(self.tmp_dir, 'm4b-config.json')
+        config = {"device_info": {}}
+        with patch('utils.dumper._atomic_write', wraps=dumper._atomic_write) as mock_write:
+            with batched_writes():
+                write_json(config, self.path)
+                config["device_info"]["os_type"] = "Linux"
+                with batched_writes():
+                    write_json(config, self.path)
+                    write_json({"system": {}}, other_path)
+                self.assertFalse(os.path.exists(self.path))
+                # The data is captured when written, later changes need another write
+                config["resource_limits"] = {}
+            self.assertEqual(mock_write.call_count, 2)
+        self.assertEqual(self.read(), {"device_info": {"os_type": "Linux"}})
+
+
+if __name__ == '__main__':
+    unittest.main()
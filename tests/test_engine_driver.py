@@ -0,0 +1,158 @@
+import os
+import sys
+import copy
+import shutil
+import tempfile
+import unittest
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.engine_driver import (EngineStackDriver, UnsupportedComposeOption, interpolate, parse_duration, parse_bytes,
+                                 plan_stack, plan_stack_files, COMPOSE_SERVICE_LABEL, COMPOSE_CONFIG_HASH_LABEL,
+                                 COMPOSE_NETWORK_LABEL)
+from utils.teardown import COMPOSE_PROJECT_LABEL
+from tests.fake_docker import FakeClient
+
+COMPOSE_DICT = {
+    'services': {
+        'earnapp': {
+            'container_name': '${DEVICE_NAME}_earnapp',
+            'image': 'fr3nd/earnapp:latest',
+            'platform': 'linux/amd64',
+            'environment': ['EARNAPP_UUID=${EARNAPP_UUID}', 'HOME'],
+            'volumes': ['./earnapp-data:/etc/earnapp'],
+            'restart': 'always',
+            'cpus': '${APP_CPU_LIMIT_LITTLE}',
+            'mem_limit': '${APP_MEM_LIMIT_LITTLE}',
+            'network_mode': 'service:proxy',
+        },
+        'proxy': {
+            'container_name': '${DEVICE_NAME}_tun2socks',
+            'image': 'xjasonlyu/tun2socks:latest',
+            'environment': ['PROXY=${STACK_PROXY_URL}'],
+            'cap_add': ['NET_ADMIN'],
+            'ports': ['${EARNAPP_PORT}:4000', '127.0.0.1:5353:53/udp'],
+            'healthcheck': {'test': 'ip link show tun0', 'interval': '5s', 'retries': 3},
+            'restart': 'always',
+        },
+    },
+    'networks': {'default': {'driver': '${NETWORK_DRIVER}', 'ipam': {'config': [{'subnet': '${NETWORK_SUBNET}/${NETWORK_NETMASK}'}]}}},
+}
+ENV = {
+    'DEVICE_NAME': 'swift_panther_ab12', 'EARNAPP_UUID': 'sdk-node-0123', 'APP_CPU_LIMIT_LITTLE': '0.5',
+    'APP_MEM_LIMIT_LITTLE': '256m', 'STACK_PROXY_URL': 'socks5://10.0.0.1:1080', 'EARNAPP_PORT': '50005',
+    'NETWORK_DRIVER': 'bridge', 'NETWORK_SUBNET': '172.19.7.32', 'NETWORK_NETMASK': '27', 'HOME': '/root',
+}
+
+
+def fake_client():
+    client = FakeClient()
+    client.api.add_image('fr3nd/earnapp:latest', 'sha256:e1')
+    client.api.remote = {'xjasonlyu/tun2socks:latest': 'sha256:t1'}
+    return client
+
+
+class TestHelpers(unittest.TestCase):
+    def test_interpolate(self):
+        env = {'A': 'a', 'EMPTY': ''}
+        self.assertEqual(interpolate('${A}-$A-${MISSING}-$$A', env), 'a-a--$A')
+        self.assertEqual(interpolate('${EMPTY:-x} ${EMPTY-x} ${MISSING-x} ${A:+y} ${MISSING:+y}', env), 'x  x y ')
+        self.assertEqual(interpolate({'k': ['${A}', 1]}, env), {'k': ['a', 1]})
+        with self.assertRaises(ValueError):
+            interpolate('${MISSING:?must be set}', env)
+
+    def test_parse_units(self):
+        self.assertEqual(parse_duration('1m30s'), 90 * 10**9)
+        self.assertEqual(parse_duration('500ms'), 5 * 10**8)
+        self.assertEqual(parse_bytes('2G'), 2 * 1024**3)
+        self.assertEqual(parse_bytes('512m'), 512 * 1024**2)
+        with self.assertRaises(ValueError):
+            parse_duration('5 minutes')
+
+
+class TestPlanStack(unittest.TestCase):
+    def test_translates_compose_dict(self):
+        plan = plan_stack(COMPOSE_DICT, 'Money4Band_AB12', ENV, '/srv/m4b/ab12')
+        self.assertEqual(plan.project, 'money4band_ab12')
+        self.assertEqual([spec.service for spec in plan.services], ['proxy', 'earnapp'])
+        proxy, earnapp = plan.services
+        self.assertEqual(proxy.name, 'swift_panther_ab12_tun2socks')
+        self.assertEqual(proxy.host['port_bindings'], {'4000': [50005], '53/udp': [('127.0.0.1', 5353)]})
+        self.assertEqual(proxy.create['healthcheck'], {'test': ['CMD-SHELL', 'ip link show tun0'],
+                                                      'interval': 5 * 10**9, 'retries': 3})
+        self.assertEqual(proxy.networks, {'money4band_ab12_default': {'aliases': ['proxy']}})
+        self.assertEqual(earnapp.create['environment'], ['EARNAPP_UUID=sdk-node-0123', 'HOME=/root'])
+        self.assertEqual(earnapp.host['binds'], ['/srv/m4b/ab12/earnapp-data:/etc/earnapp:rw'])
+        self.assertEqual(earnapp.host['nano_cpus'], 5 * 10**8)
+        self.assertEqual(earnapp.host['mem_limit'], 256 * 1024**2)
+        self.assertEqual(earnapp.network_service, 'proxy')
+        self.assertEqual(earnapp.labels[COMPOSE_PROJECT_LABEL], 'money4band_ab12')
+        self.assertEqual(earnapp.labels[COMPOSE_SERVICE_LABEL], 'earnapp')
+        self.assertEqual(plan.networks[0].subnets, ['172.19.7.32/27'])
+        self.assertEqual(plan.networks[0].labels[COMPOSE_NETWORK_LABEL], 'default')
+
+    def test_rejects_unsupported_options(self):
+        compose_dict = copy.deepcopy(COMPOSE_DICT)
+        compose_dict['services']['proxy']['build'] = '.'
+        with self.assertRaises(UnsupportedComposeOption):
+            plan_stack(compose_dict, 'money4band_ab12', ENV)
+        compose_dict = copy.deepcopy(COMPOSE_DICT)
+        compose_dict['services']['proxy']['depends_on'] = ['earnapp']
+        with self.assertRaises(ValueError):
+            plan_stack(compose_dict, 'money4band_ab12', ENV)
+
+    def test_plan_from_files(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(tmp_dir, 'docker-compose.yaml'), 'w') as f:
+                f.write("services:\n  app:\n    image: alpine:3\n    command: sleep '1 2'\n")
+            with open(os.path.join(tmp_dir, '.env'), 'w') as f:
+                f.write("# comment\nCOMPOSE_PROJECT_NAME=money4band_cd34\n")
+            plan = plan_stack_files(os.path.join(tmp_dir, 'docker-compose.yaml'), os.path.join(tmp_dir, '.env'))
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(plan.project, 'money4band_cd34')
+        self.assertEqual(plan.services[0].name, 'money4band_cd34-app-1')
+        self.assertEqual(plan.services[0].create['command'], ['sleep', '1 2'])
+
+
+class TestEngineStackDriver(unittest.TestCase):
+    def setUp(self):
+        self.client = fake_client()
+        self.driver = EngineStackDriver(self.client, grace=1)
+
+    def test_up_creates_pulls_and_is_idempotent(self):
+        plan = plan_stack(COMPOSE_DICT, 'money4band_ab12', ENV)
+        self.assertEqual(self.driver.up(plan), {'proxy': 'created', 'earnapp': 'created'})
+        api = self.client.api
+        self.assertIn(('create_network', 'money4band_ab12_default'), api.calls)
+        self.assertIn(('pull', 'xjasonlyu/tun2socks:latest'), api.calls)
+        containers = {container['Labels'][COMPOSE_SERVICE_LABEL]: container for container in api.containers_by_id.values()}
+        self.assertEqual(containers['earnapp']['HostConfig']['network_mode'], f"container:{containers['proxy']['Id']}")
+        self.assertEqual(containers['proxy']['HostConfig']['network_mode'], 'money4band_ab12_default')
+
+        api.calls.clear()
+        self.assertEqual(self.driver.up(plan), {'proxy': 'running', 'earnapp': 'running'})
+        self.assertEqual(api.changes(), [])
+
+    def test_changed_service_is_recreated_with_its_dependents(self):
+        self.client.api.add_image('xjasonlyu/tun2socks:latest', 'sha256:t1')
+        self.driver.up(plan_stack(COMPOSE_DICT, 'money4band_ab12', ENV))
+        changed_env = dict(ENV, STACK_PROXY_URL='socks5://10.0.0.2:1080')
+        compose_dict = copy.deepcopy(COMPOSE_DICT)
+        compose_dict['services']['orphan_free'] = {'image': 'fr3nd/earnapp:latest'}
+        actions = self.driver.up(plan_stack(compose_dict, 'money4band_ab12', changed_env))
+        self.assertEqual(actions, {'proxy': 'recreated', 'earnapp': 'recreated', 'orphan_free': 'created'})
+
+        actions = self.driver.up(plan_stack(COMPOSE_DICT, 'money4band_ab12', changed_env))
+        self.assertEqual(actions, {'proxy': 'running', 'earnapp': 'running', 'orphan_free': 'removed'})
+        hashes = {container['Labels'][COMPOSE_CONFIG_HASH_LABEL] for container in self.client.api.containers_by_id.values()}
+        self.assertEqual(len(hashes), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,15 @@
+import json
+import os
+import shutil
+import tempfile
 import unittest
-from utils.generator import validate_uuid, generate_uuid, generate_device_name
+from unittest.mock import patch
+import yaml
+from utils.generator import (validate_uuid, generate_uuid, generate_device_name, merge_config, build_compose_dict,
+                             build_env_lines, assemble_docker_compose, generate_env_file, generate_instances_batch,
+                             prune_shared_composes, dump_compose_yaml, regenerate_instances, SHARED_COMPOSE_DIR)
+from utils.loader import load_instance_configs, INSTANCE_BASE_DIR, INSTANCE_CONFIG_FILES, INSTANCE_OVERLAY_FILE
+from utils.dumper import write_json
 
 class TestGeneratorFunctions(unittest.TestCase):
 
@@ -20,5 +30,256 @@ class TestGeneratorFunctions(unittest.TestCase):
         self.assertIn(device_name.split("_")[0], adjectives)
         self.assertIn(device_name.split("_")[1], animals)
 
+
+def make_configs():
+    m4b_config = {
+        'system': {'default_docker_platform': 'linux/amd64'},
+        'project': {'compose_project_name': 'money4band'},
+        'network': {'subnet': '172.19.7.0', 'netmask': 27},
+    }
+    app_config = {
+        'apps': [{
+            'name': 'EARNAPP',
+            'flags': {'uuid': {}},
+            'compose_config': {'image': 'fazalfarhan01/earnapp:lite', 'ports': ['${EARNAPP_PORT}:80']},
+            'compose_config_proxy': {'network_mode': 'service:proxy', 'dns': None},
+        }],
+        'extra-apps': [],
+    }
+    user_config = {
+        'apps': {'earnapp': {'enabled': True, 'uuid': 'sdk-node-1234', 'ports': 50000}},
+        'proxies': {'url': '', 'enabled': False},
+        'device_info': {'device_name': 'swift_panther'},
+        'm4b_dashboard': {'enabled': True, 'ports': 8081},
+        'compose_config_common': {
+            'network': {'driver': 'bridge', 'subnet': '${NETWORK_SUBNET}', 'netmask': '${NETWORK_NETMASK}'},
+            'proxy_service': {'image': 'xjasonlyu/tun2socks:latest', 'ports': ['${M4B_DASHBOARD_PORT}:80']},
+        },
+    }
+    return m4b_config, app_config, user_config
+
+
+@patch('utils.generator.index_images')
+@patch('utils.generator.resolve_image_platform', side_effect=lambda image, tag, platform, default: (tag, platform))
+class TestBatchGeneration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def instance(self, name, proxy, port):
+        instance_dir = os.path.join(self.tmp_dir, name)
+        os.makedirs(instance_dir)
+        return {
+            'compose_output_path': os.path.join(instance_dir, 'docker-compose.yaml'),
+            'env_output_path': os.path.join(instance_dir, '.env'),
+            'overrides': {
+                'user_config': {
+                    'device_info': {'device_name': name},
+                    'proxies': {'url': proxy, 'enabled': True},
+                    'apps': {'earnapp': {'ports': port}},
+                    'm4b_dashboard': {'enabled': False, 'ports': None},
+                },
+                'm4b_config': {'project': {'compose_project_name': name}},
+            },
+        }
+
+    def test_merge_config(self, mock_resolve, mock_index):
+        base = {'a': {'b': 1, 'c': [1]}, 'd': 2, 'e': {'f': 3}}
+        merged = merge_config(base, {'a': {'b': 5}, 'd': None, 'g': 7})
+        self.assertEqual(merged, {'a': {'b': 5, 'c': [1]}, 'e': {'f': 3}, 'g': 7})
+        self.assertEqual(base, {'a': {'b': 1, 'c': [1]}, 'd': 2, 'e': {'f': 3}})
+        # Untouched branches are shared rather than copied
+        self.assertIs(merged['e'], base['e'])
+
+    def test_build_does_not_modify_configs(self, mock_resolve, mock_index):
+        m4b_config, app_config, user_config = make_configs()
+        user_config['proxies']['enabled'] = True
+        snapshot = json.dumps([m4b_config, app_config, user_config], sort_keys=True)
+        compose_dict = build_compose_dict(m4b_config, app_config, user_config)
+        build_env_lines(m4b_config, app_config, user_config)
+        self.assertEqual(json.dumps([m4b_config, app_config, user_config], sort_keys=True), snapshot)
+        self.assertEqual(compose_dict['services']['earnapp']['network_mode'], 'service:proxy')
+        self.assertNotIn('dns', compose_dict['services']['earnapp'])
+        self.assertEqual(compose_dict['services']['proxy']['ports'], ['${EARNAPP_PORT}:80'])
+
+    def test_batch_matches_single_instance_generation(self, mock_resolve, mock_index):
+        m4b_config, app_config, user_config = make_configs()
+        instances = [self.instance(f"swift_panther_{i}", f"socks5://10.0.0.{i}:1080", 50010 + i * 10)
+                     for i in range(3)]
+        results = generate_instances_batch(m4b_config, app_config, user_config, instances)
+        self.assertEqual([r['compose_output_path'] for r in results],
+                         [i['compose_output_path'] for i in instances])
+        # Images are resolved once for the whole batch
+        self.assertEqual(mock_resolve.call_count, 1)
+        mock_index.assert_called_once()
+
+        for instance in instances:
+            overrides = instance['overrides']
+            instance_m4b = merge_config(m4b_config, overrides['m4b_config'])
+            instance_user = merge_config(user_config, overrides['user_config'])
+            single_compose = os.path.join(self.tmp_dir, 'single.yaml')
+            single_env = os.path.join(self.tmp_dir, 'single.env')
+            assemble_docker_compose(instance_m4b, app_config, instance_user, compose_output_path=single_compose)
+            generate_env_file(instance_m4b, app_config, instance_user, env_output_path=single_env)
+            with open(instance['compose_output_path']) as f, open(single_compose) as g:
+                self.assertEqual(f.read(), g.read())
+            with open(instance['env_output_path']) as f, open(single_env) as g:
+                self.assertEqual(f.read(), g.read())
+
+        with open(instances[1]['env_output_path']) as f:
+            env = f.read().splitlines()
+        self.assertIn('EARNAPP_PORT=50020', env)
+        self.assertIn('STACK_PROXY_URL=socks5://10.0.0.1:1080', env)
+        self.assertNotIn('M4B_DASHBOARD_PORT=8081', env)
+        self.assertEqual(user_config['m4b_dashboard'], {'enabled': True, 'ports': 8081})
+
+    def test_batch_skips_unchanged_instances(self, mock_resolve, mock_index):
+        m4b_config, app_config, user_config = make_configs()
+        instances = [self.instance(f"swift_panther_{i}", f"socks5://10.0.0.{i}:1080", 50010 + i * 10)
+                     for i in range(2)]
+        first = generate_instances_batch(m4b_config, app_config, user_config, instances)
+        self.assertTrue(all(result['changed'] for result in first))
+        mtime = os.stat(instances[0]['compose_output_path']).st_mtime_ns
+
+        instances[1]['overrides']['user_config']['proxies']['url'] = 'socks5://10.0.0.9:1080'
+        second = generate_instances_batch(m4b_config, app_config, user_config, instances)
+        self.assertEqual([result['changed'] for result in second], [False, True])
+        self.assertEqual(os.stat(instances[0]['compose_output_path']).st_mtime_ns, mtime)
+        with open(instances[1]['env_output_path']) as f:
+            self.assertIn('STACK_PROXY_URL=socks5://10.0.0.9:1080', f.read())
+
+        # A resolved tag change only invalidates the compose file
+        mock_resolve.side_effect = lambda image, tag, platform, default: ('latest', platform)
+        third = generate_instances_batch(m4b_config, app_config, user_config, instances)
+        self.assertTrue(all(result['changed'] for result in third))
+        with open(instances[0]['compose_output_path']) as f:
+            self.assertIn('fazalfarhan01/earnapp:latest', f.read())
+
+        self.assertTrue(all(result['changed'] for result in
+                            generate_instances_batch(m4b_config, app_config, user_config, instances, force=True)))
+
+    def test_single_file_generation_skips_unchanged(self, mock_resolve, mock_index):
+        m4b_config, app_config, user_config = make_configs()
+        compose_path = os.path.join(self.tmp_dir, 'docker-compose.yaml')
+        env_path = os.path.join(self.tmp_dir, '.env')
+        self.assertTrue(assemble_docker_compose(m4b_config, app_config, user_config, compose_output_path=compose_path))
+        self.assertTrue(generate_env_file(m4b_config, app_config, user_config, env_output_path=env_path))
+        self.assertFalse(assemble_docker_compose(m4b_config, app_config, user_config, compose_output_path=compose_path))
+        self.assertFalse(generate_env_file(m4b_config, app_config, user_config, env_output_path=env_path))
+
+        os.remove(env_path)
+        self.assertTrue(generate_env_file(m4b_config, app_config, user_config, env_output_path=env_path))
+        user_config['device_info']['device_name'] = 'brave_eagle'
+        self.assertTrue(generate_env_file(m4b_config, app_config, user_config, env_output_path=env_path))
+        self.assertTrue(assemble_docker_compose(m4b_config, app_config, user_config, compose_output_path=compose_path))
+        # Sections the generator does not read do not invalidate the files
+        user_config['unrelated'] = {'key': 'value'}
+        self.assertFalse(assemble_docker_compose(m4b_config, app_config, user_config, compose_output_path=compose_path))
+
+    def test_batch_shares_one_compose_file(self, mock_resolve, mock_index):
+        m4b_config, app_config, user_config = make_configs()
+        shared_dir = os.path.join(self.tmp_dir, SHARED_COMPOSE_DIR)
+        instances = [self.instance(f"swift_panther_{i}", f"socks5://10.0.0.{i}:1080", 50010 + i * 10)
+                     for i in range(4)]
+        results = generate_instances_batch(m4b_config, app_config, user_config, instances,
+                                           shared_compose_dir=shared_dir)
+        self.assertTrue(all(result['changed'] for result in results))
+        self.assertEqual(len(os.listdir(shared_dir)), 1)
+        shared_file = os.path.realpath(instances[0]['compose_output_path'])
+        for instance in instances:
+            self.assertTrue(os.path.islink(instance['compose_output_path']))
+            self.assertEqual(os.path.realpath(instance['compose_output_path']), shared_file)
+
+        # The shared file is what each instance would have rendered on its own
+        overrides = instances[2]['overrides']
+        single_compose = os.path.join(self.tmp_dir, 'single.yaml')
+        assemble_docker_compose(merge_config(m4b_config, overrides['m4b_config']), app_config,
+                                merge_config(user_config, overrides['user_config']), compose_output_path=single_compose)
+        with open(shared_file) as f, open(single_compose) as g:
+            self.assertEqual(f.read(), g.read())
+
+        again = generate_instances_batch(m4b_config, app_config, user_config, instances,
+                                         shared_compose_dir=shared_dir)
+        self.assertFalse(any(result['changed'] for result in again))
+
+        # An instance with a different app set gets its own shared file, the old one is pruned once unused
+        for instance in instances:
+            instance['overrides']['user_config']['apps']['earnapp']['docker_platform'] = 'linux/arm64'
+        generate_instances_batch(m4b_config, app_config, user_config, instances[:1], shared_compose_dir=shared_dir)
+        self.assertEqual(len(os.listdir(shared_dir)), 2)
+        self.assertEqual(prune_shared_composes(shared_dir, self.tmp_dir), [])
+        generate_instances_batch(m4b_config, app_config, user_config, instances, shared_compose_dir=shared_dir)
+        self.assertEqual(prune_shared_composes(shared_dir, self.tmp_dir), [shared_file])
+
+
+    def test_regenerate_instances_from_overlays(self, mock_resolve, mock_index):
+        m4b_config, app_config, user_config = make_configs()
+        base_dir = os.path.join(self.tmp_dir, INSTANCE_BASE_DIR)
+        os.makedirs(base_dir)
+        for key, config in (('m4b_config', m4b_config), ('app_config', app_config), ('user_config', user_config)):
+            write_json(config, os.path.join(base_dir, INSTANCE_CONFIG_FILES[key]))
+        instances = [self.instance(f"swift_panther_{i}", f"socks5://10.0.0.{i}:1080", 50010 + i * 10)
+                     for i in range(2)]
+        for instance in instances:
+            write_json({'overrides': instance['overrides']}, os.path.join(
+                os.path.dirname(instance['env_output_path']), INSTANCE_OVERLAY_FILE))
+
+        instance_dir = os.path.dirname(instances[1]['env_output_path'])
+        instance_m4b, instance_app, instance_user = load_instance_configs(instance_dir)
+        self.assertEqual(instance_user['device_info']['device_name'], 'swift_panther_1')
+        self.assertEqual(instance_user['apps']['earnapp'], {'enabled': True, 'uuid': 'sdk-node-1234', 'ports': 50020})
+        self.assertNotIn('ports', instance_user['m4b_dashboard'])
+        self.assertEqual(instance_m4b['network'], m4b_config['network'])
+
+        results = regenerate_instances(self.tmp_dir)
+        self.assertEqual([result['project_name'] for result in results], ['swift_panther_0', 'swift_panther_1'])
+        self.assertTrue(all(result['changed'] for result in results))
+        self.assertFalse(any(result['changed'] for result in regenerate_instances(self.tmp_dir)))
+
+        # A base change reaches every instance, overridden values stay per instance
+        user_config['apps']['earnapp']['uuid'] = 'sdk-node-5678'
+        write_json(user_config, os.path.join(base_dir, INSTANCE_CONFIG_FILES['user_config']))
+        self.assertTrue(all(result['changed'] for result in regenerate_instances(self.tmp_dir)))
+        with open(instances[1]['env_output_path']) as f:
+            env = f.read().splitlines()
+        self.assertIn('EARNAPP_UUID=sdk-node-5678', env)
+        self.assertIn('EARNAPP_PORT=50020', env)
+
+    def test_load_instance_configs_from_full_copies(self, mock_resolve, mock_index):
+        configs = make_configs()
+        for filename, config in zip(INSTANCE_CONFIG_FILES.values(), configs):
+            write_json(config, os.path.join(self.tmp_dir, filename))
+        self.assertEqual(load_instance_configs(self.tmp_dir), configs)
+        self.assertEqual(regenerate_instances(self.tmp_dir), [])
+
+@patch('utils.generator.index_images')
+@patch('utils.generator.resolve_image_platform', side_effect=lambda image, tag, platform, default: (tag, platform))
+class TestComposeYaml(unittest.TestCase):
+
+    def compose_dicts(self):
+        m4b_config, app_config, user_config = make_configs()
+        user_config['compose_config_common']['watchtower_service'] = {
+            'proxy_enabled': {'image': 'containrrr/watchtower:latest', 'command': ['--cleanup', '--interval', '7200']},
+            'proxy_disabled': {'image': 'containrrr/watchtower:latest'}}
+        user_config['compose_config_common']['m4b_dashboard_service'] = {
+            'image': 'nginx:alpine-slim', 'ports': ['${M4B_DASHBOARD_PORT}:80'], 'volumes': ['./.resources/.www:/usr/share/nginx/html']}
+        compose_dicts = [build_compose_dict(m4b_config, app_config, user_config, True)]
+        user_config['proxies']['enabled'] = True
+        compose_dicts.append(build_compose_dict(m4b_config, app_config, user_config, True))
+        return compose_dicts
+
+    def test_round_trip(self, mock_resolve, mock_index):
+        for compose_dict in self.compose_dicts():
+            self.assertEqual(yaml.safe_load(dump_compose_yaml(compose_dict)), compose_dict)
+
+    @unittest.skipUnless(hasattr(yaml, 'CDumper'), 'PyYAML built without libyaml')
+    def test_c_emitter_matches_python_emitter(self, mock_resolve, mock_index):
+        for compose_dict in self.compose_dicts():
+            self.assertEqual(dump_compose_yaml(compose_dict, yaml.CDumper),
+                             dump_compose_yaml(compose_dict, yaml.Dumper))
+
 if __name__ == '__main__':
     unittest.main()
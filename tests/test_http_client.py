@@ -0,0 +1,94 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import requests
+from utils import http_client
+
+
+def make_response(status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        http_client.reset_host_stats()
+        self.session = MagicMock()
+        patcher = patch('utils.http_client.get_session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('utils.http_client.time.sleep')
+    def test_retry_after_honoured_on_429(self, mock_sleep):
+        """
+        Test that a 429 with Retry-After is retried after the requested delay.
+        """
+        self.session.request.side_effect = [
+            make_response(429, {'Retry-After': '7'}), make_response(200)]
+
+        response = http_client.get('https://registry.hub.docker.com/v2/x')
+        self.assertEqual(response.status_code, 200)
+        mock_sleep.assert_called_once_with(7.0)
+        _, kwargs = self.session.request.call_args
+        self.assertEqual(kwargs['timeout'], http_client.DEFAULT_TIMEOUT)
+
+    @patch('utils.http_client.time.sleep')
+    def test_github_rate_limit_is_retried(self, mock_sleep):
+        """
+        Test that GitHub's 403 with an exhausted quota is treated as a rate limit.
+        """
+        self.session.request.side_effect = [
+            make_response(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '0'}), make_response(200)]
+
+        self.assertEqual(http_client.get('https://api.github.com/repos').status_code, 200)
+        mock_sleep.assert_called_once_with(0.0)
+
+    @patch('utils.http_client.time.sleep')
+    def test_connection_errors_retried_then_raised(self, mock_sleep):
+        """
+        Test that connection errors are retried with backoff and finally raised.
+        """
+        self.session.request.side_effect = requests.ConnectionError('down')
+
+        with self.assertRaises(requests.ConnectionError):
+            http_client.get('https://example.com/file', retries=2)
+        self.assertEqual(self.session.request.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        stats = http_client.get_host_stats()['example.com']
+        self.assertEqual(stats['calls'], 3)
+        self.assertEqual(stats['errors'], 3)
+        self.assertEqual(stats['retries'], 2)
+
+    @patch('utils.http_client.time.sleep')
+    def test_non_idempotent_requests_not_retried(self, mock_sleep):
+        """
+        Test that POST requests are sent once even on a retryable status.
+        """
+        self.session.request.return_value = make_response(503)
+
+        self.assertEqual(http_client.request('POST', 'https://example.com/api').status_code, 503)
+        self.assertEqual(self.session.request.call_count, 1)
+        mock_sleep.assert_not_called()
+
+    def test_backoff_delay_is_bounded(self):
+        """
+        Test that the jittered backoff never exceeds the exponential cap.
+        """
+        for attempt in range(10):
+            delay = http_client.backoff_delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(http_client.BACKOFF_MAX, http_client.BACKOFF_BASE * 2 ** attempt))
+
+    @patch('utils.http_client.time.time', return_value=784111767.0)
+    def test_retry_after_dates(self, mock_time):
+        """
+        Test that Retry-After dates are read as GMT and unparsable values are ignored.
+        """
+        self.assertEqual(http_client._retry_after(make_response(429, {'Retry-After': 'Sun, 06 Nov 1994 08:49:47 GMT'})), 20.0)
+        self.assertEqual(http_client._retry_after(make_response(429, {'Retry-After': 'Sun, 06 Nov 1994 08:49:47 -0000'})), 20.0)
+        self.assertIsNone(http_client._retry_after(make_response(429, {'Retry-After': 'soon'})))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import json
+import shutil
+import tempfile
+import unittest
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.image_prepull import collect_images, prepull_images, format_bytes
+from tests.fake_docker import FakeClient
+
+COMPOSE_FILE = """services:
+  earnapp:
+    image: fr3nd/earnapp:latest
+    platform: ${EARNAPP_PLATFORM}
+  proxy:
+    image: xjasonlyu/tun2socks:latest
+  sidecar:
+    image: xjasonlyu/tun2socks:latest
+"""
+
+
+class TestCollectImages(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_dedupes_across_stacks(self):
+        compose_file = os.path.join(self.tmp_dir, 'docker-compose.yaml')
+        with open(compose_file, 'w') as f:
+            f.write(COMPOSE_FILE)
+        stacks = []
+        for i, platform in enumerate(['linux/amd64', 'linux/amd64', 'linux/arm64']):
+            env_file = os.path.join(self.tmp_dir, f"{i}.env")
+            with open(env_file, 'w') as f:
+                f.write(f"EARNAPP_PLATFORM={platform}\n")
+            stacks.append((compose_file, env_file))
+        stacks.append((os.path.join(self.tmp_dir, 'missing.yaml'), env_file))
+        self.assertEqual(collect_images(stacks), {
+            ('fr3nd/earnapp:latest', 'linux/amd64'): 2,
+            ('xjasonlyu/tun2socks:latest', None): 3,
+            ('fr3nd/earnapp:latest', 'linux/arm64'): 1,
+        })
+
+
+class TestPrepullImages(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.tmp_dir, 'pulls.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pulls_only_what_changed(self):
+        client = FakeClient()
+        client.api.remote = {'a:1': 'sha256:a1', 'b:1': 'sha256:b2', 'c:1': 'sha256:c1'}
+        client.api.add_image('a:1', 'sha256:a1')
+        client.api.add_image('b:1', 'sha256:b1')
+        images = {('a:1', None): 3, ('b:1', None): 3, ('c:1', 'linux/arm64'): 1, ('gone:1', None): 1}
+        results = prepull_images(client, images, workers=2, state_path=self.state_path)
+        self.assertEqual([result.status for result in results], ['current', 'pulled', 'pulled', 'failed'])
+        self.assertEqual(results[1].bytes_pulled, 1024)
+        self.assertIn('not found', results[3].error)
+        self.assertEqual(sorted(client.api.pulls), [('b:1', None), ('c:1', 'linux/arm64'), ('gone:1', None)])
+        with open(self.state_path) as f:
+            self.assertEqual(json.load(f)['b:1|']['digest'], 'sha256:b2')
+
+        # Checked images are trusted within the TTL, the registry is asked again once it expired
+        client.api.pulls.clear()
+        client.api.remote['a:1'] = 'sha256:a2'
+        results = prepull_images(client, images, state_path=self.state_path)
+        self.assertEqual([result.status for result in results], ['fresh', 'fresh', 'fresh', 'failed'])
+        results = prepull_images(client, images, ttl=0, state_path=self.state_path)
+        self.assertEqual([result.status for result in results], ['pulled', 'current', 'current', 'failed'])
+
+    def test_pulls_concurrently_within_the_limit(self):
+        client = FakeClient(latency=0.05)
+        images = {(f"img{i}:1", None): 1 for i in range(8)}
+        client.api.remote = {image: f"sha256:{image}" for image, _ in images}
+        start = time.perf_counter()
+        results = prepull_images(client, images, workers=4, state_path=self.state_path)
+        self.assertTrue(all(result.status == 'pulled' for result in results))
+        self.assertEqual(client.api.max_active, 4)
+        # Every image takes an inspect, a registry check and a pull, sequentially that would be 8 * 3 * 0.05
+        self.assertLess(time.perf_counter() - start, 8 * 3 * 0.05 / 2)
+
+    def test_format_bytes(self):
+        self.assertEqual(format_bytes(512), '512 B')
+        self.assertEqual(format_bytes(3 * 1024**2), '3.0 MB')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
 import unittest
 from unittest.mock import patch, mock_open, MagicMock, call
 import json
+import copy
 import os
-from utils.loader import load_json_config, load_module_from_file, load_modules_from_directory
+import pickle
+import shutil
+import tempfile
+from utils import loader
+from utils.dumper import write_json
+from utils.loader import load_json_config, load_module_from_file, load_modules_from_directory, get_config_cache_stats
 
 class TestModuleLoader(unittest.TestCase):
     @patch('builtins.open', new_callable=mock_open, read_data='{"key": "value"}')
@@ -70,5 +76,75 @@ class TestModuleLoader(unittest.TestCase):
         }
         self.assertEqual(modules, expected_modules)
 
+
+class TestConfigCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.tmp_dir, 'config.json')
+        with open(self.config_path, 'w') as f:
+            json.dump({"system": {"sleep_time": 3}, "menu": [{"label": "Quit"}]}, f)
+        loader.invalidate_config_cache()
+
+    def tearDown(self):
+        loader.invalidate_config_cache()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cache_hit_does_not_reparse(self):
+        """
+        Test that an unchanged file is parsed once.
+        """
+        before = get_config_cache_stats()
+        load_json_config(self.config_path)
+        with patch('utils.loader.json.load') as mock_load:
+            config = load_json_config(self.config_path)
+            mock_load.assert_not_called()
+        self.assertEqual(config["system"]["sleep_time"], 3)
+        stats = get_config_cache_stats()
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['hits'] - before['hits'], 1)
+
+    def test_cache_invalidates_on_change(self):
+        """
+        Test that a file changed on disk is reloaded.
+        """
+        self.assertEqual(load_json_config(self.config_path)["system"]["sleep_time"], 3)
+        with open(self.config_path, 'w') as f:
+            json.dump({"system": {"sleep_time": 10}}, f)
+        self.assertEqual(load_json_config(self.config_path)["system"]["sleep_time"], 10)
+        # Same size, possibly the same mtime tick: write_json drops the cache entry itself
+        write_json({"system": {"sleep_time": 11}}, self.config_path)
+        self.assertEqual(load_json_config(self.config_path)["system"]["sleep_time"], 11)
+
+    def test_mutable_copies_are_independent(self):
+        """
+        Test that modifying a loaded config does not leak into later loads.
+        """
+        config = load_json_config(self.config_path)
+        config["system"]["sleep_time"] = 0
+        config["menu"].append({"label": "Extra"})
+        fresh = load_json_config(self.config_path)
+        self.assertEqual(fresh["system"]["sleep_time"], 3)
+        self.assertEqual(len(fresh["menu"]), 1)
+
+    def test_readonly_view(self):
+        """
+        Test that read-only configs are shared, refuse modification and copy to mutable configs.
+        """
+        config = load_json_config(self.config_path, readonly=True)
+        self.assertIs(config, load_json_config(self.config_path, readonly=True))
+        self.assertIsInstance(config, dict)
+        with self.assertRaises(TypeError):
+            config["system"]["sleep_time"] = 0
+        with self.assertRaises(TypeError):
+            config.setdefault("device_info", {})
+        with self.assertRaises(TypeError):
+            config["menu"].append({})
+        self.assertEqual(json.loads(json.dumps(config))["system"]["sleep_time"], 3)
+
+        copied = copy.deepcopy(config)
+        copied["menu"].append({})
+        self.assertEqual(len(copied["menu"]), 2)
+        self.assertEqual(pickle.loads(pickle.dumps(config)), config)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+from unittest.mock import patch
+import os
+import shutil
+import ipaddress
+import tempfile
+import time
+from utils.networker import PortAllocator, SubnetAllocator, read_proc_net_ports, read_env_ports, read_env_subnets
+
+TCP_TABLE = """  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode
+   0: 00000000:C350 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 1 1 0000000000000000 100 0 0 10 0
+   1: 0100007F:C351 0100007F:9C40 01 00000000:00000000 00:00000000 00000000     0        0 2 1 0000000000000000 20 4 30 10 -1
+"""
+TCP6_TABLE = """  sl  local_address                         remote_address                        st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode
+   0: 00000000000000000000000000000000:C352 00000000000000000000000000000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 3 1 0000000000000000 100 0 0 10 0
+"""
+UDP_TABLE = """   sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode ref pointer drops
+  10: 00000000:C354 00000000:0000 07 00000000:00000000 00:00000000 00000000     0        0 4 2 0000000000000000 0
+"""
+
+
+class TestPortAllocator(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.proc_dir = os.path.join(self.tmp_dir, 'proc')
+        os.makedirs(self.proc_dir)
+        for name, table in (('tcp', TCP_TABLE), ('tcp6', TCP6_TABLE), ('udp', UDP_TABLE)):
+            with open(os.path.join(self.proc_dir, name), 'w') as f:
+                f.write(table)
+        self.instances_dir = os.path.join(self.tmp_dir, 'm4b_proxy_instances')
+        os.makedirs(os.path.join(self.instances_dir, 'money4band_ab12'))
+        with open(os.path.join(self.instances_dir, 'money4band_ab12', '.env'), 'w') as f:
+            f.write("DEVICE_NAME=swift_panther_ab12\nEARNAPP_PORT=50005\nMYSTNODE_PORT_1=50006\nM4B_DASHBOARD_PORT=8081")
+        self.reservations = os.path.join(self.instances_dir, '.port-reservations.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_allocator(self):
+        return PortAllocator(self.reservations, instances_dir=self.instances_dir, proc_net_dir=self.proc_dir)
+
+    def test_read_proc_net_ports(self):
+        # Only listening TCP sockets count, every UDP socket does
+        self.assertEqual(read_proc_net_ports(self.proc_dir), {50000, 50002, 50004})
+        self.assertIsNone(read_proc_net_ports(os.path.join(self.tmp_dir, 'missing')))
+
+    def test_read_env_ports(self):
+        env_file = os.path.join(self.instances_dir, 'money4band_ab12', '.env')
+        self.assertEqual(read_env_ports([env_file, '/nonexistent/.env']), {50005, 50006, 8081})
+
+    def test_allocate_skips_taken_ports(self):
+        allocator = self.make_allocator()
+        self.assertEqual(allocator.allocate(50000, 'money4band_cd34'), 50001)
+        self.assertEqual(allocator.allocate(50000, 'money4band_cd34'), 50003)
+        self.assertEqual(allocator.allocate(50004, 'money4band_ef56'), 50007)
+        self.assertEqual(allocator.allocate_range(50000, 3, 'money4band_ef56'), [50008, 50009, 50010])
+        self.assertEqual(allocator.reservations, {'money4band_cd34': [50001, 50003],
+                                                  'money4band_ef56': [50007, 50008, 50009, 50010]})
+
+    def test_reservations_persist_and_release(self):
+        allocator = self.make_allocator()
+        allocator.allocate(50000, 'money4band_cd34')
+        allocator.save()
+
+        reloaded = self.make_allocator()
+        self.assertTrue(reloaded.is_taken(50001))
+        self.assertEqual(reloaded.allocate(50000, 'money4band_ef56'), 50003)
+        self.assertEqual(reloaded.release('money4band_cd34'), [50001])
+        self.assertEqual(reloaded.allocate(50000, 'money4band_gh78'), 50001)
+
+    def test_claim_ports_in_use_by_owner(self):
+        allocator = self.make_allocator()
+        allocator.allocate(50001, 'money4band_cd34')
+        # 50005 comes from the instance .env and 50000 is bound, both may be held by the instance itself
+        self.assertTrue(allocator.claim([50005, 50000], 'money4band_ab12'))
+        self.assertFalse(allocator.claim([50003, 50001], 'money4band_ab12'))
+        self.assertFalse(allocator.is_taken(50003))
+        self.assertEqual(allocator.reservations['money4band_ab12'], [50005, 50000])
+        self.assertEqual(allocator.release('money4band_ab12'), [50005, 50000])
+        self.assertTrue(allocator.claim([50001], 'money4band_cd34'))
+        self.assertEqual(allocator.reservations['money4band_cd34'], [50001])
+
+    def test_probes_without_socket_table(self):
+        with patch('utils.networker.read_psutil_ports', return_value=None), \
+                patch('utils.networker.is_port_in_use', side_effect=lambda port: port in (40000, 40001)):
+            allocator = PortAllocator(proc_net_dir=os.path.join(self.tmp_dir, 'missing'))
+            self.assertEqual(allocator.allocate(40000, 'money4band_cd34'), 40002)
+
+    def test_exhausted(self):
+        allocator = self.make_allocator()
+        with self.assertRaises(RuntimeError):
+            allocator.allocate_range(65530, 10, 'money4band_cd34')
+
+
+class TestSubnetAllocator(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.instances_dir = os.path.join(self.tmp_dir, 'm4b_proxy_instances')
+        os.makedirs(os.path.join(self.instances_dir, 'money4band_ab12'))
+        with open(os.path.join(self.instances_dir, 'money4band_ab12', '.env'), 'w') as f:
+            f.write("NETWORK_SUBNET=172.19.7.32\nNETWORK_NETMASK=27\nDEVICE_NAME=swift_panther_ab12")
+        self.main_env = os.path.join(self.tmp_dir, '.env')
+        with open(self.main_env, 'w') as f:
+            f.write("NETWORK_SUBNET=172.19.7.0\nNETWORK_NETMASK=27")
+        self.assignments = os.path.join(self.instances_dir, '.subnet-assignments.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_allocator(self, pool='172.19.7.0/24', use_docker=False):
+        return SubnetAllocator(pool, 27, self.assignments, instances_dir=self.instances_dir,
+                               env_files=[self.main_env], use_docker=use_docker)
+
+    def test_read_env_subnets(self):
+        self.assertEqual(read_env_subnets([self.main_env, '/nonexistent/.env']),
+                         [ipaddress.ip_network('172.19.7.0/27')])
+
+    def test_allocate_skips_instances_and_docker_networks(self):
+        with patch('utils.networker.read_docker_subnets',
+                   return_value=[ipaddress.ip_network('172.19.7.80/28'), ipaddress.ip_network('10.0.0.0/8')]):
+            allocator = self.make_allocator(use_docker=True)
+        # 172.19.7.64/27 is not in use by an instance but overlaps the docker network .80/28
+        self.assertEqual(str(allocator.allocate('money4band_cd34')), '172.19.7.96/27')
+        self.assertEqual(str(allocator.allocate('money4band_ef56')), '172.19.7.128/27')
+        self.assertEqual(str(allocator.allocate('money4band_cd34')), '172.19.7.96/27')
+        self.assertTrue(allocator.is_taken('172.19.7.64/27'))
+        self.assertFalse(allocator.is_taken('172.19.7.160/27'))
+
+    def test_assignments_persist(self):
+        allocator = self.make_allocator()
+        subnet = allocator.allocate('money4band_cd34')
+        allocator.save()
+        reloaded = self.make_allocator()
+        self.assertEqual(reloaded.allocate('money4band_cd34'), subnet)
+        self.assertEqual(str(reloaded.allocate('money4band_ef56')), '172.19.7.96/27')
+        self.assertEqual(reloaded.release('money4band_cd34'), str(subnet))
+
+    def test_assign_existing_subnet(self):
+        allocator = self.make_allocator()
+        allocator.allocate('money4band_cd34')
+        self.assertEqual(str(allocator.assign('money4band_ab12', '172.19.7.32')), '172.19.7.32/27')
+        self.assertEqual(str(allocator.allocate('money4band_ab12')), '172.19.7.32/27')
+        with self.assertRaises(ValueError):
+            allocator.assign('money4band_ef56', '172.19.7.64/27')
+
+    def test_pool_exhausted(self):
+        allocator = self.make_allocator(pool='172.19.7.0/26')
+        with self.assertRaises(RuntimeError):
+            allocator.allocate('money4band_cd34')
+        with self.assertRaises(ValueError):
+            SubnetAllocator('172.19.7.0/28', 27, use_docker=False)
+
+    def test_thousands_of_instances(self):
+        allocator = SubnetAllocator('10.128.0.0/12', 27, use_docker=False)
+        start = time.perf_counter()
+        subnets = [allocator.allocate(f"money4band_{i}") for i in range(5000)]
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertEqual(len({str(subnet) for subnet in subnets}), 5000)
+        self.assertEqual(len(allocator._starts), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils import pacing
+
+
+class TestPause(unittest.TestCase):
+    def tearDown(self):
+        pacing.set_interactive(None)
+
+    @patch('utils.pacing.time.sleep')
+    def test_pauses_only_when_interactive(self, mock_sleep):
+        pacing.set_interactive(False)
+        pacing.pause(3)
+        mock_sleep.assert_not_called()
+        pacing.set_interactive(True)
+        pacing.pause(3)
+        mock_sleep.assert_called_once_with(3)
+
+    def test_environment_disables_pacing(self):
+        with patch.dict(os.environ, {pacing.NON_INTERACTIVE_ENV: '1'}):
+            self.assertFalse(pacing.is_interactive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.readiness import wait_for_projects, COMPOSE_PROJECT_LABEL
+from tests.fake_docker import FakeClient
+
+
+def container(container_id, project, state='running', status='Up 2 seconds'):
+    return {'Id': container_id, 'Names': [f"/{container_id}"], 'State': state, 'Status': status,
+            'Labels': {COMPOSE_PROJECT_LABEL: project}}
+
+
+def event(container_id, project, action):
+    return {'Type': 'container', 'Action': action,
+            'Actor': {'ID': container_id, 'Attributes': {COMPOSE_PROJECT_LABEL: project, 'name': container_id}}}
+
+
+class TestWaitForProjects(unittest.TestCase):
+    def test_ready_without_events(self):
+        client = FakeClient([container('ab12_tun2socks', 'money4band_ab12', status='Up 9 seconds (healthy)'),
+                             container('ab12_earnapp', 'money4band_ab12'),
+                             container('other', 'nextcloud', state='exited')])
+        results = wait_for_projects(client, ['money4band_ab12'], timeout=5)
+        self.assertTrue(results[0].ready)
+        self.assertEqual(client.api.events_calls, [])
+
+    def test_waits_for_running_and_healthy_events(self):
+        client = FakeClient(
+            [container('ab12_tun2socks', 'money4band_ab12', status='Up 1 second (health: starting)'),
+             container('ab12_earnapp', 'money4band_ab12', state='created', status='Created'),
+             container('cd34_tun2socks', 'money4band_cd34')],
+            events=[event('ab12_earnapp', 'money4band_ab12', 'start'),
+                    event('ab12_tun2socks', 'money4band_ab12', 'exec_start: /bin/sh -c ip link show tun0'),
+                    event('ab12_tun2socks', 'money4band_ab12', 'health_status: healthy'),
+                    event('never', 'money4band_ab12', 'start')])
+        results = wait_for_projects(client, ['money4band_ab12', 'money4band_CD34'], timeout=5)
+        self.assertEqual([(result.project, result.ready) for result in results],
+                         [('money4band_ab12', True), ('money4band_cd34', True)])
+        self.assertEqual(client.api.events_calls[0]['filters'],
+                         {'type': 'container', 'label': COMPOSE_PROJECT_LABEL})
+
+    def test_reports_pending_containers_on_timeout(self):
+        client = FakeClient(
+            [container('ab12_tun2socks', 'money4band_ab12', status='Up 1 second (health: starting)'),
+             container('ab12_earnapp', 'money4band_ab12')],
+            events=[event('ab12_tun2socks', 'money4band_ab12', 'health_status: unhealthy'),
+                    event('ab12_earnapp', 'money4band_ab12', 'die')])
+        results = wait_for_projects(client, ['money4band_ab12', 'money4band_ef56'], timeout=1)
+        self.assertFalse(results[0].ready)
+        self.assertEqual(results[0].pending, ['ab12_earnapp (not running)', 'ab12_tun2socks (unhealthy)'])
+        self.assertEqual(results[1].pending, ['no containers'])
+        # Health is ignored when only running containers are required
+        client = FakeClient([container('ab12_tun2socks', 'money4band_ab12', status='Up 1 second (unhealthy)')])
+        self.assertTrue(wait_for_projects(client, ['money4band_ab12'], require_healthy=False)[0].ready)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.registry import InstanceRegistry, open_registry, record_generated, REGISTRY_FILE
+
+
+def write_instance(instances_dir, name, device_name, port, uuid, subnet='172.19.7.32', compose='services: {}\n'):
+    instance_dir = os.path.join(instances_dir, name)
+    os.makedirs(instance_dir, exist_ok=True)
+    with open(os.path.join(instance_dir, '.env'), 'w') as f:
+        f.write(f"COMPOSE_PROJECT_NAME={name}\nDEVICE_NAME={device_name}\nNETWORK_SUBNET={subnet}\nNETWORK_NETMASK=27\n"
+                f"STACK_PROXY_URL=socks5://10.0.0.1:1080\nPROXY_PORT=1080\nEARNAPP_UUID={uuid}\n"
+                f"MYSTNODE_PORT={port}\nMYSTNODE_PORT={port}\nM4B_DASHBOARD_PORT=None\n")
+    with open(os.path.join(instance_dir, 'docker-compose.yaml'), 'w') as f:
+        f.write(compose)
+    return instance_dir
+
+
+class TestInstanceRegistry(unittest.TestCase):
+    def setUp(self):
+        self.instances_dir = tempfile.mkdtemp()
+        write_instance(self.instances_dir, 'money4band_aa11', 'dev_aa11', 50010, 'sdk-node-1')
+        write_instance(self.instances_dir, 'money4band_bb22', 'dev_bb22', 50020, 'sdk-node-2', '172.19.7.64')
+
+    def tearDown(self):
+        shutil.rmtree(self.instances_dir)
+
+    def test_sync_reads_only_changed_instances(self):
+        with open_registry(self.instances_dir) as registry:
+            record = registry.get('money4band_aa11')
+            self.assertEqual(record.device_name, 'dev_aa11')
+            self.assertEqual(record.subnet, '172.19.7.32/27')
+            self.assertEqual(record.ports, {'MYSTNODE_PORT': 50010})
+            self.assertEqual(record.app_ids, {'EARNAPP_UUID': 'sdk-node-1'})
+            self.assertEqual(registry.sync(self.instances_dir), (0, 0))
+
+            write_instance(self.instances_dir, 'money4band_bb22', 'dev_bb22', 50030, 'sdk-node-2', '172.19.7.64')
+            shutil.rmtree(os.path.join(self.instances_dir, 'money4band_aa11'))
+            self.assertEqual(registry.sync(self.instances_dir), (1, 1))
+            self.assertEqual(registry.names(), ['money4band_bb22'])
+            self.assertEqual(registry.find('port', 50030), ['money4band_bb22'])
+            self.assertEqual(registry.sync(self.instances_dir, rebuild=True), (1, 0))
+        self.assertTrue(os.path.isfile(os.path.join(self.instances_dir, REGISTRY_FILE)))
+
+    def test_conflicts(self):
+        write_instance(self.instances_dir, 'money4band_cc33', 'dev_aa11', 50010, 'sdk-node-2', '172.19.7.96')
+        main_env = os.path.join(self.instances_dir, 'main.env')
+        with open(main_env, 'w') as f:
+            f.write("DEVICE_NAME=dev_main\nMYSTNODE_PORT=50020\n")
+        with open_registry(self.instances_dir, {'money4band': (main_env, None)}) as registry:
+            conflicts = registry.conflicts()
+        self.assertEqual(conflicts, {
+            'device_name': {'dev_aa11': ['money4band_aa11', 'money4band_cc33']},
+            'port': {50010: ['money4band_aa11', 'money4band_cc33'], 50020: ['money4band', 'money4band_bb22']},
+            'app_id': {'sdk-node-2': ['money4band_bb22', 'money4band_cc33']},
+        })
+
+    def test_get_current_and_record_generated(self):
+        instance_dir = os.path.join(self.instances_dir, 'money4band_aa11')
+        with open_registry(self.instances_dir, sync=False) as registry:
+            self.assertEqual(registry.names(), [])
+            record = registry.get_current('money4band_aa11', os.path.join(instance_dir, '.env'))
+            self.assertEqual(record.project_name, 'money4band_aa11')
+            self.assertIsNone(registry.get_current('gone', os.path.join(self.instances_dir, 'gone', '.env')))
+
+        record_generated(self.instances_dir, [{'env_output_path': os.path.join(instance_dir, '.env'),
+                                               'compose_output_path': os.path.join(instance_dir, 'docker-compose.yaml'),
+                                               'changed': True}])
+        with open_registry(self.instances_dir, sync=False) as registry:
+            self.assertEqual(registry.names(), ['money4band_aa11', 'money4band_bb22'])
+            self.assertIsNotNone(registry.get('money4band_aa11').compose_hash)
+
+    def test_outdated_schema_is_rebuilt(self):
+        db_path = os.path.join(self.instances_dir, REGISTRY_FILE)
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE instances (name TEXT)")
+        conn.commit()
+        conn.close()
+        with InstanceRegistry(db_path) as registry:
+            registry.sync(self.instances_dir)
+            self.assertEqual(len(registry.instances()), 2)
+
+    def test_missing_directory_stays_in_memory(self):
+        missing_dir = os.path.join(self.instances_dir, 'missing')
+        with open_registry(missing_dir) as registry:
+            self.assertEqual(registry.instances(), [])
+        self.assertFalse(os.path.exists(missing_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.rolling_update import (RateLimiter, StackUpdate, engine_up, restore_files, restore_images, rolling_update,
+                                  snapshot_files)
+from utils.teardown import COMPOSE_PROJECT_LABEL
+from tests.fake_docker import FakeClient
+
+
+class TestRollingUpdate(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient()
+        self.started = []
+        self.broken = set()
+
+    def up(self, stack):
+        self.started.append(stack.name)
+        containers = self.client.api.containers_by_id
+        for container_id, container in list(containers.items()):
+            if container['Labels'][COMPOSE_PROJECT_LABEL] == stack.project:
+                del containers[container_id]
+        container_id = f"id_{stack.project}_{len(self.started)}"
+        containers[container_id] = {
+            'Id': container_id, 'Names': [f"/{stack.project}_app"], 'Status': 'Up 1 second',
+            'State': 'exited' if stack.name in self.broken else 'running', 'Labels': {COMPOSE_PROJECT_LABEL: stack.project}}
+
+    def teardown(self, client, projects, grace=None):
+        projects = set(projects)
+        containers = client.api.containers_by_id
+        for container_id, container in list(containers.items()):
+            if container['Labels'][COMPOSE_PROJECT_LABEL] in projects:
+                del containers[container_id]
+        return []
+
+    def stacks(self, count, new=()):
+        return [StackUpdate(f"m4b_{index}", f"m4b_{index}", 'docker-compose.yaml', '.env', f"m4b_{index}" not in new)
+                for index in range(count)]
+
+    def test_updates_in_waves(self):
+        result = rolling_update(self.client, self.stacks(5), self.up, wave_size=2, create_rate=0)
+        self.assertFalse(result.aborted)
+        self.assertEqual(result.waves, 3)
+        self.assertEqual(result.failed, [])
+        self.assertEqual(sorted(self.started), [f"m4b_{index}" for index in range(5)])
+        self.assertTrue(all(stack.ok for stack in result.updated))
+
+    def test_failures_under_the_threshold_continue(self):
+        self.broken = {'m4b_1'}
+        result = rolling_update(self.client, self.stacks(4), self.up, wave_size=2, max_failures=1, create_rate=0)
+        self.assertFalse(result.aborted)
+        self.assertEqual([stack.name for stack in result.failed], ['m4b_1'])
+        self.assertIn('m4b_1_app (not running)', result.failed[0].error)
+        self.assertEqual(result.waves, 2)
+
+    def test_too_many_failures_roll_back(self):
+        self.broken = {'m4b_2', 'm4b_3'}
+        restored = []
+
+        def restore():
+            restored.append(True)
+            self.broken = set()
+
+        with patch('utils.rolling_update.teardown_projects', side_effect=self.teardown):
+            result = rolling_update(self.client, self.stacks(6, new={'m4b_3'}), self.up, wave_size=2, max_failures=1,
+                                    create_rate=0, restore=restore)
+        self.assertTrue(result.aborted)
+        self.assertEqual(result.waves, 2)
+        self.assertEqual(restored, [True])
+        self.assertEqual([stack.name for stack in result.rolled_back], ['m4b_3', 'm4b_2', 'm4b_1', 'm4b_0'])
+        self.assertTrue(all(stack.ok for stack in result.rolled_back))
+        # The stack that did not exist before is removed instead of started again, later waves are never touched
+        self.assertEqual(sorted(self.started[4:]), ['m4b_0', 'm4b_1', 'm4b_2'])
+        self.assertNotIn('m4b_4', self.started)
+        projects = {container['Labels'][COMPOSE_PROJECT_LABEL] for container in self.client.api.containers_by_id.values()}
+        self.assertEqual(projects, {'m4b_0', 'm4b_1', 'm4b_2'})
+
+    def test_engine_rollback_plans_restored_files(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        stacks = []
+        for index in range(2):
+            instance_dir = os.path.join(tmp_dir, f"m4b_{index}")
+            os.makedirs(instance_dir)
+            with open(os.path.join(instance_dir, '.env'), 'w') as f:
+                f.write(f"COMPOSE_PROJECT_NAME=m4b_{index}\n")
+            stacks.append(StackUpdate(f"m4b_{index}", f"m4b_{index}", os.path.join(instance_dir, 'docker-compose.yaml'),
+                                      os.path.join(instance_dir, '.env'), True))
+        # Both instances link to one shared compose file, so the parse cache is hit
+        shared = os.path.join(tmp_dir, 'docker-compose.yaml')
+        with open(shared, 'w') as f:
+            f.write("services:\n  app:\n    image: old:1\n")
+        for stack in stacks:
+            os.symlink(shared, stack.compose_file)
+        snapshot = snapshot_files([shared])
+        with open(shared, 'w') as f:
+            f.write("services:\n  app:\n    image: new:2\n")
+
+        planned = []
+        client = self.client
+
+        class FakeDriver:
+            def up(driver, plan):
+                image = plan.services[0].image
+                planned.append((plan.project, image))
+                self.broken = {'m4b_0', 'm4b_1'} if image == 'new:2' else set()
+                self.up(StackUpdate(plan.project, plan.project, '', ''))
+
+        with patch('utils.rolling_update.teardown_projects', side_effect=self.teardown):
+            result = rolling_update(client, stacks, engine_up(FakeDriver()), wave_size=2, max_failures=0, create_rate=0,
+                                    restore=lambda: restore_files(snapshot), rollback_up=engine_up(FakeDriver()))
+        self.assertTrue(result.aborted)
+        self.assertEqual(sorted(planned), [('m4b_0', 'new:2'), ('m4b_0', 'old:1'), ('m4b_1', 'new:2'), ('m4b_1', 'old:1')])
+        self.assertTrue(all(stack.ok for stack in result.rolled_back))
+
+
+class TestRestore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_restores_files_and_links(self):
+        shared = os.path.join(self.tmp_dir, '.shared-compose', 'old.yaml')
+        os.makedirs(os.path.dirname(shared))
+        with open(shared, 'w') as f:
+            f.write('services: {}\n')
+        compose_file = os.path.join(self.tmp_dir, 'docker-compose.yaml')
+        env_file = os.path.join(self.tmp_dir, '.env')
+        os.symlink(os.path.relpath(shared, self.tmp_dir), compose_file)
+        with open(env_file, 'w') as f:
+            f.write('DEVICE_NAME=old\n')
+        snapshot = snapshot_files([compose_file, env_file, os.path.join(self.tmp_dir, 'missing.json')])
+
+        os.remove(compose_file)
+        os.remove(shared)
+        with open(compose_file, 'w') as f:
+            f.write('services: {new: {}}\n')
+        with open(env_file, 'w') as f:
+            f.write('DEVICE_NAME=new\n')
+        with open(os.path.join(self.tmp_dir, 'missing.json'), 'w') as f:
+            f.write('{}')
+
+        self.assertEqual(len(restore_files(snapshot)), 4)
+        self.assertEqual(os.path.realpath(compose_file), os.path.realpath(shared))
+        with open(compose_file) as f:
+            self.assertEqual(f.read(), 'services: {}\n')
+        with open(env_file) as f:
+            self.assertEqual(f.read(), 'DEVICE_NAME=old\n')
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, 'missing.json')))
+        self.assertEqual(restore_files(snapshot), [])
+
+    def test_restores_image_tags(self):
+        client = FakeClient()
+        client.api.images = {'fr3nd/earnapp:latest': {'Id': 'sha256:new'}, 'localhost:5000/proxy': {'Id': 'sha256:same'}}
+        restored = restore_images(client, {'fr3nd/earnapp:latest': 'sha256:old', 'localhost:5000/proxy': 'sha256:same',
+                                           'alpine@sha256:abc': 'sha256:abc'})
+        self.assertEqual(restored, ['fr3nd/earnapp:latest'])
+        self.assertEqual(client.api.tags, [('sha256:old', 'fr3nd/earnapp', 'latest')])
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_spaces_out_calls(self):
+        limiter = RateLimiter(50)
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
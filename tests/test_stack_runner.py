@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.stack_runner import StackJob, StackResult, run_stack_jobs, format_results_table
+
+
+def python_job(name, code, log_file=None):
+    return StackJob(name, [sys.executable, '-c', code], log_file)
+
+
+class TestRunStackJobs(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_streams_output_to_log_and_reports_failures(self):
+        log_file = os.path.join(self.tmp_dir, 'stacks', 'money4band_ab12.log')
+        results = run_stack_jobs([
+            python_job('money4band_ab12', "print('Container started'); import sys; sys.stderr.write('warning\\n')", log_file),
+            python_job('money4band_cd34', "import sys; print('port is already allocated'); sys.exit(3)"),
+            StackJob('money4band_ef56', [os.path.join(self.tmp_dir, 'missing-binary')]),
+        ], workers=2, timeout=10)
+
+        self.assertEqual([result.name for result in results], ['money4band_ab12', 'money4band_cd34', 'money4band_ef56'])
+        self.assertTrue(results[0].ok)
+        with open(log_file) as f:
+            log = f.read()
+        self.assertIn('Container started\n', log)
+        self.assertIn('warning\n', log)
+        self.assertEqual((results[1].ok, results[1].returncode, results[1].error), (False, 3, 'Exit code 3'))
+        self.assertEqual(results[1].tail, ['port is already allocated'])
+        self.assertFalse(results[2].ok)
+        self.assertIn('Failed to run', results[2].error)
+
+    def test_timeout_kills_command(self):
+        start = time.perf_counter()
+        results = run_stack_jobs([python_job('money4band_ab12', "import time; print('pulling', flush=True); time.sleep(30)")],
+                                 timeout=0.5)
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(results[0].error, 'Timed out after 0.5s')
+        self.assertEqual(results[0].tail, ['pulling'])
+
+    def test_workers_bound_concurrency(self):
+        jobs = [python_job(f"money4band_{i}", "import time; time.sleep(0.3)") for i in range(4)]
+        done = []
+        start = time.perf_counter()
+        results = run_stack_jobs(jobs, workers=2, timeout=10, on_result=lambda result, count, total: done.append((count, total)))
+        elapsed = time.perf_counter() - start
+        self.assertTrue(all(result.ok for result in results))
+        self.assertGreaterEqual(elapsed, 0.6)
+        self.assertEqual(done, [(1, 4), (2, 4), (3, 4), (4, 4)])
+
+    def test_format_results_table(self):
+        table = format_results_table([StackResult('money4band', 0, 1.25, 'logs/stacks/money4band.log'),
+                                      StackResult('money4band_ab12', 1, 0.5, error='Exit code 1', tail=['port is already allocated'])])
+        lines = table.splitlines()
+        self.assertTrue(lines[0].startswith('Instance'))
+        self.assertIn('OK', lines[2])
+        self.assertIn('logs/stacks/money4band.log', lines[2])
+        self.assertIn('FAILED', lines[3])
+        self.assertIn('Exit code 1: port is already allocated', lines[3])
+        self.assertEqual(lines[-1], '1/2 succeeded')
+
+
+if __name__ == '__main__':
+    unittest.main()
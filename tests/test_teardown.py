@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import unittest
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.teardown import teardown_projects, stop_running_containers, COMPOSE_PROJECT_LABEL
+from tests.fake_docker import FakeClient
+
+
+def container(container_id, project, state='running'):
+    return {'Id': container_id, 'State': state, 'Labels': {COMPOSE_PROJECT_LABEL: project}}
+
+
+def network(network_id, project):
+    return {'Id': network_id, 'Labels': {COMPOSE_PROJECT_LABEL: project}}
+
+
+class TestTeardownProjects(unittest.TestCase):
+    def test_removes_only_fleet_projects(self):
+        client = FakeClient([
+            container('main1', 'money4band'),
+            container('ab12a', 'money4band_ab12'),
+            container('ab12b', 'money4band_ab12', state='exited'),
+            container('orphan', 'money4band_ffff'),
+            container('other', 'nextcloud'),
+            container('gone1', 'money4band_ab12'),
+        ], [network('net1', 'money4band_ab12'), network('net2', 'nextcloud'), network('net3', 'money4band_ffff')])
+        client.api.errors = {('stop', 'gone1'): 404}
+
+        results = teardown_projects(client, ['money4band_ab12', 'money4band_CD34'], instance_prefix='money4band', grace=1)
+
+        self.assertEqual([(result.project, result.containers, result.networks) for result in results],
+                         [('money4band_ab12', 3, 1), ('money4band_cd34', 0, 0), ('money4band_ffff', 1, 1)])
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(set(client.api.containers_by_id), {'main1', 'other'})
+        self.assertEqual(set(client.api.networks_by_id), {'net2'})
+        # Exited containers are removed without a stop call, the rest get the grace period
+        stops = {call[1]: call[2] for call in client.api.calls if call[0] == 'stop'}
+        self.assertEqual(stops, {'ab12a': 1, 'orphan': 1, 'gone1': 1})
+        self.assertEqual(sum(1 for call in client.api.calls if call[0] == 'containers'), 1)
+
+    def test_reports_errors_per_project(self):
+        client = FakeClient([container('stuck1', 'money4band_ab12'), container('cd34a', 'money4band_cd34')])
+        client.api.errors = {('remove_container', 'stuck1'): 409}
+        results = teardown_projects(client, ['money4band_ab12', 'money4band_cd34'])
+        self.assertFalse(results[0].ok)
+        self.assertIn('already in progress', results[0].errors[0])
+        self.assertTrue(results[1].ok)
+
+    def test_removes_containers_concurrently(self):
+        containers = [container(f"c{i}", f"money4band_{i:04x}") for i in range(60)]
+        client = FakeClient(containers, [network(f"n{i}", f"money4band_{i:04x}") for i in range(20)], latency=0.05)
+        start = time.perf_counter()
+        results = teardown_projects(client, [], instance_prefix='money4band', workers=20)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(sum(result.containers for result in results), 60)
+        self.assertEqual(sum(result.networks for result in results), 20)
+        self.assertLessEqual(client.api.max_active, 20)
+        # 140 sequential calls would take 7s
+        self.assertLess(elapsed, 2)
+
+    def test_stop_running_containers(self):
+        client = FakeClient([container('a', 'nextcloud'), container('b', 'money4band', state='exited'),
+                             container('gone1', 'money4band')])
+        client.api.errors = {('stop', 'gone1'): 404}
+        self.assertEqual(stop_running_containers(client, grace=3), 2)
+        self.assertEqual(client.api.containers_by_id['a']['State'], 'exited')
+
+
+if __name__ == '__main__':
+    unittest.main()
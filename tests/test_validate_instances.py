@@ -0,0 +1,123 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.dumper import write_json
+from utils.generator import regenerate_instances
+from utils.loader import INSTANCE_BASE_DIR, INSTANCE_CONFIG_FILES, INSTANCE_OVERLAY_FILE, load_instance_overlay
+from utils.teardown import COMPOSE_PROJECT_LABEL
+from utils.validate_instances import Conflict, StackInfo, find_conflicts, fix_conflicts, validate_fleet
+from tests.fake_docker import FakeClient
+
+M4B_CONFIG = {
+    'system': {'default_docker_platform': 'linux/amd64'},
+    'project': {'compose_project_name': 'money4band'},
+    'network': {'subnet': '172.19.7.0', 'netmask': 27},
+}
+APP_CONFIG = {
+    'apps': [{
+        'name': 'EARNAPP',
+        'flags': {'uuid': {}},
+        'compose_config': {'image': 'fazalfarhan01/earnapp:lite', 'container_name': '${DEVICE_NAME}_earnapp',
+                           'ports': ['${EARNAPP_PORT}:80']},
+    }],
+    'extra-apps': [],
+}
+USER_CONFIG = {
+    'apps': {'earnapp': {'enabled': True, 'uuid': 'sdk-node-1234abcd', 'ports': 50000}},
+    'proxies': {'url': '', 'enabled': False},
+    'device_info': {'device_name': 'swift_panther'},
+    'm4b_dashboard': {'enabled': False, 'ports': None},
+    'compose_config_common': {
+        'network': {'driver': 'bridge', 'subnet': '${NETWORK_SUBNET}', 'netmask': '${NETWORK_NETMASK}'},
+    },
+}
+
+
+@patch('utils.networker.read_docker_subnets', return_value=[])
+@patch('utils.generator.index_images')
+@patch('utils.generator.resolve_image_platform', side_effect=lambda image, tag, platform, default: (tag, platform))
+class TestValidateFleet(unittest.TestCase):
+    def setUp(self):
+        self.instances_dir = tempfile.mkdtemp()
+        base_dir = os.path.join(self.instances_dir, INSTANCE_BASE_DIR)
+        os.makedirs(base_dir)
+        for key, config in (('m4b_config', M4B_CONFIG), ('app_config', APP_CONFIG), ('user_config', USER_CONFIG)):
+            write_json(config, os.path.join(base_dir, INSTANCE_CONFIG_FILES[key]))
+        # The second and third instance share a device name, the third reuses the port and subnet of the first
+        for name, device_name, port, subnet in (('money4band_aa11', 'swift_panther_aa11', 50010, '172.19.0.32'),
+                                                ('money4band_bb22', 'swift_panther_bb22', 50020, '172.19.0.64'),
+                                                ('money4band_cc33', 'swift_panther_bb22', 50010, '172.19.0.32')):
+            instance_dir = os.path.join(self.instances_dir, name)
+            os.makedirs(instance_dir)
+            write_json({'overrides': {
+                'user_config': {'device_info': {'device_name': device_name}, 'apps': {'earnapp': {'ports': port}}},
+                'm4b_config': {'project': {'compose_project_name': name}, 'network': {'subnet': subnet}},
+            }}, os.path.join(instance_dir, INSTANCE_OVERLAY_FILE))
+
+    def tearDown(self):
+        shutil.rmtree(self.instances_dir)
+
+    def test_reports_every_conflict_and_fixes_them(self, mock_resolve, mock_index, mock_subnets):
+        regenerate_instances(self.instances_dir)
+        client = FakeClient(containers=[
+            {'Id': 'c1', 'Names': ['/swift_panther_aa11_earnapp'], 'State': 'exited', 'Labels': {}, 'Ports': []},
+            {'Id': 'c2', 'Names': ['/web'], 'State': 'running', 'Labels': {COMPOSE_PROJECT_LABEL: 'other'},
+             'Ports': [{'PrivatePort': 80, 'PublicPort': 50020, 'Type': 'tcp'}]},
+        ])
+        stacks, conflicts = validate_fleet(self.instances_dir, client=client)
+        self.assertEqual([call[0] for call in client.api.calls], ['containers'])
+        self.assertEqual(stacks[0].containers, {'swift_panther_aa11_earnapp': 'earnapp'})
+        self.assertEqual(stacks[0].ports, {(50010, 'tcp'): 'earnapp'})
+        found = {(conflict.kind, conflict.value, conflict.live): conflict.stacks for conflict in conflicts}
+        self.assertEqual(found, {
+            ('device_name', 'swift_panther_bb22', False): ['money4band_bb22', 'money4band_cc33'],
+            ('container_name', 'swift_panther_bb22_earnapp', False): ['money4band_bb22', 'money4band_cc33'],
+            ('host_port', '50010/tcp', False): ['money4band_aa11', 'money4band_cc33'],
+            ('subnet', '172.19.0.32/27', False): ['money4band_aa11', 'money4band_cc33'],
+            ('app_id', 'sdk-node-1234abcd', False): ['money4band_aa11', 'money4band_bb22', 'money4band_cc33'],
+            ('container_name', 'swift_panther_aa11_earnapp', True): ['docker (no project)', 'money4band_aa11'],
+            ('host_port', '50020/tcp', True): ['docker (web)', 'money4band_bb22'],
+        })
+
+        changed = fix_conflicts(self.instances_dir, stacks, conflicts)
+        self.assertEqual(changed, ['money4band_bb22', 'money4band_cc33'])
+        overrides = load_instance_overlay(os.path.join(self.instances_dir, 'money4band_cc33'))
+        self.assertNotEqual(overrides['user_config']['device_info']['device_name'], 'swift_panther_bb22')
+        self.assertRegex(overrides['user_config']['apps']['earnapp']['uuid'], r'^sdk-node-[0-9a-f]{8}$')
+        self.assertNotEqual(overrides['user_config']['apps']['earnapp']['ports'], 50010)
+        self.assertNotEqual(overrides['m4b_config']['network']['subnet'], '172.19.0.32')
+
+        # Only the stale container of the first instance is left, it needs a manual fix
+        stacks, conflicts = validate_fleet(self.instances_dir, client=client)
+        self.assertEqual([(conflict.kind, conflict.value) for conflict in conflicts],
+                         [('container_name', 'swift_panther_aa11_earnapp')])
+
+
+class TestFindConflicts(unittest.TestCase):
+    def test_overlapping_subnets(self):
+        import ipaddress
+        stacks = [StackInfo('a', None, 'a/.env', 'a', subnets=[ipaddress.ip_network('10.0.0.0/24')]),
+                  StackInfo('b', None, 'b/.env', 'b', subnets=[ipaddress.ip_network('10.0.0.128/25')]),
+                  StackInfo('c', None, 'c/.env', 'c', subnets=[ipaddress.ip_network('10.0.1.0/24')])]
+        self.assertEqual(find_conflicts(stacks), [Conflict('subnet', '10.0.0.0/24', ['a', 'b'])])
+
+    def test_shared_app_ids_are_warnings(self):
+        stacks = [StackInfo('a', None, 'a/.env', 'a', app_ids={'EARNAPP_UUID': 'sdk-node-1'}),
+                  StackInfo('b', None, 'b/.env', 'b', app_ids={'EARNAPP_UUID': 'sdk-node-1'})]
+        conflicts = find_conflicts(stacks)
+        self.assertEqual([(conflict.kind, conflict.blocking) for conflict in conflicts], [('app_id', False)])
+        self.assertTrue(Conflict('host_port', '50000/tcp', ['a', 'b']).blocking)
+
+
+if __name__ == '__main__':
+    unittest.main()
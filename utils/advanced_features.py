@@ -3,8 +3,8 @@ import json
 import time
 import psutil
 import docker
-import requests
 import logging
+from utils import http_client
 from datetime import datetime
 from typing import Dict, List, Optional
 from dataclasses import dataclass
@@ -36,6 +36,18 @@ class LoadBalancer:
                 errors=0
             )
 
+    def add_proxy(self, proxy: str):
+        if proxy in self.stats:
+            return
+        self.proxies.append(proxy)
+        self.stats[proxy] = ProxyStats(
+            proxy=proxy,
+            success_rate=100.0,
+            response_time=0.0,
+            last_used=datetime.now(),
+            errors=0
+        )
+
     def get_next_proxy(self) -> str:
         if self.strategy == "round-robin":
             proxy = self.proxies[self.current_index]
@@ -231,9 +243,9 @@ class SecurityManager:
     def verify_proxy_auth(self, proxy: str, username: str, password: str) -> bool:
         try:
             proxy_url = f"http://{username}:{password}@{proxy}"
-            response = requests.get("http://api.ipify.org", 
-                                 proxies={"http": proxy_url, "https": proxy_url},
-                                 timeout=10)
+            response = http_client.get("http://api.ipify.org",
+                                       proxies={"http": proxy_url, "https": proxy_url},
+                                       timeout=10, retries=0)
             return response.status_code == 200
         except:
             return False 
\ No newline at end of file
@@ -1,9 +1,22 @@
 from utils.helper import ensure_service
+from utils import http_client
 import requests
 import logging
 import sys
 import os
-from typing import Dict, Optional
+import json
+import time
+import tempfile
+import threading
+import argparse
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows, fall back to atomic replace without locking
+    fcntl = None
 
 # Ensure the parent directory is in the sys.path
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,27 +28,487 @@ if parent_dir not in sys.path:
 # Store the Docker Hub base URL in a variable
 DOCKERHUB_BASE_URL = "https://registry.hub.docker.com/v2/"
 
+# Persistent registry cache settings
+REGISTRY_CACHE_PATH = os.path.join(
+    parent_dir, "config", ".registry-cache.json")
+REGISTRY_CACHE_TTL = 6 * 60 * 60  # Seconds before an entry is revalidated
 
-def fetch_docker_tags(image: str) -> Optional[Dict]:
+# Registry crawl settings
+REGISTRY_PAGE_SIZE = 100  # Maximum page size accepted by Docker Hub
+REGISTRY_CRAWL_WORKERS = 8
+
+
+class RegistryCache:
     """
-    Fetch the tags of a Docker image from Docker Hub.
+    Persistent on-disk cache of Docker Hub tag lookups keyed by image.
+
+    Entries hold the response body, its ETag and the time it was last validated.
+    The file is shared by every generator call in this process (through the
+    in-memory copy) and by every other process (through a locked read-merge-write).
+    """
+
+    def __init__(self, cache_path: str = REGISTRY_CACHE_PATH, ttl: int = REGISTRY_CACHE_TTL):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.refresh = False
+        self._refreshed = set()
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _read_file(self) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_path, 'r') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(
+                f"Ignoring unreadable registry cache {self.cache_path}: {str(e)}")
+            return {}
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            self._entries = self._read_file()
+            logging.debug(
+                f"Loaded {len(self._entries)} registry cache entries from {self.cache_path}")
+        return self._entries
+
+    def reload(self) -> None:
+        """Drop the in-memory copy so the next lookup re-reads the file."""
+        with self._lock:
+            self._entries = None
+
+    def get(self, image: str) -> Optional[Dict]:
+        """Return the cached entry for an image, fresh or not."""
+        with self._lock:
+            return self._load().get(image)
+
+    def is_fresh(self, image: str, entry: Optional[Dict]) -> bool:
+        """Check whether an entry can be used without asking the registry."""
+        if not entry or 'data' not in entry:
+            return False
+        if self.refresh and image not in self._refreshed:
+            return False
+        return time.time() - entry.get('validated_at', 0) < self.ttl
+
+    def store(self, image: str, data: Dict, etag: Optional[str] = None) -> None:
+        """Store (or revalidate) an entry and persist it to disk."""
+        entry = {'data': data, 'etag': etag, 'validated_at': time.time()}
+        with self._lock:
+            self._load()[image] = entry
+            self._refreshed.add(image)
+            self._persist(image, entry)
+
+    def _persist(self, image: str, entry: Dict) -> None:
+        cache_dir = os.path.dirname(self.cache_path) or '.'
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(f"{self.cache_path}.lock", 'a') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Merge with entries written by other processes since we loaded
+                entries = self._read_file()
+                entries[image] = entry
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=cache_dir, prefix='.registry-cache.', suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(entries, f)
+                    os.replace(tmp_path, self.cache_path)
+                except Exception:
+                    os.unlink(tmp_path)
+                    raise
+            self._entries = entries
+        except OSError as e:
+            logging.warning(
+                f"Could not persist registry cache to {self.cache_path}: {str(e)}")
+
+
+_registry_cache = RegistryCache()
+
+
+def configure_registry_cache(cache_path: Optional[str] = None, ttl: Optional[int] = None, refresh: Optional[bool] = None) -> RegistryCache:
+    """
+    Configure the shared registry cache used by fetch_docker_tags.
+
+    Args:
+        cache_path (str, optional): The path of the cache file.
+        ttl (int, optional): Seconds an entry is trusted before revalidation.
+        refresh (bool, optional): Force one refetch per image for this run (--refresh-registry-cache).
+
+    Returns:
+        RegistryCache: The shared cache instance.
+    """
+    global _registry_cache
+    if cache_path is not None and cache_path != _registry_cache.cache_path:
+        _registry_cache = RegistryCache(cache_path, _registry_cache.ttl)
+        _tag_index.clear()
+    if ttl is not None:
+        _registry_cache.ttl = ttl
+    if refresh is not None:
+        _registry_cache.refresh = refresh
+        _registry_cache._refreshed.clear()
+        if refresh:
+            _tag_index.clear()
+    return _registry_cache
+
+
+_resolver_settings = {'offline': False, 'use_local_images': True}
+
+
+def configure_image_resolver(offline: Optional[bool] = None, use_local_images: Optional[bool] = None) -> Dict[str, bool]:
+    """
+    Configure the image platform resolver chain (local images, registry cache, network).
+
+    Args:
+        offline (bool, optional): Never contact the registry, use local images and cached data only.
+        use_local_images (bool, optional): Consult images already present in the local Docker engine first.
+
+    Returns:
+        Dict[str, bool]: The resolver settings.
+    """
+    if offline is not None:
+        _resolver_settings['offline'] = offline
+    if use_local_images is not None:
+        _resolver_settings['use_local_images'] = use_local_images
+    _tag_index.clear()
+    return _resolver_settings
+
+
+def get_local_image_tags(image: str) -> Dict[str, set]:
+    """
+    List the tags of an image present in the local Docker engine with their architectures.
 
     Args:
         image (str): The name of the Docker image.
 
     Returns:
-        Optional[Dict]: A dictionary containing tag information if successful, None otherwise.
+        Dict[str, set]: Tag name mapped to the architectures available locally, empty if Docker is unavailable.
+    """
+    try:
+        import docker
+        client = docker.from_env(timeout=5)
+        local_tags: Dict[str, set] = {}
+        for local_image in client.images.list(name=image):
+            arch = local_image.attrs.get('Architecture')
+            for repo_tag in local_image.tags:
+                repo, _, tag = repo_tag.rpartition(':')
+                if repo in (image, f"docker.io/{image}") and arch:
+                    local_tags.setdefault(tag, set()).add(arch)
+        return local_tags
+    except Exception as e:
+        logging.debug(f"Local image lookup for {image} unavailable: {str(e)}")
+        return {}
+
+
+def _tags_page_url(image: str, page: int = 1) -> str:
+    return f"{DOCKERHUB_BASE_URL}repositories/{image}/tags?page_size={REGISTRY_PAGE_SIZE}&page={page}"
+
+
+def _tag_resolved(tags_info: Dict, tag: Optional[str] = None, arch: Optional[str] = None) -> bool:
+    """
+    Check whether the crawled tag data already answers a lookup.
+
+    A lookup for a specific tag is resolved once that tag is seen (its image list is
+    authoritative for the architecture check). A lookup for an architecture only is
+    resolved once any tag supporting it is seen. Without a target only a complete
+    crawl is enough.
+    """
+    results = tags_info.get('results', [])
+    if tag:
+        return any(t.get('name') == tag for t in results)
+    if arch:
+        return any(image_info.get('architecture') == arch for t in results for image_info in t.get('images', []))
+    return tags_info.get('complete', False)
+
+
+def crawl_docker_tags(image: str, tag: Optional[str] = None, arch: Optional[str] = None) -> Optional[Dict]:
+    """
+    Crawl every page of an image's tags on Docker Hub.
+    The first page gives the total count, the remaining pages are fetched concurrently.
+    When a tag and/or architecture is given the crawl stops as soon as they are resolved.
+    Results are served from and stored in the persistent registry cache.
+
+    Args:
+        image (str): The name of the Docker image.
+        tag (str, optional): Stop once this tag has been seen.
+        arch (str, optional): Stop once a tag supporting this architecture has been seen.
+
+    Returns:
+        Optional[Dict]: The merged tag information ('results', 'count', 'complete') if successful, None otherwise.
     """
+    cache = _registry_cache
+    entry = cache.get(image)
+    if not cache.is_fresh(image, entry):
+        # Another process may have refreshed the entry in the meantime
+        cache.reload()
+        entry = cache.get(image)
+    if cache.is_fresh(image, entry):
+        data = entry['data']
+        if data.get('complete', True) or _tag_resolved(data, tag, arch):
+            logging.debug(f"Registry cache hit for {image}")
+            return data
+
+    if _resolver_settings['offline']:
+        # Never touch the network, stale cached data is better than nothing
+        if entry and 'data' in entry:
+            logging.debug(f"Offline mode, using cached registry data for {image}")
+            return entry['data']
+        logging.debug(f"Offline mode, no cached registry data for {image}")
+        return None
+
+    headers = {}
+    force_refresh = cache.refresh and image not in cache._refreshed
+    cached_complete = bool(entry and entry.get('data', {}).get('complete', True))
+    if entry and entry.get('etag') and cached_complete and not force_refresh:
+        headers['If-None-Match'] = entry['etag']
     try:
-        response = requests.get(
-            f"{DOCKERHUB_BASE_URL}repositories/{image}/tags")
+        response = http_client.get(
+            _tags_page_url(image), headers=headers)
+        if response.status_code == 304 and entry:
+            logging.debug(f"Registry cache entry for {image} revalidated")
+            cache.store(image, entry['data'], entry.get('etag'))
+            return entry['data']
         response.raise_for_status()
-        return response.json()
+        first_page = response.json()
+        etag = response.headers.get('ETag')
+
+        pages = {1: first_page.get('results', [])}
+        tags_info = {'count': first_page.get('count', len(pages[1])),
+                     'results': list(pages[1]), 'complete': not first_page.get('next')}
+        if not tags_info['complete'] and not _tag_resolved(tags_info, tag, arch):
+            tags_info = _crawl_remaining_pages(
+                image, first_page, pages, tag, arch)
+
+        cache.store(image, tags_info, etag)
+        return tags_info
     except requests.RequestException as e:
         logging.error(f"Error fetching Docker tags for {image}: {str(e)}")
+        if entry and 'data' in entry:
+            logging.warning(f"Using stale registry cache entry for {image}")
+            return entry['data']
         return None
 
 
+def _crawl_remaining_pages(image: str, first_page: Dict, pages: Dict[int, List], tag: Optional[str], arch: Optional[str]) -> Dict:
+    """
+    Fetch the pages after the first one and merge them in page order.
+
+    Raises:
+        requests.RequestException: If a page cannot be fetched.
+    """
+    count = first_page.get('count')
+    complete = True
+    if count:
+        last_page = math.ceil(count / REGISTRY_PAGE_SIZE)
+        executor = ThreadPoolExecutor(
+            max_workers=REGISTRY_CRAWL_WORKERS, thread_name_prefix='registry-crawl')
+        try:
+            futures = {executor.submit(_fetch_page, image, page): page
+                       for page in range(2, last_page + 1)}
+            for future in as_completed(futures):
+                pages[futures[future]] = future.result()
+                merged = [t for page in sorted(pages) for t in pages[page]]
+                if len(pages) < last_page and _tag_resolved({'results': merged}, tag, arch):
+                    complete = False
+                    logging.debug(
+                        f"Stopped crawling {image} after {len(pages)}/{last_page} pages")
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    else:
+        # No total count, follow the next links one by one
+        next_url = first_page.get('next')
+        page = 1
+        while next_url:
+            response = http_client.get(next_url)
+            response.raise_for_status()
+            data = response.json()
+            page += 1
+            pages[page] = data.get('results', [])
+            next_url = data.get('next')
+            merged = [t for p in sorted(pages) for t in pages[p]]
+            if next_url and _tag_resolved({'results': merged}, tag, arch):
+                complete = False
+                break
+
+    results = [t for page in sorted(pages) for t in pages[page]]
+    return {'count': count or len(results), 'results': results, 'complete': complete}
+
+
+def _fetch_page(image: str, page: int) -> List[Dict]:
+    response = http_client.get(_tags_page_url(image, page))
+    response.raise_for_status()
+    return response.json().get('results', [])
+
+
+def fetch_docker_tags(image: str) -> Optional[Dict]:
+    """
+    Fetch the tags of a Docker image from Docker Hub.
+    Results are served from the persistent registry cache while fresh and revalidated
+    with If-None-Match once the TTL has expired.
+
+    Args:
+        image (str): The name of the Docker image.
+
+    Returns:
+        Optional[Dict]: A dictionary containing tag information if successful, None otherwise.
+    """
+    return crawl_docker_tags(image)
+
+
+def build_tag_index(tags_info: Dict) -> Dict[str, List[str]]:
+    """
+    Build an {arch: [tags ordered by last_updated, newest first]} index from crawled tag data.
+
+    Args:
+        tags_info (Dict): The tag information as returned by crawl_docker_tags.
+
+    Returns:
+        Dict[str, List[str]]: The per-architecture tag index.
+    """
+    ordered = sorted(tags_info.get('results', []),
+                     key=lambda t: t.get('last_updated') or '', reverse=True)
+    index: Dict[str, List[str]] = {}
+    for tag_info in ordered:
+        for image_info in tag_info.get('images', []):
+            tags = index.setdefault(image_info.get('architecture'), [])
+            if tag_info['name'] not in tags:
+                tags.append(tag_info['name'])
+    return index
+
+
+class TagIndex:
+    """
+    Run-wide {image: {arch: [tags]}} index so arch checks are dictionary lookups.
+
+    Lookups go through a resolver chain: images already present in the local Docker
+    engine, then the persisted registry cache, then the network (unless offline).
+    Local images only ever prove that a tag supports an architecture, registry data
+    is authoritative for every tag it contains.
+    Images are crawled at most once per run unless a partial crawl cannot answer a lookup.
+    """
+
+    def __init__(self):
+        self._results: Dict[str, Dict[str, Dict]] = {}
+        self._archs: Dict[str, Dict[str, List[str]]] = {}
+        self._tags: Dict[str, Dict[str, set]] = {}
+        self._complete: Dict[str, bool] = {}
+        self._local: Dict[str, Dict[str, set]] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, image: str) -> bool:
+        return image in self._archs or bool(self._local.get(image))
+
+    def get(self, image: str) -> Optional[Dict[str, List[str]]]:
+        return self._archs.get(image)
+
+    def add(self, image: str, tags_info: Dict) -> None:
+        with self._lock:
+            results = self._results.setdefault(image, {})
+            for tag_info in tags_info.get('results', []):
+                results[tag_info['name']] = tag_info
+            merged = {'results': list(results.values())}
+            archs = build_tag_index(merged)
+            tags: Dict[str, set] = {}
+            for arch, arch_tags in archs.items():
+                for tag in arch_tags:
+                    tags.setdefault(tag, set()).add(arch)
+            self._archs[image] = archs
+            self._tags[image] = tags
+            self._complete[image] = self._complete.get(
+                image, False) or tags_info.get('complete', True)
+
+    def add_local(self, image: str, local_tags: Dict[str, set]) -> None:
+        with self._lock:
+            self._local[image] = local_tags
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._archs.clear()
+            self._tags.clear()
+            self._complete.clear()
+            self._local.clear()
+
+    def _resolved_locally(self, image: str, tag: Optional[str], arch: Optional[str]) -> bool:
+        local_tags = self._local.get(image, {})
+        if tag and arch:
+            return arch in local_tags.get(tag, ())
+        if arch:
+            return any(arch in archs for archs in local_tags.values())
+        return False
+
+    def resolves(self, image: str, tag: Optional[str] = None, arch: Optional[str] = None) -> bool:
+        if self._resolved_locally(image, tag, arch):
+            return True
+        if image not in self._archs:
+            return False
+        if self._complete.get(image):
+            return True
+        if tag:
+            return tag in self._tags[image]
+        if arch:
+            return bool(self._archs[image].get(arch))
+        return False
+
+    def ensure(self, image: str, tag: Optional[str] = None, arch: Optional[str] = None) -> bool:
+        """
+        Walk the resolver chain until the index can answer the lookup.
+
+        Returns:
+            bool: True if anything is known about the image, False if no source had data.
+        """
+        if self.resolves(image, tag, arch):
+            return True
+        if _resolver_settings['use_local_images'] and image not in self._local:
+            self.add_local(image, get_local_image_tags(image))
+            if self.resolves(image, tag, arch):
+                logging.debug(f"Resolved {image} from local images")
+                return True
+        tags_info = crawl_docker_tags(image, tag, arch)
+        if tags_info is not None:
+            self.add(image, tags_info)
+        return image in self
+
+    def supports(self, image: str, tag: str, arch: str) -> bool:
+        return arch in self._tags.get(image, {}).get(tag, ()) or arch in self._local.get(image, {}).get(tag, ())
+
+    def has_tag(self, image: str, tag: str) -> bool:
+        return tag in self._tags.get(image, {}) or tag in self._local.get(image, {})
+
+    def tags_for(self, image: str, arch: str) -> List[str]:
+        tags = list(self._archs.get(image, {}).get(arch, []))
+        tags.extend(tag for tag, archs in self._local.get(image, {}).items()
+                    if arch in archs and tag not in tags)
+        return tags
+
+
+_tag_index = TagIndex()
+
+
+def index_images(targets: Dict[str, Tuple[Optional[str], Optional[str]]], max_workers: int = REGISTRY_CRAWL_WORKERS) -> TagIndex:
+    """
+    Crawl several images in parallel and add them to the run-wide tag index.
+
+    Args:
+        targets (Dict[str, Tuple]): Image name mapped to the (tag, arch) lookup it must answer; use (None, None) for a full crawl.
+        max_workers (int): The maximum number of images crawled at once.
+
+    Returns:
+        TagIndex: The shared tag index.
+    """
+    pending = {image: target for image, target in targets.items()
+               if not _tag_index.resolves(image, *target)}
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='registry-index') as executor:
+            for image, target in pending.items():
+                executor.submit(_tag_index.ensure, image, *target)
+        logging.info(f"Indexed tags for {len(pending)} images")
+    return _tag_index
+
+
 def check_img_arch_support(image: str, tag: str, docker_platform: str) -> bool:
     """
     Check if a Docker image tag supports the given docker platform.
@@ -49,17 +522,14 @@ def check_img_arch_support(image: str, tag: str, docker_platform: str) -> bool:
         bool: True if the architecture is supported, False otherwise.
     """
     arch = docker_platform.split('/')[1]
-    tags_info = fetch_docker_tags(image)
-    if tags_info is None:
+    if not _tag_index.ensure(image, tag=tag, arch=arch):
         return False
 
-    tag_info = next((t for t in tags_info.get(
-        'results', []) if t['name'] == tag), None)
-    if not tag_info:
+    if not _tag_index.has_tag(image, tag):
         logging.error(f"Tag {tag} not found for image {image}")
         return False
 
-    return any(image_info['architecture'] == arch for image_info in tag_info['images'])
+    return _tag_index.supports(image, tag, arch)
 
 
 def get_compatible_tag(image: str, docker_platform: str) -> Optional[str]:
@@ -75,15 +545,11 @@ def get_compatible_tag(image: str, docker_platform: str) -> Optional[str]:
         Optional[str]: The compatible tag name if found, None otherwise.
     """
     arch = docker_platform.split('/')[1]
-    tags_info = fetch_docker_tags(image)
-    if tags_info is None:
+    if not _tag_index.ensure(image, arch=arch):
         return None
 
-    compatible_tag = next(
-        (t['name'] for t in tags_info.get('results', []) if any(
-            image_info['architecture'] == arch for image_info in t['images'])),
-        None
-    )
+    compatible_tags = _tag_index.tags_for(image, arch)
+    compatible_tag = compatible_tags[0] if compatible_tags else None
 
     if not compatible_tag:
         # Construct the path to the docker.binfmt.service file
@@ -102,3 +568,97 @@ def get_compatible_tag(image: str, docker_platform: str) -> Optional[str]:
             f"Found compatible tag {compatible_tag} for {image} on platform {docker_platform}")
 
     return compatible_tag
+
+
+def resolve_image_platform(image_name: str, image_tag: str, docker_platform: str, default_docker_platform: str) -> Optional[Tuple[str, str]]:
+    """
+    Resolve the image tag and docker platform to use for an app.
+    Prefers the configured tag on the requested platform, then a compatible tag for that
+    platform, then a tag for the default platform to run under binfmt emulation.
+    When no resolver source knows the image at all (e.g. an air-gapped host without
+    cached data) the configured tag and platform are kept instead of dropping the app.
+
+    Args:
+        image_name (str): The name of the Docker image.
+        image_tag (str): The configured tag of the Docker image.
+        docker_platform (str): The docker platform requested for the app.
+        default_docker_platform (str): The docker platform used for emulation.
+
+    Returns:
+        Optional[Tuple[str, str]]: The (tag, platform) pair to use, None if the image is known to be incompatible.
+    """
+    arch = docker_platform.split('/')[1]
+    if not _tag_index.ensure(image_name, tag=image_tag, arch=arch):
+        logging.warning(
+            f"No registry data available for {image_name}, keeping configured tag {image_tag} on platform {docker_platform}")
+        return image_tag, docker_platform
+
+    if check_img_arch_support(image_name, image_tag, docker_platform):
+        return image_tag, docker_platform
+
+    compatible_tag = get_compatible_tag(image_name, docker_platform)
+    if compatible_tag:
+        logging.info(
+            f"Updated {image_name} to compatible tag: {compatible_tag}")
+        return compatible_tag, docker_platform
+
+    logging.warning(
+        f"No compatible tag found for {image_name} with architecture {docker_platform}. Searching for a suitable tag for default emulation architecture {default_docker_platform}.")
+    # find a compatibile tag with default docker platform
+    compatible_tag = get_compatible_tag(image_name, default_docker_platform)
+    if compatible_tag:
+        logging.warning(
+            f"Compatible tag found to run {image_name} with emulation on {default_docker_platform} architecture. Using binfmt emulation for {image_name}:{image_tag}")
+        return compatible_tag, default_docker_platform
+
+    logging.error(
+        f"No compatible tag found for {image_name} with default architecture {default_docker_platform}.")
+    logging.error(
+        "Please check the image tag and architecture compatibility on the registry.")
+    return None
+
+
+if __name__ == '__main__':
+    # Get the script absolute path and name
+    script_name = os.path.basename(__file__)
+
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(
+        description=f"Run the {script_name} module standalone.")
+    parser.add_argument('--image', type=str, required=True,
+                        help='The Docker image to check (e.g. fazalfarhan01/earnapp)')
+    parser.add_argument('--tag', type=str, default='latest',
+                        help='The image tag to check')
+    parser.add_argument('--docker-platform', type=str, default='linux/amd64',
+                        help='The docker platform to check (e.g. linux/arm64)')
+    parser.add_argument('--refresh-registry-cache', action='store_true',
+                        help='Ignore cached registry data and refetch it')
+    parser.add_argument('--offline', action='store_true',
+                        help='Resolve from local images and cached registry data only')
+    parser.add_argument('--log-dir', default=os.path.join(script_dir,
+                        'logs'), help='Set the logging directory')
+    parser.add_argument(
+        '--log-file', default=f"{script_name}.log", help='Set the logging file name')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING',
+                        'ERROR', 'CRITICAL'], default='INFO', help='Set the logging level')
+    args = parser.parse_args()
+
+    # Set logging level based on command-line arguments
+    log_level = getattr(logging, args.log_level.upper(), None)
+    if not isinstance(log_level, int):
+        raise ValueError(f'Invalid log level: {args.log_level}')
+
+    # Start logging
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(args.log_dir, args.log_file),
+        format='%(asctime)s - [%(levelname)s] - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=log_level
+    )
+
+    configure_registry_cache(refresh=args.refresh_registry_cache)
+    configure_image_resolver(offline=args.offline)
+    supported = check_img_arch_support(
+        args.image, args.tag, args.docker_platform)
+    print(f"{args.image}:{args.tag} supports {args.docker_platform}: {supported}")
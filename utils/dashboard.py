@@ -2,12 +2,14 @@ from flask import Flask, jsonify, request, render_template
 from flask_cors import CORS
 import docker
 import psutil
+import io
 import json
 import logging
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List
 from .advanced_features import LoadBalancer, HealthMonitor, PerformanceMonitor
+from .proxy_parser import ProxyParseStats, iter_proxies
 
 app = Flask(__name__)
 CORS(app)
@@ -79,6 +81,33 @@ def proxies():
     
     return jsonify(proxy_stats)
 
+@app.route('/api/proxies/import', methods=['POST'])
+def import_proxies():
+    # JSON bodies carry the lines of the uploaded file, plain text bodies and uploads are streamed line by line
+    if request.is_json:
+        lines = (request.get_json(silent=True) or {}).get('proxies')
+        if not isinstance(lines, list):
+            return jsonify({"error": "Expected a JSON body with a 'proxies' list"}), 400
+        lines = (line for line in lines if isinstance(line, str))
+    elif 'file' in request.files:
+        lines = io.TextIOWrapper(request.files['file'].stream, encoding='utf-8', errors='replace')
+    else:
+        lines = io.TextIOWrapper(request.stream, encoding='utf-8', errors='replace')
+
+    if not load_balancer:
+        initialize_managers([])
+    stats = ProxyParseStats()
+    for proxy in iter_proxies(lines, seen=set(load_balancer.stats), stats=stats):
+        load_balancer.add_proxy(proxy.url)
+    logger.info(f"Proxy import: {stats.summary()}")
+
+    return jsonify({
+        "imported": stats.valid,
+        "duplicates": stats.duplicates,
+        "invalid": stats.invalid,
+        "errors": [{"line": line_number, "error": error} for line_number, error in stats.errors]
+    })
+
 @app.route('/api/containers', methods=['GET'])
 def containers():
     containers = docker_client.containers.list()
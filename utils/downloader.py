@@ -1,3 +1,4 @@
+from utils import http_client
 import os
 import requests
 import logging
@@ -18,7 +19,7 @@ def download_file(url: str, dest_path: str) -> None:
     """
     try:
         logging.info(f"Starting download from {url}")
-        response = requests.get(url, stream=True)
+        response = http_client.get(url, stream=True)
         response.raise_for_status()
 
         # Create the directory if it doesn't exist
@@ -2,26 +2,110 @@ import os
 import argparse
 import logging
 import json
-from typing import Dict, Any
+import stat
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Tuple
+from utils.loader import invalidate_config_cache
 
 
-def write_json(data: Dict[str, Any], filename: str) -> None:
+# Pending writes of the active batched_writes() blocks, real path mapped to (filename, serialized data)
+_pending_writes: List[Dict[str, Tuple[str, str]]] = []
+
+
+def _atomic_write(filename: str, payload: str) -> None:
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(filename)}.", suffix='.tmp')
+    try:
+        # mkstemp creates the file as 0600, keep the mode of the file being replaced
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(filename).st_mode))
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+        with os.fdopen(fd, 'w') as tmp_file:
+            tmp_file.write(payload)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Persist the rename itself, where the platform allows opening directories
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _write_payload(filename: str, payload: str) -> bool:
+    try:
+        with open(filename, 'r') as current_file:
+            if current_file.read() == payload:
+                logging.debug(f"{filename} is unchanged, skipping write")
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    _atomic_write(filename, payload)
+    # Rewrites within one mtime tick may keep the same size, don't rely on the stat check alone
+    invalidate_config_cache(filename)
+    logging.info(f"Data written to {filename} successfully!")
+    return True
+
+
+def write_json(data: Dict[str, Any], filename: str) -> bool:
     """
     Write data to a JSON file.
+    The file is replaced atomically and left untouched if its content would not change.
+    Inside a batched_writes() block the write is deferred to the end of the block.
 
     Arguments:
     data -- the data to write
     filename -- the file to write the data to
+
+    Returns:
+    bool -- True if the file was written, False if it was unchanged or the write was deferred.
     """
     try:
-        with open(filename, 'w') as json_file:
-            json.dump(data, json_file, indent=4)
-        logging.info(f"Data written to {filename} successfully!")
+        payload = json.dumps(data, indent=4)
+        if _pending_writes:
+            _pending_writes[-1][os.path.realpath(filename)] = (filename, payload)
+            logging.debug(f"Deferred write to {filename} until the end of the batch")
+            return False
+        return _write_payload(filename, payload)
     except Exception as e:
         logging.error(f"Error writing to {filename}: {e}")
         raise
 
 
+@contextmanager
+def batched_writes() -> Iterator[None]:
+    """
+    Coalesce the write_json calls made inside the block into one write per file, done when the block exits.
+    The last data written to each file wins. Nested blocks are flushed by the outermost one.
+    Files read from disk inside the block still have their content from before the block.
+    """
+    _pending_writes.append({})
+    try:
+        yield
+    finally:
+        pending = _pending_writes.pop()
+        if _pending_writes:
+            _pending_writes[-1].update(pending)
+        else:
+            for filename, payload in pending.values():
+                try:
+                    _write_payload(filename, payload)
+                except Exception as e:
+                    logging.error(f"Error writing to {filename}: {e}")
+                    raise
+
+
 if __name__ == '__main__':
     # Get the script absolute path and name
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -0,0 +1,654 @@
+import os
+import re
+import json
+import time
+import shlex
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+from utils.loader import read_env_file
+from utils.teardown import COMPOSE_PROJECT_LABEL, DEFAULT_STOP_GRACE, teardown_projects
+from utils.stack_runner import StackResult
+
+# Labels docker compose puts on what it creates, set by this driver too so either tool can manage the stacks
+COMPOSE_SERVICE_LABEL = 'com.docker.compose.service'
+COMPOSE_NUMBER_LABEL = 'com.docker.compose.container-number'
+COMPOSE_ONEOFF_LABEL = 'com.docker.compose.oneoff'
+COMPOSE_CONFIG_HASH_LABEL = 'com.docker.compose.config-hash'
+COMPOSE_NETWORK_LABEL = 'com.docker.compose.network'
+COMPOSE_VOLUME_LABEL = 'com.docker.compose.volume'
+COMPOSE_WORKING_DIR_LABEL = 'com.docker.compose.project.working_dir'
+COMPOSE_CONFIG_FILES_LABEL = 'com.docker.compose.project.config_files'
+
+SUPPORTED_TOP_LEVEL_KEYS = {'version', 'name', 'services', 'networks', 'volumes'}
+SUPPORTED_SERVICE_KEYS = {
+    'image', 'container_name', 'hostname', 'environment', 'volumes', 'ports', 'restart', 'cpus',
+    'mem_limit', 'mem_reservation', 'cap_add', 'cap_drop', 'privileged', 'dns', 'network_mode', 'networks',
+    'healthcheck', 'command', 'entrypoint', 'platform', 'labels', 'depends_on', 'user', 'working_dir',
+    'devices', 'sysctls', 'extra_hosts', 'tty', 'stdin_open', 'deploy', 'logging', 'security_opt',
+    'shm_size', 'stop_signal', 'stop_grace_period', 'init',
+}
+
+_INTERPOLATION_RE = re.compile(
+    r'\$(?:(\$)|\{([A-Za-z_][A-Za-z0-9_]*)(?:(:?[-?+])([^}]*))?\}|([A-Za-z_][A-Za-z0-9_]*))')
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(h|ms|us|ns|m|s)')
+_DURATION_NS = {'h': 3600 * 10**9, 'm': 60 * 10**9, 's': 10**9, 'ms': 10**6, 'us': 10**3, 'ns': 1}
+_BYTE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024**2, 'mb': 1024**2, 'g': 1024**3, 'gb': 1024**3}
+_PROJECT_NAME_RE = re.compile(r'[^a-z0-9_-]')
+
+
+class UnsupportedComposeOption(ValueError):
+    """
+    The compose file uses an option the engine driver does not translate, docker compose has to be used instead.
+    """
+
+
+@dataclass
+class NetworkSpec:
+    key: str
+    name: str
+    external: bool = False
+    driver: Optional[str] = None
+    subnets: List[str] = field(default_factory=list)
+    options: Dict[str, str] = field(default_factory=dict)
+    internal: bool = False
+    labels: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class ServiceSpec:
+    service: str
+    name: str
+    image: str
+    platform: Optional[str]
+    create: Dict[str, Any]
+    host: Dict[str, Any]
+    network_mode: Optional[str]
+    # Full network name to endpoint settings, in connection order
+    networks: Dict[str, Dict[str, Any]]
+    depends_on: List[str]
+    labels: Dict[str, str]
+
+    @property
+    def network_service(self) -> Optional[str]:
+        if self.network_mode and self.network_mode.startswith('service:'):
+            return self.network_mode.split(':', 1)[1]
+        return None
+
+
+@dataclass
+class StackPlan:
+    project: str
+    services: List[ServiceSpec]
+    networks: List[NetworkSpec]
+    volumes: Dict[str, Dict[str, str]]
+
+
+def normalize_project_name(name: str) -> str:
+    """
+    Normalize a project name the way docker compose does, lower case with only letters, digits, dashes and underscores.
+    """
+    return _PROJECT_NAME_RE.sub('', name.lower())
+
+
+def interpolate(value: Any, env: Dict[str, str]) -> Any:
+    """
+    Replace ${VAR}, ${VAR:-default}, ${VAR-default}, ${VAR:?error}, ${VAR:+alternative}, $VAR and $$
+    in every string of a compose structure.
+
+    Args:
+        value (Any): A compose dictionary, list or scalar.
+        env (Dict[str, str]): The variables.
+
+    Returns:
+        Any: A new structure with the variables replaced.
+
+    Raises:
+        ValueError: If a required variable is not set.
+    """
+    if isinstance(value, str):
+        if '$' not in value:
+            return value
+
+        def replace(match: re.Match) -> str:
+            escaped, name, operator, argument, bare = match.groups()
+            if escaped:
+                return '$'
+            if bare:
+                return env.get(bare, '')
+            current = env.get(name)
+            is_set = current is not None and (current != '' or not operator or not operator.startswith(':'))
+            if not operator:
+                return current or ''
+            if operator.endswith('-'):
+                return current if is_set else argument
+            if operator.endswith('?'):
+                if not is_set:
+                    raise ValueError(argument or f"Required variable {name} is not set")
+                return current
+            return argument if is_set else ''
+        return _INTERPOLATION_RE.sub(replace, value)
+    if isinstance(value, dict):
+        return {key: interpolate(item, env) for key, item in value.items()}
+    if isinstance(value, list):
+        return [interpolate(item, env) for item in value]
+    return value
+
+
+def parse_duration(value: Any) -> int:
+    """
+    Convert a compose duration such as 1m30s or 500ms, or a number of seconds, to nanoseconds.
+    """
+    if isinstance(value, (int, float)):
+        return int(value * 10**9)
+    text = str(value).strip()
+    parts = _DURATION_RE.findall(text)
+    if not parts or ''.join(number + unit for number, unit in parts) != text:
+        raise ValueError(f"Invalid duration '{value}'")
+    return int(sum(float(number) * _DURATION_NS[unit] for number, unit in parts))
+
+
+def parse_bytes(value: Any) -> int:
+    """
+    Convert a compose byte value such as 512m or 2G to bytes.
+    """
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([a-z]*)', str(value).strip().lower())
+    if not match or match.group(2) not in _BYTE_UNITS:
+        raise ValueError(f"Invalid byte value '{value}'")
+    return int(float(match.group(1)) * _BYTE_UNITS[match.group(2)])
+
+
+def _command(value: Any) -> Optional[List[str]]:
+    if value is None:
+        return None
+    return shlex.split(value) if isinstance(value, str) else [str(item) for item in value]
+
+
+def _environment(value: Any, env: Dict[str, str]) -> List[str]:
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = (item.split('=', 1) if '=' in item else (item, None) for item in value or [])
+    result = []
+    for key, item in items:
+        if item is None:
+            # A bare name takes its value from the environment and is left out when unset
+            if key in env:
+                result.append(f"{key}={env[key]}")
+        else:
+            result.append(f"{key}={item}")
+    return result
+
+
+def _restart_policy(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not value or value == 'no':
+        return None
+    name, _, retries = str(value).partition(':')
+    if name not in ('always', 'unless-stopped', 'on-failure'):
+        raise UnsupportedComposeOption(f"Unsupported restart policy '{value}'")
+    policy = {'Name': name}
+    if retries:
+        policy['MaximumRetryCount'] = int(retries)
+    return policy
+
+
+def _port_bindings(ports: List[Any]) -> Tuple[List[Any], Dict[str, List[Any]]]:
+    exposed, bindings = [], {}
+    for port in ports:
+        if isinstance(port, dict):
+            host_ip, published = port.get('host_ip', ''), str(port.get('published', ''))
+            target, protocol = str(port['target']), port.get('protocol', 'tcp')
+        else:
+            spec, _, protocol = str(port).partition('/')
+            protocol = protocol or 'tcp'
+            parts = spec.rsplit(':', 2)
+            target = parts[-1]
+            published = parts[-2] if len(parts) > 1 else ''
+            host_ip = parts[0] if len(parts) > 2 else ''
+        if '-' in target or '-' in published:
+            raise UnsupportedComposeOption(f"Port ranges are not supported: '{port}'")
+        key = target if protocol == 'tcp' else f"{target}/{protocol}"
+        exposed.append(int(target) if protocol == 'tcp' else (int(target), protocol))
+        binding = (host_ip, int(published)) if host_ip else (int(published) if published else None)
+        bindings.setdefault(key, []).append(binding)
+    return exposed, bindings
+
+
+def _is_path(source: str) -> bool:
+    return source.startswith(('/', '.', '~')) or bool(re.match(r'^[A-Za-z]:[\\/]', source))
+
+
+def _binds(volumes: List[Any], project: str, working_dir: str, top_level: Dict[str, Any],
+           named: Dict[str, Dict[str, str]]) -> Tuple[List[str], List[str]]:
+    container_paths, binds = [], []
+    for volume in volumes:
+        if isinstance(volume, dict):
+            source, target = volume.get('source', ''), volume['target']
+            mode = 'ro' if volume.get('read_only') else 'rw'
+            if volume.get('type', 'volume') not in ('bind', 'volume'):
+                raise UnsupportedComposeOption(f"Unsupported volume type '{volume.get('type')}'")
+        else:
+            parts = str(volume).split(':')
+            if len(parts) == 1:
+                source, target, mode = '', parts[0], 'rw'
+            else:
+                source, target = parts[0], parts[1]
+                mode = parts[2] if len(parts) > 2 else 'rw'
+        container_paths.append(target)
+        if not source:
+            continue
+        if _is_path(source):
+            source = os.path.abspath(os.path.join(working_dir, os.path.expanduser(source)))
+        else:
+            definition = top_level.get(source) or {}
+            if definition.get('external'):
+                source = definition.get('name', source)
+            else:
+                volume_name = definition.get('name') or f"{project}_{source}"
+                named[volume_name] = {COMPOSE_PROJECT_LABEL: project, COMPOSE_VOLUME_LABEL: source}
+                source = volume_name
+        binds.append(f"{source}:{target}:{mode}")
+    return container_paths, binds
+
+
+def _healthcheck(value: Dict[str, Any]) -> Dict[str, Any]:
+    if value.get('disable'):
+        return {'test': ['NONE']}
+    healthcheck = {}
+    test = value.get('test')
+    if test is not None:
+        healthcheck['test'] = ['CMD-SHELL', test] if isinstance(test, str) else list(test)
+    for key, api_key in (('interval', 'interval'), ('timeout', 'timeout'), ('start_period', 'start_period'),
+                         ('start_interval', 'start_interval')):
+        if key in value:
+            healthcheck[api_key] = parse_duration(value[key])
+    if 'retries' in value:
+        healthcheck['retries'] = int(value['retries'])
+    return healthcheck
+
+
+def _service_networks(service: Dict[str, Any], networks: Dict[str, NetworkSpec], service_name: str) -> Dict[str, Dict[str, Any]]:
+    declared = service.get('networks') or ['default']
+    items = declared.items() if isinstance(declared, dict) else ((key, None) for key in declared)
+    result = {}
+    for key, settings in items:
+        if key not in networks:
+            raise ValueError(f"Service {service_name} uses undefined network '{key}'")
+        settings = settings or {}
+        endpoint = {'aliases': [service_name] + list(settings.get('aliases', []))}
+        if settings.get('ipv4_address'):
+            endpoint['ipv4_address'] = settings['ipv4_address']
+        result[networks[key].name] = endpoint
+    return result
+
+
+def _dependency_order(services: Dict[str, ServiceSpec]) -> List[ServiceSpec]:
+    ordered, state = [], {}
+
+    def visit(name: str, path: Tuple[str, ...]) -> None:
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Dependency cycle between services: {' -> '.join(path + (name,))}")
+        if name not in services:
+            raise ValueError(f"Unknown service '{name}' in dependencies of {path[-1]}")
+        state[name] = 'visiting'
+        spec = services[name]
+        for dependency in spec.depends_on + ([spec.network_service] if spec.network_service else []):
+            visit(dependency, path + (name,))
+        state[name] = 'done'
+        ordered.append(spec)
+
+    for name in services:
+        visit(name, ())
+    return ordered
+
+
+def plan_stack(compose_dict: Dict[str, Any], project: str, env: Dict[str, str], working_dir: str = '.',
+               config_files: Optional[List[str]] = None) -> StackPlan:
+    """
+    Translate a compose dictionary, as built by generator.build_compose_dict, to engine API calls.
+
+    Args:
+        compose_dict (Dict[str, Any]): The compose dictionary, variables are replaced from env.
+        project (str): The compose project name.
+        env (Dict[str, str]): The variables, usually the instance .env and the process environment.
+        working_dir (str): The directory relative bind mounts are resolved against.
+        config_files (Optional[List[str]]): The compose files the dictionary came from, recorded in the labels.
+
+    Returns:
+        StackPlan: The networks, volumes and containers of the stack, containers in dependency order.
+
+    Raises:
+        UnsupportedComposeOption: If the dictionary uses an option the driver does not translate.
+        ValueError: If the dictionary is invalid.
+    """
+    project = normalize_project_name(project)
+    working_dir = os.path.abspath(working_dir)
+    unsupported = set(compose_dict) - SUPPORTED_TOP_LEVEL_KEYS
+    if unsupported:
+        raise UnsupportedComposeOption(f"Unsupported top level keys: {', '.join(sorted(unsupported))}")
+    compose_dict = interpolate(compose_dict, env)
+    project_labels = {COMPOSE_PROJECT_LABEL: project, COMPOSE_WORKING_DIR_LABEL: working_dir}
+    if config_files:
+        project_labels[COMPOSE_CONFIG_FILES_LABEL] = ','.join(config_files)
+
+    networks = {}
+    for key, definition in {'default': None, **(compose_dict.get('networks') or {})}.items():
+        definition = definition or {}
+        if definition.get('external'):
+            networks[key] = NetworkSpec(key, definition.get('name', key), external=True)
+            continue
+        ipam = definition.get('ipam') or {}
+        networks[key] = NetworkSpec(
+            key, definition.get('name') or f"{project}_{key}", driver=definition.get('driver') or None,
+            subnets=[pool['subnet'] for pool in ipam.get('config') or [] if pool.get('subnet')],
+            options=definition.get('driver_opts') or {}, internal=bool(definition.get('internal')),
+            labels={**(definition.get('labels') or {}), COMPOSE_PROJECT_LABEL: project, COMPOSE_NETWORK_LABEL: key})
+
+    named_volumes: Dict[str, Dict[str, str]] = {}
+    specs = {}
+    for service_name, service in (compose_dict.get('services') or {}).items():
+        unsupported = set(service) - SUPPORTED_SERVICE_KEYS
+        if unsupported:
+            raise UnsupportedComposeOption(
+                f"Service {service_name} uses unsupported keys: {', '.join(sorted(unsupported))}")
+        if not service.get('image'):
+            raise UnsupportedComposeOption(f"Service {service_name} has no image, builds are not supported")
+
+        limits = ((service.get('deploy') or {}).get('resources') or {}).get('limits') or {}
+        reservations = ((service.get('deploy') or {}).get('resources') or {}).get('reservations') or {}
+        cpus = service.get('cpus', limits.get('cpus'))
+        mem_limit = service.get('mem_limit', limits.get('memory'))
+        mem_reservation = service.get('mem_reservation', reservations.get('memory'))
+        exposed, port_bindings = _port_bindings(service.get('ports') or [])
+        container_paths, binds = _binds(service.get('volumes') or [], project, working_dir,
+                                        compose_dict.get('volumes') or {}, named_volumes)
+        network_mode = service.get('network_mode')
+        service_networks = {} if network_mode else _service_networks(service, networks, service_name)
+        depends_on = service.get('depends_on') or []
+        logging_config = service.get('logging')
+
+        host = {
+            'binds': binds or None,
+            'port_bindings': port_bindings or None,
+            'restart_policy': _restart_policy(service.get('restart')),
+            'nano_cpus': int(float(cpus) * 10**9) if cpus not in (None, '') else None,
+            'mem_limit': parse_bytes(mem_limit) if mem_limit not in (None, '') else None,
+            'mem_reservation': parse_bytes(mem_reservation) if mem_reservation not in (None, '') else None,
+            'cap_add': service.get('cap_add'),
+            'cap_drop': service.get('cap_drop'),
+            'privileged': bool(service.get('privileged', False)),
+            'dns': service.get('dns'),
+            'devices': service.get('devices'),
+            'sysctls': service.get('sysctls'),
+            'extra_hosts': service.get('extra_hosts'),
+            'security_opt': service.get('security_opt'),
+            'shm_size': parse_bytes(service['shm_size']) if service.get('shm_size') else None,
+            'log_config': {'Type': logging_config.get('driver', 'json-file'),
+                           'Config': logging_config.get('options') or {}} if logging_config else None,
+            'init': service.get('init'),
+        }
+        create = {
+            'command': _command(service.get('command')),
+            'entrypoint': _command(service.get('entrypoint')),
+            'hostname': service.get('hostname'),
+            'user': service.get('user'),
+            'working_dir': service.get('working_dir'),
+            'environment': _environment(service.get('environment'), env) or None,
+            'ports': exposed or None,
+            'volumes': container_paths or None,
+            'tty': bool(service.get('tty', False)),
+            'stdin_open': bool(service.get('stdin_open', False)),
+            'healthcheck': _healthcheck(service['healthcheck']) if service.get('healthcheck') else None,
+            'stop_signal': service.get('stop_signal'),
+            'stop_timeout': parse_duration(service['stop_grace_period']) // 10**9 if service.get('stop_grace_period') else None,
+        }
+        service_labels = service.get('labels') or {}
+        if isinstance(service_labels, list):
+            service_labels = dict(label.partition('=')[::2] for label in service_labels)
+        labels = {**service_labels, **project_labels, COMPOSE_SERVICE_LABEL: service_name,
+                  COMPOSE_NUMBER_LABEL: '1', COMPOSE_ONEOFF_LABEL: 'False'}
+        spec = ServiceSpec(
+            service_name, service.get('container_name') or f"{project}-{service_name}-1", service['image'],
+            service.get('platform'), {key: value for key, value in create.items() if value is not None},
+            {key: value for key, value in host.items() if value is not None}, network_mode, service_networks,
+            list(depends_on), labels)
+        spec.labels[COMPOSE_CONFIG_HASH_LABEL] = config_hash(spec)
+        specs[service_name] = spec
+
+    used_networks = {name for spec in specs.values() for name in spec.networks}
+    return StackPlan(project, _dependency_order(specs),
+                     [network for network in networks.values() if network.name in used_networks],
+                     named_volumes)
+
+
+def config_hash(spec: ServiceSpec) -> str:
+    """
+    Hash of everything the container is created from, a running container with the same hash is left alone.
+    """
+    payload = json.dumps([spec.image, spec.platform, spec.create, spec.host, spec.network_mode, spec.networks,
+                          {key: value for key, value in spec.labels.items() if key != COMPOSE_CONFIG_HASH_LABEL}],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _is_status(error: Exception, status_code: int) -> bool:
+    return getattr(error, 'status_code', None) == status_code
+
+
+class EngineStackDriver:
+    """
+    Creates, starts and removes compose stacks directly through the Docker engine API on one shared client.
+    Containers, networks and volumes carry the docker compose labels, so stacks started here can be
+    stopped with docker compose and the other way around.
+    """
+
+    def __init__(self, client: Any, grace: int = DEFAULT_STOP_GRACE):
+        self.client = client
+        self.grace = grace
+
+    def _ensure_networks(self, plan: StackPlan) -> None:
+        existing = {network['Name']: network for network in self.client.api.networks(
+            filters={'label': f"{COMPOSE_PROJECT_LABEL}={plan.project}"})}
+        for network in plan.networks:
+            if network.external or network.name in existing:
+                continue
+            ipam = {'Driver': 'default', 'Config': [{'Subnet': subnet} for subnet in network.subnets],
+                    'Options': {}} if network.subnets else None
+            try:
+                self.client.api.create_network(network.name, driver=network.driver, options=network.options or None,
+                                               ipam=ipam, internal=network.internal, labels=network.labels)
+                logging.info(f"Created network {network.name}")
+            except Exception as e:
+                # Created by compose before the labels were known to this driver, or by a concurrent run
+                if not _is_status(e, 409):
+                    raise
+
+    def _ensure_volumes(self, plan: StackPlan) -> None:
+        if not plan.volumes:
+            return
+        existing = {volume['Name'] for volume in (self.client.api.volumes(
+            filters={'label': f"{COMPOSE_PROJECT_LABEL}={plan.project}"}) or {}).get('Volumes') or []}
+        for name, labels in plan.volumes.items():
+            if name not in existing:
+                self.client.api.create_volume(name, labels=labels)
+
+    def _remove(self, container_id: str) -> None:
+        try:
+            self.client.api.stop(container_id, timeout=self.grace)
+            self.client.api.remove_container(container_id, force=True)
+        except Exception as e:
+            if not _is_status(e, 404):
+                raise
+
+    def _create(self, spec: ServiceSpec, container_ids: Dict[str, str]) -> str:
+        api = self.client.api
+        host = dict(spec.host)
+        networks = list(spec.networks.items())
+        networking_config = None
+        if spec.network_service:
+            host['network_mode'] = f"container:{container_ids[spec.network_service]}"
+        elif spec.network_mode:
+            host['network_mode'] = spec.network_mode
+        elif networks:
+            name, endpoint = networks[0]
+            host['network_mode'] = name
+            networking_config = api.create_networking_config({name: api.create_endpoint_config(**endpoint)})
+        arguments = dict(spec.create, name=spec.name, labels=spec.labels, host_config=api.create_host_config(**host),
+                         networking_config=networking_config, detach=True)
+        if spec.platform:
+            arguments['platform'] = spec.platform
+        try:
+            container = api.create_container(spec.image, **arguments)
+        except Exception as e:
+            if not _is_status(e, 404):
+                raise
+            logging.info(f"Pulling missing image {spec.image} for {spec.name}")
+            api.pull(spec.image, platform=spec.platform)
+            container = api.create_container(spec.image, **arguments)
+        for name, endpoint in networks[1:]:
+            api.connect_container_to_network(container['Id'], name, **endpoint)
+        return container['Id']
+
+    def up(self, plan: StackPlan) -> Dict[str, str]:
+        """
+        Bring a stack to its planned state like `docker compose up -d --remove-orphans`.
+        Containers whose configuration did not change are only started if they are stopped.
+
+        Args:
+            plan (StackPlan): The plan from plan_stack.
+
+        Returns:
+            Dict[str, str]: The action taken per service, created, recreated, started or running,
+            and removed for orphan containers.
+        """
+        api = self.client.api
+        self._ensure_networks(plan)
+        self._ensure_volumes(plan)
+        existing = {}
+        for container in api.containers(all=True, filters={'label': f"{COMPOSE_PROJECT_LABEL}={plan.project}"}):
+            existing[(container.get('Labels') or {}).get(COMPOSE_SERVICE_LABEL)] = container
+
+        actions: Dict[str, str] = {}
+        container_ids: Dict[str, str] = {}
+        for spec in plan.services:
+            current = existing.pop(spec.service, None)
+            # Containers sharing the network of a recreated container must follow it into the new namespace
+            follows_recreated = spec.network_service and actions.get(spec.network_service) in ('created', 'recreated')
+            if current and (current.get('Labels') or {}).get(COMPOSE_CONFIG_HASH_LABEL) == spec.labels[COMPOSE_CONFIG_HASH_LABEL] \
+                    and not follows_recreated:
+                container_ids[spec.service] = current['Id']
+                if current.get('State') == 'running':
+                    actions[spec.service] = 'running'
+                else:
+                    api.start(current['Id'])
+                    actions[spec.service] = 'started'
+                continue
+            if current:
+                self._remove(current['Id'])
+            container_ids[spec.service] = self._create(spec, container_ids)
+            api.start(container_ids[spec.service])
+            actions[spec.service] = 'recreated' if current else 'created'
+
+        for service, container in existing.items():
+            if (container.get('Labels') or {}).get(COMPOSE_ONEOFF_LABEL) == 'True':
+                continue
+            self._remove(container['Id'])
+            actions[service] = 'removed'
+        return actions
+
+    def down(self, project: str) -> bool:
+        """
+        Remove the containers and networks of a stack like `docker compose down`.
+
+        Returns:
+            bool: True if everything was removed.
+        """
+        results = teardown_projects(self.client, [normalize_project_name(project)], grace=self.grace)
+        return all(result.ok for result in results)
+
+
+def load_compose_file(compose_file: str, cache: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Load a compose file, shared compose files are parsed once when a cache dictionary is given.
+    """
+    key = os.path.realpath(compose_file)
+    if cache is not None and key in cache:
+        return cache[key]
+    with open(compose_file, 'r') as f:
+        compose_dict = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)) or {}
+    if cache is not None:
+        cache[key] = compose_dict
+    return compose_dict
+
+
+def plan_stack_files(compose_file: str, env_file: str, project: Optional[str] = None,
+                     cache: Optional[Dict[str, Any]] = None) -> StackPlan:
+    """
+    Plan a stack from its compose and .env files, as docker compose would read them.
+
+    Args:
+        compose_file (str): The path to the compose file.
+        env_file (str): The path to the .env file, its COMPOSE_PROJECT_NAME is the project name.
+        project (Optional[str]): The project name, overrides the .env file.
+        cache (Optional[Dict[str, Any]]): Parsed compose files by real path, shared between calls.
+
+    Returns:
+        StackPlan: The plan.
+    """
+    env = read_env_file(env_file) if os.path.isfile(env_file) else {}
+    # Like compose, variables of the process environment take precedence over the .env file
+    env.update(os.environ)
+    working_dir = os.path.dirname(os.path.abspath(compose_file))
+    project = project or env.get('COMPOSE_PROJECT_NAME') or os.path.basename(working_dir)
+    return plan_stack(load_compose_file(compose_file, cache), project, env, working_dir,
+                      [os.path.abspath(compose_file)])
+
+
+def run_engine_jobs(driver: EngineStackDriver, stacks: List[Tuple[str, str, str]], workers: int,
+                    on_result: Optional[Callable[[StackResult, int, int], None]] = None) -> List[StackResult]:
+    """
+    Start stacks concurrently through the engine driver, with at most `workers` of them being set up at once.
+
+    Args:
+        driver (EngineStackDriver): The driver sharing one docker client.
+        stacks (List[Tuple[str, str, str]]): The name, compose file and .env file of each stack.
+        workers (int): The maximum number of stacks set up at once.
+        on_result (Optional[Callable[[StackResult, int, int], None]]): Called with each result, the number done and the total.
+
+    Returns:
+        List[StackResult]: One result per stack in the given order, like stack_runner.run_stack_jobs.
+    """
+    cache: Dict[str, Any] = {}
+
+    def start(stack: Tuple[str, str, str]) -> StackResult:
+        name, compose_file, env_file = stack
+        begin = time.perf_counter()
+        try:
+            actions = driver.up(plan_stack_files(compose_file, env_file, cache=cache))
+        except Exception as e:
+            logging.error(f"{name} failed to start through the engine API: {str(e)}")
+            return StackResult(name, None, time.perf_counter() - begin, error=str(e))
+        summary = ', '.join(f"{service} {action}" for service, action in actions.items())
+        logging.info(f"{name} started through the engine API: {summary}")
+        return StackResult(name, 0, time.perf_counter() - begin, tail=[summary])
+
+    results: List[Optional[StackResult]] = [None] * len(stacks)
+    if not stacks:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(stacks)))) as executor:
+        futures = {executor.submit(start, stack): index for index, stack in enumerate(stacks)}
+        for done, future in enumerate(futures, start=1):
+            index = futures[future]
+            results[index] = future.result()
+            if on_result:
+                on_result(results[index], done, len(stacks))
+    return results
@@ -1,11 +1,11 @@
 from utils.loader import load_json_config
 from utils.cls import cls
+from utils.pacing import pause
 import os
 import sys
 import argparse
 import logging
 import json
-import time
 import random
 import sys
 from typing import Dict, Any
@@ -46,7 +46,7 @@ def fn_bye(m4b_config: Dict[str, Any]) -> None:
             'Did you know typing 404 while setting up apps the rest of the setup process will be skipped'
         ])
         print(random.choice(farewell_messages))
-        time.sleep(sleep_time)
+        pause(sleep_time)
         sys.exit(0)
     except Exception as e:
         logging.error(f"An error occurred in fn_bye: {str(e)}")
@@ -62,7 +62,7 @@ def main(app_config_path: str, m4b_config_path: str, user_config_path: str) -> N
     m4b_config_path -- the path to the m4b configuration file
     user_config_path -- the path to the user configuration file
     """
-    m4b_config = load_json_config(m4b_config_path)
+    m4b_config = load_json_config(m4b_config_path, readonly=True)
     fn_bye(m4b_config)
 
 
@@ -1,6 +1,7 @@
 from utils.prompt_helper import ask_question_yn
 from utils.loader import load_json_config
 from utils.cls import cls
+from utils.pacing import pause
 from utils.downloader import download_file
 from utils.detector import detect_os, detect_architecture
 from utils import loader
@@ -11,7 +12,6 @@ import argparse
 import json
 from typing import Dict, Any
 import sys
-import time
 
 # Ensure the parent directory is in the sys.path
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -23,7 +23,7 @@ sys.path.append(parent_dir)
 # Global config loading and global variables
 m4b_config_path = os.path.join(parent_dir, "config", "m4b-config.json")
 try:
-    m4b_config = loader.load_json_config(m4b_config_path)
+    m4b_config = loader.load_json_config(m4b_config_path, readonly=True)
 except FileNotFoundError:
     m4b_config = {}  # Fallback to empty config if not found
     logging.warning("Configuration file not found. Using default values.")
@@ -45,7 +45,7 @@ def is_docker_installed(m4b_config: Dict[str, Any]) -> bool:
         msg = f"Docker is already installed on {os_type} with {dkarch} architecture"
         logging.info(msg)
         print(msg)
-        time.sleep(sleep_time)
+        pause(sleep_time)
         return True
     except FileNotFoundError:
         return False
@@ -71,7 +71,7 @@ def install_docker_linux(files_path: str):
         subprocess.run(["sudo", "sh", installer_path], check=True)
         print("Docker should now be successfully installed on Linux")
         logging.info("Docker installed successfully on Linux")
-        time.sleep(sleep_time)
+        pause(sleep_time)
 
         # Clean-up
         os.remove(installer_path)
@@ -176,7 +176,7 @@ def main(app_config_path: str, m4b_config_path: str, user_config_path: str) -> N
     m4b_config_path -- The path to the m4b configuration file.
     user_config_path -- The path to the user configuration file.
     """
-    m4b_config = load_json_config(m4b_config_path)
+    m4b_config = load_json_config(m4b_config_path, readonly=True)
     cls()
 
     # Detect OS and architecture using the detect module
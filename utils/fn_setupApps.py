@@ -1,23 +1,27 @@
-from utils.networker import find_next_available_port
+from utils.networker import find_next_available_port, PortAllocator, SubnetAllocator, instance_subnet_pool, PORT_RESERVATIONS_FILE, SUBNET_ASSIGNMENTS_FILE
 from utils.fn_stopStack import stop_stack, stop_all_stacks
-from utils.checker import fetch_docker_tags, check_img_arch_support
-from utils.generator import generate_uuid, assemble_docker_compose, generate_env_file, generate_device_name
+from utils.fn_startStack import start_stack
+from utils.checker import fetch_docker_tags, check_img_arch_support, configure_registry_cache, configure_image_resolver
+from utils.generator import generate_uuid, assemble_docker_compose, generate_env_file, generate_device_name, generate_instances_batch, prune_shared_composes, SHARED_COMPOSE_DIR
 from utils.prompt_helper import ask_question_yn, ask_email, ask_string, ask_uuid
 from utils.dumper import write_json
 from utils.cls import cls
-from utils import loader, detector
+from utils.pacing import pause
+from utils import loader, detector, http_client
+from utils.loader import INSTANCE_BASE_DIR, INSTANCE_OVERLAY_FILE, INSTANCE_CONFIG_FILES
+from utils.proxy_parser import ProxyParseStats, iter_proxy_file, proxy_identity
+from utils.registry import record_generated
+from utils.proxy_validator import validate_proxies, write_proxy_report, PROXY_REPORT_FILE, DEFAULT_CHECK_TARGET, DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT
 import os
 import platform
 import sys
 import argparse
 import logging
 import json
-import time
 import getpass
 import shutil
 import re
-from copy import deepcopy
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import socket
 from colorama import Fore, Back, Style, just_fix_windows_console
 
@@ -31,7 +35,7 @@ if parent_dir not in sys.path:
 # Global config loading and global variables
 m4b_config_path = os.path.join(parent_dir, "config", "m4b-config.json")
 try:
-    m4b_config = loader.load_json_config(m4b_config_path)
+    m4b_config = loader.load_json_config(m4b_config_path, readonly=True)
 except FileNotFoundError:
     m4b_config = {}  # Fallback to empty config if not found
     logging.warning("Configuration file not found. Using default values.")
@@ -383,7 +387,127 @@ def setup_notifications(user_config: Dict[str, Any]) -> None:
         logging.info("User chose not to enable notifications.")
 
 
-def setup_multiproxy_instances(user_config: Dict[str, Any], app_config: Dict[str, Any], m4b_config: Dict[str, Any], proxies: list) -> None:
+def check_instance_proxies(proxies: List[str], m4b_config: Dict[str, Any], report_path: str) -> List[str]:
+    """
+    Check the proxies concurrently and keep only the working ones, so no stack is created for a dead proxy.
+    Settings are read from the proxy_validation section of the m4b config.
+
+    Args:
+        proxies (List[str]): The proxy URLs.
+        m4b_config (Dict[str, Any]): The m4b configuration dictionary.
+        report_path (str): Where to write the per-proxy JSON report.
+
+    Returns:
+        List[str]: The URLs of the working proxies, with the scheme corrected when a different protocol was detected.
+    """
+    settings = m4b_config.get('proxy_validation', {})
+    target = (settings.get('target_host', DEFAULT_CHECK_TARGET[0]),
+              int(settings.get('target_port', DEFAULT_CHECK_TARGET[1])))
+    print(f"{Fore.BLUE}Checking {len(proxies)} proxies...{Style.RESET_ALL}")
+    results = validate_proxies(proxies, target, concurrency=settings.get('concurrency', DEFAULT_CONCURRENCY),
+                               timeout=settings.get('timeout', DEFAULT_TIMEOUT),
+                               max_latency_ms=settings.get('max_latency_ms'))
+    write_proxy_report(results, report_path, target)
+
+    failed = [result for result in results if not result.ok]
+    for result in failed:
+        logging.warning(
+            f"Excluding proxy {result.to_report()['proxy']}: {result.error}")
+        print(f"{Fore.YELLOW}Excluding proxy {result.to_report()['proxy']}: {result.error}{Style.RESET_ALL}")
+    print(f"{Fore.GREEN}{len(results) - len(failed)} of {len(results)} proxies passed, report written to {report_path}{Style.RESET_ALL}")
+    return [result.url for result in results if result.ok]
+
+
+def scan_proxy_instances(instances_dir: str) -> List[Dict[str, Any]]:
+    """
+    Read the existing multiproxy instances, with what is needed to keep them stable when they are reconciled.
+
+    Args:
+        instances_dir (str): The directory containing the proxy instances.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per instance with its project_name, instance_dir, proxy, identity,
+        device_name, subnet, the ports of each app and the app flags overridden by the instance, sorted by project name.
+    """
+    instances = []
+    if not os.path.isdir(instances_dir):
+        return instances
+    for name in sorted(os.listdir(instances_dir)):
+        instance_dir = os.path.join(instances_dir, name)
+        if name.startswith('.') or not os.path.isdir(instance_dir):
+            continue
+        try:
+            instance_m4b_config, _, instance_user_config = loader.load_instance_configs(
+                instance_dir)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logging.warning(
+                f"Skipping unreadable proxy instance '{name}': {str(e)}")
+            continue
+        proxy = instance_user_config.get('proxies', {}).get('url', '')
+        # App ids set on the instance itself (e.g. by fix_conflicts) live in its overlay, next to the ports
+        app_flags = {}
+        if os.path.exists(os.path.join(instance_dir, INSTANCE_OVERLAY_FILE)):
+            overlay_apps = loader.load_instance_overlay(instance_dir).get('user_config', {}).get('apps', {})
+            app_flags = {app_name: {flag: value for flag, value in app.items() if flag not in ('enabled', 'ports')}
+                         for app_name, app in overlay_apps.items() if isinstance(app, dict)}
+            app_flags = {app_name: flags for app_name, flags in app_flags.items() if flags}
+        instances.append({
+            'project_name': instance_m4b_config.get('project', {}).get('compose_project_name', name),
+            'instance_dir': instance_dir,
+            'proxy': proxy,
+            'identity': proxy_identity(proxy),
+            'device_name': instance_user_config.get('device_info', {}).get('device_name'),
+            'subnet': instance_m4b_config.get('network', {}).get('subnet'),
+            'ports': {app_name: app['ports'] for app_name, app in instance_user_config.get('apps', {}).items()
+                      if isinstance(app, dict) and 'ports' in app},
+            'app_flags': app_flags,
+        })
+    return instances
+
+
+def pick_main_proxy(proxies: List[str], current_url: str) -> str:
+    """
+    Choose the proxy of the main stack and remove it from the list, the rest go to the multiproxy instances.
+    The current main proxy is kept while it is still in the list, so reordering or extending proxies.txt
+    does not move it to another instance.
+
+    Args:
+        proxies (List[str]): The proxies, changed in place.
+        current_url (str): The proxy the main stack uses now, empty if none.
+
+    Returns:
+        str: The proxy of the main stack.
+    """
+    if current_url:
+        identity = proxy_identity(current_url)
+        for i, proxy in enumerate(proxies):
+            if proxy_identity(proxy) == identity:
+                return proxies.pop(i)
+    return proxies.pop(-1)
+
+
+def remove_proxy_instance(instance: Dict[str, Any], port_allocator: PortAllocator, subnet_allocator: SubnetAllocator) -> None:
+    """
+    Stop the stack of a proxy instance, delete its directory and release its ports and subnet.
+
+    Args:
+        instance (Dict[str, Any]): The instance, as returned by scan_proxy_instances.
+        port_allocator (PortAllocator): The allocator holding the instance ports.
+        subnet_allocator (SubnetAllocator): The allocator holding the instance subnet.
+    """
+    compose_file = os.path.join(instance['instance_dir'], 'docker-compose.yaml')
+    if os.path.exists(compose_file):
+        stop_stack(compose_file, instance['project_name'], skip_questions=True)
+    shutil.rmtree(instance['instance_dir'], ignore_errors=True)
+    port_allocator.release(instance['project_name'])
+    subnet_allocator.release(instance['project_name'])
+    print(f"{Fore.YELLOW}Removed proxy instance {instance['project_name']}, its proxy is no longer in the list.{Style.RESET_ALL}")
+    logging.info(
+        f"Removed proxy instance {instance['project_name']} for proxy {instance['identity']}")
+
+
+def setup_multiproxy_instances(user_config: Dict[str, Any], app_config: Dict[str, Any], m4b_config: Dict[str, Any], proxies: list,
+                               validate: Optional[bool] = None, reconcile: Optional[bool] = None) -> List[str]:
     """
     Setup multiple proxy instances based on the given proxies list.
 
@@ -392,6 +516,13 @@ def setup_multiproxy_instances(user_config: Dict[str, Any], app_config: Dict[str
         app_config (dict): The app configuration dictionary.
         m4b_config (dict): The m4b configuration dictionary.
         proxies (list): List of proxy configurations.
+        validate (Optional[bool]): Check the proxies of new instances and skip the failing ones, defaults to proxy_validation.enabled
+            in the m4b config. Instances that already exist are kept whatever the check says.
+        reconcile (Optional[bool]): Match the proxies to the existing instances instead of recreating them, asked when None.
+            Kept instances keep their names, ports and subnets, instances whose proxy is gone are removed.
+
+    Returns:
+        List[str]: The project names of the instances whose files were written or changed.
     """
     instances_dir = 'm4b_proxy_instances'
     os.makedirs(instances_dir, exist_ok=True)
@@ -408,70 +539,132 @@ def setup_multiproxy_instances(user_config: Dict[str, Any], app_config: Dict[str
     print(f"{Fore.BLUE}Base device name for instances: {base_device_name}{Style.RESET_ALL}")
     logging.info(f"Base device name for proxy instances: {base_device_name}")
 
-    base_subnet = m4b_config['network']['subnet']
-    base_subnet_match = re.match(r'(\d+)\.(\d+)\.(\d+)\.(\d+)', base_subnet)
-    base_subnet = int(base_subnet_match[1]).to_bytes(1, 'big') + int(base_subnet_match[2]).to_bytes(1, 'big') \
-        + int(base_subnet_match[3]).to_bytes(1, 'big') + \
-        int(base_subnet_match[4]).to_bytes(1, 'big')
-    base_subnet = int.from_bytes(base_subnet, byteorder='big')
-    base_netmask = int(m4b_config['network']['netmask'])
-    base_subnet = ((pow(2, base_netmask) - 1) <<
-                   (32 - base_netmask)) & base_subnet
-
-    if os.listdir(instances_dir):
-        if ask_question_yn(f"Existing proxy instances found in '{instances_dir}'. Do you want to delete them?", default=True):
-            stop_all_stacks(instances_dir, skip_questions=True)
-            shutil.rmtree(instances_dir)
-            os.makedirs(instances_dir, exist_ok=True)
-        else:
-            print(
-                f"{Fore.YELLOW}Keeping existing instances alongside new ones.{Style.RESET_ALL}")
-
+    existing_instances = scan_proxy_instances(instances_dir)
+    if existing_instances:
+        if reconcile is None:
+            reconcile = ask_question_yn(
+                f"Existing proxy instances found in '{instances_dir}'. Do you want to reconcile them with the proxy list (unchanged proxies keep their instance, only new proxies get new instances)?", default=True)
+        if not reconcile:
+            if ask_question_yn("Do you want to delete the existing proxy instances?", default=True):
+                stop_all_stacks(instances_dir=instances_dir,
+                                skip_questions=True, include_main=False)
+                shutil.rmtree(instances_dir)
+                os.makedirs(instances_dir, exist_ok=True)
+                existing_instances = []
+            else:
+                print(
+                    f"{Fore.YELLOW}Keeping existing instances alongside new ones.{Style.RESET_ALL}")
+    for instance in existing_instances:
+        used_device_names.add(instance['device_name'])
+        used_project_names.add(instance['project_name'])
+
+    # Each instance only carries what differs from the base configs, the generator renders all of them in one batch
+    base_dir = os.path.join(instances_dir, INSTANCE_BASE_DIR)
+    os.makedirs(base_dir, exist_ok=True)
+    for key, config in (('m4b_config', m4b_config), ('app_config', app_config), ('user_config', user_config)):
+        write_json(config, os.path.join(base_dir, INSTANCE_CONFIG_FILES[key]))
+
+    # Reads the socket tables and the existing .env files once, then hands out ports without probing
+    port_allocator = PortAllocator(os.path.join(instances_dir, PORT_RESERVATIONS_FILE),
+                                   instances_dir=instances_dir, env_files=['./.env'])
+
+    # Instance subnets have the size of the main one and come from a pool, by default the /16 around it
+    instance_pool, prefixlen = instance_subnet_pool(m4b_config['network'])
+    subnet_allocator = SubnetAllocator(instance_pool, prefixlen,
+                                       os.path.join(
+                                           instances_dir, SUBNET_ASSIGNMENTS_FILE),
+                                       instances_dir=instances_dir, env_files=['./.env'])
+
+    # Each proxy keeps the instance already serving it, instances left without a proxy are removed
+    kept_instances: Dict[int, Dict[str, Any]] = {}
+    if reconcile and existing_instances:
+        by_identity: Dict[str, Dict[str, Any]] = {}
+        for instance in existing_instances:
+            by_identity.setdefault(instance['identity'], instance)
+        for i, proxy in enumerate(proxies):
+            instance = by_identity.pop(proxy_identity(proxy), None)
+            if instance is not None:
+                kept_instances[i] = instance
+        kept_projects = {instance['project_name']
+                         for instance in kept_instances.values()}
+        for instance in existing_instances:
+            if instance['project_name'] not in kept_projects:
+                remove_proxy_instance(
+                    instance, port_allocator, subnet_allocator)
+        print(f"{Fore.BLUE}Reconciling: {len(kept_instances)} instances kept, {len(existing_instances) - len(kept_instances)} removed, {len(proxies) - len(kept_instances)} to create.{Style.RESET_ALL}")
+
+    # Only proxies that would get a new instance are checked, a proxy failing for a moment must not remove a working instance
+    if validate is None:
+        validate = m4b_config.get('proxy_validation', {}).get('enabled', False)
+    new_proxies = [proxy for i, proxy in enumerate(proxies) if i not in kept_instances]
+    if validate and new_proxies:
+        passed = {proxy_identity(proxy): proxy for proxy in check_instance_proxies(
+            new_proxies, m4b_config, os.path.join(instances_dir, PROXY_REPORT_FILE))}
+        selected = [(proxy, kept_instances[i]) if i in kept_instances else (passed[proxy_identity(proxy)], None)
+                    for i, proxy in enumerate(proxies) if i in kept_instances or proxy_identity(proxy) in passed]
+        proxies = [proxy for proxy, _ in selected]
+        kept_instances = {i: instance for i, (_, instance) in enumerate(selected) if instance is not None}
+
+    instances = []
     for i, proxy in enumerate(proxies):
-        logging.info(
-            f"Creating instance {i+1}/{len(proxies)} with proxy: {proxy}")
-        instance_user_config = deepcopy(user_config)
-        instance_m4b_config = deepcopy(m4b_config)
-        instance_app_config = deepcopy(app_config)
-
-        # Generate a unique suffix for device and project names
-        while True:
-            suffix = generate_uuid(4)
-            instance_device_name = f"{base_device_name}_{suffix}"
-            instance_project_name = f"{base_project_name}_{suffix}"
-
-            # Ensure the device name and project name are unique
-            if instance_device_name not in used_device_names and instance_project_name not in used_project_names:
-                used_device_names.add(instance_device_name)
-                used_project_names.add(instance_project_name)
-                break
-
-        print(f"{Fore.GREEN}Created proxy instance {i+1} with device name: {instance_device_name}{Style.RESET_ALL}")
-        logging.info(
-            f"Created proxy instance with unique device name: {instance_device_name}")
-
-        instance_dir = os.path.join(instances_dir, instance_project_name)
-        os.makedirs(instance_dir, exist_ok=True)
+        kept_instance = kept_instances.get(i)
+        if kept_instance:
+            instance_device_name = kept_instance['device_name']
+            instance_project_name = kept_instance['project_name']
+            instance_dir = kept_instance['instance_dir']
+            logging.info(
+                f"Keeping instance {instance_project_name} for proxy {i+1}/{len(proxies)}")
+            # Rebuild the reservations from the ports the instance already uses, its containers may hold them
+            port_allocator.release(instance_project_name)
+            if instance_project_name not in subnet_allocator.assignments and kept_instance['subnet']:
+                try:
+                    subnet_allocator.assign(
+                        instance_project_name, kept_instance['subnet'])
+                except ValueError as e:
+                    logging.warning(
+                        f"Instance {instance_project_name} gets a new subnet: {str(e)}")
+        else:
+            logging.info(
+                f"Creating instance {i+1}/{len(proxies)} with proxy: {proxy}")
+
+            # Generate a unique suffix for device and project names
+            while True:
+                suffix = generate_uuid(4)
+                instance_device_name = f"{base_device_name}_{suffix}"
+                instance_project_name = f"{base_project_name}_{suffix}"
+
+                # Ensure the device name and project name are unique
+                if instance_device_name not in used_device_names and instance_project_name not in used_project_names:
+                    used_device_names.add(instance_device_name)
+                    used_project_names.add(instance_project_name)
+                    break
 
-        instance_user_config['device_info']['device_name'] = instance_device_name
-        instance_m4b_config['project']['compose_project_name'] = instance_project_name
+            print(f"{Fore.GREEN}Created proxy instance {i+1} with device name: {instance_device_name}{Style.RESET_ALL}")
+            logging.info(
+                f"Created proxy instance with unique device name: {instance_device_name}")
 
-        instance_user_config['proxies']['url'] = proxy
-        instance_user_config['proxies']['enabled'] = True
+            instance_dir = os.path.join(instances_dir, instance_project_name)
+            os.makedirs(instance_dir, exist_ok=True)
 
-        new_subnet = base_subnet + ((i + 1) << (32 - base_netmask))
-        new_subnet = new_subnet.to_bytes(4, 'big', signed=False)
-        new_subnet = str(new_subnet[0]) + '.' + str(new_subnet[1]) \
-            + '.' + str(new_subnet[2]) + '.' + str(new_subnet[3])
+        new_subnet = str(subnet_allocator.allocate(
+            instance_project_name).network_address)
 
-        instance_m4b_config['network']['subnet'] = new_subnet
+        user_overrides = {
+            'device_info': {'device_name': instance_device_name},
+            'proxies': {'url': proxy, 'enabled': True},
+            # Kept instances carry over their own app flags, so reconciling does not undo fix_conflicts
+            'apps': {app_name: dict(flags) for app_name, flags in kept_instance['app_flags'].items()} if kept_instance else {},
+        }
+        m4b_overrides = {
+            'project': {'compose_project_name': instance_project_name},
+            'network': {'subnet': new_subnet},
+        }
 
         # Update all enabled apps with unique ports to avoid conflicts
         for app_category in ['apps', 'extra-apps']:
-            for app_details in instance_app_config.get(app_category, []):
+            for app_details in app_config.get(app_category, []):
                 app_name = app_details['name'].lower()
-                app_config_entry = instance_user_config['apps'].get(
-                    app_name, {})
+                app_config_entry = user_config['apps'].get(app_name, {})
 
                 # Only process enabled apps
                 if app_details.get('enabled', False) or (app_config_entry and app_config_entry.get('enabled', False)):
@@ -480,9 +673,7 @@ def setup_multiproxy_instances(user_config: Dict[str, Any], app_config: Dict[str
 
                     # If app isn't in user_config yet, initialize it
                     if not app_config_entry:
-                        instance_user_config['apps'][app_name] = {
-                            'enabled': True}
-                        app_config_entry = instance_user_config['apps'][app_name]
+                        user_overrides['apps'].setdefault(app_name, {})['enabled'] = True
 
                     # Check if this app has ports defined in compose_config
                     has_ports = False
@@ -498,67 +689,95 @@ def setup_multiproxy_instances(user_config: Dict[str, Any], app_config: Dict[str
                         # Get base port from user config or use default (50000 + app index * 100)
                         base_port = app_config_entry.get(
                             'ports', 50000 + app_category.index(app_category) * 100)
-                        if isinstance(base_port, list):
+                        previous_ports = kept_instance['ports'].get(
+                            app_name) if kept_instance else None
+                        if isinstance(base_port, list) and isinstance(previous_ports, list) and len(previous_ports) == len(base_port) \
+                                and port_allocator.claim(previous_ports, instance_project_name):
+                            user_overrides['apps'].setdefault(
+                                app_name, {})['ports'] = previous_ports
+                        elif isinstance(base_port, int) and isinstance(previous_ports, int) \
+                                and port_allocator.claim([previous_ports], instance_project_name):
+                            user_overrides['apps'].setdefault(
+                                app_name, {})['ports'] = previous_ports
+                        elif isinstance(base_port, list):
                             # Handle list of ports
-                            app_config_entry['ports'] = [
-                                find_next_available_port(port + (i + 1) * 10)
+                            unique_ports = [
+                                port_allocator.allocate(
+                                    port + (i + 1) * 10, instance_project_name)
                                 for port in base_port
                             ]
+                            user_overrides['apps'].setdefault(
+                                app_name, {})['ports'] = unique_ports
                             logging.info(
-                                f"Updated ports for {app_name} in instance {instance_project_name} to {app_config_entry['ports']}")
+                                f"Updated ports for {app_name} in instance {instance_project_name} to {unique_ports}")
                         else:
                             # Handle single port
-                            unique_port = find_next_available_port(
-                                base_port + (i + 1) * 10)
-                            app_config_entry['ports'] = unique_port
+                            unique_port = port_allocator.allocate(
+                                base_port + (i + 1) * 10, instance_project_name)
+                            user_overrides['apps'].setdefault(
+                                app_name, {})['ports'] = unique_port
                             logging.info(
                                 f"Updated port for {app_name} in instance {instance_project_name} to {unique_port}")
 
         # Properly disable dashboard for multiproxy instances to avoid port conflicts
-        if 'm4b_dashboard' in instance_user_config:
-            instance_user_config['m4b_dashboard']['enabled'] = False
+        if 'm4b_dashboard' in user_config:
             # Remove dashboard port to ensure it's not included anywhere in multiproxy instances
-            if 'ports' in instance_user_config['m4b_dashboard']:
-                del instance_user_config['m4b_dashboard']['ports']
+            user_overrides['m4b_dashboard'] = {'enabled': False, 'ports': None}
 
             # Also completely remove dashboard port from proxy_service configuration ports
-            if ('compose_config_common' in instance_user_config and
-                'proxy_service' in instance_user_config['compose_config_common'] and
-                    'ports' in instance_user_config['compose_config_common']['proxy_service']):
-
-                # Get ports configuration
-                ports = instance_user_config['compose_config_common']['proxy_service']['ports']
-
-                # Filter out any dashboard port references
-                if isinstance(ports, list):
-                    dashboard_port = "${M4B_DASHBOARD_PORT}:80"
-                    ports = [port for port in ports if port != dashboard_port]
-                    instance_user_config['compose_config_common']['proxy_service']['ports'] = ports
-                    logging.info(
-                        f"Filtered out dashboard port from proxy_service configuration for multiproxy instance {instance_project_name}")
+            ports = user_config.get('compose_config_common', {}).get(
+                'proxy_service', {}).get('ports')
+
+            # Filter out any dashboard port references
+            if isinstance(ports, list):
+                dashboard_port = "${M4B_DASHBOARD_PORT}:80"
+                user_overrides['compose_config_common'] = {'proxy_service': {
+                    'ports': [port for port in ports if port != dashboard_port]}}
+                logging.info(
+                    f"Filtered out dashboard port from proxy_service configuration for multiproxy instance {instance_project_name}")
 
             logging.info(
                 f"Completely disabled dashboard for multiproxy instance {instance_project_name} to avoid port conflicts")
 
-        instance_user_config_path = os.path.join(
-            instance_dir, 'user-config.json')
-        instance_m4b_config_path = os.path.join(
-            instance_dir, 'm4b-config.json')
-        instance_app_config_path = os.path.join(
-            instance_dir, 'app-config.json')
-
-        write_json(instance_user_config, instance_user_config_path)
-        write_json(instance_m4b_config, instance_m4b_config_path)
-        write_json(instance_app_config, instance_app_config_path)
-
-        assemble_docker_compose(instance_m4b_config_path, instance_app_config_path, instance_user_config_path,
-                                compose_output_path=os.path.join(instance_dir, 'docker-compose.yaml'))
-        generate_env_file(instance_m4b_config_path, instance_app_config_path,
-                          instance_user_config_path, env_output_path=os.path.join(instance_dir, '.env'))
-
-    print(f"{Fore.GREEN}Created {len(proxies)} proxy instances with unique device names.{Style.RESET_ALL}")
+        instance = {
+            'compose_output_path': os.path.join(instance_dir, 'docker-compose.yaml'),
+            'env_output_path': os.path.join(instance_dir, '.env'),
+            'overrides': {'user_config': user_overrides, 'm4b_config': m4b_overrides},
+        }
+        # Only the overrides are stored per instance, they are resolved against the base snapshot when read
+        write_json({'overrides': instance['overrides']}, os.path.join(
+            instance_dir, INSTANCE_OVERLAY_FILE))
+        instances.append(instance)
+    port_allocator.save()
+    subnet_allocator.save()
+
+    # Instances only differ in their .env, so they can all link to one compose file per enabled-app set
+    shared_compose_dir = os.path.join(instances_dir, SHARED_COMPOSE_DIR) if m4b_config['system'].get(
+        'shared_compose_files', False) else None
+    results = generate_instances_batch(
+        m4b_config, app_config, user_config, instances, shared_compose_dir=shared_compose_dir)
+    if shared_compose_dir:
+        prune_shared_composes(shared_compose_dir, instances_dir)
+    # Also drops the removed instances from the registry
+    record_generated(instances_dir, results)
+    changed_projects = [result['project_name']
+                        for result in results if result['changed']]
+
+    print(f"{Fore.GREEN}Created {len(proxies) - len(kept_instances)} proxy instances with unique device names.{Style.RESET_ALL}")
+    print(f"{Fore.GREEN}{len(changed_projects)} of {len(results)} instances have new or changed files.{Style.RESET_ALL}")
+
+    # Kept instances are running with their old files, restart only the ones that changed
+    kept_projects = {instance['project_name']
+                     for instance in kept_instances.values()}
+    restart_instances = [(instance, result) for instance, result in zip(instances, results)
+                         if result['changed'] and result['project_name'] in kept_projects]
+    if restart_instances and ask_question_yn(f"{len(restart_instances)} kept instances have a changed proxy or configuration. Do you want to restart them now?", default=True):
+        for instance, result in restart_instances:
+            start_stack(instance['compose_output_path'], instance['env_output_path'],
+                        result['project_name'], skip_questions=True)
     print(f"{Fore.GREEN}Multiproxy instances setup completed.{Style.RESET_ALL}")
-    time.sleep(sleep_time)
+    pause(sleep_time)
+    return changed_projects
 
 
 def main(app_config_path: str, m4b_config_path: str, user_config_path: str) -> None:
@@ -594,15 +813,24 @@ def main(app_config_path: str, m4b_config_path: str, user_config_path: str) -> N
         write_json(user_config, user_config_path)
         # Step 6: Set up proxy if the user chooses to
         proxy_setup = ask_question_yn('Do you want to enable (multi)proxy?')
+        proxies = []
         if proxy_setup:
             logging.info("Multiproxy setup selected")
             print('Create a proxies.txt file in the same folder and add proxies in the following format: protocol://user:pass@ip:port (one proxy per line)')
             input('Press enter to continue...')
-            with open('proxies.txt', 'r') as file:
-                proxies = [line.strip() for line in file if line.strip()]
-
-            # Use the user config first proxy to update the base money4band docker compose and env file adding proxy
-            user_config['proxies']['url'] = proxies.pop(-1)
+            proxy_stats = ProxyParseStats()
+            proxies = [proxy.url for proxy in iter_proxy_file('proxies.txt', stats=proxy_stats)]
+            logging.info(f"proxies.txt: {proxy_stats.summary()}")
+            print(f"Found {proxy_stats.summary()} in proxies.txt")
+            for line_number, error in proxy_stats.errors:
+                print(f"{Fore.YELLOW}Line {line_number}: {error}{Style.RESET_ALL}")
+            if not proxies:
+                print(f"{Fore.RED}No valid proxies found in proxies.txt, continuing without proxy.{Style.RESET_ALL}")
+                logging.warning("No valid proxies found, multiproxy setup skipped")
+
+        if proxies:
+            # Keep the main stack on its current proxy if it is still listed, so the instances are reconciled against the rest
+            user_config['proxies']['url'] = pick_main_proxy(proxies, user_config['proxies'].get('url', ''))
             user_config['proxies']['enabled'] = True
             write_json(user_config, user_config_path)
             assemble_docker_compose(m4b_config_path_or_dict=m4b_config, app_config_path_or_dict=app_config,
@@ -625,6 +853,7 @@ def main(app_config_path: str, m4b_config_path: str, user_config_path: str) -> N
             generate_env_file(m4b_config_path, app_config_path, user_config_path,
                               env_output_path='./.env', is_main_instance=True)
         logging.info("Setup completed")
+        http_client.log_host_stats()
 
     except FileNotFoundError as e:
         logging.error(f"File not found: {str(e)}")
@@ -652,6 +881,10 @@ if __name__ == '__main__':
                         help='Path to m4b_config JSON file')
     parser.add_argument('--user-config-path', type=str,
                         default='./config/user-config.json', help='Path to user_config JSON file')
+    parser.add_argument('--refresh-registry-cache', action='store_true',
+                        help='Ignore cached Docker Hub tag data and refetch it')
+    parser.add_argument('--offline', action='store_true',
+                        help='Resolve app images from local images and cached registry data only')
     parser.add_argument('--log-dir', default=os.path.join(script_dir,
                         'logs'), help='Set the logging directory')
     parser.add_argument(
@@ -676,6 +909,9 @@ if __name__ == '__main__':
 
     logging.info(f"Starting {script_name} script...")
 
+    configure_registry_cache(refresh=args.refresh_registry_cache)
+    configure_image_resolver(offline=args.offline)
+
     try:
         # Call the main function
         main(app_config_path=args.app_config, m4b_config_path=args.m4b_config,
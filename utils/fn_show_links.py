@@ -58,7 +58,7 @@ def main(app_config_path: str, m4b_config_path: str, user_config_path: str) -> N
     m4b_config_path -- the path to the m4b configuration file
     user_config_path -- the path to the user configuration file
     """
-    app_config = load_json_config(app_config_path)
+    app_config = load_json_config(app_config_path, readonly=True)
     fn_show_links(app_config)
 
 
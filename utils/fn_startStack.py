@@ -1,6 +1,14 @@
 from utils.helper import is_user_root, is_user_in_docker_group, create_docker_group_if_needed, run_docker_command, show_spinner
 from utils.prompt_helper import ask_question_yn
-from utils.generator import generate_dashboard_urls
+from utils.generator import generate_dashboard_urls, regenerate_instances
+from utils.stack_runner import StackJob, StackResult, run_stack_jobs, print_progress, format_results_table, STACK_LOG_DIR, DEFAULT_WORKERS, DEFAULT_COMMAND_TIMEOUT
+from utils.teardown import connect_docker, stop_running_containers, DEFAULT_TEARDOWN_WORKERS, DEFAULT_STOP_GRACE
+from utils.readiness import wait_for_projects, DEFAULT_READY_TIMEOUT
+from utils.engine_driver import EngineStackDriver, plan_stack_files, run_engine_jobs
+from utils.image_prepull import prepull_stacks, DEFAULT_PULL_WORKERS, DEFAULT_PULL_TTL
+from utils.pacing import pause
+from utils.registry import open_registry
+from utils.validate_instances import validate_fleet
 from utils.cls import cls
 from utils import loader
 import json
@@ -9,10 +17,9 @@ import argparse
 import logging
 import platform
 import subprocess
-import time
 import threading
 from colorama import Fore, Style, just_fix_windows_console
-import re
+from typing import List, Optional, Tuple
 
 # Ensure the parent directory is in the sys.path
 import sys
@@ -25,7 +32,7 @@ if parent_dir not in sys.path:
 # Global config loading and global variables
 m4b_config_path = os.path.join(parent_dir, "config", "m4b-config.json")
 try:
-    m4b_config = loader.load_json_config(m4b_config_path)
+    m4b_config = loader.load_json_config(m4b_config_path, readonly=True)
 except FileNotFoundError:
     m4b_config = {}  # Fallback to empty config if not found
     logging.warning("Configuration file not found. Using default values.")
@@ -33,59 +40,97 @@ except FileNotFoundError:
 # Set global sleep time
 sleep_time = m4b_config.get("system", {}).get(
     "sleep_time", 3)  # Default to 3 seconds if not specified
+teardown_workers = m4b_config.get("system", {}).get(
+    "teardown_workers", DEFAULT_TEARDOWN_WORKERS)
+stop_grace_period = m4b_config.get("system", {}).get(
+    "stop_grace_period", DEFAULT_STOP_GRACE)
+ready_timeout = m4b_config.get("system", {}).get(
+    "ready_timeout", DEFAULT_READY_TIMEOUT)
+pull_workers = m4b_config.get("system", {}).get(
+    "pull_workers", DEFAULT_PULL_WORKERS)
+image_pull_ttl = m4b_config.get("system", {}).get(
+    "image_pull_ttl", DEFAULT_PULL_TTL)
+# "compose" runs the docker compose CLI, "engine" talks to the Docker engine API directly
+stack_driver = m4b_config.get("system", {}).get("stack_driver", "compose")
+
+
+def build_compose_up_command(compose_file: str, env_file: str, project_name: Optional[str] = None) -> List[str]:
+    """
+    Build the docker compose command that starts a stack.
 
+    Args:
+        compose_file (str): The path to the Docker Compose file.
+        env_file (str): The path to the environment file.
+        project_name (Optional[str]): The project name when already known, e.g. from the instance registry.
 
-def get_compose_project_name(env_file: str) -> str:
+    Returns:
+        List[str]: The command, with the project name from the env file when it has one.
     """
-    Extract the COMPOSE_PROJECT_NAME from an environment file.
+    # Read COMPOSE_PROJECT_NAME from the .env file
+    if not project_name and os.path.isfile(env_file):
+        project_name = loader.read_env_file(env_file).get('COMPOSE_PROJECT_NAME')
+
+    # Build the docker compose command, adding -p flag if project_name was found
+    command = ["docker", "compose"]
+    if project_name:
+        command.extend(["-p", project_name])
+    else:
+        logging.warning(
+            f"COMPOSE_PROJECT_NAME not found in {env_file}, relying on Docker Compose defaults")
+    command.extend(["-f", compose_file, "--env-file",
+                   env_file, "up", "-d", "--remove-orphans"])
+    return command
+
+
+def get_engine_driver(workers: int = 1) -> Optional[EngineStackDriver]:
+    """
+    Get the engine API stack driver if it is the configured stack driver.
 
     Args:
-        env_file (str): Path to the .env file
+        workers (int): The number of threads that will share the driver.
 
     Returns:
-        str: The COMPOSE_PROJECT_NAME value, or None if not found
+        Optional[EngineStackDriver]: The driver, None to use docker compose, also when the engine API is not reachable.
     """
-    project_name = None
-    try:
-        if os.path.isfile(env_file):
-            with open(env_file, 'r') as f:
-                for line in f:
-                    if line.startswith('COMPOSE_PROJECT_NAME='):
-                        project_name = line.strip().split('=', 1)[1]
-                        logging.info(
-                            f"Found COMPOSE_PROJECT_NAME in {env_file}: {project_name}")
-                        break
-    except Exception as e:
-        logging.error(
-            f"Error reading COMPOSE_PROJECT_NAME from {env_file}: {str(e)}")
-
-    return project_name
+    if stack_driver != 'engine':
+        return None
+    client = connect_docker(workers)
+    if client is None:
+        logging.warning(
+            "Docker engine API not reachable, starting stacks with docker compose")
+        return None
+    return EngineStackDriver(client, stop_grace_period)
 
 
-def get_device_name_from_env(env_file: str) -> str:
+def wait_for_stacks(projects: List[str]) -> bool:
     """
-    Extract the DEVICE_NAME from an environment file.
+    Wait until the containers of the started stacks are running and healthy, instead of sleeping a fixed time.
 
     Args:
-        env_file (str): Path to the .env file
+        projects (List[str]): The compose project names of the started stacks.
 
     Returns:
-        str: The DEVICE_NAME value, or None if not found
+        bool: True if every stack is ready, or readiness cannot be checked because the engine API is not reachable.
     """
-    device_name = None
+    if not projects or ready_timeout <= 0:
+        return True
+    client = connect_docker(1)
+    if client is None:
+        logging.warning("Skipping readiness check, the Docker engine API is not reachable")
+        return True
+    print(f"{Fore.YELLOW}Waiting up to {ready_timeout}s for {len(projects)} stacks to be ready...{Style.RESET_ALL}")
     try:
-        if os.path.isfile(env_file):
-            with open(env_file, 'r') as f:
-                for line in f:
-                    if line.startswith('DEVICE_NAME='):
-                        device_name = line.strip().split('=', 1)[1]
-                        logging.info(
-                            f"Found DEVICE_NAME in {env_file}: {device_name}")
-                        break
+        results = wait_for_projects(client, projects, ready_timeout)
     except Exception as e:
-        logging.error(f"Error reading DEVICE_NAME from {env_file}: {str(e)}")
-
-    return device_name
+        logging.error(f"Readiness check failed: {str(e)}")
+        print(f"{Fore.RED}Could not check whether the stacks are ready: {str(e)}{Style.RESET_ALL}")
+        return False
+    not_ready = [result for result in results if not result.ready]
+    for result in not_ready:
+        print(f"{Fore.RED}{result.project} is not ready after {result.waited:.0f}s: {', '.join(result.pending)}{Style.RESET_ALL}")
+    if not not_ready:
+        print(f"{Fore.GREEN}All {len(results)} stacks are ready after {max(result.waited for result in results):.1f}s.{Style.RESET_ALL}")
+    return not not_ready
 
 
 def start_stack(compose_file: str = './docker-compose.yaml', env_file: str = './.env', instance_name: str = 'money4band', skip_questions: bool = False) -> bool:
@@ -108,7 +153,7 @@ def start_stack(compose_file: str = './docker-compose.yaml', env_file: str = './
     if not skip_questions and not ask_question_yn(f"This will launch all the apps for '{instance_name}' instance using the configured .env file and the docker-compose.yaml file (Docker must be already installed and running). Do you wish to proceed?"):
         print(
             f"{Fore.BLUE}Docker stack startup for '{instance_name}' instance canceled.{Style.RESET_ALL}")
-        time.sleep(sleep_time)
+        pause(sleep_time)
         return False
 
     event = threading.Event()
@@ -118,43 +163,44 @@ def start_stack(compose_file: str = './docker-compose.yaml', env_file: str = './
 
     use_sudo = not is_user_root() and platform.system().lower() == 'linux'
     try:
-        # Read COMPOSE_PROJECT_NAME from the .env file
-        project_name = get_compose_project_name(env_file)
-        device_name = get_device_name_from_env(env_file)
+        env = loader.read_env_file(env_file) if os.path.isfile(env_file) else {}
+        device_name = env.get('DEVICE_NAME')
 
         if device_name:
             logging.info(
                 f"Using device name '{device_name}' for instance '{instance_name}'")
 
-        # Build the docker compose command, adding -p flag if project_name was found
-        command = ["docker", "compose"]
-
-        if project_name:
-            command.extend(["-p", project_name])
-            logging.info(
-                f"Using project name '{project_name}' for instance '{instance_name}'")
+        driver = get_engine_driver()
+        if driver:
+            try:
+                actions = driver.up(plan_stack_files(compose_file, env_file))
+                logging.info(
+                    f"Stack for '{instance_name}' started through the engine API: {actions}")
+                result = 0
+            except Exception as e:
+                logging.error(
+                    f"Engine API start of '{instance_name}' failed: {str(e)}")
+                result = 1
         else:
-            logging.warning(
-                f"COMPOSE_PROJECT_NAME not found in {env_file}, relying on Docker Compose defaults")
-
-        command.extend(["-f", compose_file, "--env-file",
-                       env_file, "up", "-d", "--remove-orphans"])
-
-        result = run_docker_command(command, use_sudo=use_sudo)
+            command = build_compose_up_command(compose_file, env_file, env.get('COMPOSE_PROJECT_NAME'))
+            result = run_docker_command(command, use_sudo=use_sudo)
         if result == 0:
             print(
                 f"{Fore.GREEN}All Apps for '{instance_name}' instance started.{Style.RESET_ALL}")
             logging.info(f"Stack for '{instance_name}' started successfully.")
+            event.set()
+            wait_for_stacks(
+                [env.get('COMPOSE_PROJECT_NAME') or instance_name])
         else:
             print(f"{Fore.RED}Error starting Docker stack for '{instance_name}' instance. Please check that Docker is running and that the configuration is complete, then try again.{Style.RESET_ALL}")
             logging.error(
                 f"Stack for '{instance_name}' failed to start with exit code {result}.")
-            time.sleep(sleep_time)
+            pause(sleep_time)
         return result == 0
     except Exception as e:
         print(f"{Fore.RED}An unexpected error occurred while starting the stack for '{instance_name}' instance.{Style.RESET_ALL}")
         logging.error(f"Unexpected error: {str(e)}")
-        time.sleep(sleep_time)
+        pause(sleep_time)
     finally:
         event.set()
         spinner_thread.join()
@@ -175,7 +221,7 @@ def start_all_stacks(main_compose_file: str = './docker-compose.yaml', main_env_
     """
     if not skip_questions and not ask_question_yn(f"This will launch all the apps for '{main_instance_name}' and any multi-proxy instances using the configured .env files and docker-compose.yaml files. Docker must be already installed and running. Do you wish to proceed?"):
         print(f"{Fore.BLUE}Docker stack startup canceled.{Style.RESET_ALL}")
-        time.sleep(sleep_time)
+        pause(sleep_time)
         return
 
     if platform.system().lower() == 'linux' and not is_user_in_docker_group():
@@ -188,8 +234,17 @@ def start_all_stacks(main_compose_file: str = './docker-compose.yaml', main_env_
             return
 
         print(f"{Fore.YELLOW}Stopping all Docker containers...{Style.RESET_ALL}")
-        subprocess.run(["docker", "stop", "$(docker ps -q)"], shell=True)
-        print(f"{Fore.GREEN}All containers stopped.{Style.RESET_ALL}")
+        client = connect_docker(teardown_workers)
+        if client is not None:
+            stopped = stop_running_containers(
+                client, teardown_workers, stop_grace_period)
+        else:
+            container_ids = subprocess.run(
+                ["docker", "ps", "-q"], capture_output=True, text=True).stdout.split()
+            if container_ids:
+                subprocess.run(["docker", "stop", "-t", str(stop_grace_period), *container_ids])
+            stopped = len(container_ids)
+        print(f"{Fore.GREEN}{stopped} containers stopped.{Style.RESET_ALL}")
 
     # Check for any running containers that might conflict
     result = subprocess.run(
@@ -207,159 +262,98 @@ def start_all_stacks(main_compose_file: str = './docker-compose.yaml', main_env_
             return
 
     try:
-        # First verify each instance has unique container names
-        container_names = {}
-        device_names = set()
-
-        # Check main instance container names
-        main_device_name = None
-        with open(main_env_file, 'r') as f:
-            for line in f:
-                if line.startswith('DEVICE_NAME='):
-                    main_device_name = line.strip().split('=', 1)[1]
-                    device_names.add(main_device_name)
-                    break
-
-        if main_device_name:
-            print(
-                f"{Fore.CYAN}Main instance device name: {main_device_name}{Style.RESET_ALL}")
-            main_containers = get_container_names_from_env(main_env_file)
-            for container in main_containers:
-                container_names[container] = "main instance"
-
-        # Check proxy instances container names and device names
-        has_conflicts = False
+        # Resolve overlay-based instances against the current base snapshot, only changed files are rewritten
         if os.path.isdir(instances_dir):
-            for instance in os.listdir(instances_dir):
-                instance_dir = os.path.join(instances_dir, instance)
-                env_file = os.path.join(instance_dir, '.env')
-                if os.path.isfile(env_file):
-                    # Get device name from this instance
-                    instance_device_name = None
-                    with open(env_file, 'r') as f:
-                        for line in f:
-                            if line.startswith('DEVICE_NAME='):
-                                instance_device_name = line.strip().split('=', 1)[
-                                    1]
-                                break
-
-                    if instance_device_name:
-                        if instance_device_name in device_names:
-                            print(
-                                f"{Fore.RED}Duplicate device name detected: '{instance_device_name}' is already used by another instance!{Style.RESET_ALL}")
-                            print(
-                                f"{Fore.RED}This will cause container name conflicts. Please run the validator to fix this issue.{Style.RESET_ALL}")
-                            has_conflicts = True
-                        else:
-                            device_names.add(instance_device_name)
-                            print(
-                                f"{Fore.GREEN}Instance {instance} device name: {instance_device_name}{Style.RESET_ALL}")
-
-                    instance_containers = get_container_names_from_env(
-                        env_file)
-                    for container in instance_containers:
-                        if container in container_names:
-                            print(
-                                f"{Fore.RED}Container name conflict detected: '{container}' is used in both {container_names[container]} and {instance}{Style.RESET_ALL}")
-                            print(
-                                f"{Fore.RED}This conflict occurs because your docker-compose.yaml files explicitly name containers using DEVICE_NAME{Style.RESET_ALL}")
-                            print(
-                                f"{Fore.RED}For example: container_name: ${{DEVICE_NAME}}_earnapp{Style.RESET_ALL}")
-                            logging.error(
-                                f"Container name conflict: '{container}' in {container_names[container]} and {instance}")
-                            has_conflicts = True
-                        container_names[container] = instance
-
-        if has_conflicts:
+            regenerated = regenerate_instances(instances_dir)
+            changed = [result['project_name']
+                       for result in regenerated if result['changed']]
+            if changed:
+                logging.info(
+                    f"Regenerated files of {len(changed)} instances from their overlays: {', '.join(changed)}")
+
+        # One pass over the compose files of the fleet and one listing of the existing containers
+        fleet, conflicts = validate_fleet(instances_dir, main_compose_file, main_env_file, main_instance_name)
+        main_stack = fleet.pop(0) if fleet and fleet[0].name == main_instance_name else None
+        if main_stack and main_stack.device_name:
+            print(
+                f"{Fore.CYAN}Main instance device name: {main_stack.device_name}{Style.RESET_ALL}")
+
+        blocking = [conflict for conflict in conflicts if conflict.blocking]
+        for conflict in conflicts:
+            if not conflict.blocking:
+                print(f"{Fore.YELLOW}Warning: {conflict.describe()}{Style.RESET_ALL}")
+                logging.warning(f"Conflict: {conflict.describe()}")
+        if len(blocking) < len(conflicts):
             print(
-                f"{Fore.RED}Container name conflicts detected! These must be fixed before starting.{Style.RESET_ALL}")
+                f"{Fore.YELLOW}Instances sharing app ids show up as one node, give them their own with: python utils/validate_instances.py --fix{Style.RESET_ALL}")
+        if blocking:
+            for conflict in blocking:
+                print(f"{Fore.RED}{conflict.describe()}{Style.RESET_ALL}")
+                logging.error(f"Conflict: {conflict.describe()}")
+            print(
+                f"{Fore.RED}{len(blocking)} conflicts detected! These must be fixed before starting.{Style.RESET_ALL}")
             print(
                 f"{Fore.YELLOW}Please run the validator tool: python utils/validate_instances.py --fix{Style.RESET_ALL}")
             if not skip_questions and not ask_question_yn("Continue anyway? (Conflicts will cause failures)"):
                 return
-            print(f"{Fore.YELLOW}Continuing despite container name conflicts. This may lead to unpredictable behavior.{Style.RESET_ALL}")
-
-        # Start main stack
-        all_started = start_stack(
-            main_compose_file, main_env_file, main_instance_name, skip_questions=True)
-
-        # Wait a moment for main stack to initialize
-        time.sleep(3)
+            print(f"{Fore.YELLOW}Continuing despite the conflicts. This may lead to unpredictable behavior.{Style.RESET_ALL}")
+
+        workers = m4b_config.get('system', {}).get(
+            'start_workers', DEFAULT_WORKERS)
+        command_timeout = m4b_config.get('system', {}).get(
+            'compose_timeout', DEFAULT_COMMAND_TIMEOUT)
+        sudo = ['sudo'] if not is_user_root() and platform.system().lower() == 'linux' else []
+        driver = get_engine_driver(workers)
+
+        def run(jobs: List[StackJob], stacks: List[Tuple[str, str, str]], job_workers: int) -> List[StackResult]:
+            if driver:
+                return run_engine_jobs(driver, stacks, job_workers, print_progress)
+            return run_stack_jobs(jobs, job_workers, command_timeout, print_progress)
+
+        jobs, stacks, instance_projects = [], [], []
+        for stack in fleet:
+            # The registry already accepts both docker-compose.yaml and docker-compose.yml, only stacks without one are left out
+            if not stack.compose_file:
+                logging.warning(
+                    f"Skipping instance '{stack.name}': no docker-compose.yaml or docker-compose.yml next to {stack.env_file}")
+                print(f"{Fore.YELLOW}Skipping instance '{stack.name}', it has no compose file.{Style.RESET_ALL}")
+                continue
+            jobs.append(StackJob(stack.name, sudo + build_compose_up_command(stack.compose_file, stack.env_file, stack.project),
+                                 os.path.join(STACK_LOG_DIR, f"{stack.name}.log")))
+            stacks.append((stack.name, stack.compose_file, stack.env_file))
+            instance_projects.append(stack.project)
+
+        # Every unique image is pulled once up front, so the stacks do not race to pull the same ones.
+        # When the engine API is unreachable compose pulls the missing images itself.
+        prepull_stacks([(main_compose_file, main_env_file)] + [(compose_file, env_file) for _, compose_file, env_file in stacks],
+                       client=driver.client if driver else None, workers=pull_workers, ttl=image_pull_ttl)
+
+        # `up -d` only returns once the containers are started, no settling delay is needed afterwards.
+        main_project = main_stack.project if main_stack else None
+        projects = [main_project or main_instance_name]
+        results = run([StackJob(main_instance_name, sudo + build_compose_up_command(main_compose_file, main_env_file, main_project),
+                                os.path.join(STACK_LOG_DIR, f"{main_instance_name}.log"))],
+                      [(main_instance_name, main_compose_file, main_env_file)], 1)
+        all_started = results[0].ok
 
         # Start proxy instances
-        if all_started and os.path.isdir(instances_dir):
-            for instance in os.listdir(instances_dir):
-                instance_dir = os.path.join(instances_dir, instance)
-                compose_file = os.path.join(
-                    instance_dir, 'docker-compose.yaml')
-                env_file = os.path.join(instance_dir, '.env')
-                if os.path.isfile(compose_file) and os.path.isfile(env_file):
-                    try:
-                        print(
-                            f"{Fore.YELLOW}Starting instance: {instance}{Style.RESET_ALL}")
-                        instance_started = start_stack(
-                            compose_file, env_file, instance, skip_questions=True)
-                        all_started &= instance_started
-                        if not instance_started:
-                            logging.error(
-                                f"Failed to start instance '{instance}'")
-
-                        # Add small delay between instance starts to prevent race conditions
-                        time.sleep(2)
-                    except Exception as e:
-                        all_started = False
-                        logging.error(
-                            f"Error starting instance '{instance}': {str(e)}")
+        if all_started and jobs:
+            projects.extend(instance_projects)
+            print(f"{Fore.YELLOW}Starting {len(jobs)} instances, {min(workers, len(jobs))} at a time...{Style.RESET_ALL}")
+            results.extend(run(jobs, stacks, workers))
+            all_started = all(result.ok for result in results)
+
+        print(format_results_table(results))
+        logging.info(f"Stack start results:\n{format_results_table(results)}")
+        wait_for_stacks([project for project, result in zip(
+            projects, results) if result.ok])
 
         if all_started:
             generate_dashboard_urls(None, None, main_env_file)
             print(f"{Fore.YELLOW}Use the previously generated apps nodes URLs to add your device in any apps dashboard that require node claiming/registration (e.g., Earnapp, ProxyRack, etc.){Style.RESET_ALL}")
             logging.info("All stacks started.")
     finally:
-        time.sleep(sleep_time)
-
-
-def get_container_names_from_env(env_file):
-    """
-    Extract the potential container names from an env file by reading the DEVICE_NAME
-    and generating the standard container name patterns used in the compose files.
-
-    Args:
-        env_file (str): Path to the .env file
-
-    Returns:
-        list: List of predicted container names
-    """
-    container_names = []
-    try:
-        with open(env_file, 'r') as f:
-            env_content = f.read()
-
-        # Find the DEVICE_NAME value
-        match = re.search(r'DEVICE_NAME=([^\s#]+)', env_content)
-        if match:
-            device_name = match.group(1)
-            # Common app names used in container names
-            app_names = [
-                "earnapp", "iproyalpawns", "packetstream", "traffmonetizer",
-                "repocket", "earnfm", "proxyrack", "bitping", "packetshare",
-                "grass", "gradient", "dawn", "teneo", "mystnode", "peer2profit",
-                "watchtower", "m4bwebdashboard", "tun2socks"
-            ]
-
-            # Generate container names based on pattern
-            for app in app_names:
-                container_names.append(f"{device_name}_{app}")
-
-            logging.info(
-                f"Extracted potential container names for {env_file}: {len(container_names)} names")
-        else:
-            logging.warning(f"Could not find DEVICE_NAME in {env_file}")
-    except Exception as e:
-        logging.error(
-            f"Error extracting container names from {env_file}: {str(e)}")
-
-    return container_names
+        pause(sleep_time)
 
 
 def validate_env_files(main_env_file: str, instances_dir: str) -> bool:
@@ -373,28 +367,12 @@ def validate_env_files(main_env_file: str, instances_dir: str) -> bool:
     Returns:
         bool: True if all DEVICE_NAME values are unique, False otherwise
     """
-    device_names = {}
-
-    # Check main .env file
-    main_device_name = get_device_name_from_env(main_env_file)
-    if main_device_name:
-        device_names[main_device_name] = "main"
-
-    # Check instance .env files
-    if os.path.isdir(instances_dir):
-        for instance in os.listdir(instances_dir):
-            instance_dir = os.path.join(instances_dir, instance)
-            env_file = os.path.join(instance_dir, '.env')
-            if os.path.isfile(env_file):
-                device_name = get_device_name_from_env(env_file)
-                if device_name:
-                    if device_name in device_names:
-                        print(
-                            f"{Fore.RED}Duplicate DEVICE_NAME '{device_name}' found in {instance} and {device_names[device_name]}{Style.RESET_ALL}")
-                        return False
-                    device_names[device_name] = instance
-
-    return True
+    with open_registry(instances_dir, {"main": (main_env_file, None)}) as registry:
+        duplicates = registry.conflicts(('device_name',)).get('device_name', {})
+    for device_name, names in duplicates.items():
+        print(
+            f"{Fore.RED}Duplicate DEVICE_NAME '{device_name}' found in {', '.join(names)}{Style.RESET_ALL}")
+    return not duplicates
 
 
 def main(app_config_path: str, m4b_config_path: str, user_config_path: str) -> None:
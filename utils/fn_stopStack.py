@@ -1,7 +1,10 @@
 from utils.helper import is_user_root, is_user_in_docker_group, create_docker_group_if_needed, run_docker_command, show_spinner
 from utils.prompt_helper import ask_question_yn
 from utils.cls import cls
+from utils.pacing import pause
 from utils import loader
+from utils.teardown import connect_docker, teardown_projects, print_teardown_summary, DEFAULT_TEARDOWN_WORKERS, DEFAULT_STOP_GRACE
+from utils.registry import open_registry
 import json
 import os
 import argparse
@@ -9,6 +12,7 @@ import logging
 import platform
 import time
 import threading
+from typing import Set
 from colorama import Fore, Style, just_fix_windows_console
 
 # Ensure the parent directory is in the sys.path
@@ -23,7 +27,7 @@ if parent_dir not in sys.path:
 # Global config loading and global variables
 m4b_config_path = os.path.join(parent_dir, "config", "m4b-config.json")
 try:
-    m4b_config = loader.load_json_config(m4b_config_path)
+    m4b_config = loader.load_json_config(m4b_config_path, readonly=True)
 except FileNotFoundError:
     m4b_config = {}  # Fallback to empty config if not found
     logging.warning("Configuration file not found. Using default values.")
@@ -31,36 +35,10 @@ except FileNotFoundError:
 # Set global sleep time
 sleep_time = m4b_config.get("system", {}).get(
     "sleep_time", 3)  # Default to 3 seconds if not specified
-
-
-def get_compose_project_name(env_file: str) -> str:
-    """
-    Extract the COMPOSE_PROJECT_NAME from an environment file.
-
-    Args:
-        env_file (str): Path to the .env file
-
-    Returns:
-        str: The COMPOSE_PROJECT_NAME value, or None if not found
-    """
-    project_name = None
-    # Handle if compose file was passed
-    env_file = env_file.replace('docker-compose.yaml', '.env')
-
-    try:
-        if os.path.isfile(env_file):
-            with open(env_file, 'r') as f:
-                for line in f:
-                    if line.startswith('COMPOSE_PROJECT_NAME='):
-                        project_name = line.strip().split('=', 1)[1]
-                        logging.info(
-                            f"Found COMPOSE_PROJECT_NAME in {env_file}: {project_name}")
-                        break
-    except Exception as e:
-        logging.error(
-            f"Error reading COMPOSE_PROJECT_NAME from {env_file}: {str(e)}")
-
-    return project_name
+teardown_workers = m4b_config.get("system", {}).get(
+    "teardown_workers", DEFAULT_TEARDOWN_WORKERS)
+stop_grace_period = m4b_config.get("system", {}).get(
+    "stop_grace_period", DEFAULT_STOP_GRACE)
 
 
 def stop_stack(compose_file: str = './docker-compose.yaml', instance_name: str = 'money4band', skip_questions: bool = False) -> bool:
@@ -82,7 +60,7 @@ def stop_stack(compose_file: str = './docker-compose.yaml', instance_name: str =
     if not skip_questions and not ask_question_yn(f"This will stop all the apps for '{instance_name}' instance and delete the docker stack previously created using the configured docker-compose.yaml file. Do you wish to proceed?"):
         print(
             f"{Fore.BLUE}Docker stack removal for '{instance_name}' instance canceled.{Style.RESET_ALL}")
-        time.sleep(sleep_time)
+        pause(sleep_time)
         return False
 
     event = threading.Event()
@@ -99,7 +77,8 @@ def stop_stack(compose_file: str = './docker-compose.yaml', instance_name: str =
         env_file = os.path.join(compose_dir, '.env')
 
         # Read COMPOSE_PROJECT_NAME from the .env file
-        project_name = get_compose_project_name(env_file)
+        project_name = loader.read_env_file(env_file).get(
+            'COMPOSE_PROJECT_NAME') if os.path.isfile(env_file) else None
 
         # Build the docker compose command, adding -p flag if project_name was found
         command = ["docker", "compose"]
@@ -112,7 +91,11 @@ def stop_stack(compose_file: str = './docker-compose.yaml', instance_name: str =
             logging.warning(
                 f"COMPOSE_PROJECT_NAME not found in {env_file}, relying on Docker Compose defaults")
 
-        command.extend(["-f", compose_file, "down"])
+        command.extend(["-f", compose_file])
+        # Pass the instance .env explicitly, the compose file may be a link to a shared file elsewhere
+        if os.path.isfile(env_file):
+            command.extend(["--env-file", env_file])
+        command.append("down")
 
         result = run_docker_command(command, use_sudo=use_sudo)
         if result == 0:
@@ -133,26 +116,64 @@ def stop_stack(compose_file: str = './docker-compose.yaml', instance_name: str =
     return False
 
 
-def stop_all_stacks(main_compose_file: str = './docker-compose.yaml', main_instance_name: str = 'money4band', instances_dir: str = 'm4b_proxy_instances', skip_questions: bool = False) -> None:
+def fleet_project_names(instances_dir: str) -> Set[str]:
+    """
+    Collect the compose project names of the multi-proxy instances.
+
+    Args:
+        instances_dir (str): The directory containing the proxy instances.
+
+    Returns:
+        Set[str]: The project names, the instance directory name when its .env does not set one.
+    """
+    with open_registry(instances_dir) as registry:
+        return {record.project_name or record.name for record in registry.instances()}
+
+
+def stop_all_stacks(main_compose_file: str = './docker-compose.yaml', main_instance_name: str = 'money4band', instances_dir: str = 'm4b_proxy_instances', skip_questions: bool = False, include_main: bool = True) -> None:
     """
     Stop the main stack and all multi-proxy instances.
+    The containers and networks of every stack are removed concurrently through the Docker engine API,
+    `docker compose down` is run for each stack when the API is not reachable.
 
     Args:
         main_compose_file (str): The path to the main Docker Compose file.
         main_instance_name (str): The name of the main instance.
         instances_dir (str): The directory containing the proxy instances.
         skip_questions (bool): Whether to skip the confirmation question.
+        include_main (bool): Whether the main stack is stopped as well, or only the multi-proxy instances.
     """
-    if not skip_questions and not ask_question_yn(f"This will stop all the apps for '{main_instance_name}' and any multi-proxy instances and delete the docker stacks previously created. Do you wish to proceed?"):
+    target = f"'{main_instance_name}' and any multi-proxy instances" if include_main else "all multi-proxy instances"
+    if not skip_questions and not ask_question_yn(f"This will stop all the apps for {target} and delete the docker stacks previously created. Do you wish to proceed?"):
         print(f"{Fore.BLUE}Docker stack removal canceled.{Style.RESET_ALL}")
-        time.sleep(sleep_time)
+        pause(sleep_time)
         return
 
     if platform.system().lower() == 'linux' and not is_user_in_docker_group():
         create_docker_group_if_needed()
 
     try:
-        stop_stack(main_compose_file, main_instance_name, skip_questions=True)
+        client = connect_docker(teardown_workers)
+        if client is not None:
+            projects = fleet_project_names(instances_dir)
+            if include_main:
+                main_env_file = os.path.join(
+                    os.path.dirname(main_compose_file) or '.', '.env')
+                main_env = loader.read_env_file(
+                    main_env_file) if os.path.isfile(main_env_file) else {}
+                projects.add(main_env.get('COMPOSE_PROJECT_NAME') or main_instance_name)
+            print(f"{Fore.YELLOW}Stopping {len(projects)} stacks...{Style.RESET_ALL}")
+            start = time.perf_counter()
+            # Instances named after the main project are removed too, even if their directory is gone
+            results = teardown_projects(client, projects, instance_prefix=main_instance_name,
+                                        workers=teardown_workers, grace=stop_grace_period)
+            print_teardown_summary(results, time.perf_counter() - start)
+            return
+
+        logging.warning(
+            "Docker engine API not reachable, stopping stacks with docker compose")
+        if include_main:
+            stop_stack(main_compose_file, main_instance_name, skip_questions=True)
         if os.path.isdir(instances_dir):
             print(f"{Fore.YELLOW}Stopping multi-proxy instances...{Style.RESET_ALL}")
             for instance in os.listdir(instances_dir):
@@ -170,7 +191,7 @@ def stop_all_stacks(main_compose_file: str = './docker-compose.yaml', main_insta
             logging.warning(
                 f"Multi-proxy instances directory '{instances_dir}' does not exist.")
     finally:
-        time.sleep(sleep_time)
+        pause(sleep_time)
 
 
 def main(app_config_path: str, m4b_config_path: str, user_config_path: str) -> None:
@@ -1,8 +1,9 @@
 from utils.helper import show_spinner
 from utils.dumper import write_json
-from utils.loader import load_json_config
+from utils.loader import load_json_config, merge_config, load_instance_overlay, INSTANCE_BASE_DIR, INSTANCE_OVERLAY_FILE, INSTANCE_CONFIG_FILES
 from utils.detector import detect_architecture
-from utils.checker import check_img_arch_support, get_compatible_tag
+from utils.checker import resolve_image_platform, index_images
+from utils.registry import record_generated
 import os
 import subprocess
 import sys
@@ -10,11 +11,17 @@ import argparse
 import logging
 import json
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import yaml  # Import PyYAML
 import secrets
+import hashlib
+import shutil
 import getpass
 import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# libyaml's emitter is much faster than the pure Python one and is used whenever PyYAML was built with it
+COMPOSE_YAML_DUMPER = getattr(yaml, 'CDumper', yaml.Dumper)
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
@@ -51,243 +58,679 @@ def generate_uuid(length: int) -> str:
     return str(os.urandom(length // 2 + 1).hex())[:length]
 
 
-def assemble_docker_compose(m4b_config_path_or_dict: Any, app_config_path_or_dict: Any, user_config_path_or_dict: Any, compose_output_path: str = str(os.path.join(os.getcwd(), 'docker-compose.yaml')), is_main_instance: bool = False) -> None:
+def _app_image_keys(m4b_config: Dict[str, Any], app_config: Dict[str, Any], user_config: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+    default_docker_platform = m4b_config['system'].get(
+        'default_docker_platform', 'linux/amd64')
+    image_keys = []
+    for category in ['apps', 'extra-apps']:
+        for app in app_config.get(category, []):
+            user_app_config = user_config['apps'].get(app['name'].lower(), {})
+            if user_app_config.get('enabled'):
+                image_name, image_tag = app['compose_config']['image'].split(
+                    ':')
+                docker_platform = user_app_config.get(
+                    'docker_platform', default_docker_platform)
+                image_keys.append((image_name, image_tag, docker_platform))
+    return image_keys
+
+
+def _resolve_image_keys(image_keys: List[Tuple[str, str, str]], default_docker_platform: str) -> Dict[Tuple[str, str, str], Optional[Tuple[str, str]]]:
+    # Crawl the registry for every enabled app image at once so the checks below are index lookups
+    index_images({image_name: (image_tag, docker_platform.split('/')[1])
+                  for image_name, image_tag, docker_platform in image_keys})
+
+    return {image_key: resolve_image_platform(*image_key, default_docker_platform)
+            for image_key in dict.fromkeys(image_keys)}
+
+
+def resolve_app_images(m4b_config: Dict[str, Any], app_config: Dict[str, Any], user_config: Dict[str, Any]) -> Dict[Tuple[str, str, str], Optional[Tuple[str, str]]]:
     """
-    Assemble a Docker Compose file based on the app and user configuration.
+    Resolve the image tag and platform of every enabled app once.
+    The registry is crawled for all images in parallel first so each resolution is an index lookup.
 
     Args:
-        m4b_config_path_or_dict (Any): The path to the m4b configuration file or the config dictionary.
-        app_config_path_or_dict (Any): The path to the app configuration file or the config dictionary.
-        user_config_path_or_dict (Any): The path to the user configuration file or the config dictionary.
-        compose_output_path (str, optional): The path to save the assembled docker-compose.yaml file. Defaults to './docker-compose.yaml'.
-        is_main_instance (bool, optional): Whether this is the main instance. Defaults to False.
+        m4b_config (Dict[str, Any]): The m4b configuration dictionary.
+        app_config (Dict[str, Any]): The app configuration dictionary.
+        user_config (Dict[str, Any]): The user configuration dictionary.
 
-    Raises:
-        Exception: If an error occurs during the assembly process.
+    Returns:
+        Dict[Tuple[str, str, str], Optional[Tuple[str, str]]]: (image, tag, platform) mapped to the resolved (tag, platform), None if incompatible.
     """
-    event = threading.Event()
-    spinner_thread = threading.Thread(target=show_spinner, args=(
-        "Assembling Docker Compose file...", event))
-    spinner_thread.start()
+    default_docker_platform = m4b_config['system'].get(
+        'default_docker_platform', 'linux/amd64')
+    return _resolve_image_keys(_app_image_keys(m4b_config, app_config, user_config), default_docker_platform)
 
-    try:
-        m4b_config = load_json_config(m4b_config_path_or_dict)
-        app_config = load_json_config(app_config_path_or_dict)
-        user_config = load_json_config(user_config_path_or_dict)
 
-        default_docker_platform = m4b_config['system'].get(
-            'default_docker_platform', 'linux/amd64')
-        proxy_enabled = user_config['proxies'].get('enabled', False)
+def build_compose_dict(m4b_config: Dict[str, Any], app_config: Dict[str, Any], user_config: Dict[str, Any], is_main_instance: bool = False, resolved_images: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Build the Docker Compose dictionary for an instance without writing it.
+    The configuration dictionaries are not modified.
+
+    Args:
+        m4b_config (Dict[str, Any]): The m4b configuration dictionary.
+        app_config (Dict[str, Any]): The app configuration dictionary.
+        user_config (Dict[str, Any]): The user configuration dictionary.
+        is_main_instance (bool, optional): Whether this is the main instance. Defaults to False.
+        resolved_images (Dict, optional): Image resolutions from resolve_app_images, resolved on demand if omitted.
 
-        services = {}
-        apps_categories = ['apps']
-        # Overrides extra apps exclusion from m4b proxies instances
+    Returns:
+        Dict[str, Any]: The compose dictionary.
+    """
+    default_docker_platform = m4b_config['system'].get(
+        'default_docker_platform', 'linux/amd64')
+    proxy_enabled = user_config['proxies'].get('enabled', False)
+
+    services = {}
+    apps_categories = ['apps']
+    # Overrides extra apps exclusion from m4b proxies instances
+    apps_categories.append('extra-apps')
+    if is_main_instance:
         apps_categories.append('extra-apps')
-        if is_main_instance:
-            apps_categories.append('extra-apps')
-
-        # Collect ports for proxy service if proxy is enabled
-        proxy_ports = []
-        # Dictionary to keep track of which app ports have been added to proxy
-        app_ports_transferred = {}
-
-        for category in apps_categories:
-            for app in app_config.get(category, []):
-                app_name = app['name'].lower()
-                user_app_config = user_config['apps'].get(app_name, {})
-                if user_app_config.get('enabled'):
-                    # Copy the app's compose configuration to avoid modifying the original
-                    app_compose_config = app['compose_config'].copy()
-                    image = app_compose_config['image']
-                    image_name, image_tag = image.split(':')
-                    docker_platform = user_app_config.get(
-                        'docker_platform', default_docker_platform)
-
-                    if not check_img_arch_support(image_name, image_tag, docker_platform):
-                        compatible_tag = get_compatible_tag(
-                            image_name, docker_platform)
-                        if compatible_tag:
-                            app_compose_config['image'] = f"{image_name}:{compatible_tag}"
-                            # Add platform also on all already compatible images tags
-                            app_compose_config['platform'] = docker_platform
+
+    if resolved_images is None:
+        resolved_images = resolve_app_images(
+            m4b_config, app_config, user_config)
+
+    # Collect ports for proxy service if proxy is enabled
+    proxy_ports = []
+    # Dictionary to keep track of which app ports have been added to proxy
+    app_ports_transferred = {}
+
+    for category in apps_categories:
+        for app in app_config.get(category, []):
+            app_name = app['name'].lower()
+            user_app_config = user_config['apps'].get(app_name, {})
+            if user_app_config.get('enabled'):
+                # Copy the app's compose configuration to avoid modifying the original
+                app_compose_config = app['compose_config'].copy()
+                image = app_compose_config['image']
+                image_name, image_tag = image.split(':')
+                docker_platform = user_app_config.get(
+                    'docker_platform', default_docker_platform)
+
+                image_key = (image_name, image_tag, docker_platform)
+                if image_key not in resolved_images:
+                    resolved_images[image_key] = resolve_image_platform(
+                        image_name, image_tag, docker_platform, default_docker_platform)
+                resolved = resolved_images[image_key]
+                if resolved is None:
+                    logging.error(
+                        f"No compatible image found for {app_name}. Skipping {app_name}...")
+                    continue  # Do not add the app to the compose file
+                compatible_tag, resolved_platform = resolved
+                app_compose_config['image'] = f"{image_name}:{compatible_tag}"
+                # Add platform also on all already compatible images tags
+                app_compose_config['platform'] = resolved_platform
+
+                if proxy_enabled:
+                    app_proxy_compose = app.get('compose_config_proxy', {})
+
+                    # If using proxy's network, we can't publish ports directly
+                    if app_proxy_compose.get('network_mode', '').startswith('service:'):
+                        # If the app has ports and will use proxy, collect them for the proxy service
+                        if 'ports' in app_compose_config:
                             logging.info(
-                                f"Updated {app_name} to compatible tag: {compatible_tag}")
-                        else:
-                            logging.warning(
-                                f"No compatible tag found for {image_name} with architecture {docker_platform}. Searching for a suitable tag for default emulation architecture {default_docker_platform}.")
-                            # find a compatibile tag with default docker platform
-                            compatible_tag = get_compatible_tag(
-                                image_name, default_docker_platform)
-                            if compatible_tag:
-                                app_compose_config['image'] = f"{image_name}:{compatible_tag}"
-                                # Add platform to the compose configuration to force image pull for emulation
-                                app_compose_config['platform'] = default_docker_platform
-                                logging.warning(
-                                    f"Compatible tag found to run {image_name} with emulation on {default_docker_platform} architecture. Using binfmt emulation for {app_name} with image {image_name}:{image_tag}")
-                            else:
-                                logging.error(
-                                    f"No compatible tag found for {image_name} with default architecture {default_docker_platform}.")
-                                logging.error(
-                                    f"Please check the image tag and architecture compatibility on the registry. Skipping {app_name}...")
-                                continue  # Do not add the app to the compose file
-                    else:
-                        # Add platform also on all already compatible images tags
-                        app_compose_config['platform'] = docker_platform
-
-                    if proxy_enabled:
-                        app_proxy_compose = app.get('compose_config_proxy', {})
-
-                        # If using proxy's network, we can't publish ports directly
-                        if app_proxy_compose.get('network_mode', '').startswith('service:'):
-                            # If the app has ports and will use proxy, collect them for the proxy service
-                            if 'ports' in app_compose_config:
-                                logging.info(
-                                    f"Moving ports from {app_name} to proxy service as it's using proxy network")
-
-                                # Track which app's ports are being transferred to proxy
-                                app_ports_transferred[app_name] = True
-
-                                # Check if 'ports' is a list or a single value
-                                if isinstance(app_compose_config['ports'], list):
-                                    for port_mapping in app_compose_config['ports']:
-                                        # Only add if the port mapping contains a variable that's defined
-                                        if "${" in str(port_mapping) and "}" in str(port_mapping):
-                                            env_var = str(port_mapping).split(
-                                                ':')[0].strip('${}')
-                                            # Check if this app is enabled (we already know it is at this point)
-                                            # and if it has the port defined in user_config
-                                            if user_app_config.get('ports'):
-                                                proxy_ports.append(
-                                                    port_mapping)
-                                                logging.info(
-                                                    f"Added port mapping {port_mapping} to proxy from {app_name}")
-                                        else:
-                                            # For static port mappings
-                                            proxy_ports.append(port_mapping)
-                                            logging.info(
-                                                f"Added static port mapping {port_mapping} to proxy from {app_name}")
-                                else:
-                                    # For single port value
-                                    port_mapping = app_compose_config['ports']
+                                f"Moving ports from {app_name} to proxy service as it's using proxy network")
+
+                            # Track which app's ports are being transferred to proxy
+                            app_ports_transferred[app_name] = True
+
+                            # Check if 'ports' is a list or a single value
+                            if isinstance(app_compose_config['ports'], list):
+                                for port_mapping in app_compose_config['ports']:
+                                    # Only add if the port mapping contains a variable that's defined
                                     if "${" in str(port_mapping) and "}" in str(port_mapping):
                                         env_var = str(port_mapping).split(
                                             ':')[0].strip('${}')
-                                        # Check if this app is enabled and has the port defined
+                                        # Check if this app is enabled (we already know it is at this point)
+                                        # and if it has the port defined in user_config
                                         if user_app_config.get('ports'):
-                                            proxy_ports.append(port_mapping)
+                                            proxy_ports.append(
+                                                port_mapping)
                                             logging.info(
                                                 f"Added port mapping {port_mapping} to proxy from {app_name}")
                                     else:
-                                        # For static port mapping
+                                        # For static port mappings
                                         proxy_ports.append(port_mapping)
                                         logging.info(
                                             f"Added static port mapping {port_mapping} to proxy from {app_name}")
+                            else:
+                                # For single port value
+                                port_mapping = app_compose_config['ports']
+                                if "${" in str(port_mapping) and "}" in str(port_mapping):
+                                    env_var = str(port_mapping).split(
+                                        ':')[0].strip('${}')
+                                    # Check if this app is enabled and has the port defined
+                                    if user_app_config.get('ports'):
+                                        proxy_ports.append(port_mapping)
+                                        logging.info(
+                                            f"Added port mapping {port_mapping} to proxy from {app_name}")
+                                else:
+                                    # For static port mapping
+                                    proxy_ports.append(port_mapping)
+                                    logging.info(
+                                        f"Added static port mapping {port_mapping} to proxy from {app_name}")
+
+                            # Remove ports from the app config since they're now handled by the proxy
+                            del app_compose_config['ports']
+
+                    # Apply all other proxy-specific configurations
+                    for key, value in app_proxy_compose.items():
+                        app_compose_config[key] = value
+                        if app_compose_config[key] is None:
+                            del app_compose_config[key]
+
+                services[app_name] = app_compose_config
+
+    # Add common services only if this is the main instance
+    compose_config_common = user_config.get('compose_config_common', {})
+    if is_main_instance:
+        watchtower_service_key = 'proxy_enabled' if proxy_enabled else 'proxy_disabled'
+        watchtower_service = compose_config_common['watchtower_service'][watchtower_service_key]
+        services['watchtower'] = watchtower_service
+        services['m4bwebdashboard'] = dict(
+            compose_config_common['m4b_dashboard_service'])
+
+    if proxy_enabled:
+        # Get the base proxy service configuration
+        proxy_service = compose_config_common['proxy_service'].copy()
+
+        # Add collected ports from apps to the proxy service
+        if proxy_ports:
+            # If 'ports' key not in the proxy service, create it
+            if 'ports' not in proxy_service:
+                proxy_service['ports'] = []
+            elif not isinstance(proxy_service['ports'], list):
+                # If it's not a list, convert it to one
+                proxy_service['ports'] = [proxy_service['ports']]
+            else:
+                # Copy the list so the base configuration is left untouched
+                proxy_service['ports'] = list(proxy_service['ports'])
 
-                                # Remove ports from the app config since they're now handled by the proxy
-                                del app_compose_config['ports']
-
-                        # Apply all other proxy-specific configurations
-                        for key, value in app_proxy_compose.items():
-                            app_compose_config[key] = value
-                            if app_compose_config[key] is None:
-                                del app_compose_config[key]
-
-                    services[app_name] = app_compose_config
-
-        # Add common services only if this is the main instance
-        compose_config_common = user_config.get('compose_config_common', {})
-        if is_main_instance:
-            watchtower_service_key = 'proxy_enabled' if proxy_enabled else 'proxy_disabled'
-            watchtower_service = compose_config_common['watchtower_service'][watchtower_service_key]
-            services['watchtower'] = watchtower_service
-            services['m4bwebdashboard'] = compose_config_common['m4b_dashboard_service']
-
-        if proxy_enabled:
-            # Get the base proxy service configuration
-            proxy_service = compose_config_common['proxy_service'].copy()
-
-            # Add collected ports from apps to the proxy service
-            if proxy_ports:
-                # If 'ports' key not in the proxy service, create it
-                if 'ports' not in proxy_service:
-                    proxy_service['ports'] = []
-                elif not isinstance(proxy_service['ports'], list):
-                    # If it's not a list, convert it to one
-                    proxy_service['ports'] = [proxy_service['ports']]
-
-                # IMPORTANT: Remove any existing dashboard port from the proxy service ports
-                dashboard_port = "${M4B_DASHBOARD_PORT}:80"
-                if dashboard_port in proxy_service['ports']:
-                    proxy_service['ports'].remove(dashboard_port)
-                    logging.info(
-                        "Removed existing dashboard port mapping from proxy service")
-
-                # Add required ports from enabled apps
-                for port_mapping in proxy_ports:
-                    if port_mapping not in proxy_service['ports']:
-                        proxy_service['ports'].append(port_mapping)
-
-                # Dashboard port handling based on instance type
-                if is_main_instance and user_config['m4b_dashboard'].get('enabled'):
-                    # Only add dashboard port to proxy service if using proxy AND dashboard is enabled
-                    if proxy_enabled and not app_ports_transferred.get('m4bwebdashboard'):
-                        # Add the dashboard port to proxy service
-                        proxy_service['ports'].append(dashboard_port)
-                        logging.info(
-                            "Added M4B dashboard port mapping to proxy service for main instance")
-
-                        # If we're adding dashboard port to proxy, we should remove 'ports' entirely from the dashboard service
-                        if 'm4bwebdashboard' in services and 'ports' in services['m4bwebdashboard']:
-                            del services['m4bwebdashboard']['ports']
-                            logging.info(
-                                "Removed ports key from m4bwebdashboard service as it's handled by proxy")
-                else:
+            # IMPORTANT: Remove any existing dashboard port from the proxy service ports
+            dashboard_port = "${M4B_DASHBOARD_PORT}:80"
+            if dashboard_port in proxy_service['ports']:
+                proxy_service['ports'].remove(dashboard_port)
+                logging.info(
+                    "Removed existing dashboard port mapping from proxy service")
+
+            # Add required ports from enabled apps
+            for port_mapping in proxy_ports:
+                if port_mapping not in proxy_service['ports']:
+                    proxy_service['ports'].append(port_mapping)
+
+            # Dashboard port handling based on instance type
+            if is_main_instance and user_config['m4b_dashboard'].get('enabled'):
+                # Only add dashboard port to proxy service if using proxy AND dashboard is enabled
+                if proxy_enabled and not app_ports_transferred.get('m4bwebdashboard'):
+                    # Add the dashboard port to proxy service
+                    proxy_service['ports'].append(dashboard_port)
                     logging.info(
-                        "Skipping dashboard port mapping for multiproxy instance to avoid conflicts")
+                        "Added M4B dashboard port mapping to proxy service for main instance")
 
+                    # If we're adding dashboard port to proxy, we should remove 'ports' entirely from the dashboard service
+                    if 'm4bwebdashboard' in services and 'ports' in services['m4bwebdashboard']:
+                        del services['m4bwebdashboard']['ports']
+                        logging.info(
+                            "Removed ports key from m4bwebdashboard service as it's handled by proxy")
+            else:
                 logging.info(
-                    f"Added {len(proxy_ports)} port mappings to the proxy service from apps using its network")
-
-            services['proxy'] = proxy_service
-
-        # Define network configuration using config json and environment variables
-        # This is a hybrid solution to remember that it could be possible to ditch the env file and generate all compose file parts from config json
-        network_config = {
-            'networks': {
-                'default': {
-                    'driver': compose_config_common['network']['driver'],
-                    'ipam': {
-                        'config': [
-                            {
-                                'subnet': f"{compose_config_common['network']['subnet']}/{compose_config_common['network']['netmask']}"
-                            }
-                        ]
-                    }
+                    "Skipping dashboard port mapping for multiproxy instance to avoid conflicts")
+
+            logging.info(
+                f"Added {len(proxy_ports)} port mappings to the proxy service from apps using its network")
+
+        services['proxy'] = proxy_service
+
+    # Define network configuration using config json and environment variables
+    # This is a hybrid solution to remember that it could be possible to ditch the env file and generate all compose file parts from config json
+    network_config = {
+        'networks': {
+            'default': {
+                'driver': compose_config_common['network']['driver'],
+                'ipam': {
+                    'config': [
+                        {
+                            'subnet': f"{compose_config_common['network']['subnet']}/{compose_config_common['network']['netmask']}"
+                        }
+                    ]
                 }
             }
         }
+    }
 
-        # Create the compose dictionary
-        compose_dict = {
-            'services': services
-        }
+    # Create the compose dictionary
+    compose_dict = {
+        'services': services
+    }
+
+    # Append network configuration at the bottom
+    compose_dict.update(network_config)
+
+    return compose_dict
+
+
+def build_env_lines(m4b_config: Dict[str, Any], app_config: Dict[str, Any], user_config: Dict[str, Any], is_main_instance: bool = False) -> List[str]:
+    """
+    Build the .env lines for an instance without writing them.
+
+    Args:
+        m4b_config (Dict[str, Any]): The m4b configuration dictionary.
+        app_config (Dict[str, Any]): The app configuration dictionary.
+        user_config (Dict[str, Any]): The user configuration dictionary.
+        is_main_instance (bool, optional): Whether this is the main instance. Defaults to False.
+
+    Returns:
+        List[str]: The KEY=value lines.
+    """
+    env_lines = []
+
+    # Add project and system configurations
+    project_config = m4b_config.get('project', {})
+    for key, value in project_config.items():
+        env_lines.append(f"{key.upper()}={value}")
+
+    # Add resource limits configurations
+    resource_limits_config = user_config.get('resource_limits', {})
+    for key, value in resource_limits_config.items():
+        env_lines.append(f"{key.upper()}={value}")
+
+    # Add network configurations
+    network_config = m4b_config.get('network', {})
+    for key, value in network_config.items():
+        env_lines.append(f"NETWORK_{key.upper()}={value}")
+
+    # Add user and device configurations
+    device_info = user_config.get('device_info', {})
+    for key, value in device_info.items():
+        env_lines.append(f"{key.upper()}={value}")
+
+    # Add m4b_dashboard configurations
+    m4b_dashboard_name = 'm4b_dashboard'
+    m4b_dashboard_config = user_config.get(m4b_dashboard_name, {})
+    for key, value in m4b_dashboard_config.items():
+        if key == 'ports':
+            env_lines.append(f"{m4b_dashboard_name.upper()}_PORT={value}")
+        else:
+            env_lines.append(
+                f"{m4b_dashboard_name.upper()}_{key.upper()}={value}")
+
+    # Add proxy configurations
+    proxy_config = user_config.get('proxies', {})
+    for key, value in proxy_config.items():
+        env_lines.append(f"STACK_PROXY_{key.upper()}={value}")
+
+    # Add notification configurations if enabled
+    notifications_config = user_config.get('notifications', {})
+    if notifications_config.get('enabled'):
+        for key, value in notifications_config.items():
+            env_lines.append(
+                f"WATCHTOWER_NOTIFICATION_{key.upper()}={value}")
+
+    # Add app-specific configurations only if the app is enabled
+    apps_categories = ['apps']
+    if is_main_instance:
+        apps_categories.append('extra-apps')
+    for category in apps_categories:
+        for app in app_config.get(category, []):
+            app_name = app['name'].upper()
+            app_lower = app['name'].lower()
+            app_flags = app.get('flags', {})
+            app_user_config = user_config['apps'].get(app_lower, {})
+            if app_user_config.get('enabled', False):
+                for flag_name in app_flags.keys():
+                    if flag_name in app_user_config:
+                        env_var_name = f"{app_name}_{flag_name.upper()}"
+                        env_var_value = app_user_config[flag_name]
+                        env_lines.append(f"{env_var_name}={env_var_value}")
+
+                # Add ports configurations for apps that have them
+                if 'dashboard_port' in app_user_config:
+                    env_lines.append(
+                        f"{app_name.upper()}_DASHBOARD_PORT={app_user_config['dashboard_port']}")
+                if 'ports' in app_user_config:
+                    # Handle both single port and list of ports
+                    if isinstance(app_user_config['ports'], list):
+                        for i, port in enumerate(app_user_config['ports']):
+                            env_lines.append(
+                                f"{app_name.upper()}_PORT_{i+1}={port}")
+                    else:
+                        # Add standard app port variable
+                        env_lines.append(
+                            f"{app_name.upper()}_PORT={app_user_config['ports']}")
+
+                        # Add app-specific port variable (for backward compatibility)
+                        # This ensures services that explicitly reference ${APPNAME_PORT} in docker-compose
+                        # continue to work without modifications
+                        env_lines.append(
+                            f"{app_lower.upper()}_PORT={app_user_config['ports']}")
+
+    return env_lines
+
+
+def dump_compose_yaml(compose_dict: Dict[str, Any], dumper: Optional[type] = None) -> str:
+    """
+    Serialize a compose dictionary to YAML.
+    Uses the libyaml C emitter when available.
+
+    Args:
+        compose_dict (Dict[str, Any]): The compose dictionary.
+        dumper (type, optional): The PyYAML dumper class. Defaults to COMPOSE_YAML_DUMPER.
+
+    Returns:
+        str: The YAML document.
+    """
+    return yaml.dump(compose_dict, Dumper=dumper or COMPOSE_YAML_DUMPER, sort_keys=False,
+                     default_flow_style=False)
+
+
+def write_compose_file(compose_dict: Dict[str, Any], compose_output_path: str) -> None:
+    """
+    Write a compose dictionary to a docker-compose.yaml file.
+
+    Args:
+        compose_dict (Dict[str, Any]): The compose dictionary.
+        compose_output_path (str): The path to save the file.
+    """
+    with open(compose_output_path, 'w') as f:
+        f.write(dump_compose_yaml(compose_dict))
+
+
+def write_env_file(env_lines: List[str], env_output_path: str) -> None:
+    """
+    Write .env lines to a file.
+
+    Args:
+        env_lines (List[str]): The KEY=value lines.
+        env_output_path (str): The path to save the file.
+    """
+    with open(env_output_path, 'w') as f:
+        f.write('\n'.join(env_lines))
+
+
+GENERATION_HASH_FILE = '.m4b-generated.json'
+# Bump when the output format changes so existing files are regenerated
+GENERATION_HASH_VERSION = 1
+# Directory inside the instances directory holding compose files shared by several instances
+SHARED_COMPOSE_DIR = '.shared-compose'
+# The user config sections that end up in the compose or .env files
+GENERATION_USER_KEYS = ('apps', 'proxies', 'device_info', 'm4b_dashboard',
+                        'compose_config_common', 'resource_limits', 'notifications')
+
+
+def compute_generation_hash(m4b_config: Dict[str, Any], app_config: Dict[str, Any], user_config: Dict[str, Any], is_main_instance: bool = False, resolved_images: Optional[Dict] = None) -> str:
+    """
+    Compute a canonical hash of everything a generated compose or .env file depends on.
+
+    Args:
+        m4b_config (Dict[str, Any]): The m4b configuration dictionary.
+        app_config (Dict[str, Any]): The app configuration dictionary.
+        user_config (Dict[str, Any]): The user configuration dictionary.
+        is_main_instance (bool, optional): Whether this is the main instance. Defaults to False.
+        resolved_images (Dict, optional): Image resolutions from resolve_app_images, only needed for compose files.
+
+    Returns:
+        str: The hex digest.
+    """
+    enabled_apps = [app for category in ['apps', 'extra-apps'] for app in app_config.get(category, [])
+                    if user_config['apps'].get(app['name'].lower(), {}).get('enabled')]
+    payload = {
+        'version': GENERATION_HASH_VERSION,
+        'is_main_instance': is_main_instance,
+        'project': m4b_config.get('project', {}),
+        'network': m4b_config.get('network', {}),
+        'default_docker_platform': m4b_config['system'].get('default_docker_platform'),
+        'user': {key: user_config.get(key) for key in GENERATION_USER_KEYS},
+        'apps': enabled_apps,
+        'images': [[list(key), list(resolved_images[key]) if resolved_images.get(key) else None]
+                   for key in sorted(set(_app_image_keys(m4b_config, app_config, user_config)))]
+        if resolved_images is not None else None,
+    }
+    canonical = json.dumps(payload, sort_keys=True,
+                           separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _hash_file_path(output_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(output_path)), GENERATION_HASH_FILE)
+
+
+def is_output_current(output_path: str, generation_hash: str) -> bool:
+    """
+    Check whether a generated file exists and was generated from inputs with the given hash.
+
+    Args:
+        output_path (str): The generated file.
+        generation_hash (str): The hash of the current inputs.
+
+    Returns:
+        bool: True if the file can be kept as is.
+    """
+    # A link to a shared compose file is never a current per-instance output
+    if not os.path.exists(output_path) or os.path.islink(output_path):
+        return False
+    try:
+        with open(_hash_file_path(output_path), 'r') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return stored.get(os.path.basename(output_path)) == generation_hash
+
+
+def record_output_hash(output_path: str, generation_hash: str) -> None:
+    """
+    Record the input hash of a generated file in the hash file beside it.
+
+    Args:
+        output_path (str): The generated file.
+        generation_hash (str): The hash of the inputs it was generated from.
+    """
+    hash_file = _hash_file_path(output_path)
+    try:
+        with open(hash_file, 'r') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        stored = {}
+    stored[os.path.basename(output_path)] = generation_hash
+    with open(hash_file, 'w') as f:
+        json.dump(stored, f, indent=4, sort_keys=True)
+
+
+def compute_compose_key(m4b_config: Dict[str, Any], app_config: Dict[str, Any], user_config: Dict[str, Any], is_main_instance: bool = False, resolved_images: Optional[Dict] = None) -> str:
+    """
+    Compute a hash of only the inputs build_compose_dict reads.
+    Instances that differ only in values the compose file takes from .env (device name, proxy URL,
+    subnet, port numbers) get the same key and can share one compose file.
+
+    Args:
+        m4b_config (Dict[str, Any]): The m4b configuration dictionary.
+        app_config (Dict[str, Any]): The app configuration dictionary.
+        user_config (Dict[str, Any]): The user configuration dictionary.
+        is_main_instance (bool, optional): Whether this is the main instance. Defaults to False.
+        resolved_images (Dict, optional): Image resolutions from resolve_app_images, resolved on demand if omitted.
+
+    Returns:
+        str: The hex digest.
+    """
+    if resolved_images is None:
+        resolved_images = resolve_app_images(
+            m4b_config, app_config, user_config)
+    default_docker_platform = m4b_config['system'].get(
+        'default_docker_platform', 'linux/amd64')
+    apps = []
+    for category in ['apps', 'extra-apps']:
+        for app in app_config.get(category, []):
+            user_app_config = user_config['apps'].get(app['name'].lower(), {})
+            if user_app_config.get('enabled'):
+                image_name, image_tag = app['compose_config']['image'].split(':')
+                docker_platform = user_app_config.get(
+                    'docker_platform', default_docker_platform)
+                resolved = resolved_images.get(
+                    (image_name, image_tag, docker_platform))
+                apps.append([app, bool(user_app_config.get('ports')),
+                             list(resolved) if resolved else None])
+    payload = {
+        'version': GENERATION_HASH_VERSION,
+        'is_main_instance': is_main_instance,
+        'proxy_enabled': bool(user_config['proxies'].get('enabled', False)),
+        'dashboard_enabled': bool(user_config.get('m4b_dashboard', {}).get('enabled')),
+        'compose_config_common': user_config.get('compose_config_common', {}),
+        'apps': apps,
+    }
+    canonical = json.dumps(payload, sort_keys=True,
+                           separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def shared_compose_path(shared_compose_dir: str, compose_key: str) -> str:
+    """
+    Get the path of the shared compose file for a compose key.
+
+    Args:
+        shared_compose_dir (str): The directory holding the shared compose files.
+        compose_key (str): The key from compute_compose_key.
+
+    Returns:
+        str: The shared compose file path.
+    """
+    return os.path.join(shared_compose_dir, f"docker-compose.{compose_key[:16]}.yaml")
+
+
+def link_shared_compose(shared_path: str, compose_output_path: str) -> bool:
+    """
+    Point an instance compose file at a shared compose file.
+    A relative symlink is used where the platform allows it, otherwise the file is copied.
+
+    Args:
+        shared_path (str): The shared compose file.
+        compose_output_path (str): The instance compose file path.
+
+    Returns:
+        bool: True if the instance compose file changed, False if it already pointed at the shared file.
+    """
+    target = os.path.relpath(os.path.abspath(shared_path),
+                             os.path.dirname(os.path.abspath(compose_output_path)))
+    if os.path.islink(compose_output_path) and os.readlink(compose_output_path) == target:
+        return False
+    if os.path.lexists(compose_output_path):
+        os.remove(compose_output_path)
+    try:
+        os.symlink(target, compose_output_path)
+    except (OSError, NotImplementedError):
+        logging.warning(
+            f"Could not symlink {compose_output_path}, copying the shared compose file instead")
+        shutil.copyfile(shared_path, compose_output_path)
+    return True
 
-        # Append network configuration at the bottom
-        compose_dict.update(network_config)
 
-        with open(compose_output_path, 'w') as f:
-            yaml.dump(compose_dict, f, sort_keys=False,
-                      default_flow_style=False)
+def _ensure_shared_compose(m4b_config: Dict[str, Any], app_config: Dict[str, Any], user_config: Dict[str, Any], is_main_instance: bool, resolved_images: Dict, shared_compose_dir: str, force: bool = False) -> str:
+    shared_path = shared_compose_path(shared_compose_dir, compute_compose_key(
+        m4b_config, app_config, user_config, is_main_instance, resolved_images))
+    # The file name is derived from its inputs, so an existing file is already current
+    if force or not os.path.isfile(shared_path):
+        os.makedirs(shared_compose_dir, exist_ok=True)
+        write_compose_file(build_compose_dict(
+            m4b_config, app_config, user_config, is_main_instance, resolved_images), shared_path)
+        logging.info(f"Shared Docker Compose file saved to {shared_path}")
+    return shared_path
+
+
+def prune_shared_composes(shared_compose_dir: str, instances_dir: str) -> List[str]:
+    """
+    Remove shared compose files that no instance compose file links to anymore.
+
+    Args:
+        shared_compose_dir (str): The directory holding the shared compose files.
+        instances_dir (str): The directory holding the instance directories.
+
+    Returns:
+        List[str]: The removed files.
+    """
+    if not os.path.isdir(shared_compose_dir):
+        return []
+    referenced = set()
+    if os.path.isdir(instances_dir):
+        for instance in os.listdir(instances_dir):
+            compose_file = os.path.join(
+                instances_dir, instance, 'docker-compose.yaml')
+            if os.path.islink(compose_file):
+                referenced.add(os.path.realpath(compose_file))
+    removed = []
+    for name in os.listdir(shared_compose_dir):
+        path = os.path.join(shared_compose_dir, name)
+        if os.path.realpath(path) not in referenced:
+            os.remove(path)
+            removed.append(path)
+    if removed:
+        logging.info(f"Removed {len(removed)} unused shared compose files")
+    return removed
+
+
+def assemble_docker_compose(m4b_config_path_or_dict: Any, app_config_path_or_dict: Any, user_config_path_or_dict: Any, compose_output_path: str = str(os.path.join(os.getcwd(), 'docker-compose.yaml')), is_main_instance: bool = False, force: bool = False, shared_compose_dir: Optional[str] = None) -> bool:
+    """
+    Assemble a Docker Compose file based on the app and user configuration.
+    The file is left untouched if it was already generated from the same inputs.
+    With shared_compose_dir, the compose file is rendered once per distinct set of compose inputs
+    into that directory and compose_output_path becomes a link to it.
+
+    Args:
+        m4b_config_path_or_dict (Any): The path to the m4b configuration file or the config dictionary.
+        app_config_path_or_dict (Any): The path to the app configuration file or the config dictionary.
+        user_config_path_or_dict (Any): The path to the user configuration file or the config dictionary.
+        compose_output_path (str, optional): The path to save the assembled docker-compose.yaml file. Defaults to './docker-compose.yaml'.
+        is_main_instance (bool, optional): Whether this is the main instance. Defaults to False.
+        force (bool, optional): Write the file even if its inputs are unchanged. Defaults to False.
+        shared_compose_dir (str, optional): Directory for shared compose files. Defaults to None (write a standalone file).
+
+    Returns:
+        bool: True if the file was written, False if it was already up to date.
+
+    Raises:
+        Exception: If an error occurs during the assembly process.
+    """
+    event = threading.Event()
+    spinner_thread = threading.Thread(target=show_spinner, args=(
+        "Assembling Docker Compose file...", event))
+    spinner_thread.start()
+
+    try:
+        m4b_config = load_json_config(m4b_config_path_or_dict)
+        app_config = load_json_config(app_config_path_or_dict)
+        user_config = load_json_config(user_config_path_or_dict)
+
+        resolved_images = resolve_app_images(
+            m4b_config, app_config, user_config)
+        if shared_compose_dir:
+            shared_path = _ensure_shared_compose(
+                m4b_config, app_config, user_config, is_main_instance, resolved_images, shared_compose_dir, force)
+            changed = link_shared_compose(shared_path, compose_output_path)
+            logging.info(
+                f"Docker Compose file {compose_output_path} uses shared file {shared_path}")
+            return changed
+
+        generation_hash = compute_generation_hash(
+            m4b_config, app_config, user_config, is_main_instance, resolved_images)
+        if not force and is_output_current(compose_output_path, generation_hash):
+            logging.info(
+                f"Docker Compose file {compose_output_path} is up to date, skipping")
+            return False
+
+        compose_dict = build_compose_dict(
+            m4b_config, app_config, user_config, is_main_instance, resolved_images)
+        write_compose_file(compose_dict, compose_output_path)
+        record_output_hash(compose_output_path, generation_hash)
         logging.info(
             f"Docker Compose file assembled and saved to {compose_output_path}")
+        return True
     finally:
         event.set()
         spinner_thread.join()
 
 
-def generate_env_file(m4b_config_path_or_dict: Any, app_config_path_or_dict: Any, user_config_path_or_dict: Any, env_output_path: str = str(os.path.join(os.getcwd(), '.env')), is_main_instance: bool = False) -> None:
+def generate_env_file(m4b_config_path_or_dict: Any, app_config_path_or_dict: Any, user_config_path_or_dict: Any, env_output_path: str = str(os.path.join(os.getcwd(), '.env')), is_main_instance: bool = False, force: bool = False) -> bool:
     """
     Generate a .env file based on the m4b and user configuration.
+    The file is left untouched if it was already generated from the same inputs.
 
     Args:
         m4b_config_path_or_dict (Any): The path to the m4b configuration file or the config dictionary.
@@ -295,6 +738,10 @@ def generate_env_file(m4b_config_path_or_dict: Any, app_config_path_or_dict: Any
         user_config_path_or_dict (Any): The path to the user configuration file or the config dictionary.
         env_output_path (str, optional): The path to save the generated .env file. Defaults to './.env'.
         is_main_instance (bool, optional): Whether this is the main instance. Defaults to False.
+        force (bool, optional): Write the file even if its inputs are unchanged. Defaults to False.
+
+    Returns:
+        bool: True if the file was written, False if it was already up to date.
 
     Raises:
         Exception: If an error occurs during the file generation process.
@@ -309,97 +756,201 @@ def generate_env_file(m4b_config_path_or_dict: Any, app_config_path_or_dict: Any
         app_config = load_json_config(app_config_path_or_dict)
         user_config = load_json_config(user_config_path_or_dict)
 
-        env_lines = []
-
-        # Add project and system configurations
-        project_config = m4b_config.get('project', {})
-        for key, value in project_config.items():
-            env_lines.append(f"{key.upper()}={value}")
-
-        # Add resource limits configurations
-        resource_limits_config = user_config.get('resource_limits', {})
-        for key, value in resource_limits_config.items():
-            env_lines.append(f"{key.upper()}={value}")
-
-        # Add network configurations
-        network_config = m4b_config.get('network', {})
-        for key, value in network_config.items():
-            env_lines.append(f"NETWORK_{key.upper()}={value}")
-
-        # Add user and device configurations
-        device_info = user_config.get('device_info', {})
-        for key, value in device_info.items():
-            env_lines.append(f"{key.upper()}={value}")
-
-        # Add m4b_dashboard configurations
-        m4b_dashboard_name = 'm4b_dashboard'
-        m4b_dashboard_config = user_config.get(m4b_dashboard_name, {})
-        for key, value in m4b_dashboard_config.items():
-            if key == 'ports':
-                env_lines.append(f"{m4b_dashboard_name.upper()}_PORT={value}")
-            else:
-                env_lines.append(
-                    f"{m4b_dashboard_name.upper()}_{key.upper()}={value}")
-
-        # Add proxy configurations
-        proxy_config = user_config.get('proxies', {})
-        for key, value in proxy_config.items():
-            env_lines.append(f"STACK_PROXY_{key.upper()}={value}")
-
-        # Add notification configurations if enabled
-        notifications_config = user_config.get('notifications', {})
-        if notifications_config.get('enabled'):
-            for key, value in notifications_config.items():
-                env_lines.append(
-                    f"WATCHTOWER_NOTIFICATION_{key.upper()}={value}")
-
-        # Add app-specific configurations only if the app is enabled
-        apps_categories = ['apps']
-        if is_main_instance:
-            apps_categories.append('extra-apps')
-        for category in apps_categories:
-            for app in app_config.get(category, []):
-                app_name = app['name'].upper()
-                app_lower = app['name'].lower()
-                app_flags = app.get('flags', {})
-                app_user_config = user_config['apps'].get(app_lower, {})
-                if app_user_config.get('enabled', False):
-                    for flag_name in app_flags.keys():
-                        if flag_name in app_user_config:
-                            env_var_name = f"{app_name}_{flag_name.upper()}"
-                            env_var_value = app_user_config[flag_name]
-                            env_lines.append(f"{env_var_name}={env_var_value}")
-
-                    # Add ports configurations for apps that have them
-                    if 'dashboard_port' in app_user_config:
-                        env_lines.append(
-                            f"{app_name.upper()}_DASHBOARD_PORT={app_user_config['dashboard_port']}")
-                    if 'ports' in app_user_config:
-                        # Handle both single port and list of ports
-                        if isinstance(app_user_config['ports'], list):
-                            for i, port in enumerate(app_user_config['ports']):
-                                env_lines.append(
-                                    f"{app_name.upper()}_PORT_{i+1}={port}")
-                        else:
-                            # Add standard app port variable
-                            env_lines.append(
-                                f"{app_name.upper()}_PORT={app_user_config['ports']}")
+        generation_hash = compute_generation_hash(
+            m4b_config, app_config, user_config, is_main_instance)
+        if not force and is_output_current(env_output_path, generation_hash):
+            logging.info(f".env file {env_output_path} is up to date, skipping")
+            return False
 
-                            # Add app-specific port variable (for backward compatibility)
-                            # This ensures services that explicitly reference ${APPNAME_PORT} in docker-compose
-                            # continue to work without modifications
-                            env_lines.append(
-                                f"{app_lower.upper()}_PORT={app_user_config['ports']}")
-
-        # Write to .env file
-        with open(env_output_path, 'w') as f:
-            f.write('\n'.join(env_lines))
+        env_lines = build_env_lines(
+            m4b_config, app_config, user_config, is_main_instance)
+        write_env_file(env_lines, env_output_path)
+        record_output_hash(env_output_path, generation_hash)
         logging.info(f".env file generated and saved to {env_output_path}")
+        return True
+    finally:
+        event.set()
+        spinner_thread.join()
+
+
+def _instance_configs(m4b_config: Dict[str, Any], app_config: Dict[str, Any], user_config: Dict[str, Any], instance: Dict[str, Any]) -> Tuple[Dict, Dict, Dict]:
+    overrides = instance.get('overrides', {})
+    return (merge_config(m4b_config, overrides.get('m4b_config', {})),
+            merge_config(app_config, overrides.get('app_config', {})),
+            merge_config(user_config, overrides.get('user_config', {})))
+
+
+_batch_context: Dict[str, Any] = {}
+
+
+def _init_batch_worker(m4b_config: Dict, app_config: Dict, user_config: Dict, resolved_images: Dict, force: bool) -> None:
+    # Keep the base configs in the worker so they are pickled once per process, not once per instance
+    _batch_context.update(m4b_config=m4b_config, app_config=app_config,
+                          user_config=user_config, resolved_images=resolved_images, force=force)
+
+
+def _render_instance(instance: Dict[str, Any]) -> Dict[str, Any]:
+    m4b_config, app_config, user_config = _instance_configs(
+        _batch_context['m4b_config'], _batch_context['app_config'], _batch_context['user_config'], instance)
+    is_main_instance = instance.get('is_main_instance', False)
+    compose_output_path = instance['compose_output_path']
+    env_output_path = instance['env_output_path']
+    force = _batch_context['force']
+
+    if instance.get('shared_compose_path'):
+        compose_changed = link_shared_compose(
+            instance['shared_compose_path'], compose_output_path)
+    else:
+        compose_hash = compute_generation_hash(m4b_config, app_config, user_config,
+                                              is_main_instance, _batch_context['resolved_images'])
+        compose_changed = force or not is_output_current(
+            compose_output_path, compose_hash)
+    if compose_changed and not instance.get('shared_compose_path'):
+        compose_dict = build_compose_dict(m4b_config, app_config, user_config,
+                                          is_main_instance, _batch_context['resolved_images'])
+        write_compose_file(compose_dict, compose_output_path)
+        record_output_hash(compose_output_path, compose_hash)
+
+    env_hash = compute_generation_hash(
+        m4b_config, app_config, user_config, is_main_instance)
+    env_changed = force or not is_output_current(env_output_path, env_hash)
+    if env_changed:
+        env_lines = build_env_lines(
+            m4b_config, app_config, user_config, is_main_instance)
+        write_env_file(env_lines, env_output_path)
+        record_output_hash(env_output_path, env_hash)
+
+    return {'compose_output_path': compose_output_path, 'env_output_path': env_output_path,
+            'project_name': m4b_config.get('project', {}).get('compose_project_name'),
+            'changed': compose_changed or env_changed}
+
+
+def generate_instances_batch(m4b_config_path_or_dict: Any, app_config_path_or_dict: Any, user_config_path_or_dict: Any, instances: List[Dict[str, Any]], processes: int = 0, force: bool = False, shared_compose_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Generate the docker-compose.yaml and .env files of many instances in one pass.
+    The base configurations are loaded once, image platforms are resolved once for the
+    whole batch and each instance only carries the overrides that differ from the base.
+    Files whose inputs are unchanged since the last generation are not rewritten.
+    With shared_compose_dir, one compose file is rendered per distinct set of compose inputs
+    and every instance compose file links to it, so only the .env files differ between instances.
+
+    Args:
+        m4b_config_path_or_dict (Any): The path to the base m4b configuration file or the config dictionary.
+        app_config_path_or_dict (Any): The path to the base app configuration file or the config dictionary.
+        user_config_path_or_dict (Any): The path to the base user configuration file or the config dictionary.
+        instances (List[Dict[str, Any]]): One entry per instance with 'compose_output_path', 'env_output_path',
+            optional 'overrides' ({'m4b_config': {...}, 'app_config': {...}, 'user_config': {...}}, see merge_config)
+            and optional 'is_main_instance'.
+        processes (int, optional): Render in a pool of this many processes, 0 renders in this process. Defaults to 0.
+        force (bool, optional): Rewrite every file even if its inputs are unchanged. Defaults to False.
+        shared_compose_dir (str, optional): Directory for shared compose files. Defaults to None (one standalone file per instance).
+
+    Returns:
+        List[Dict[str, Any]]: The output paths, project name and whether anything was rewritten ('changed') of every instance, in input order.
+
+    Raises:
+        Exception: If an error occurs while generating any instance.
+    """
+    event = threading.Event()
+    spinner_thread = threading.Thread(target=show_spinner, args=(
+        f"Generating files for {len(instances)} instances...", event))
+    spinner_thread.start()
+
+    try:
+        m4b_config = load_json_config(m4b_config_path_or_dict)
+        app_config = load_json_config(app_config_path_or_dict)
+        user_config = load_json_config(user_config_path_or_dict)
+
+        # Resolve every distinct image of every instance once for the whole batch
+        image_keys = []
+        for instance in instances:
+            image_keys.extend(_app_image_keys(
+                *_instance_configs(m4b_config, app_config, user_config, instance)))
+        default_docker_platform = m4b_config['system'].get(
+            'default_docker_platform', 'linux/amd64')
+        resolved_images = _resolve_image_keys(
+            image_keys, default_docker_platform)
+
+        if shared_compose_dir:
+            # Render each distinct compose file once here, the workers only link to it
+            shared_paths = {}
+            linked_instances = []
+            for instance in instances:
+                instance_configs = _instance_configs(
+                    m4b_config, app_config, user_config, instance)
+                is_main_instance = instance.get('is_main_instance', False)
+                compose_key = compute_compose_key(
+                    *instance_configs, is_main_instance, resolved_images)
+                if compose_key not in shared_paths:
+                    shared_paths[compose_key] = _ensure_shared_compose(
+                        *instance_configs, is_main_instance, resolved_images, shared_compose_dir, force)
+                linked_instances.append(
+                    dict(instance, shared_compose_path=shared_paths[compose_key]))
+            instances = linked_instances
+            logging.info(
+                f"Rendered {len(shared_paths)} shared compose files for {len(instances)} instances")
+
+        context = (m4b_config, app_config,
+                   user_config, resolved_images, force)
+        if processes and len(instances) > 1:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_batch_worker, initargs=context) as executor:
+                chunksize = max(1, len(instances) // (processes * 4))
+                results = list(executor.map(
+                    _render_instance, instances, chunksize=chunksize))
+        else:
+            _init_batch_worker(*context)
+            results = [_render_instance(instance) for instance in instances]
+        changed = [result['project_name']
+                   for result in results if result['changed']]
+        logging.info(
+            f"Generated files for {len(results)} instances, {len(changed)} changed: {', '.join(map(str, changed)) or 'none'}")
+        return results
     finally:
+        _batch_context.clear()
         event.set()
         spinner_thread.join()
 
 
+def regenerate_instances(instances_dir: str, force: bool = False) -> List[Dict[str, Any]]:
+    """
+    Regenerate the files of every multiproxy instance from the base snapshot and its overlay.
+    Only instances whose inputs changed are rewritten, see generate_instances_batch, and recorded in the instance registry.
+
+    Args:
+        instances_dir (str): The directory holding the base snapshot and the instance directories.
+        force (bool, optional): Rewrite every file even if its inputs are unchanged. Defaults to False.
+
+    Returns:
+        List[Dict[str, Any]]: The generate_instances_batch results, empty if the directory has no overlay instances.
+    """
+    base_dir = os.path.join(instances_dir, INSTANCE_BASE_DIR)
+    if not os.path.isdir(base_dir):
+        return []
+
+    instances = []
+    for name in sorted(os.listdir(instances_dir)):
+        instance_dir = os.path.join(instances_dir, name)
+        if os.path.isfile(os.path.join(instance_dir, INSTANCE_OVERLAY_FILE)):
+            instances.append({
+                'compose_output_path': os.path.join(instance_dir, 'docker-compose.yaml'),
+                'env_output_path': os.path.join(instance_dir, '.env'),
+                'overrides': load_instance_overlay(instance_dir),
+            })
+    if not instances:
+        return []
+
+    m4b_config, app_config, user_config = (load_json_config(os.path.join(base_dir, filename))
+                                           for filename in INSTANCE_CONFIG_FILES.values())
+    shared_compose_dir = os.path.join(instances_dir, SHARED_COMPOSE_DIR) if m4b_config['system'].get(
+        'shared_compose_files', False) else None
+    results = generate_instances_batch(m4b_config, app_config, user_config, instances,
+                                       force=force, shared_compose_dir=shared_compose_dir)
+    if shared_compose_dir:
+        prune_shared_composes(shared_compose_dir, instances_dir)
+    record_generated(instances_dir, results)
+    return results
+
+
 def generate_dashboard_urls(compose_project_name: str, device_name: str, env_file: str = str(os.path.join(os.getcwd(), ".env"))) -> None:
     """
     Generate dashboard URLs based on the provided compose project name and device name.
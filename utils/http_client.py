@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+import datetime
+import email.utils
+from urllib.parse import urlparse
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 0.5  # Seconds, doubled on every attempt
+BACKOFF_MAX = 60  # Upper bound for any single wait, including Retry-After
+POOL_CONNECTIONS = 10  # Number of hosts kept in the pool
+POOL_MAXSIZE = 16  # Keep-alive connections kept per host
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide HTTP session with keep-alive connection pools per host.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def _record(host: str, latency: float, error: bool = False, retry: bool = False) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(
+            host, {'calls': 0, 'errors': 0, 'retries': 0, 'total_latency': 0.0, 'max_latency': 0.0})
+        stats['calls'] += 1
+        stats['total_latency'] += latency
+        stats['max_latency'] = max(stats['max_latency'], latency)
+        if error:
+            stats['errors'] += 1
+        if retry:
+            stats['retries'] += 1
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Read how long the server asked us to wait, from Retry-After or GitHub's rate limit headers.
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_date = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if retry_date.tzinfo is None:
+            # HTTP dates are always GMT, "-0000" is parsed as naive
+            retry_date = retry_date.replace(tzinfo=datetime.timezone.utc)
+        return max(retry_date.timestamp() - time.time(), 0.0)
+    if response.headers.get('X-RateLimit-Remaining') == '0' and response.headers.get('X-RateLimit-Reset'):
+        try:
+            return max(float(response.headers['X-RateLimit-Reset']) - time.time(), 0.0)
+        except ValueError:
+            return None
+    return None
+
+
+def _should_retry(response: requests.Response) -> bool:
+    if response.status_code in RETRY_STATUSES:
+        return True
+    # GitHub signals primary rate limits with 403 and an exhausted quota
+    return response.status_code == 403 and response.headers.get('X-RateLimit-Remaining') == '0'
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Compute a jittered exponential backoff delay (full jitter) for a retry attempt.
+
+    Args:
+        attempt (int): The zero-based retry attempt.
+
+    Returns:
+        float: The number of seconds to wait.
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def request(method: str, url: str, timeout: Any = DEFAULT_TIMEOUT, retries: Optional[int] = None, **kwargs) -> requests.Response:
+    """
+    Send a request through the shared session with default deadlines.
+    Idempotent requests are retried with jittered exponential backoff on connection
+    errors, timeouts, 5xx and rate limiting, honouring Retry-After.
+
+    Args:
+        method (str): The HTTP method.
+        url (str): The URL to request.
+        timeout (Any, optional): The (connect, read) timeout. Defaults to DEFAULT_TIMEOUT.
+        retries (int, optional): Retries for idempotent methods. Defaults to DEFAULT_RETRIES.
+        **kwargs: Passed through to requests.Session.request.
+
+    Returns:
+        requests.Response: The final response (which may still be an error status).
+
+    Raises:
+        requests.RequestException: If the request fails after all retries.
+    """
+    method = method.upper()
+    if retries is None:
+        retries = DEFAULT_RETRIES if method in IDEMPOTENT_METHODS else 0
+    host = urlparse(url).netloc
+    session = get_session()
+
+    for attempt in range(retries + 1):
+        start = time.monotonic()
+        try:
+            response = session.request(
+                method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _record(host, time.monotonic() - start,
+                    error=True, retry=attempt > 0)
+            if attempt >= retries:
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(
+                f"{method} {url} failed ({str(e)}), retrying in {delay:.1f}s ({attempt + 1}/{retries})")
+            time.sleep(delay)
+            continue
+
+        _record(host, time.monotonic() - start,
+                error=response.status_code >= 400, retry=attempt > 0)
+        if attempt >= retries or not _should_retry(response):
+            return response
+        server_delay = _retry_after(response)
+        delay = min(server_delay, BACKOFF_MAX) if server_delay is not None else backoff_delay(
+            attempt)
+        logging.warning(
+            f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s ({attempt + 1}/{retries})")
+        response.close()
+        time.sleep(delay)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """
+    Send a GET request through the shared session. See request() for the retry policy.
+    """
+    return request('GET', url, **kwargs)
+
+
+def get_host_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Return the per-host call counters and latency totals collected so far.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Host mapped to calls, errors, retries, total_latency, max_latency and avg_latency.
+    """
+    with _stats_lock:
+        return {host: dict(stats, avg_latency=stats['total_latency'] / stats['calls'])
+                for host, stats in _stats.items()}
+
+
+def reset_host_stats() -> None:
+    """Clear the per-host counters."""
+    with _stats_lock:
+        _stats.clear()
+
+
+def log_host_stats(level: int = logging.INFO) -> None:
+    """
+    Log one line per host with call counts and latency, to see where setup time goes.
+
+    Args:
+        level (int): The logging level to use.
+    """
+    for host, stats in sorted(get_host_stats().items(), key=lambda item: -item[1]['total_latency']):
+        logging.log(level, f"HTTP {host}: {stats['calls']} calls, {stats['retries']} retries, {stats['errors']} errors, "
+                    f"{stats['total_latency']:.2f}s total, {stats['avg_latency'] * 1000:.0f}ms avg, {stats['max_latency'] * 1000:.0f}ms max")
+
+
+if __name__ == '__main__':
+    # Get the script absolute path and name
+    script_name = os.path.basename(__file__)
+
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(
+        description=f"Run the {script_name} module standalone.")
+    parser.add_argument('--url', type=str, required=True,
+                        help='The URL to fetch')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING',
+                        'ERROR', 'CRITICAL'], default='INFO', help='Set the logging level')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - [%(levelname)s] - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=getattr(logging, args.log_level.upper())
+    )
+
+    response = get(args.url)
+    print(f"{response.status_code} {len(response.content)} bytes")
+    log_host_stats()
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from colorama import Fore, Style
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.engine_driver import interpolate, load_compose_file
+from utils.loader import read_env_file
+from utils.teardown import connect_docker
+
+PULL_STATE_PATH = os.path.join(parent_dir, "config", ".image-pulls.json")
+DEFAULT_PULL_TTL = 6 * 60 * 60  # Seconds a checked image is trusted without asking the registry again
+DEFAULT_PULL_WORKERS = 4
+
+
+@dataclass
+class PullResult:
+    image: str
+    platform: Optional[str]
+    stacks: int
+    # fresh: checked within the TTL, current: the registry digest matches the local one, pulled or failed
+    status: str
+    bytes_pulled: int = 0
+    duration: float = 0.0
+    error: Optional[str] = None
+
+
+def collect_images(stacks: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, Optional[str]], int]:
+    """
+    Collect the unique image references of compose files, shared compose files are parsed once.
+
+    Args:
+        stacks (Iterable[Tuple[str, str]]): The compose file and .env file of each stack.
+
+    Returns:
+        Dict[Tuple[str, Optional[str]], int]: The number of stacks using each image and platform, in first use order.
+    """
+    images: Dict[Tuple[str, Optional[str]], int] = {}
+    cache: Dict[str, Any] = {}
+    for compose_file, env_file in stacks:
+        try:
+            services = load_compose_file(compose_file, cache).get('services') or {}
+            env = read_env_file(env_file) if os.path.isfile(env_file) else {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping images of {compose_file}: {str(e)}")
+            continue
+        env.update(os.environ)
+        seen = set()
+        for service in services.values():
+            if not service.get('image'):
+                continue
+            key = (interpolate(service['image'], env), interpolate(service.get('platform'), env) or None)
+            if key not in seen:
+                seen.add(key)
+                images[key] = images.get(key, 0) + 1
+    return images
+
+
+def _load_state(state_path: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable image pull state {state_path}: {str(e)}")
+        return {}
+
+
+def _save_state(state_path: str, state: Dict[str, Dict[str, Any]]) -> None:
+    state_dir = os.path.dirname(state_path) or '.'
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=state_dir, prefix='.image-pulls.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
+    except OSError as e:
+        logging.warning(f"Could not save image pull state to {state_path}: {str(e)}")
+
+
+def _local_image(client: Any, image: str) -> Optional[Dict[str, Any]]:
+    try:
+        return client.api.inspect_image(image)
+    except Exception as e:
+        if getattr(e, 'status_code', None) == 404:
+            return None
+        raise
+
+
+def _remote_digest(client: Any, image: str) -> Optional[str]:
+    try:
+        return client.api.inspect_distribution(image)['Descriptor']['digest']
+    except Exception as e:
+        logging.debug(f"Registry digest of {image} unavailable: {str(e)}")
+        return None
+
+
+def pull_image(client: Any, image: str, platform: Optional[str] = None) -> int:
+    """
+    Pull an image and count the bytes downloaded, layers already present count as zero.
+
+    Args:
+        client (Any): A docker client, see teardown.connect_docker.
+        image (str): The image reference.
+        platform (Optional[str]): The platform to pull, e.g. linux/arm64.
+
+    Returns:
+        int: The compressed size of the downloaded layers.
+
+    Raises:
+        RuntimeError: If the engine reports an error while pulling.
+    """
+    layer_sizes: Dict[str, int] = {}
+    for event in client.api.pull(image, platform=platform, stream=True, decode=True):
+        if 'error' in event:
+            raise RuntimeError(event['error'])
+        progress = event.get('progressDetail') or {}
+        if event.get('status') == 'Downloading' and progress.get('total'):
+            layer_sizes[event.get('id', '')] = progress['total']
+    return sum(layer_sizes.values())
+
+
+def prepull_images(client: Any, images: Dict[Tuple[str, Optional[str]], int], workers: int = DEFAULT_PULL_WORKERS,
+                   ttl: int = DEFAULT_PULL_TTL, state_path: str = PULL_STATE_PATH) -> List[PullResult]:
+    """
+    Make sure every image is present and up to date, pulling each unique image once and several at a time.
+    An image checked within the TTL is trusted as is. An older one is only pulled when the registry
+    digest differs from the local one.
+
+    Args:
+        client (Any): A docker client, see teardown.connect_docker.
+        images (Dict[Tuple[str, Optional[str]], int]): The images and platforms with their number of stacks, see collect_images.
+        workers (int): The maximum number of simultaneous pulls.
+        ttl (int): Seconds a checked image is trusted without asking the registry.
+        state_path (str): The file the check times and digests are kept in.
+
+    Returns:
+        List[PullResult]: One result per image, in the given order.
+    """
+    state = _load_state(state_path)
+    now = time.time()
+
+    def prepare(image: str, platform: Optional[str], stacks: int) -> PullResult:
+        start = time.perf_counter()
+        key = f"{image}|{platform or ''}"
+        try:
+            local = _local_image(client, image)
+            entry = state.get(key) or {}
+            if local and entry.get('id') == local['Id'] and now - entry.get('checked_at', 0) < ttl:
+                return PullResult(image, platform, stacks, 'fresh')
+            if local:
+                digest = _remote_digest(client, image)
+                local_digests = {repo_digest.partition('@')[2] for repo_digest in local.get('RepoDigests') or []}
+                if digest and digest in local_digests:
+                    state[key] = {'id': local['Id'], 'digest': digest, 'checked_at': now}
+                    return PullResult(image, platform, stacks, 'current', duration=time.perf_counter() - start)
+            bytes_pulled = pull_image(client, image, platform)
+            local = _local_image(client, image) or {}
+            repo_digests = local.get('RepoDigests') or []
+            state[key] = {'id': local.get('Id'), 'checked_at': now,
+                          'digest': repo_digests[0].partition('@')[2] if repo_digests else None}
+            logging.info(f"Pulled {image} ({bytes_pulled} bytes) for {stacks} stacks")
+            return PullResult(image, platform, stacks, 'pulled', bytes_pulled, time.perf_counter() - start)
+        except Exception as e:
+            logging.error(f"Failed to pull {image}: {str(e)}")
+            return PullResult(image, platform, stacks, 'failed', duration=time.perf_counter() - start, error=str(e))
+
+    if not images:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(images)))) as executor:
+        results = list(executor.map(lambda item: prepare(item[0][0], item[0][1], item[1]), images.items()))
+    _save_state(state_path, state)
+    return results
+
+
+def format_bytes(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+
+def print_prepull_summary(results: List[PullResult], elapsed: float) -> None:
+    """
+    Print the totals of a pre-pull and the images that could not be pulled.
+    """
+    pulled = [result for result in results if result.status == 'pulled']
+    failed = [result for result in results if result.status == 'failed']
+    skipped = len(results) - len(pulled) - len(failed)
+    stacks = sum(result.stacks for result in results)
+    print(f"{Fore.GREEN}{len(results)} unique images used {stacks} times across the stacks: {len(pulled)} pulled "
+          f"({format_bytes(sum(result.bytes_pulled for result in pulled))}), {skipped} already up to date, "
+          f"in {elapsed:.1f}s.{Style.RESET_ALL}")
+    for result in failed:
+        print(f"{Fore.RED}Failed to pull {result.image}: {result.error}{Style.RESET_ALL}")
+
+
+def prepull_stacks(stacks: Iterable[Tuple[str, str]], client: Optional[Any] = None, workers: int = DEFAULT_PULL_WORKERS,
+                   ttl: int = DEFAULT_PULL_TTL, state_path: str = PULL_STATE_PATH) -> Optional[List[PullResult]]:
+    """
+    Pre-pull the images of all stacks once before they are started, so compose finds them locally.
+
+    Args:
+        stacks (Iterable[Tuple[str, str]]): The compose file and .env file of each stack.
+        client (Optional[Any]): A docker client, one is created when not given.
+        workers (int): The maximum number of simultaneous pulls.
+        ttl (int): Seconds a checked image is trusted without asking the registry.
+        state_path (str): The file the check times and digests are kept in.
+
+    Returns:
+        Optional[List[PullResult]]: One result per unique image, None if the engine API is not available.
+    """
+    client = client or connect_docker(workers)
+    if client is None:
+        return None
+    images = collect_images(stacks)
+    print(f"{Fore.YELLOW}Checking {len(images)} unique images...{Style.RESET_ALL}")
+    start = time.perf_counter()
+    results = prepull_images(client, images, workers, ttl, state_path)
+    print_prepull_summary(results, time.perf_counter() - start)
+    return results
+
+
+if __name__ == '__main__':
+    script_name = os.path.basename(__file__)
+
+    parser = argparse.ArgumentParser(
+        description='Pull the images of the main stack and all multi-proxy instances once each.')
+    parser.add_argument('--compose-file', default='./docker-compose.yaml',
+                        help='The compose file of the main stack')
+    parser.add_argument('--env-file', default='./.env',
+                        help='The .env file of the main stack')
+    parser.add_argument('--instances-dir', default='m4b_proxy_instances',
+                        help='The directory containing the proxy instances')
+    parser.add_argument('--workers', type=int, default=DEFAULT_PULL_WORKERS,
+                        help='Maximum number of simultaneous pulls')
+    parser.add_argument('--ttl', type=int, default=DEFAULT_PULL_TTL,
+                        help='Seconds a checked image is trusted without asking the registry, 0 to always check')
+    parser.add_argument('--log-dir', default=os.path.join(script_dir,
+                        'logs'), help='Set the logging directory')
+    parser.add_argument(
+        '--log-file', default=f"{script_name}.log", help='Set the logging file name')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING',
+                        'ERROR', 'CRITICAL'], default='INFO', help='Set the logging level')
+    args = parser.parse_args()
+
+    # Set logging level based on command-line arguments
+    log_level = getattr(logging, args.log_level.upper(), None)
+    if not isinstance(log_level, int):
+        raise ValueError(f'Invalid log level: {args.log_level}')
+
+    # Start logging
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(args.log_dir, args.log_file),
+        format='%(asctime)s - [%(levelname)s] - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=log_level
+    )
+
+    logging.info(f"Starting {script_name} script...")
+
+    try:
+        stacks = [(args.compose_file, args.env_file)] if os.path.isfile(args.compose_file) else []
+        if os.path.isdir(args.instances_dir):
+            for instance in sorted(os.listdir(args.instances_dir)):
+                compose_file = os.path.join(args.instances_dir, instance, 'docker-compose.yaml')
+                if os.path.isfile(compose_file):
+                    stacks.append((compose_file, os.path.join(args.instances_dir, instance, '.env')))
+        results = prepull_stacks(stacks, workers=args.workers, ttl=args.ttl)
+        if results is None:
+            print(f"{Fore.RED}The Docker engine is not reachable.{Style.RESET_ALL}")
+            sys.exit(1)
+        logging.info(f"{script_name} script completed successfully")
+        sys.exit(1 if any(result.status == 'failed' for result in results) else 0)
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {str(e)}")
+        raise
@@ -3,15 +3,107 @@ import argparse
 import logging
 import json
 import importlib.util
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
 
-def load_json_config(config_path_or_dict: Any) -> Dict[str, Any]:
+class ReadOnlyDict(dict):
+    """
+    A dict that refuses modification, returned by load_json_config(readonly=True).
+    Copies (copy.copy, copy.deepcopy) are plain mutable dicts.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError(
+            "Config loaded read-only, use load_json_config(path) for a mutable copy")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce__(self):
+        return (ReadOnlyDict, (dict(self),))
+
+
+class ReadOnlyList(list):
+    """
+    A list that refuses modification, used for the lists inside a ReadOnlyDict.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError(
+            "Config loaded read-only, use load_json_config(path) for a mutable copy")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce__(self):
+        return (ReadOnlyList, (list(self),))
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return ReadOnlyDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return ReadOnlyList(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    # JSON only nests dicts and lists, so this is a much cheaper deep copy than copy.deepcopy
+    if isinstance(value, dict):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_thaw(item) for item in value]
+    return value
+
+
+# Parsed config files keyed by real path, with the (mtime_ns, size, inode) of the file they were parsed from
+_config_cache: Dict[str, Tuple[Tuple[int, int, int], Any]] = {}
+_config_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def invalidate_config_cache(config_path: Optional[str] = None) -> None:
+    """
+    Drop a config file, or every config file, from the load_json_config cache.
+
+    Arguments:
+    config_path -- the config file path, None to clear the whole cache
+    """
+    if config_path is None:
+        _config_cache.clear()
+    else:
+        _config_cache.pop(os.path.realpath(config_path), None)
+
+
+def get_config_cache_stats() -> Dict[str, int]:
+    """
+    Get the load_json_config cache hit and miss counters.
+
+    Returns:
+    Dict[str, int] -- The 'hits' and 'misses' counts and the number of cached 'files'.
+    """
+    return {**_config_cache_stats, 'files': len(_config_cache)}
+
+
+def load_json_config(config_path_or_dict: Any, readonly: bool = False) -> Dict[str, Any]:
     """
     Load JSON config variables from a file or dictionary.
+    Files are parsed once and served from a cache until their modification time, size or inode changes.
 
     Arguments:
     config_path_or_dict -- the config file path or dictionary
+    readonly -- return the shared cached config, which raises TypeError on modification, instead of a private mutable copy
 
     Returns:
     Dict[str, Any] -- The loaded configuration dictionary.
@@ -24,10 +116,31 @@ def load_json_config(config_path_or_dict: Any) -> Dict[str, Any]:
     if isinstance(config_path_or_dict, str):
         # If config is a string, assume it's a file path and load the JSON file
         try:
-            with open(config_path_or_dict, 'r') as f:
+            try:
+                real_path = os.path.realpath(config_path_or_dict)
+                stat = os.stat(real_path)
+            except OSError:
+                # Let open() report missing or unreadable files
+                with open(config_path_or_dict, 'r') as f:
+                    return json.load(f)
+
+            signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            cached = _config_cache.get(real_path)
+            if cached is not None and cached[0] == signature:
+                _config_cache_stats['hits'] += 1
+                config = cached[1]
+                logging.debug(
+                    f"Config cache hit for {config_path_or_dict} (hits: {_config_cache_stats['hits']}, misses: {_config_cache_stats['misses']})")
+            else:
+                with open(config_path_or_dict, 'r') as f:
+                    logging.debug(
+                        f"Loading config from file: {config_path_or_dict}")
+                    config = _freeze(json.load(f))
+                _config_cache[real_path] = (signature, config)
+                _config_cache_stats['misses'] += 1
                 logging.debug(
-                    f"Loading config from file: {config_path_or_dict}")
-                return json.load(f)
+                    f"Config cache miss for {config_path_or_dict} (hits: {_config_cache_stats['hits']}, misses: {_config_cache_stats['misses']})")
+            return config if readonly else _thaw(config)
         except FileNotFoundError:
             logging.error(f"Config file {config_path_or_dict} not found.")
             raise
@@ -47,6 +160,121 @@ def load_json_config(config_path_or_dict: Any) -> Dict[str, Any]:
             "Invalid config type. Config must be a file path or a dictionary.")
 
 
+def merge_config(base: Dict[str, Any], overlay: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply an overlay to a configuration dictionary without modifying either.
+    Nested dictionaries are merged, a None value removes the key and any other value replaces it.
+    Branches the overlay does not touch are shared with the base.
+
+    Arguments:
+    base -- the base configuration
+    overlay -- the overrides to apply
+
+    Returns:
+    Dict[str, Any] -- The merged configuration.
+    """
+    merged = dict(base)
+    for key, value in overlay.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+# Multiproxy instances store only their overrides, resolved against one shared base snapshot
+INSTANCE_BASE_DIR = '.base'
+INSTANCE_OVERLAY_FILE = 'instance-config.json'
+INSTANCE_CONFIG_FILES = {'m4b_config': 'm4b-config.json',
+                         'app_config': 'app-config.json',
+                         'user_config': 'user-config.json'}
+
+
+def load_instance_overlay(instance_dir: str) -> Dict[str, Any]:
+    """
+    Load the overrides of a multiproxy instance.
+
+    Arguments:
+    instance_dir -- the instance directory
+
+    Returns:
+    Dict[str, Any] -- The 'm4b_config', 'app_config' and 'user_config' overrides.
+
+    Raises:
+    FileNotFoundError -- If the instance has no overlay file.
+    """
+    overlay = load_json_config(os.path.join(
+        instance_dir, INSTANCE_OVERLAY_FILE))
+    return overlay.get('overrides', {})
+
+
+def load_instance_configs(instance_dir: str) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """
+    Load the m4b, app and user configs of a multiproxy instance.
+    Instances with an overlay file are resolved against the base snapshot in their parent directory,
+    instances created before overlays existed are read from their full config copies.
+
+    Arguments:
+    instance_dir -- the instance directory
+
+    Returns:
+    Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]] -- The m4b, app and user configurations.
+
+    Raises:
+    FileNotFoundError -- If the instance or its base configs are missing.
+    """
+    if os.path.isfile(os.path.join(instance_dir, INSTANCE_OVERLAY_FILE)):
+        overrides = load_instance_overlay(instance_dir)
+        base_dir = os.path.join(os.path.dirname(
+            os.path.abspath(instance_dir)), INSTANCE_BASE_DIR)
+        return tuple(merge_config(load_json_config(os.path.join(base_dir, filename)), overrides.get(key, {}))
+                     for key, filename in INSTANCE_CONFIG_FILES.items())
+    return tuple(load_json_config(os.path.join(instance_dir, filename))
+                 for filename in INSTANCE_CONFIG_FILES.values())
+
+
+def parse_env_text(text: str) -> Dict[str, str]:
+    """
+    Parse the KEY=value lines of a .env file, the last value of a repeated key wins.
+
+    Args:
+        text (str): The content of the .env file.
+
+    Returns:
+        Dict[str, str]: The variables, quotes around values removed.
+    """
+    env = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, _, value = line.partition('=')
+        key = key.strip()
+        if key.startswith('export '):
+            key = key[len('export '):].strip()
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+            value = value[1:-1]
+        env[key] = value
+    return env
+
+
+def read_env_file(env_file: str) -> Dict[str, str]:
+    """
+    Read the KEY=value lines of a .env file.
+
+    Args:
+        env_file (str): The path to the .env file.
+
+    Returns:
+        Dict[str, str]: The variables, quotes around values removed.
+    """
+    with open(env_file, 'r') as f:
+        return parse_env_text(f.read())
+
+
 def load_module_from_file(module_name: str, file_path: str):
     """
     Dynamically load a module from a Python file.
@@ -1,4 +1,23 @@
+import os
+import re
+import json
 import socket
+import logging
+import bisect
+import ipaddress
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import psutil
+
+from utils.dumper import write_json
+
+PROC_NET_DIR = '/proc/net'
+PORT_RESERVATIONS_FILE = '.port-reservations.json'
+SUBNET_ASSIGNMENTS_FILE = '.subnet-assignments.json'
+# Matches the port variables generate_env_file writes, e.g. EARNAPP_PORT=50010, MYSTNODE_PORT_2=4449, M4B_DASHBOARD_PORT=8081
+ENV_PORT_PATTERN = re.compile(r'^[A-Z0-9_]*PORT(?:_\d+)?=(\d+)\s*$')
+TCP_LISTEN_STATE = '0A'
+MAX_PORT = 65535
 
 
 def is_port_in_use(port):
@@ -13,3 +32,467 @@ def find_next_available_port(starting_port):
     while is_port_in_use(port):
         port += 1
     return port
+
+
+def read_proc_net_ports(proc_net_dir: str = PROC_NET_DIR) -> Optional[Set[int]]:
+    """
+    Read the ports bound on any address from the kernel socket tables.
+    TCP sockets count when listening, UDP sockets always.
+
+    Args:
+        proc_net_dir (str): The directory holding the tcp, tcp6, udp and udp6 tables.
+
+    Returns:
+        Optional[Set[int]]: The bound ports, None if the tables are not available (non-Linux hosts).
+    """
+    ports = set()
+    found = False
+    for table in ('tcp', 'tcp6', 'udp', 'udp6'):
+        try:
+            with open(os.path.join(proc_net_dir, table), 'r') as f:
+                next(f, None)  # Header line
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 4:
+                        continue
+                    if table.startswith('tcp') and fields[3] != TCP_LISTEN_STATE:
+                        continue
+                    ports.add(int(fields[1].rsplit(':', 1)[1], 16))
+            found = True
+        except OSError:
+            continue
+    return ports if found else None
+
+
+def read_psutil_ports() -> Optional[Set[int]]:
+    """
+    Read the bound ports through psutil, for hosts without /proc/net.
+
+    Returns:
+        Optional[Set[int]]: The bound ports, None if psutil is not allowed to list connections.
+    """
+    try:
+        connections = psutil.net_connections(kind='inet')
+    except (psutil.AccessDenied, psutil.Error, OSError) as e:
+        logging.warning(f"Could not list sockets with psutil: {str(e)}")
+        return None
+    return {conn.laddr.port for conn in connections
+            if conn.laddr and (conn.type == socket.SOCK_DGRAM or conn.status == psutil.CONN_LISTEN)}
+
+
+def read_env_ports(env_files: Iterable[str]) -> Set[int]:
+    """
+    Collect the host ports already assigned in generated .env files.
+
+    Args:
+        env_files (Iterable[str]): The .env files to read, missing ones are skipped.
+
+    Returns:
+        Set[int]: The assigned ports.
+    """
+    ports = set()
+    for env_file in env_files:
+        try:
+            with open(env_file, 'r') as f:
+                for line in f:
+                    match = ENV_PORT_PATTERN.match(line)
+                    if match:
+                        ports.add(int(match.group(1)))
+        except OSError:
+            continue
+    return ports
+
+
+class PortAllocator:
+    """
+    Hand out host ports that are free on this host, not used by any generated instance and not handed out before.
+
+    The bound sockets and the existing .env files are read once when the allocator is created,
+    every later allocation is a lookup in a 64K port map. Reservations are persisted per owner
+    so instances generated in different runs never share a port.
+    """
+
+    def __init__(self, reservations_path: Optional[str] = None, instances_dir: Optional[str] = None,
+                 env_files: Iterable[str] = (), proc_net_dir: str = PROC_NET_DIR):
+        """
+        Args:
+            reservations_path (str, optional): JSON file persisting the reservations. Defaults to None (not persisted).
+            instances_dir (str, optional): Directory of instance directories whose .env ports are taken. Defaults to None.
+            env_files (Iterable[str]): Further .env files whose ports are taken, such as the main instance one.
+            proc_net_dir (str): The directory holding the kernel socket tables.
+        """
+        self.reservations_path = reservations_path
+        self.reservations: Dict[str, List[int]] = {}
+        # One byte per port, non-zero means taken, so searching for free ports runs in C via bytearray.find
+        self._ports = bytearray(MAX_PORT + 1)
+        self._ports[0] = 1
+
+        bound_ports = read_proc_net_ports(proc_net_dir)
+        if bound_ports is None:
+            bound_ports = read_psutil_ports()
+        # Without a socket table, fall back to probing every candidate as find_next_available_port did
+        self._probe = bound_ports is None
+        if self._probe:
+            logging.warning(
+                "No socket table available, probing each port before handing it out")
+
+        env_files = list(env_files)
+        if instances_dir and os.path.isdir(instances_dir):
+            env_files.extend(os.path.join(instances_dir, name, '.env')
+                             for name in os.listdir(instances_dir))
+
+        if reservations_path:
+            try:
+                with open(reservations_path, 'r') as f:
+                    self.reservations = {owner: list(ports)
+                                         for owner, ports in json.load(f).items()}
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logging.warning(
+                    f"Ignoring unreadable port reservations {reservations_path}: {str(e)}")
+
+        taken = set(bound_ports or ()) | read_env_ports(env_files)
+        self._owners: Dict[int, str] = {}
+        for owner, ports in self.reservations.items():
+            taken.update(ports)
+            self._owners.update(dict.fromkeys(ports, owner))
+        for port in taken:
+            if 0 < port <= MAX_PORT:
+                self._ports[port] = 1
+        logging.info(
+            f"Port allocator initialised with {len(taken)} taken ports")
+
+    def is_taken(self, port: int) -> bool:
+        """Check whether a port is bound, assigned or reserved."""
+        return bool(self._ports[port])
+
+    def allocate(self, preferred_port: int, owner: str) -> int:
+        """
+        Reserve the preferred port, or the next free one above it.
+
+        Args:
+            preferred_port (int): The port to start from.
+            owner (str): Who the port is reserved for, usually the instance project name.
+
+        Returns:
+            int: The reserved port.
+
+        Raises:
+            RuntimeError: If no port is free at or above the preferred one.
+        """
+        return self.allocate_range(preferred_port, 1, owner)[0]
+
+    def allocate_range(self, preferred_port: int, count: int, owner: str) -> List[int]:
+        """
+        Reserve a block of consecutive free ports starting at the preferred port or the next free block above it.
+
+        Args:
+            preferred_port (int): The first port to consider.
+            count (int): The number of consecutive ports.
+            owner (str): Who the ports are reserved for, usually the instance project name.
+
+        Returns:
+            List[int]: The reserved ports.
+
+        Raises:
+            RuntimeError: If no block is free at or above the preferred port.
+        """
+        free_block = bytes(count)
+        start = preferred_port
+        while True:
+            start = self._ports.find(free_block, start)
+            if start == -1:
+                raise RuntimeError(
+                    f"No block of {count} free ports at or above {preferred_port}")
+            block = range(start, start + count)
+            if self._probe:
+                busy = [port for port in block if is_port_in_use(port)]
+                if busy:
+                    for port in busy:
+                        self._ports[port] = 1
+                    start = busy[-1] + 1
+                    continue
+            break
+
+        for port in block:
+            self._ports[port] = 1
+            self._owners[port] = owner
+        self.reservations.setdefault(owner, []).extend(block)
+        return list(block)
+
+    def claim(self, ports: Iterable[int], owner: str) -> bool:
+        """
+        Reserve ports an owner already uses, such as the ports of a kept instance.
+        They are claimed even when bound, since the owner's own containers may be holding them,
+        but none are claimed if any is reserved for another owner.
+
+        Args:
+            ports (Iterable[int]): The ports to claim.
+            owner (str): Who the ports are reserved for, usually the instance project name.
+
+        Returns:
+            bool: True if all the ports were claimed.
+        """
+        ports = list(ports)
+        if any(not 0 < port <= MAX_PORT or self._owners.get(port, owner) != owner for port in ports):
+            return False
+        for port in ports:
+            self._ports[port] = 1
+            if port not in self._owners:
+                self._owners[port] = owner
+                self.reservations.setdefault(owner, []).append(port)
+        return True
+
+    def release(self, owner: str) -> List[int]:
+        """
+        Release every port reserved for an owner.
+
+        Args:
+            owner (str): The owner whose reservations are dropped.
+
+        Returns:
+            List[int]: The released ports.
+        """
+        ports = self.reservations.pop(owner, [])
+        for port in ports:
+            self._ports[port] = 0
+            self._owners.pop(port, None)
+        return ports
+
+    def save(self) -> None:
+        """Persist the reservations, if the allocator has a reservations file."""
+        if self.reservations_path:
+            write_json(self.reservations, self.reservations_path)
+
+
+def read_docker_subnets() -> Optional[List[ipaddress.IPv4Network]]:
+    """
+    List the IPv4 subnets of every Docker network with one Engine API call.
+
+    Returns:
+        Optional[List[ipaddress.IPv4Network]]: The subnets, None if Docker is unavailable.
+    """
+    try:
+        import docker
+        client = docker.from_env(timeout=5)
+        subnets = []
+        for network in client.api.networks():
+            for ipam_config in (network.get('IPAM') or {}).get('Config') or []:
+                subnet = ipam_config.get('Subnet')
+                if subnet:
+                    parsed = ipaddress.ip_network(subnet, strict=False)
+                    if parsed.version == 4:
+                        subnets.append(parsed)
+        return subnets
+    except Exception as e:
+        logging.warning(f"Could not list Docker networks: {str(e)}")
+        return None
+
+
+def read_env_subnets(env_files: Iterable[str]) -> List[ipaddress.IPv4Network]:
+    """
+    Collect the instance subnets written in generated .env files.
+
+    Args:
+        env_files (Iterable[str]): The .env files to read, missing ones are skipped.
+
+    Returns:
+        List[ipaddress.IPv4Network]: The subnets.
+    """
+    subnets = []
+    for env_file in env_files:
+        values = {}
+        try:
+            with open(env_file, 'r') as f:
+                for line in f:
+                    key, _, value = line.strip().partition('=')
+                    if key in ('NETWORK_SUBNET', 'NETWORK_NETMASK'):
+                        values[key] = value
+        except OSError:
+            continue
+        if 'NETWORK_SUBNET' in values and 'NETWORK_NETMASK' in values:
+            try:
+                subnets.append(ipaddress.ip_network(
+                    f"{values['NETWORK_SUBNET']}/{values['NETWORK_NETMASK']}", strict=False))
+            except ValueError:
+                logging.warning(f"Ignoring invalid subnet in {env_file}")
+    return subnets
+
+
+def instance_subnet_pool(network_config: Dict[str, Any]) -> Tuple[str, int]:
+    """
+    Get the pool instance subnets come from and their prefix length.
+    Instance subnets have the size of the main one, the pool is the /16 around it unless instance_pool is set.
+
+    Args:
+        network_config (Dict[str, Any]): The network section of the m4b config.
+
+    Returns:
+        Tuple[str, int]: The pool and the prefix length of each instance subnet.
+    """
+    base_network = ipaddress.ip_network(
+        f"{network_config['subnet']}/{network_config['netmask']}", strict=False)
+    instance_pool = network_config.get(
+        'instance_pool', str(base_network.supernet(new_prefix=min(16, base_network.prefixlen))))
+    return instance_pool, base_network.prefixlen
+
+
+class SubnetAllocator:
+    """
+    Hand out instance subnets from a pool that do not overlap any Docker network, any generated instance or any earlier assignment.
+
+    The taken address ranges are kept as sorted, merged intervals so checking a candidate block is a bisect.
+    Assignments are persisted per owner so reruns and kept instances never collide.
+    """
+
+    def __init__(self, pool: str, prefixlen: int, assignments_path: Optional[str] = None,
+                 instances_dir: Optional[str] = None, env_files: Iterable[str] = (), use_docker: bool = True):
+        """
+        Args:
+            pool (str): The address pool instance subnets are carved from, e.g. '172.19.0.0/16'.
+            prefixlen (int): The prefix length of each instance subnet.
+            assignments_path (str, optional): JSON file persisting the assignments. Defaults to None (not persisted).
+            instances_dir (str, optional): Directory of instance directories whose .env subnets are taken. Defaults to None.
+            env_files (Iterable[str]): Further .env files whose subnets are taken, such as the main instance one.
+            use_docker (bool): Also take the subnets of existing Docker networks. Defaults to True.
+
+        Raises:
+            ValueError: If the pool is smaller than one instance subnet.
+        """
+        self.pool = ipaddress.ip_network(pool, strict=False)
+        self.prefixlen = int(prefixlen)
+        if self.prefixlen < self.pool.prefixlen:
+            raise ValueError(
+                f"Subnet prefix /{self.prefixlen} does not fit in pool {self.pool}")
+        self.block_size = 2 ** (32 - self.prefixlen)
+        self.assignments_path = assignments_path
+        self.assignments: Dict[str, str] = {}
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._cursor = int(self.pool.network_address)
+
+        if assignments_path:
+            try:
+                with open(assignments_path, 'r') as f:
+                    self.assignments = dict(json.load(f))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logging.warning(
+                    f"Ignoring unreadable subnet assignments {assignments_path}: {str(e)}")
+
+        env_files = list(env_files)
+        if instances_dir and os.path.isdir(instances_dir):
+            env_files.extend(os.path.join(instances_dir, name, '.env')
+                             for name in os.listdir(instances_dir))
+
+        taken = read_env_subnets(env_files)
+        taken.extend(ipaddress.ip_network(subnet)
+                     for subnet in self.assignments.values())
+        if use_docker:
+            taken.extend(read_docker_subnets() or [])
+        for subnet in taken:
+            self._take(int(subnet.network_address),
+                       int(subnet.broadcast_address))
+        logging.info(
+            f"Subnet allocator initialised with {len(taken)} taken subnets in {len(self._starts)} ranges")
+
+    def _take(self, start: int, end: int) -> None:
+        # Merge with every overlapping or adjacent range so the ranges stay disjoint and sorted
+        low = bisect.bisect_left(self._ends, start - 1)
+        high = bisect.bisect_right(self._starts, end + 1)
+        if low < high:
+            start = min(start, self._starts[low])
+            end = max(end, self._ends[high - 1])
+        self._starts[low:high] = [start]
+        self._ends[low:high] = [end]
+
+    def _overlap_end(self, start: int, end: int) -> Optional[int]:
+        index = bisect.bisect_right(self._starts, end) - 1
+        if index >= 0 and self._ends[index] >= start:
+            return self._ends[index]
+        return None
+
+    def is_taken(self, subnet: str) -> bool:
+        """Check whether a subnet overlaps a taken range."""
+        network = ipaddress.ip_network(subnet, strict=False)
+        return self._overlap_end(int(network.network_address), int(network.broadcast_address)) is not None
+
+    def allocate(self, owner: str) -> ipaddress.IPv4Network:
+        """
+        Assign the next free subnet of the pool to an owner, or return the one it already has.
+
+        Args:
+            owner (str): Who the subnet is assigned to, usually the instance project name.
+
+        Returns:
+            ipaddress.IPv4Network: The assigned subnet.
+
+        Raises:
+            RuntimeError: If the pool is exhausted.
+        """
+        if owner in self.assignments:
+            return ipaddress.ip_network(self.assignments[owner])
+
+        pool_end = int(self.pool.broadcast_address)
+        candidate = self._cursor
+        while candidate + self.block_size - 1 <= pool_end:
+            overlap_end = self._overlap_end(
+                candidate, candidate + self.block_size - 1)
+            if overlap_end is None:
+                break
+            # Jump past the taken range to the next aligned block
+            candidate = (overlap_end // self.block_size + 1) * self.block_size
+        else:
+            raise RuntimeError(
+                f"No free /{self.prefixlen} subnet left in {self.pool}")
+
+        self._take(candidate, candidate + self.block_size - 1)
+        self._cursor = candidate + self.block_size
+        subnet = ipaddress.ip_network(f"{ipaddress.ip_address(candidate)}/{self.prefixlen}")
+        self.assignments[owner] = str(subnet)
+        return subnet
+
+    def assign(self, owner: str, subnet: str) -> ipaddress.IPv4Network:
+        """
+        Record a subnet an owner already uses, such as the subnet of a kept instance created before assignments were persisted.
+
+        Args:
+            owner (str): Who the subnet is assigned to, usually the instance project name.
+            subnet (str): The subnet, with or without prefix length, the allocator prefix length is used when missing.
+
+        Returns:
+            ipaddress.IPv4Network: The assigned subnet.
+
+        Raises:
+            ValueError: If the subnet is assigned to another owner.
+        """
+        network = ipaddress.ip_network(
+            subnet if '/' in subnet else f"{subnet}/{self.prefixlen}", strict=False)
+        for other, assigned in self.assignments.items():
+            if other != owner and ipaddress.ip_network(assigned).overlaps(network):
+                raise ValueError(
+                    f"Subnet {network} is already assigned to {other}")
+        self._take(int(network.network_address),
+                   int(network.broadcast_address))
+        self.assignments[owner] = str(network)
+        return network
+
+    def release(self, owner: str) -> Optional[str]:
+        """
+        Drop the assignment of an owner so it is not persisted anymore.
+        The range stays taken until the allocator is recreated, as its network may still exist.
+
+        Args:
+            owner (str): The owner whose assignment is dropped.
+
+        Returns:
+            Optional[str]: The released subnet.
+        """
+        return self.assignments.pop(owner, None)
+
+    def save(self) -> None:
+        """Persist the assignments, if the allocator has an assignments file."""
+        if self.assignments_path:
+            write_json(self.assignments, self.assignments_path)
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import logging
+from typing import Optional
+
+# Set to any non-empty value to disable pauses, e.g. when run from cron, systemd or CI
+NON_INTERACTIVE_ENV = 'M4B_NON_INTERACTIVE'
+
+_interactive: Optional[bool] = None
+
+
+def set_interactive(interactive: Optional[bool]) -> None:
+    """
+    Force interactive pacing on or off, None to detect it from the terminal again.
+
+    Args:
+        interactive (Optional[bool]): Whether pauses should happen.
+    """
+    global _interactive
+    _interactive = interactive
+
+
+def is_interactive() -> bool:
+    """
+    Check whether a person is watching the output.
+
+    Returns:
+        bool: False if disabled through set_interactive or M4B_NON_INTERACTIVE, or stdin and stdout are not terminals.
+    """
+    if _interactive is not None:
+        return _interactive
+    if os.environ.get(NON_INTERACTIVE_ENV):
+        return False
+    try:
+        return sys.stdin.isatty() and sys.stdout.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def pause(seconds: float) -> None:
+    """
+    Give the user time to read a message before the menu clears the screen.
+    This is presentation only, nothing may depend on it for readiness, and it returns immediately in non-interactive runs.
+
+    Args:
+        seconds (float): How long to pause, usually the sleep_time of m4b-config.
+    """
+    if seconds > 0 and is_interactive():
+        time.sleep(seconds)
+    else:
+        logging.debug(f"Skipping {seconds}s pause in non-interactive run")
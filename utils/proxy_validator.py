@@ -0,0 +1,339 @@
+import os
+import ssl
+import sys
+import time
+import base64
+import asyncio
+import argparse
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.dumper import write_json
+from utils.proxy_parser import ProxyEntry, ProxyParseStats, iter_proxy_file, parse_proxy_line
+
+
+DEFAULT_CHECK_TARGET = ('www.google.com', 443)
+DEFAULT_CONCURRENCY = 100
+DEFAULT_TIMEOUT = 5.0
+PROXY_REPORT_FILE = '.proxy-report.json'
+
+# Handshakes tried in order for each declared protocol, the second one detects mislabelled proxies
+_CANDIDATE_PROTOCOLS = {
+    'http': ('http', 'socks5'),
+    'https': ('http',),
+    'socks5': ('socks5', 'http'),
+    'socks5h': ('socks5', 'http'),
+    'socks4': ('tcp',),
+    'socks4a': ('tcp',),
+}
+# Scheme written back for a detected protocol, keeping the declared variant when it matches
+_DETECTED_SCHEMES = {
+    ('socks5', 'socks5h'): 'socks5h',
+    ('http', 'https'): 'https',
+}
+
+
+class ProxyCheckError(Exception):
+    """The proxy answered but cannot be used."""
+
+
+class ProtocolMismatch(ProxyCheckError):
+    """The proxy does not speak the protocol that was tried."""
+
+
+@dataclass
+class ProxyCheckResult:
+    url: str
+    ok: bool
+    protocol: Optional[str] = None
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_report(self) -> Dict[str, Any]:
+        """
+        The result as written to the JSON report, with the proxy password masked.
+        """
+        try:
+            proxy = parse_proxy_line(self.url)
+        except ValueError:
+            proxy = None
+        if proxy is not None and proxy.password:
+            masked = proxy._replace(password='').url.replace(':@', ':***@', 1)
+        else:
+            masked = self.url
+        return {'proxy': masked, 'ok': self.ok, 'protocol': self.protocol,
+                'latency_ms': self.latency_ms, 'error': self.error}
+
+
+async def _socks5_handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                            proxy: ProxyEntry, target: Tuple[str, int]) -> None:
+    methods = b'\x00\x02' if proxy.username or proxy.password else b'\x00'
+    writer.write(bytes([5, len(methods)]) + methods)
+    await writer.drain()
+    reply = await reader.readexactly(2)
+    if reply[0] != 5:
+        raise ProtocolMismatch("Not a SOCKS5 proxy")
+    if reply[1] == 2:
+        username, password = proxy.username.encode(), proxy.password.encode()
+        writer.write(bytes([1, len(username)]) + username +
+                     bytes([len(password)]) + password)
+        await writer.drain()
+        status = await reader.readexactly(2)
+        if status[1] != 0:
+            raise ProxyCheckError("Authentication failed")
+    elif reply[1] != 0:
+        raise ProxyCheckError("No acceptable SOCKS5 authentication method")
+    host = target[0].encode('idna')
+    writer.write(b'\x05\x01\x00\x03' + bytes([len(host)]) +
+                 host + target[1].to_bytes(2, 'big'))
+    await writer.drain()
+    response = await reader.readexactly(2)
+    if response[1] != 0:
+        raise ProxyCheckError(
+            f"Connection to {target[0]}:{target[1]} refused by the proxy (SOCKS5 reply {response[1]})")
+
+
+async def _http_handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                          proxy: ProxyEntry, target: Tuple[str, int]) -> None:
+    authority = f"{target[0]}:{target[1]}"
+    request = f"CONNECT {authority} HTTP/1.1\r\nHost: {authority}\r\n"
+    if proxy.username or proxy.password:
+        credentials = base64.b64encode(
+            f"{proxy.username}:{proxy.password}".encode()).decode()
+        request += f"Proxy-Authorization: Basic {credentials}\r\n"
+    writer.write(f"{request}\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    fields = status_line.split()
+    if len(fields) < 2 or not fields[0].startswith(b'HTTP/') or not fields[1].isdigit():
+        raise ProtocolMismatch("Not an HTTP proxy")
+    status = int(fields[1])
+    if status == 407:
+        raise ProxyCheckError("Authentication failed")
+    if not 200 <= status < 300:
+        raise ProxyCheckError(
+            f"Connection to {authority} refused by the proxy (HTTP {status})")
+
+
+async def _tcp_handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         proxy: ProxyEntry, target: Tuple[str, int]) -> None:
+    # SOCKS4 proxies are only checked for reachability
+    return None
+
+
+_HANDSHAKES = {
+    'http': _http_handshake,
+    'socks5': _socks5_handshake,
+    'tcp': _tcp_handshake,
+}
+
+
+async def check_proxy(proxy: Union[str, ProxyEntry], target: Tuple[str, int] = DEFAULT_CHECK_TARGET,
+                      timeout: float = DEFAULT_TIMEOUT, max_latency_ms: Optional[float] = None) -> ProxyCheckResult:
+    """
+    Check one proxy by asking it to open a tunnel to the target.
+    The declared protocol is tried first, HTTP and SOCKS5 proxies are also tried as the other one
+    so mislabelled proxies are detected and returned with the right scheme.
+
+    Args:
+        proxy (Union[str, ProxyEntry]): The proxy URL or parsed proxy.
+        target (Tuple[str, int]): The host and port the proxy is asked to connect to.
+        timeout (float): Seconds allowed for the connection and for each handshake.
+        max_latency_ms (Optional[float]): Proxies slower than this are reported as failed.
+
+    Returns:
+        ProxyCheckResult: The outcome, with the handshake latency measured from the TCP connect.
+    """
+    if isinstance(proxy, str):
+        try:
+            proxy = parse_proxy_line(proxy)
+        except ValueError as e:
+            return ProxyCheckResult(url=proxy, ok=False, error=str(e))
+        if proxy is None:
+            return ProxyCheckResult(url='', ok=False, error="Empty proxy")
+
+    ssl_context = ssl.create_default_context() if proxy.scheme == 'https' else None
+    protocols = _CANDIDATE_PROTOCOLS[proxy.scheme]
+    for protocol in protocols:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(proxy.host, proxy.port, ssl=ssl_context), timeout)
+        except asyncio.TimeoutError:
+            return ProxyCheckResult(url=proxy.url, ok=False, error=f"Connection timed out after {timeout}s")
+        except OSError as e:
+            return ProxyCheckResult(url=proxy.url, ok=False, error=f"Connection failed: {e.strerror or e}")
+        try:
+            await asyncio.wait_for(_HANDSHAKES[protocol](reader, writer, proxy, target), timeout)
+            latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        except (ProtocolMismatch, asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError) as e:
+            # A proxy waiting for more bytes or hanging up may just speak the other protocol
+            logging.debug(
+                f"No {protocol} handshake with {proxy.host}:{proxy.port}: {e!r}")
+            continue
+        except ProxyCheckError as e:
+            return ProxyCheckResult(url=proxy.url, ok=False, protocol=protocol, error=str(e))
+        except (ValueError, OSError, UnicodeError) as e:
+            # Oversized replies, TLS errors mid-handshake and target names that cannot be encoded
+            return ProxyCheckResult(url=proxy.url, ok=False, protocol=protocol,
+                                    error=f"{protocol} handshake failed: {e!r}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+        scheme = _DETECTED_SCHEMES.get((protocol, proxy.scheme), protocol)
+        if protocol == 'tcp':
+            scheme = proxy.scheme
+        elif scheme != proxy.scheme:
+            logging.info(
+                f"Proxy {proxy.host}:{proxy.port} is declared {proxy.scheme} but speaks {protocol}")
+        url = proxy._replace(scheme=scheme).url
+        if max_latency_ms is not None and latency_ms > max_latency_ms:
+            return ProxyCheckResult(url=url, ok=False, protocol=protocol, latency_ms=latency_ms,
+                                    error=f"Too slow, {latency_ms}ms exceeds {max_latency_ms}ms")
+        return ProxyCheckResult(url=url, ok=True, protocol=protocol, latency_ms=latency_ms)
+    return ProxyCheckResult(url=proxy.url, ok=False,
+                            error=f"The proxy did not complete a {' or '.join(protocols)} handshake")
+
+
+async def validate_proxies_async(proxies: Iterable[Union[str, ProxyEntry]], target: Tuple[str, int] = DEFAULT_CHECK_TARGET,
+                                 concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT,
+                                 max_latency_ms: Optional[float] = None) -> List[ProxyCheckResult]:
+    """
+    Check many proxies concurrently with at most `concurrency` checks in flight.
+
+    Args:
+        proxies (Iterable[Union[str, ProxyEntry]]): The proxy URLs or parsed proxies.
+        target (Tuple[str, int]): The host and port each proxy is asked to connect to.
+        concurrency (int): The maximum number of simultaneous checks.
+        timeout (float): Seconds allowed for the connection and for each handshake.
+        max_latency_ms (Optional[float]): Proxies slower than this are reported as failed.
+
+    Returns:
+        List[ProxyCheckResult]: One result per proxy, in input order.
+    """
+    proxies = list(proxies)
+    results: List[Optional[ProxyCheckResult]] = [None] * len(proxies)
+    pending = iter(enumerate(proxies))
+
+    # A fixed pool of workers pulls from one iterator, so the number of pending tasks stays bounded
+    async def worker() -> None:
+        for index, proxy in pending:
+            try:
+                results[index] = await check_proxy(proxy, target, timeout, max_latency_ms)
+            except Exception as e:
+                # One misbehaving proxy must not abort the checks of all the others
+                logging.error(f"Checking proxy {index + 1} failed unexpectedly: {e!r}")
+                results[index] = ProxyCheckResult(url=getattr(proxy, 'url', proxy), ok=False,
+                                                  error=f"Unexpected error: {e!r}")
+
+    await asyncio.gather(*(worker() for _ in range(min(max(concurrency, 1), len(proxies)))))
+    return results
+
+
+def validate_proxies(proxies: Iterable[Union[str, ProxyEntry]], target: Tuple[str, int] = DEFAULT_CHECK_TARGET,
+                     concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT,
+                     max_latency_ms: Optional[float] = None) -> List[ProxyCheckResult]:
+    """
+    Synchronous wrapper around validate_proxies_async.
+
+    Args:
+        proxies (Iterable[Union[str, ProxyEntry]]): The proxy URLs or parsed proxies.
+        target (Tuple[str, int]): The host and port each proxy is asked to connect to.
+        concurrency (int): The maximum number of simultaneous checks.
+        timeout (float): Seconds allowed for the connection and for each handshake.
+        max_latency_ms (Optional[float]): Proxies slower than this are reported as failed.
+
+    Returns:
+        List[ProxyCheckResult]: One result per proxy, in input order.
+    """
+    return asyncio.run(validate_proxies_async(proxies, target, concurrency, timeout, max_latency_ms))
+
+
+def write_proxy_report(results: List[ProxyCheckResult], report_path: str,
+                       target: Tuple[str, int] = DEFAULT_CHECK_TARGET) -> None:
+    """
+    Write the per-proxy results to a JSON report, proxy passwords are masked.
+
+    Args:
+        results (List[ProxyCheckResult]): The check results.
+        report_path (str): The file to write.
+        target (Tuple[str, int]): The target the proxies were checked against.
+    """
+    passed = sum(1 for result in results if result.ok)
+    write_json({
+        'checked_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'target': f"{target[0]}:{target[1]}",
+        'total': len(results),
+        'passed': passed,
+        'failed': len(results) - passed,
+        'results': [result.to_report() for result in results],
+    }, report_path)
+
+
+if __name__ == '__main__':
+    # Get the script absolute path and name
+    script_name = os.path.basename(__file__)
+
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(
+        description='Check the proxies of a proxy list concurrently and write a JSON report.')
+    parser.add_argument('--proxies-file', type=str, default='proxies.txt',
+                        help='The proxy list to check')
+    parser.add_argument('--report', type=str, default=PROXY_REPORT_FILE,
+                        help='The JSON report to write')
+    parser.add_argument('--target', type=str, default=f"{DEFAULT_CHECK_TARGET[0]}:{DEFAULT_CHECK_TARGET[1]}",
+                        help='The host:port the proxies are asked to connect to')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='Maximum number of simultaneous checks')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='Seconds allowed for the connection and for each handshake')
+    parser.add_argument('--max-latency-ms', type=float, default=None,
+                        help='Fail proxies slower than this')
+    parser.add_argument('--log-dir', default=os.path.join(script_dir,
+                        'logs'), help='Set the logging directory')
+    parser.add_argument(
+        '--log-file', default=f"{script_name}.log", help='Set the logging file name')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING',
+                        'ERROR', 'CRITICAL'], default='INFO', help='Set the logging level')
+    args = parser.parse_args()
+
+    # Set logging level based on command-line arguments
+    log_level = getattr(logging, args.log_level.upper(), None)
+    if not isinstance(log_level, int):
+        raise ValueError(f'Invalid log level: {args.log_level}')
+
+    # Start logging
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(args.log_dir, args.log_file),
+        format='%(asctime)s - [%(levelname)s] - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=log_level
+    )
+
+    logging.info(f"Starting {script_name} script...")
+
+    try:
+        target_host, _, target_port = args.target.rpartition(':')
+        target = (target_host, int(target_port))
+        proxies = list(iter_proxy_file(args.proxies_file, stats=ProxyParseStats()))
+        results = validate_proxies(proxies, target, args.concurrency, args.timeout, args.max_latency_ms)
+        write_proxy_report(results, args.report, target)
+        passed = sum(1 for result in results if result.ok)
+        print(f"{passed} of {len(results)} proxies passed, report written to {args.report}")
+        logging.info(f"{script_name} script completed successfully")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {str(e)}")
+        raise
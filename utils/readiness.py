@@ -0,0 +1,155 @@
+import re
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.teardown import COMPOSE_PROJECT_LABEL
+
+DEFAULT_READY_TIMEOUT = 120
+# Health reported by `docker ps` at the end of the status column, e.g. "Up 5 seconds (health: starting)"
+_STATUS_HEALTH_RE = re.compile(r'\((healthy|unhealthy|health: starting)\)\s*$')
+_RUNNING_ACTIONS = ('start', 'restart', 'unpause')
+_STOPPED_ACTIONS = ('die', 'pause')
+
+
+@dataclass
+class _Container:
+    project: str
+    name: str
+    running: bool
+    # None when the container has no healthcheck
+    health: Optional[str] = None
+
+    def ready(self, require_healthy: bool) -> bool:
+        return self.running and (not require_healthy or self.health in (None, 'healthy'))
+
+    def describe(self) -> str:
+        if not self.running:
+            return f"{self.name} (not running)"
+        return f"{self.name} ({self.health})"
+
+
+@dataclass
+class ReadinessResult:
+    project: str
+    ready: bool
+    waited: float
+    pending: List[str] = field(default_factory=list)
+
+
+def _container_name(names: Optional[List[str]], fallback: str) -> str:
+    return names[0].lstrip('/') if names else fallback[:12]
+
+
+def snapshot_containers(client: Any, projects: Iterable[str]) -> Dict[str, _Container]:
+    """
+    Read the state and health of every container of the projects with one engine API query.
+
+    Args:
+        client (Any): A docker client, see teardown.connect_docker.
+        projects (Iterable[str]): The compose project names.
+
+    Returns:
+        Dict[str, _Container]: The containers by id.
+    """
+    projects = set(projects)
+    containers = {}
+    for container in client.api.containers(all=True, filters={'label': COMPOSE_PROJECT_LABEL}):
+        project = (container.get('Labels') or {}).get(COMPOSE_PROJECT_LABEL)
+        if project not in projects:
+            continue
+        match = _STATUS_HEALTH_RE.search(container.get('Status', ''))
+        health = match.group(1).replace('health: ', '') if match else None
+        containers[container['Id']] = _Container(
+            project, _container_name(container.get('Names'), container['Id']),
+            container.get('State') == 'running', health)
+    return containers
+
+
+def _apply_event(containers: Dict[str, _Container], event: Dict[str, Any], projects: set) -> None:
+    actor = event.get('Actor') or {}
+    attributes = actor.get('Attributes') or {}
+    container_id = actor.get('ID') or event.get('id')
+    action = event.get('Action') or event.get('status') or ''
+    container = containers.get(container_id)
+    if container is None:
+        project = attributes.get(COMPOSE_PROJECT_LABEL)
+        if project not in projects or action == 'destroy':
+            return
+        container = containers[container_id] = _Container(
+            project, attributes.get('name', container_id[:12]), False)
+    if action in _RUNNING_ACTIONS:
+        container.running = True
+        if container.health is not None:
+            container.health = 'starting'
+    elif action in _STOPPED_ACTIONS:
+        container.running = False
+    elif action == 'destroy':
+        del containers[container_id]
+    elif action.startswith('health_status:'):
+        container.health = action.split(':', 1)[1].strip()
+
+
+def wait_for_projects(client: Any, projects: Iterable[str], timeout: float = DEFAULT_READY_TIMEOUT,
+                      require_healthy: bool = True) -> List[ReadinessResult]:
+    """
+    Wait until every container of the projects is running, and healthy if it has a healthcheck.
+    The current state is read once and then followed through Docker events, so fast stacks are
+    reported ready as soon as they are and no time is spent polling.
+
+    Args:
+        client (Any): A docker client, see teardown.connect_docker.
+        projects (Iterable[str]): The compose project names.
+        timeout (float): Seconds to wait for all projects in total.
+        require_healthy (bool): Whether containers with a healthcheck must also report healthy.
+
+    Returns:
+        List[ReadinessResult]: One result per project in the given order, failed ones list their pending containers.
+    """
+    projects = [project.lower() for project in projects]
+    project_set = set(projects)
+    start = time.time()
+    deadline = start + timeout
+    ready_after: Dict[str, float] = {}
+
+    # Events are replayed from before the snapshot so no state change between the two is lost
+    since = int(start) - 1
+    containers = snapshot_containers(client, project_set)
+
+    def update() -> bool:
+        by_project: Dict[str, List[_Container]] = {}
+        for container in containers.values():
+            by_project.setdefault(container.project, []).append(container)
+        for project in project_set - ready_after.keys():
+            members = by_project.get(project)
+            if members and all(container.ready(require_healthy) for container in members):
+                ready_after[project] = time.time() - start
+                logging.info(f"{project} is ready after {ready_after[project]:.1f}s")
+        return len(ready_after) == len(project_set)
+
+    if not update():
+        events = client.api.events(since=since, until=int(deadline) + 1, decode=True,
+                                   filters={'type': 'container', 'label': COMPOSE_PROJECT_LABEL})
+        try:
+            for event in events:
+                _apply_event(containers, event, project_set)
+                if update() or time.time() >= deadline:
+                    break
+        finally:
+            close = getattr(events, 'close', None)
+            if close:
+                close()
+
+    results = []
+    for project in projects:
+        if project in ready_after:
+            results.append(ReadinessResult(project, True, ready_after[project]))
+            continue
+        pending = sorted(container.describe() for container in containers.values()
+                         if container.project == project and not container.ready(require_healthy))
+        results.append(ReadinessResult(project, False, time.time() - start,
+                                       pending or ['no containers']))
+        logging.warning(
+            f"{project} not ready after {timeout}s: {', '.join(results[-1].pending)}")
+    return results
@@ -0,0 +1,482 @@
+import os
+import sys
+import time
+import json
+import sqlite3
+import hashlib
+import argparse
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from colorama import Fore, Style
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils.loader import parse_env_text
+
+# Kept inside the instances directory, a dot file so instance scans skip it
+REGISTRY_FILE = '.instance-registry.db'
+# Bump when the schema changes, an older registry is dropped and rebuilt from disk
+REGISTRY_VERSION = 1
+# The columns conflicts can be looked up for
+CONFLICT_KEYS = ('project_name', 'device_name', 'subnet', 'port', 'app_id')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    name TEXT PRIMARY KEY,
+    env_file TEXT NOT NULL,
+    compose_file TEXT,
+    project_name TEXT,
+    device_name TEXT,
+    subnet TEXT,
+    proxy TEXT,
+    env TEXT NOT NULL,
+    env_hash TEXT NOT NULL,
+    compose_hash TEXT,
+    stat_key TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS instances_project_name ON instances (project_name);
+CREATE INDEX IF NOT EXISTS instances_device_name ON instances (device_name);
+CREATE INDEX IF NOT EXISTS instances_subnet ON instances (subnet);
+CREATE TABLE IF NOT EXISTS ports (
+    instance TEXT NOT NULL REFERENCES instances (name) ON DELETE CASCADE,
+    variable TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    PRIMARY KEY (instance, variable)
+);
+CREATE INDEX IF NOT EXISTS ports_port ON ports (port);
+CREATE TABLE IF NOT EXISTS app_ids (
+    instance TEXT NOT NULL REFERENCES instances (name) ON DELETE CASCADE,
+    variable TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (instance, variable)
+);
+CREATE INDEX IF NOT EXISTS app_ids_value ON app_ids (value);
+"""
+
+
+@dataclass
+class InstanceRecord:
+    name: str
+    env_file: str
+    compose_file: Optional[str]
+    project_name: Optional[str]
+    device_name: Optional[str]
+    subnet: Optional[str]
+    proxy: Optional[str]
+    env_hash: str
+    compose_hash: Optional[str]
+    env: Dict[str, str] = field(default_factory=dict)
+    ports: Dict[str, int] = field(default_factory=dict)
+    app_ids: Dict[str, str] = field(default_factory=dict)
+
+
+def _file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _stat_key(env_file: str, compose_file: Optional[str]) -> str:
+    parts = []
+    for path in (env_file, compose_file):
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        parts.append(f"{stat.st_mtime_ns}:{stat.st_size}" if stat else '-')
+    return '|'.join(parts)
+
+
+def read_instance(name: str, env_file: str, compose_file: Optional[str] = None,
+                  compose_hashes: Optional[Dict[str, str]] = None) -> InstanceRecord:
+    """
+    Read what the registry keeps about an instance from its .env and compose files.
+
+    Args:
+        name (str): The instance name, its directory name for the multiproxy instances.
+        env_file (str): The path to the .env file.
+        compose_file (Optional[str]): The path to the compose file, if the instance has one.
+        compose_hashes (Optional[Dict[str, str]]): Hashes by real path, so shared compose files are hashed once.
+
+    Returns:
+        InstanceRecord: The parsed instance.
+
+    Raises:
+        OSError: If the .env file cannot be read.
+    """
+    with open(env_file, 'rb') as f:
+        content = f.read()
+    env = parse_env_text(content.decode('utf-8', errors='replace'))
+
+    compose_hash = None
+    if compose_file and os.path.isfile(compose_file):
+        real_path = os.path.realpath(compose_file)
+        if compose_hashes is not None and real_path in compose_hashes:
+            compose_hash = compose_hashes[real_path]
+        else:
+            compose_hash = _file_hash(real_path)
+            if compose_hashes is not None:
+                compose_hashes[real_path] = compose_hash
+
+    ports = {}
+    for key, value in env.items():
+        # The proxy ports are on the proxy host, not on this one
+        if key.startswith(('PROXY_', 'STACK_PROXY_')):
+            continue
+        if key.endswith('_PORT') or '_PORT_' in key:
+            try:
+                ports[key] = int(value)
+            except ValueError:
+                continue
+    # App identities such as EARNAPP_UUID or INSTANCE_UUID must be unique across the fleet
+    app_ids = {key: value for key, value in env.items() if key.endswith('_UUID') and value}
+
+    subnet = env.get('NETWORK_SUBNET')
+    if subnet and env.get('NETWORK_NETMASK'):
+        subnet = f"{subnet}/{env['NETWORK_NETMASK']}"
+    return InstanceRecord(
+        name=name, env_file=env_file, compose_file=compose_file,
+        project_name=env.get('COMPOSE_PROJECT_NAME'), device_name=env.get('DEVICE_NAME') or None,
+        subnet=subnet, proxy=env.get('STACK_PROXY_URL') or None,
+        env_hash=hashlib.sha256(content).hexdigest(), compose_hash=compose_hash,
+        env=env, ports=ports, app_ids=app_ids)
+
+
+def find_instance_files(instances_dir: str) -> Dict[str, Tuple[str, Optional[str]]]:
+    """
+    Find the .env and compose file of every instance directory.
+
+    Args:
+        instances_dir (str): The directory containing the instances.
+
+    Returns:
+        Dict[str, Tuple[str, Optional[str]]]: The .env file and compose file, or None, of each instance by name.
+    """
+    instances = {}
+    if not os.path.isdir(instances_dir):
+        return instances
+    for entry in os.scandir(instances_dir):
+        if entry.name.startswith('.') or not entry.is_dir():
+            continue
+        env_file = os.path.join(entry.path, '.env')
+        if not os.path.isfile(env_file):
+            continue
+        compose_file = None
+        for compose_name in ('docker-compose.yaml', 'docker-compose.yml'):
+            if os.path.isfile(os.path.join(entry.path, compose_name)):
+                compose_file = os.path.join(entry.path, compose_name)
+                break
+        instances[entry.name] = (env_file, compose_file)
+    return instances
+
+
+class InstanceRegistry:
+    """
+    SQLite inventory of the instances, so names, ports, subnets and app identities are looked up
+    through indexes instead of opening every .env file again.
+    The .env files stay the source of truth: sync only re-reads the files whose size or
+    modification time changed since they were recorded.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != REGISTRY_VERSION:
+            with self.conn:
+                for table in ('app_ids', 'ports', 'instances'):
+                    self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self.conn.execute(f"PRAGMA user_version = {REGISTRY_VERSION}")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> 'InstanceRegistry':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _write(self, record: InstanceRecord, stat_key: str) -> None:
+        self.conn.execute("DELETE FROM instances WHERE name = ?", (record.name,))
+        self.conn.execute(
+            "INSERT INTO instances (name, env_file, compose_file, project_name, device_name, subnet, proxy, env, "
+            "env_hash, compose_hash, stat_key, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (record.name, record.env_file, record.compose_file, record.project_name, record.device_name,
+             record.subnet, record.proxy, json.dumps(record.env), record.env_hash, record.compose_hash,
+             stat_key, time.time()))
+        self.conn.executemany("INSERT INTO ports (instance, variable, port) VALUES (?, ?, ?)",
+                              [(record.name, variable, port) for variable, port in record.ports.items()])
+        self.conn.executemany("INSERT INTO app_ids (instance, variable, value) VALUES (?, ?, ?)",
+                              [(record.name, variable, value) for variable, value in record.app_ids.items()])
+
+    def record(self, instances: Iterable[Tuple[str, str, Optional[str]]]) -> int:
+        """
+        Record or update instances from their files in one transaction, called by the code that writes them.
+
+        Args:
+            instances (Iterable[Tuple[str, str, Optional[str]]]): The name, .env file and compose file of each instance.
+
+        Returns:
+            int: The number of instances recorded.
+        """
+        compose_hashes: Dict[str, str] = {}
+        recorded = 0
+        with self.conn:
+            for name, env_file, compose_file in instances:
+                self._write(read_instance(name, env_file, compose_file, compose_hashes),
+                            _stat_key(env_file, compose_file))
+                recorded += 1
+        return recorded
+
+    def remove(self, name: str) -> None:
+        """
+        Remove an instance, its ports and app identities.
+
+        Args:
+            name (str): The instance name.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM instances WHERE name = ?", (name,))
+
+    def sync(self, instances_dir: str, extra_instances: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+             rebuild: bool = False) -> Tuple[int, int]:
+        """
+        Bring the registry in line with the instance files on disk in one pass.
+        Unchanged instances cost one stat of their files, changed ones are read again and
+        instances whose directory is gone are removed.
+
+        Args:
+            instances_dir (str): The directory containing the instances.
+            extra_instances (Optional[Dict[str, Tuple[str, Optional[str]]]]): Instances outside the directory,
+                such as the main stack, as name to (.env file, compose file). Instances not given are dropped.
+            rebuild (bool): Read every instance again, even the unchanged ones.
+
+        Returns:
+            Tuple[int, int]: The number of instances read again and removed.
+        """
+        on_disk = find_instance_files(instances_dir)
+        for name, (env_file, compose_file) in (extra_instances or {}).items():
+            if os.path.isfile(env_file):
+                on_disk[name] = (env_file, compose_file if compose_file and os.path.isfile(compose_file) else None)
+        known = {row['name']: row['stat_key'] for row in self.conn.execute("SELECT name, stat_key FROM instances")}
+
+        compose_hashes: Dict[str, str] = {}
+        updated = removed = 0
+        with self.conn:
+            for name in known.keys() - on_disk.keys():
+                self.conn.execute("DELETE FROM instances WHERE name = ?", (name,))
+                removed += 1
+            for name, (env_file, compose_file) in on_disk.items():
+                stat_key = _stat_key(env_file, compose_file)
+                if not rebuild and known.get(name) == stat_key:
+                    continue
+                try:
+                    record = read_instance(name, env_file, compose_file, compose_hashes)
+                except OSError as e:
+                    logging.warning(f"Skipping instance {name} in the registry: {str(e)}")
+                    continue
+                self._write(record, stat_key)
+                updated += 1
+        if updated or removed:
+            logging.info(f"Instance registry {self.db_path}: {updated} instances read, {removed} removed")
+        return updated, removed
+
+    def _records(self, where: str = '', params: Tuple = ()) -> List[InstanceRecord]:
+        records = {row['name']: InstanceRecord(
+            name=row['name'], env_file=row['env_file'], compose_file=row['compose_file'],
+            project_name=row['project_name'], device_name=row['device_name'], subnet=row['subnet'],
+            proxy=row['proxy'], env_hash=row['env_hash'], compose_hash=row['compose_hash'], env=json.loads(row['env']))
+            for row in self.conn.execute(f"SELECT * FROM instances {where} ORDER BY name", params)}
+        # One query per table for all the instances, not one per instance
+        instance_filter = where.replace('name', 'instance')
+        for row in self.conn.execute(f"SELECT instance, variable, port FROM ports {instance_filter}", params):
+            records[row['instance']].ports[row['variable']] = row['port']
+        for row in self.conn.execute(f"SELECT instance, variable, value FROM app_ids {instance_filter}", params):
+            records[row['instance']].app_ids[row['variable']] = row['value']
+        return list(records.values())
+
+    def get(self, name: str) -> Optional[InstanceRecord]:
+        records = self._records("WHERE name = ?", (name,))
+        return records[0] if records else None
+
+    def get_current(self, name: str, env_file: str, compose_file: Optional[str] = None) -> Optional[InstanceRecord]:
+        """
+        Get one instance without syncing the whole directory, it is read again only if its files changed.
+
+        Args:
+            name (str): The instance name.
+            env_file (str): The path to its .env file.
+            compose_file (Optional[str]): The path to its compose file.
+
+        Returns:
+            Optional[InstanceRecord]: The instance, None if its .env file does not exist.
+        """
+        if not os.path.isfile(env_file):
+            self.remove(name)
+            return None
+        row = self.conn.execute("SELECT stat_key FROM instances WHERE name = ?", (name,)).fetchone()
+        if row is None or row['stat_key'] != _stat_key(env_file, compose_file):
+            self.record([(name, env_file, compose_file)])
+        return self.get(name)
+
+    def instances(self) -> List[InstanceRecord]:
+        return self._records()
+
+    def names(self) -> List[str]:
+        return [row['name'] for row in self.conn.execute("SELECT name FROM instances ORDER BY name")]
+
+    def find(self, key: str, value: object) -> List[str]:
+        """
+        Find the instances using a value, through the index of its column.
+
+        Args:
+            key (str): One of CONFLICT_KEYS.
+            value (object): The project name, device name, subnet, host port or app identity.
+
+        Returns:
+            List[str]: The names of the instances using the value.
+        """
+        if key == 'port':
+            query = "SELECT DISTINCT instance FROM ports WHERE port = ? ORDER BY instance"
+        elif key == 'app_id':
+            query = "SELECT DISTINCT instance FROM app_ids WHERE value = ? ORDER BY instance"
+        elif key in CONFLICT_KEYS:
+            query = f"SELECT name FROM instances WHERE {key} = ? ORDER BY name"
+        else:
+            raise ValueError(f"Unknown registry key: {key}")
+        return [row[0] for row in self.conn.execute(query, (value,))]
+
+    def conflicts(self, keys: Iterable[str] = CONFLICT_KEYS) -> Dict[str, Dict[object, List[str]]]:
+        """
+        Find every value used by more than one instance.
+
+        Args:
+            keys (Iterable[str]): The CONFLICT_KEYS to check.
+
+        Returns:
+            Dict[str, Dict[object, List[str]]]: For each key with conflicts, the instances sharing each value.
+        """
+        conflicts: Dict[str, Dict[object, List[str]]] = {}
+        for key in keys:
+            if key == 'port':
+                query = "SELECT port, instance FROM ports WHERE port IN (SELECT port FROM ports GROUP BY port " \
+                        "HAVING COUNT(DISTINCT instance) > 1) GROUP BY port, instance ORDER BY port, instance"
+            elif key == 'app_id':
+                query = "SELECT value, instance FROM app_ids WHERE value IN (SELECT value FROM app_ids GROUP BY value " \
+                        "HAVING COUNT(DISTINCT instance) > 1) GROUP BY value, instance ORDER BY value, instance"
+            elif key in CONFLICT_KEYS:
+                query = f"SELECT {key}, name FROM instances WHERE {key} IN (SELECT {key} FROM instances " \
+                        f"WHERE {key} IS NOT NULL GROUP BY {key} HAVING COUNT(*) > 1) ORDER BY {key}, name"
+            else:
+                raise ValueError(f"Unknown registry key: {key}")
+            for value, name in self.conn.execute(query):
+                conflicts.setdefault(key, {}).setdefault(value, []).append(name)
+        return conflicts
+
+
+def open_registry(instances_dir: str, extra_instances: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+                  sync: bool = True) -> InstanceRegistry:
+    """
+    Open the registry of an instances directory, synced with the files on disk.
+    Without the directory the registry is kept in memory, so no directory is created as a side effect.
+
+    Args:
+        instances_dir (str): The directory containing the instances.
+        extra_instances (Optional[Dict[str, Tuple[str, Optional[str]]]]): Instances outside the directory, see InstanceRegistry.sync.
+        sync (bool): Sync with the files on disk before returning.
+
+    Returns:
+        InstanceRegistry: The open registry, close it when done.
+    """
+    registry = InstanceRegistry(os.path.join(instances_dir, REGISTRY_FILE) if os.path.isdir(instances_dir) else ':memory:')
+    if sync:
+        registry.sync(instances_dir, extra_instances)
+    return registry
+
+
+def record_generated(instances_dir: str, results: List[Dict[str, object]]) -> None:
+    """
+    Update the registry after instance files were generated, then drop the instances that are gone.
+    The registry only mirrors the files, so a failure is logged and never stops the caller.
+
+    Args:
+        instances_dir (str): The directory containing the instances.
+        results (List[Dict[str, object]]): The generator results, see generator.generate_instances_batch.
+    """
+    try:
+        with open_registry(instances_dir, sync=False) as registry:
+            registry.record((os.path.basename(os.path.dirname(str(result['env_output_path']))),
+                             str(result['env_output_path']), str(result['compose_output_path']))
+                            for result in results if result['changed'])
+            registry.sync(instances_dir)
+    except (OSError, sqlite3.Error) as e:
+        logging.warning(f"Could not update the instance registry of {instances_dir}: {str(e)}")
+
+
+def print_registry(registry: InstanceRegistry) -> None:
+    records = registry.instances()
+    print(f"{Fore.CYAN}{len(records)} instances in {registry.db_path}{Style.RESET_ALL}")
+    for record in records:
+        print(f" - {record.name}: project {record.project_name}, device {record.device_name}, subnet {record.subnet}, "
+              f"ports {', '.join(str(port) for port in sorted(set(record.ports.values()))) or 'none'}")
+    for key, values in registry.conflicts().items():
+        for value, names in values.items():
+            print(f"{Fore.RED}{key} {value} is used by {', '.join(names)}{Style.RESET_ALL}")
+
+
+if __name__ == '__main__':
+    script_name = os.path.basename(__file__)
+
+    parser = argparse.ArgumentParser(
+        description='Rebuild or show the instance registry of a multiproxy instances directory.')
+    parser.add_argument('command', choices=['rebuild', 'sync', 'show'],
+                        help='rebuild: read every instance again, sync: read only the changed ones, show: list the instances and conflicts')
+    parser.add_argument('--instances-dir', default='m4b_proxy_instances',
+                        help='The directory containing the proxy instances')
+    parser.add_argument('--log-dir', default=os.path.join(script_dir,
+                        'logs'), help='Set the logging directory')
+    parser.add_argument(
+        '--log-file', default=f"{script_name}.log", help='Set the logging file name')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING',
+                        'ERROR', 'CRITICAL'], default='INFO', help='Set the logging level')
+    args = parser.parse_args()
+
+    # Set logging level based on command-line arguments
+    log_level = getattr(logging, args.log_level.upper(), None)
+    if not isinstance(log_level, int):
+        raise ValueError(f'Invalid log level: {args.log_level}')
+
+    # Start logging
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(args.log_dir, args.log_file),
+        format='%(asctime)s - [%(levelname)s] - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=log_level
+    )
+
+    logging.info(f"Starting {script_name} script...")
+
+    try:
+        with open_registry(args.instances_dir, sync=False) as registry:
+            if args.command == 'show':
+                registry.sync(args.instances_dir)
+                print_registry(registry)
+            else:
+                start = time.perf_counter()
+                updated, removed = registry.sync(args.instances_dir, rebuild=args.command == 'rebuild')
+                print(f"{Fore.GREEN}{updated} instances read and {removed} removed in "
+                      f"{time.perf_counter() - start:.2f}s, {len(registry.names())} instances recorded.{Style.RESET_ALL}")
+        logging.info(f"{script_name} script completed successfully")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {str(e)}")
+        raise
@@ -0,0 +1,498 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import logging
+import platform
+import threading
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from colorama import Fore, Style
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils import loader
+from utils.engine_driver import EngineStackDriver, plan_stack_files
+from utils.fn_startStack import build_compose_up_command
+from utils.generator import GENERATION_HASH_FILE, regenerate_instances
+from utils.helper import is_user_root
+from utils.image_prepull import prepull_stacks, DEFAULT_PULL_TTL, DEFAULT_PULL_WORKERS
+from utils.readiness import wait_for_projects, DEFAULT_READY_TIMEOUT
+from utils.stack_runner import StackJob, run_stack_job, STACK_LOG_DIR, DEFAULT_COMMAND_TIMEOUT
+from utils.teardown import COMPOSE_PROJECT_LABEL, connect_docker, teardown_projects, DEFAULT_STOP_GRACE
+from utils.validate_instances import collect_stacks, validate_fleet
+
+DEFAULT_WAVE_SIZE = 4
+# More failed stacks than this abort the update and roll back every stack updated so far
+DEFAULT_MAX_FAILURES = 2
+# Stacks started per second, so container creation does not saturate the host
+DEFAULT_CREATE_RATE = 2.0
+
+# A snapshotted path is a regular file with its content, a symbolic link with its target, or missing
+FileState = Tuple[str, Optional[Any]]
+
+
+@dataclass
+class StackUpdate:
+    name: str
+    project: str
+    compose_file: str
+    env_file: str
+    # Whether the project had containers before the update, stacks without any are only removed on rollback
+    existed: bool = False
+    error: Optional[str] = None
+    ready: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.ready
+
+
+@dataclass
+class RolloutResult:
+    updated: List[StackUpdate] = field(default_factory=list)
+    failed: List[StackUpdate] = field(default_factory=list)
+    waves: int = 0
+    aborted: bool = False
+    # The rollback state of every updated stack when aborted
+    rolled_back: List[StackUpdate] = field(default_factory=list)
+
+
+class RateLimiter:
+    """
+    Spaces out calls to at most `rate` per second across threads, a rate of 0 or less does not limit.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval
+        if wait:
+            time.sleep(wait)
+
+
+def _file_state(path: str) -> FileState:
+    if os.path.islink(path):
+        return ('link', os.readlink(path))
+    try:
+        with open(path, 'rb') as f:
+            return ('file', f.read())
+    except FileNotFoundError:
+        return ('missing', None)
+
+
+def snapshot_files(paths: Iterable[str]) -> Dict[str, FileState]:
+    """
+    Record the content of files, and of the files symbolic links point to, so they can be restored later.
+
+    Args:
+        paths (Iterable[str]): The files to record.
+
+    Returns:
+        Dict[str, FileState]: The state of every path by absolute path.
+    """
+    snapshot: Dict[str, FileState] = {}
+    for path in paths:
+        path = os.path.abspath(path)
+        if path in snapshot:
+            continue
+        snapshot[path] = _file_state(path)
+        if snapshot[path][0] == 'link':
+            # Shared compose files are pruned once no instance links to them
+            target = os.path.realpath(path)
+            snapshot.setdefault(target, _file_state(target))
+    return snapshot
+
+
+def restore_files(snapshot: Dict[str, FileState]) -> List[str]:
+    """
+    Put files back in the state recorded by snapshot_files.
+
+    Returns:
+        List[str]: The paths that were changed.
+    """
+    changed = []
+    # Link targets are restored before the links to them
+    for path, state in sorted(snapshot.items(), key=lambda item: item[1][0] == 'link'):
+        if _file_state(path) == state:
+            continue
+        if os.path.lexists(path):
+            os.remove(path)
+        if state[0] == 'file':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(state[1])
+        elif state[0] == 'link':
+            os.symlink(state[1], path)
+        changed.append(path)
+    return changed
+
+
+def _split_reference(image: str) -> Tuple[Optional[str], Optional[str]]:
+    if '@' in image or image.startswith('sha256:'):
+        return None, None
+    repository, _, tag = image.rpartition(':')
+    if not repository or '/' in tag:
+        return image, 'latest'
+    return repository, tag
+
+
+def restore_images(client: Any, image_ids: Dict[str, str]) -> List[str]:
+    """
+    Point image tags that were pulled again back to the images the stacks ran before.
+
+    Args:
+        client (Any): A docker client, see teardown.connect_docker.
+        image_ids (Dict[str, str]): The image id every image reference had before the update.
+
+    Returns:
+        List[str]: The image references that were retagged.
+    """
+    restored = []
+    for image, image_id in image_ids.items():
+        repository, tag = _split_reference(image)
+        if not repository:
+            continue
+        try:
+            if client.api.inspect_image(image)['Id'] == image_id:
+                continue
+        except Exception as e:
+            if getattr(e, 'status_code', None) != 404:
+                logging.warning(f"Could not inspect {image}: {str(e)}")
+                continue
+        try:
+            client.api.tag(image_id, repository, tag, force=True)
+            restored.append(image)
+            logging.info(f"Tagged {image_id[:19]} as {image} again")
+        except Exception as e:
+            logging.warning(f"Could not restore {image} to {image_id[:19]}: {str(e)}")
+    return restored
+
+
+def fleet_state(client: Any) -> Tuple[set, Dict[str, str]]:
+    """
+    Read the compose projects that have containers and the image id each image reference runs as, with one query.
+
+    Returns:
+        Tuple[set, Dict[str, str]]: The project names and the image ids by image reference.
+    """
+    projects, image_ids = set(), {}
+    for container in client.api.containers(all=True, filters={'label': COMPOSE_PROJECT_LABEL}):
+        projects.add((container.get('Labels') or {}).get(COMPOSE_PROJECT_LABEL))
+        image = container.get('Image') or ''
+        if container.get('ImageID') and not image.startswith('sha256:'):
+            image_ids.setdefault(image, container['ImageID'])
+    return projects, image_ids
+
+
+def _start_wave(stacks: List[StackUpdate], up: Callable[[StackUpdate], None], limiter: RateLimiter) -> None:
+    def start(stack: StackUpdate) -> None:
+        limiter.acquire()
+        try:
+            up(stack)
+        except Exception as e:
+            stack.error = str(e) or type(e).__name__
+            logging.error(f"{stack.name} failed to start: {stack.error}")
+
+    with ThreadPoolExecutor(max_workers=len(stacks)) as executor:
+        list(executor.map(start, stacks))
+
+
+def _wait_wave(client: Any, stacks: List[StackUpdate], ready_timeout: float) -> None:
+    started = [stack for stack in stacks if stack.error is None]
+    if not started:
+        return
+    if ready_timeout <= 0:
+        for stack in started:
+            stack.ready = True
+        return
+    for stack, result in zip(started, wait_for_projects(client, [stack.project for stack in started], ready_timeout)):
+        stack.ready = result.ready
+        if not result.ready:
+            stack.error = f"not ready after {result.waited:.0f}s: {', '.join(result.pending)}"
+
+
+def _waves(stacks: List[StackUpdate], wave_size: int) -> List[List[StackUpdate]]:
+    wave_size = max(1, wave_size)
+    return [stacks[index:index + wave_size] for index in range(0, len(stacks), wave_size)]
+
+
+def rollback_stacks(client: Any, stacks: List[StackUpdate], up: Callable[[StackUpdate], None],
+                    wave_size: int = DEFAULT_WAVE_SIZE, create_rate: float = DEFAULT_CREATE_RATE,
+                    ready_timeout: float = DEFAULT_READY_TIMEOUT, grace: int = DEFAULT_STOP_GRACE) -> List[StackUpdate]:
+    """
+    Recreate updated stacks from their restored files in waves, stacks that did not exist before are only removed.
+
+    Args:
+        client (Any): A docker client, see teardown.connect_docker.
+        stacks (List[StackUpdate]): The updated stacks, their files and images already restored.
+        up (Callable[[StackUpdate], None]): Starts one stack, raises on failure.
+        wave_size (int): The number of stacks recreated at once.
+        create_rate (float): Stacks started per second.
+        ready_timeout (float): Seconds each wave gets to become ready.
+        grace (int): Seconds each container gets to stop before it is killed.
+
+    Returns:
+        List[StackUpdate]: The rollback state of every stack, in the given order.
+    """
+    limiter = RateLimiter(create_rate)
+    restored = [dataclasses.replace(stack, error=None, ready=False) for stack in stacks]
+    for wave in _waves(restored, wave_size):
+        # Removing the containers first also recreates the ones whose configuration is back to the old one
+        teardown_projects(client, [stack.project for stack in wave], grace=grace)
+        previous = [stack for stack in wave if stack.existed]
+        for stack in wave:
+            stack.ready = not stack.existed
+        if previous:
+            _start_wave(previous, up, limiter)
+            _wait_wave(client, previous, ready_timeout)
+    return restored
+
+
+def rolling_update(client: Any, stacks: List[StackUpdate], up: Callable[[StackUpdate], None],
+                   wave_size: int = DEFAULT_WAVE_SIZE, max_failures: int = DEFAULT_MAX_FAILURES,
+                   create_rate: float = DEFAULT_CREATE_RATE, ready_timeout: float = DEFAULT_READY_TIMEOUT,
+                   grace: int = DEFAULT_STOP_GRACE, restore: Optional[Callable[[], None]] = None,
+                   rollback_up: Optional[Callable[[StackUpdate], None]] = None) -> RolloutResult:
+    """
+    Recreate stacks in waves, each wave must be ready before the next one starts.
+    When more than max_failures stacks failed, the update stops, restore puts the previous
+    files and images back, and every stack updated so far is rolled back.
+
+    Args:
+        client (Any): A docker client, see teardown.connect_docker.
+        stacks (List[StackUpdate]): The stacks in update order.
+        up (Callable[[StackUpdate], None]): Starts one stack from its current files, raises on failure.
+        wave_size (int): The number of stacks recreated at once.
+        max_failures (int): The number of failed stacks tolerated before the update is aborted.
+        create_rate (float): Stacks started per second, 0 for no limit.
+        ready_timeout (float): Seconds each wave gets to become ready, 0 to only check that the stacks started.
+        grace (int): Seconds each container gets to stop before it is killed on rollback.
+        restore (Optional[Callable[[], None]]): Restores the previous files and images before a rollback.
+        rollback_up (Optional[Callable[[StackUpdate], None]]): Starts one stack on rollback, defaults to up.
+            It must not reuse compose files up parsed before restore, see engine_up.
+
+    Returns:
+        RolloutResult: The updated and failed stacks, and the rollback if the update was aborted.
+    """
+    result = RolloutResult()
+    limiter = RateLimiter(create_rate)
+    waves = _waves(stacks, wave_size)
+    for index, wave in enumerate(waves, start=1):
+        print(f"{Fore.YELLOW}Wave {index}/{len(waves)}: updating {', '.join(stack.name for stack in wave)}...{Style.RESET_ALL}")
+        begin = time.perf_counter()
+        _start_wave(wave, up, limiter)
+        _wait_wave(client, wave, ready_timeout)
+        result.waves = index
+        result.updated.extend(wave)
+        failed = [stack for stack in wave if not stack.ok]
+        result.failed.extend(failed)
+        for stack in failed:
+            print(f"{Fore.RED}{stack.name} failed: {stack.error}{Style.RESET_ALL}")
+        logging.info(f"Wave {index}/{len(waves)} done in {time.perf_counter() - begin:.1f}s, "
+                     f"{len(wave) - len(failed)} of {len(wave)} stacks ready")
+        if len(result.failed) > max_failures:
+            result.aborted = True
+            print(f"{Fore.RED}{len(result.failed)} stacks failed, more than the {max_failures} allowed. "
+                  f"Rolling back {len(result.updated)} stacks...{Style.RESET_ALL}")
+            logging.error(f"Rolling update aborted after wave {index}, rolling back {len(result.updated)} stacks")
+            if restore:
+                restore()
+            result.rolled_back = rollback_stacks(client, result.updated[::-1], rollback_up or up, wave_size, create_rate,
+                                                 ready_timeout, grace)
+            break
+    return result
+
+
+def engine_up(driver: EngineStackDriver) -> Callable[[StackUpdate], None]:
+    """
+    Start stacks through the engine API stack driver, shared compose files are parsed once.
+    The parsed files are kept for the life of the returned function, a rollback needs a new one.
+    """
+    cache: Dict[str, Any] = {}
+
+    def up(stack: StackUpdate) -> None:
+        actions = driver.up(plan_stack_files(stack.compose_file, stack.env_file, stack.project, cache))
+        logging.info(f"{stack.name} updated through the engine API: {actions}")
+
+    return up
+
+
+def compose_up(command_timeout: Optional[float] = DEFAULT_COMMAND_TIMEOUT, sudo: Optional[List[str]] = None
+               ) -> Callable[[StackUpdate], None]:
+    """
+    Start stacks with `docker compose up -d`, which recreates only the containers whose configuration or image changed.
+    """
+    def up(stack: StackUpdate) -> None:
+        job = StackJob(stack.name, (sudo or []) + build_compose_up_command(stack.compose_file, stack.env_file, stack.project),
+                       os.path.join(STACK_LOG_DIR, f"{stack.name}.log"))
+        result = asyncio.run(run_stack_job(job, command_timeout))
+        if not result.ok:
+            raise RuntimeError(result.error or f"exit code {result.returncode}: {' '.join(result.tail[-3:])}")
+
+    return up
+
+
+def print_rollout_summary(result: RolloutResult, elapsed: float) -> None:
+    """
+    Print how many stacks were updated, which failed, and how the rollback went.
+    """
+    if not result.aborted:
+        print(f"{Fore.GREEN}{len(result.updated) - len(result.failed)} of {len(result.updated)} stacks updated "
+              f"in {result.waves} waves in {elapsed:.1f}s.{Style.RESET_ALL}")
+        for stack in result.failed:
+            print(f"{Fore.RED}{stack.name} is not ready: {stack.error}{Style.RESET_ALL}")
+        return
+    restored = [stack for stack in result.rolled_back if stack.ok]
+    print(f"{Fore.YELLOW}Update aborted after {result.waves} waves, {len(restored)} of {len(result.rolled_back)} "
+          f"stacks rolled back in {elapsed:.1f}s.{Style.RESET_ALL}")
+    for stack in result.rolled_back:
+        if not stack.ok:
+            print(f"{Fore.RED}{stack.name} could not be rolled back: {stack.error}{Style.RESET_ALL}")
+
+
+def main(instances_dir: str, main_compose_file: Optional[str], main_env_file: str, main_instance_name: str,
+         wave_size: Optional[int] = None, max_failures: Optional[int] = None, create_rate: Optional[float] = None) -> bool:
+    """
+    Regenerate the instances, pull the changed images once, and update the main stack and all instances in waves.
+    The settings not given are read from the system section of m4b-config.json.
+
+    Returns:
+        bool: True if every stack was updated and is ready.
+    """
+    try:
+        system = loader.load_json_config(os.path.join(parent_dir, 'config', 'm4b-config.json'), readonly=True).get('system', {})
+    except FileNotFoundError:
+        system = {}
+    wave_size = wave_size or system.get('rolling_wave_size', DEFAULT_WAVE_SIZE)
+    max_failures = max_failures if max_failures is not None else system.get('rolling_max_failures', DEFAULT_MAX_FAILURES)
+    create_rate = create_rate if create_rate is not None else system.get('rolling_create_rate', DEFAULT_CREATE_RATE)
+    pull_workers = system.get('pull_workers', DEFAULT_PULL_WORKERS)
+    grace = system.get('stop_grace_period', DEFAULT_STOP_GRACE)
+
+    client = connect_docker(max(wave_size, pull_workers))
+    if client is None:
+        print(f"{Fore.RED}The Docker engine is not reachable, a rolling update needs it to follow readiness.{Style.RESET_ALL}")
+        return False
+
+    # The files the stacks run from now, restored if the update is rolled back
+    previous = collect_stacks(instances_dir, main_compose_file, main_env_file, main_instance_name)
+    paths = []
+    for stack in previous:
+        for path in (stack.env_file, stack.compose_file):
+            if path:
+                paths.extend([path, os.path.join(os.path.dirname(path), GENERATION_HASH_FILE)])
+    files = snapshot_files(paths)
+    if os.path.isdir(instances_dir):
+        regenerate_instances(instances_dir)
+
+    fleet, conflicts = validate_fleet(instances_dir, main_compose_file, main_env_file, main_instance_name, client)
+    for conflict in conflicts:
+        if not conflict.blocking:
+            print(f"{Fore.YELLOW}Warning: {conflict.describe()}{Style.RESET_ALL}")
+    conflicts = [conflict for conflict in conflicts if conflict.blocking]
+    if conflicts:
+        for conflict in conflicts:
+            print(f"{Fore.RED}{conflict.describe()}{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}Fix the conflicts first: python utils/validate_instances.py --fix{Style.RESET_ALL}")
+        restore_files(files)
+        return False
+
+    existing, image_ids = fleet_state(client)
+    stacks = [StackUpdate(stack.name, stack.project, stack.compose_file, stack.env_file, stack.project in existing)
+              for stack in fleet if stack.compose_file]
+    pulls = prepull_stacks([(stack.compose_file, stack.env_file) for stack in stacks], client=client,
+                           workers=pull_workers, ttl=system.get('image_pull_ttl', DEFAULT_PULL_TTL))
+    if any(pull.status == 'failed' for pull in pulls or []):
+        print(f"{Fore.RED}Not all images could be pulled, no stack was updated.{Style.RESET_ALL}")
+        restore_files(files)
+        restore_images(client, image_ids)
+        return False
+
+    def make_up() -> Callable[[StackUpdate], None]:
+        if system.get('stack_driver', 'compose') == 'engine':
+            return engine_up(EngineStackDriver(client, grace))
+        sudo = ['sudo'] if not is_user_root() and platform.system().lower() == 'linux' else []
+        return compose_up(system.get('compose_timeout', DEFAULT_COMMAND_TIMEOUT), sudo)
+
+    def restore() -> None:
+        changed = restore_files(files)
+        retagged = restore_images(client, image_ids)
+        logging.info(f"Restored {len(changed)} files and {len(retagged)} image tags for the rollback")
+
+    print(f"{Fore.YELLOW}Updating {len(stacks)} stacks, {wave_size} at a time...{Style.RESET_ALL}")
+    start = time.perf_counter()
+    # The rollback starts from the restored files, so it must not see the compose files parsed for the update
+    result = rolling_update(client, stacks, make_up(), wave_size, max_failures, create_rate,
+                            system.get('ready_timeout', DEFAULT_READY_TIMEOUT), grace, restore, make_up())
+    print_rollout_summary(result, time.perf_counter() - start)
+    if result.aborted:
+        print(f"{Fore.YELLOW}The instance overlays still hold the new configuration, fix it before updating again.{Style.RESET_ALL}")
+    return not result.aborted and not result.failed
+
+
+if __name__ == '__main__':
+    script_name = os.path.basename(__file__)
+
+    parser = argparse.ArgumentParser(
+        description='Recreate the main stack and all multi-proxy instances in waves after a config or image change, rolling back on failures.')
+    parser.add_argument('--instances-dir', default='m4b_proxy_instances',
+                        help='The directory containing the proxy instances')
+    parser.add_argument('--compose-file', default='./docker-compose.yaml',
+                        help='The compose file of the main stack')
+    parser.add_argument('--env-file', default='./.env',
+                        help='The .env file of the main stack')
+    parser.add_argument('--main-instance-name', default='money4band',
+                        help='The name of the main stack')
+    parser.add_argument('--wave-size', type=int,
+                        help='Number of stacks recreated at once, defaults to rolling_wave_size')
+    parser.add_argument('--max-failures', type=int,
+                        help='Failed stacks tolerated before rolling back, defaults to rolling_max_failures')
+    parser.add_argument('--create-rate', type=float,
+                        help='Stacks started per second, 0 for no limit, defaults to rolling_create_rate')
+    parser.add_argument('--log-dir', default=os.path.join(script_dir,
+                        'logs'), help='Set the logging directory')
+    parser.add_argument(
+        '--log-file', default=f"{script_name}.log", help='Set the logging file name')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING',
+                        'ERROR', 'CRITICAL'], default='INFO', help='Set the logging level')
+    args = parser.parse_args()
+
+    # Set logging level based on command-line arguments
+    log_level = getattr(logging, args.log_level.upper(), None)
+    if not isinstance(log_level, int):
+        raise ValueError(f'Invalid log level: {args.log_level}')
+
+    # Start logging
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(args.log_dir, args.log_file),
+        format='%(asctime)s - [%(levelname)s] - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=log_level
+    )
+
+    logging.info(f"Starting {script_name} script...")
+
+    try:
+        ok = main(args.instances_dir, args.compose_file if os.path.isfile(args.compose_file) else None,
+                  args.env_file, args.main_instance_name, args.wave_size, args.max_failures, args.create_rate)
+        logging.info(f"{script_name} script completed successfully")
+        sys.exit(0 if ok else 1)
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {str(e)}")
+        raise
@@ -0,0 +1,189 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, List, Optional
+
+from colorama import Fore, Style
+
+
+DEFAULT_WORKERS = 4
+DEFAULT_COMMAND_TIMEOUT = 300
+STACK_LOG_DIR = os.path.join('logs', 'stacks')
+# Lines of output kept per command to explain failures in the result table
+TAIL_LINES = 5
+
+
+@dataclass
+class StackJob:
+    name: str
+    command: List[str]
+    log_file: Optional[str] = None
+
+
+@dataclass
+class StackResult:
+    name: str
+    returncode: Optional[int]
+    duration: float
+    log_file: Optional[str] = None
+    error: Optional[str] = None
+    tail: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and self.error is None
+
+
+async def _stream_output(stream: asyncio.StreamReader, log_file, tail: Deque[str]) -> None:
+    # Written and flushed line by line so the log can be followed while compose runs
+    async for line in stream:
+        if log_file:
+            log_file.write(line)
+            log_file.flush()
+        tail.append(line.decode(errors='replace').rstrip())
+
+
+async def run_stack_job(job: StackJob, timeout: Optional[float] = DEFAULT_COMMAND_TIMEOUT) -> StackResult:
+    """
+    Run one stack command as an asyncio subprocess, streaming its output to the job log file.
+
+    Args:
+        job (StackJob): The job to run.
+        timeout (Optional[float]): Seconds before the command is killed, None to wait forever.
+
+    Returns:
+        StackResult: The exit code, duration and last output lines of the command.
+    """
+    logging.info(f"Running command for {job.name}: {' '.join(job.command)}")
+    start = time.perf_counter()
+    tail: Deque[str] = deque(maxlen=TAIL_LINES)
+    log_file = None
+    if job.log_file:
+        os.makedirs(os.path.dirname(job.log_file) or '.', exist_ok=True)
+        log_file = open(job.log_file, 'ab')
+        log_file.write(
+            f"$ {' '.join(job.command)}\n".encode())
+    try:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *job.command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        except OSError as e:
+            return StackResult(job.name, None, time.perf_counter() - start, job.log_file,
+                               error=f"Failed to run {job.command[0]}: {e.strerror or e}")
+
+        async def communicate() -> int:
+            await _stream_output(process.stdout, log_file, tail)
+            return await process.wait()
+
+        try:
+            returncode = await asyncio.wait_for(communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return StackResult(job.name, None, time.perf_counter() - start, job.log_file,
+                               error=f"Timed out after {timeout}s", tail=list(tail))
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        error = None if returncode == 0 else f"Exit code {returncode}"
+        return StackResult(job.name, returncode, time.perf_counter() - start, job.log_file,
+                           error=error, tail=list(tail))
+    finally:
+        if log_file:
+            log_file.close()
+
+
+async def run_stack_jobs_async(jobs: List[StackJob], workers: int = DEFAULT_WORKERS,
+                               timeout: Optional[float] = DEFAULT_COMMAND_TIMEOUT,
+                               on_result: Optional[Callable[[StackResult, int, int], None]] = None) -> List[StackResult]:
+    """
+    Run stack commands concurrently with at most `workers` of them running at once.
+
+    Args:
+        jobs (List[StackJob]): The jobs to run.
+        workers (int): The maximum number of simultaneous commands.
+        timeout (Optional[float]): Seconds before each command is killed, None to wait forever.
+        on_result (Optional[Callable[[StackResult, int, int], None]]): Called with each result, the number done and the total.
+
+    Returns:
+        List[StackResult]: One result per job, in job order.
+    """
+    results: List[Optional[StackResult]] = [None] * len(jobs)
+    pending = iter(enumerate(jobs))
+    done = 0
+
+    # A fixed pool of workers pulling from one iterator, so at most `workers` compose processes run at once
+    async def worker() -> None:
+        nonlocal done
+        for index, job in pending:
+            results[index] = result = await run_stack_job(job, timeout)
+            if result.ok:
+                logging.info(f"{result.name} finished in {result.duration:.1f}s")
+            else:
+                logging.error(f"{result.name} failed after {result.duration:.1f}s: {result.error}")
+            done += 1
+            if on_result:
+                on_result(results[index], done, len(jobs))
+
+    await asyncio.gather(*(worker() for _ in range(min(max(workers, 1), len(jobs)))))
+    return results
+
+
+def run_stack_jobs(jobs: List[StackJob], workers: int = DEFAULT_WORKERS,
+                   timeout: Optional[float] = DEFAULT_COMMAND_TIMEOUT,
+                   on_result: Optional[Callable[[StackResult, int, int], None]] = None) -> List[StackResult]:
+    """
+    Synchronous wrapper around run_stack_jobs_async.
+
+    Args:
+        jobs (List[StackJob]): The jobs to run.
+        workers (int): The maximum number of simultaneous commands.
+        timeout (Optional[float]): Seconds before each command is killed, None to wait forever.
+        on_result (Optional[Callable[[StackResult, int, int], None]]): Called with each result, the number done and the total.
+
+    Returns:
+        List[StackResult]: One result per job, in job order.
+    """
+    if not jobs:
+        return []
+    return asyncio.run(run_stack_jobs_async(jobs, workers, timeout, on_result))
+
+
+def print_progress(result: StackResult, done: int, total: int) -> None:
+    """
+    Print one line per finished job, usable as the on_result callback.
+    """
+    color = Fore.GREEN if result.ok else Fore.RED
+    status = 'done' if result.ok else f"failed ({result.error})"
+    print(f"{color}[{done}/{total}] {result.name} {status} in {result.duration:.1f}s{Style.RESET_ALL}")
+
+
+def format_results_table(results: List[StackResult]) -> str:
+    """
+    Format the results as a plain text table with one row per instance.
+
+    Args:
+        results (List[StackResult]): The results to format.
+
+    Returns:
+        str: The table, failed instances include their last output line.
+    """
+    rows = [('Instance', 'Status', 'Time', 'Details')]
+    for result in results:
+        details = result.log_file or ''
+        if not result.ok:
+            last_line = result.tail[-1] if result.tail else ''
+            details = f"{result.error}: {last_line}" if last_line else result.error
+        rows.append((result.name, 'OK' if result.ok else 'FAILED',
+                     f"{result.duration:.1f}s", details))
+    widths = [max(len(row[column]) for row in rows) for column in range(3)]
+    lines = [f"{row[0]:<{widths[0]}}  {row[1]:<{widths[1]}}  {row[2]:>{widths[2]}}  {row[3]}".rstrip()
+             for row in rows]
+    lines.insert(1, '-' * max(len(line) for line in lines))
+    passed = sum(1 for result in results if result.ok)
+    lines.append(f"{passed}/{len(results)} succeeded")
+    return '\n'.join(lines)
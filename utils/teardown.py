@@ -0,0 +1,186 @@
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from colorama import Fore, Style
+
+
+COMPOSE_PROJECT_LABEL = 'com.docker.compose.project'
+DEFAULT_TEARDOWN_WORKERS = 64
+# Seconds a container gets to exit after SIGTERM before the engine kills it
+DEFAULT_STOP_GRACE = 2
+# Suffix of instance project names created by the multi-proxy setup
+INSTANCE_SUFFIX_PATTERN = r'_[0-9a-f]{4}'
+# States in which a container has a process that should get a graceful stop first
+_STOPPABLE_STATES = ('running', 'restarting', 'paused')
+
+
+@dataclass
+class ProjectTeardown:
+    project: str
+    containers: int = 0
+    networks: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def connect_docker(workers: int = DEFAULT_TEARDOWN_WORKERS) -> Optional[Any]:
+    """
+    Connect to the Docker engine with a connection pool large enough for the teardown workers.
+
+    Args:
+        workers (int): The number of threads that will share the client.
+
+    Returns:
+        Optional[Any]: The docker client, None if the SDK is missing or the engine is unreachable.
+    """
+    try:
+        import docker
+        return docker.from_env(timeout=30, max_pool_size=max(workers, 1))
+    except Exception as e:
+        logging.warning(f"Docker engine API is not available: {str(e)}")
+        return None
+
+
+def _is_missing(error: Exception) -> bool:
+    # The container or network went away on its own, e.g. removed by a concurrent compose down
+    return getattr(error, 'status_code', None) == 404
+
+
+def _remove_container(client: Any, container: Dict[str, Any], grace: int) -> None:
+    try:
+        if container.get('State') in _STOPPABLE_STATES:
+            client.api.stop(container['Id'], timeout=grace)
+        client.api.remove_container(container['Id'], force=True)
+    except Exception as e:
+        if not _is_missing(e):
+            raise
+
+
+def _remove_network(client: Any, network: Dict[str, Any]) -> None:
+    try:
+        client.api.remove_network(network['Id'])
+    except Exception as e:
+        if not _is_missing(e):
+            raise
+
+
+def teardown_projects(client: Any, projects: Iterable[str], instance_prefix: Optional[str] = None,
+                      workers: int = DEFAULT_TEARDOWN_WORKERS, grace: int = DEFAULT_STOP_GRACE,
+                      on_progress: Optional[Callable[[int, int], None]] = None) -> List[ProjectTeardown]:
+    """
+    Stop and remove the containers and networks of compose projects through the Docker engine API.
+    All compose containers are listed in one query and filtered by their project label, containers
+    are then stopped and removed concurrently and the project networks removed once they are empty.
+
+    Args:
+        client (Any): A docker client, see connect_docker.
+        projects (Iterable[str]): The compose project names to tear down.
+        instance_prefix (Optional[str]): Also tear down projects named like instances of this project,
+            so instances whose directory was deleted do not leave containers behind.
+        workers (int): The maximum number of simultaneous engine API calls.
+        grace (int): Seconds each container gets to stop before it is killed.
+        on_progress (Optional[Callable[[int, int], None]]): Called with the number of removed containers and the total.
+
+    Returns:
+        List[ProjectTeardown]: One result per project that was requested or found, sorted by name.
+    """
+    projects = {project.lower() for project in projects}
+    orphan_re = re.compile(re.escape(instance_prefix.lower()) + INSTANCE_SUFFIX_PATTERN) \
+        if instance_prefix else None
+
+    def in_fleet(resource: Dict[str, Any]) -> Optional[str]:
+        project = (resource.get('Labels') or {}).get(COMPOSE_PROJECT_LABEL)
+        if project in projects or (project and orphan_re and orphan_re.fullmatch(project)):
+            return project
+        return None
+
+    results: Dict[str, ProjectTeardown] = {
+        project: ProjectTeardown(project) for project in projects}
+    containers = []
+    for container in client.api.containers(all=True, filters={'label': COMPOSE_PROJECT_LABEL}):
+        project = in_fleet(container)
+        if project:
+            results.setdefault(project, ProjectTeardown(project))
+            containers.append((project, container))
+    logging.info(
+        f"Found {len(containers)} containers of {len(results)} compose projects to tear down")
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [(project, executor.submit(_remove_container, client, container, grace))
+                   for project, container in containers]
+        for done, (project, future) in enumerate(futures, start=1):
+            try:
+                future.result()
+                results[project].containers += 1
+            except Exception as e:
+                results[project].errors.append(str(e))
+                logging.error(f"Failed to remove a container of {project}: {str(e)}")
+            if on_progress:
+                on_progress(done, len(futures))
+
+        # Networks are only listed now, compose may have created more while containers were stopping
+        networks = []
+        for network in client.api.networks(filters={'label': COMPOSE_PROJECT_LABEL}):
+            project = in_fleet(network)
+            if project:
+                results.setdefault(project, ProjectTeardown(project))
+                networks.append((project, network))
+        futures = [(project, executor.submit(_remove_network, client, network))
+                   for project, network in networks]
+        for project, future in futures:
+            try:
+                future.result()
+                results[project].networks += 1
+            except Exception as e:
+                results[project].errors.append(str(e))
+                logging.error(f"Failed to remove a network of {project}: {str(e)}")
+
+    return [results[project] for project in sorted(results)]
+
+
+def stop_running_containers(client: Any, workers: int = DEFAULT_TEARDOWN_WORKERS,
+                            grace: int = DEFAULT_STOP_GRACE) -> int:
+    """
+    Stop every running container on the host concurrently, whichever project it belongs to.
+
+    Args:
+        client (Any): A docker client, see connect_docker.
+        workers (int): The maximum number of simultaneous engine API calls.
+        grace (int): Seconds each container gets to stop before it is killed.
+
+    Returns:
+        int: The number of containers stopped.
+    """
+    def stop(container: Dict[str, Any]) -> bool:
+        try:
+            client.api.stop(container['Id'], timeout=grace)
+            return True
+        except Exception as e:
+            if _is_missing(e):
+                return True
+            logging.error(f"Failed to stop container {container['Id'][:12]}: {str(e)}")
+            return False
+
+    containers = client.api.containers()
+    if not containers:
+        return 0
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        return sum(executor.map(stop, containers))
+
+
+def print_teardown_summary(results: List[ProjectTeardown], elapsed: float) -> None:
+    """
+    Print the totals of a teardown and the errors of the projects that could not be fully removed.
+    """
+    containers = sum(result.containers for result in results)
+    networks = sum(result.networks for result in results)
+    print(f"{Fore.GREEN}Removed {containers} containers and {networks} networks of {len(results)} projects in {elapsed:.1f}s.{Style.RESET_ALL}")
+    for result in results:
+        if not result.ok:
+            print(f"{Fore.RED}{result.project}: {len(result.errors)} errors, first: {result.errors[0]}{Style.RESET_ALL}")
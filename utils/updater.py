@@ -1,9 +1,10 @@
 from utils.loader import load_json_config
+from utils import http_client
 import os
 import sys
 from typing import List, Dict
-import urllib.request
 import json
+import requests
 import logging
 from datetime import datetime
 import re
@@ -95,43 +96,46 @@ def get_latest_releases(count: int = 5) -> List[Dict]:
     repo = 'money4band'
     url = f"https://api.github.com/repos/{owner}/{repo}/releases"
     try:
-        with urllib.request.urlopen(url) as response:
-            data = response.read().decode()
-            releases = json.loads(data)
-            stripped_releases = []
-            for release in releases:
-                if release['prerelease']:
-                    continue
-                if release['draft']:
-                    continue
-                name = release['name']
-                if not name:
-                    name = release['tag_name']
-                if not name:
-                    continue
-                try:
-                    version = Version.from_string(name)
-                except ValueError:
-                    logging.warning(
-                        f"Skipping release with unparseable version: '{name}'")
-                    continue
-                url = release['html_url']
-                published_at = release['published_at']
-                published_at = datetime.strptime(
-                    published_at, '%Y-%m-%dT%H:%M:%SZ')
-                stripped_releases.append({
-                    'name': name,
-                    'version': version,
-                    'url': url,
-                    'published_at': published_at
-                })
-            stripped_releases.sort(
-                key=lambda x: x['version'], reverse=True)
-            return stripped_releases[:count]
-    except urllib.error.HTTPError as e:
-        raise Exception(f"Failed to fetch releases. HTTP Error: {e.code}")
-    except urllib.error.URLError as e:
-        raise Exception(f"Failed to fetch releases. URL Error: {e.reason}")
+        response = http_client.get(
+            url, headers={'Accept': 'application/vnd.github+json'})
+        response.raise_for_status()
+        data = response.text
+        releases = json.loads(data)
+        stripped_releases = []
+        for release in releases:
+            if release['prerelease']:
+                continue
+            if release['draft']:
+                continue
+            name = release['name']
+            if not name:
+                name = release['tag_name']
+            if not name:
+                continue
+            try:
+                version = Version.from_string(name)
+            except ValueError:
+                logging.warning(
+                    f"Skipping release with unparseable version: '{name}'")
+                continue
+            url = release['html_url']
+            published_at = release['published_at']
+            published_at = datetime.strptime(
+                published_at, '%Y-%m-%dT%H:%M:%SZ')
+            stripped_releases.append({
+                'name': name,
+                'version': version,
+                'url': url,
+                'published_at': published_at
+            })
+        stripped_releases.sort(
+            key=lambda x: x['version'], reverse=True)
+        return stripped_releases[:count]
+    except requests.HTTPError as e:
+        raise Exception(
+            f"Failed to fetch releases. HTTP Error: {e.response.status_code}")
+    except requests.RequestException as e:
+        raise Exception(f"Failed to fetch releases. URL Error: {e}")
     except json.JSONDecodeError:
         raise Exception("Failed to parse JSON response.")
     except Exception as e:
@@ -140,7 +144,7 @@ def get_latest_releases(count: int = 5) -> List[Dict]:
 
 def check_update_available(m4b_config_path_or_dict: str | dict) -> None:
     just_fix_windows_console()
-    m4b_config = load_json_config(m4b_config_path_or_dict)
+    m4b_config = load_json_config(m4b_config_path_or_dict, readonly=True)
     try:
         current_version_str = m4b_config.get('project', {}).get(
             'project_version', "0.0.0")
@@ -0,0 +1,475 @@
+import os
+import sys
+import argparse
+import logging
+import ipaddress
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from colorama import Fore, Style
+
+# Ensure the parent directory is in the sys.path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from utils import loader
+from utils.dumper import write_json
+from utils.engine_driver import interpolate, load_compose_file, normalize_project_name
+from utils.generator import generate_uuid, regenerate_instances
+from utils.loader import INSTANCE_BASE_DIR, INSTANCE_OVERLAY_FILE, INSTANCE_CONFIG_FILES
+from utils.networker import PortAllocator, SubnetAllocator, instance_subnet_pool, PORT_RESERVATIONS_FILE, SUBNET_ASSIGNMENTS_FILE
+from utils.registry import open_registry
+from utils.teardown import COMPOSE_PROJECT_LABEL, connect_docker
+
+# The kinds of conflicts, in report order
+CONFLICT_KINDS = ('device_name', 'project_name', 'container_name', 'host_port', 'subnet', 'app_id')
+# Conflicts --fix resolves by changing the overlay of the later instance
+FIXABLE_KINDS = ('device_name', 'host_port', 'subnet', 'app_id')
+# Conflicts that do not stop the stacks from starting. Setup gives every instance the app ids of the main
+# stack, so they only show up as one node in the app dashboards until --fix gives them their own.
+WARNING_KINDS = ('app_id',)
+
+
+@dataclass
+class StackInfo:
+    name: str
+    compose_file: Optional[str]
+    env_file: str
+    project: str
+    device_name: Optional[str] = None
+    # Container name to service, as compose will name them
+    containers: Dict[str, str] = field(default_factory=dict)
+    # (host port, protocol) to service
+    ports: Dict[Tuple[int, str], str] = field(default_factory=dict)
+    subnets: List[ipaddress.IPv4Network] = field(default_factory=list)
+    app_ids: Dict[str, str] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Conflict:
+    kind: str
+    value: str
+    # The stacks sharing the value, the first one keeps it. 'docker' stands for containers outside the fleet.
+    stacks: List[str]
+    live: bool = False
+
+    @property
+    def blocking(self) -> bool:
+        return self.kind not in WARNING_KINDS
+
+    def describe(self) -> str:
+        where = 'a running container' if self.live else 'the fleet'
+        return f"{self.kind.replace('_', ' ')} {self.value} is used by {', '.join(self.stacks)} ({where})"
+
+
+def _host_ports(ports: List[Any]) -> List[Tuple[int, str]]:
+    host_ports = []
+    for port in ports:
+        if isinstance(port, dict):
+            published, protocol = str(port.get('published') or ''), port.get('protocol') or 'tcp'
+        else:
+            spec, _, protocol = str(port).partition('/')
+            protocol = protocol or 'tcp'
+            parts = spec.rsplit(':', 2)
+            published = parts[-2] if len(parts) > 1 else ''
+        if not published:
+            continue
+        first, _, last = published.partition('-')
+        try:
+            host_ports.extend((number, protocol) for number in range(int(first), int(last or first) + 1))
+        except ValueError:
+            continue
+    return host_ports
+
+
+def read_stack(name: str, compose_file: Optional[str], env_file: str, env: Dict[str, str],
+               app_ids: Dict[str, str], cache: Dict[str, Any]) -> StackInfo:
+    """
+    Read the names, ports and subnets a stack really uses from its compose file, with its variables replaced.
+
+    Args:
+        name (str): The stack name.
+        compose_file (Optional[str]): The path to the compose file.
+        env_file (str): The path to the .env file.
+        env (Dict[str, str]): The .env variables.
+        app_ids (Dict[str, str]): The app identities of the .env file.
+        cache (Dict[str, Any]): Parsed compose files by real path, shared compose files are parsed once.
+
+    Returns:
+        StackInfo: The stack, with the problems found while reading it in errors.
+    """
+    variables = dict(env)
+    # Like compose, variables of the process environment take precedence over the .env file
+    variables.update(os.environ)
+    project = normalize_project_name(variables.get('COMPOSE_PROJECT_NAME') or name)
+    stack = StackInfo(name, compose_file, env_file, project, env.get('DEVICE_NAME') or None, app_ids=dict(app_ids))
+    if not compose_file:
+        stack.errors.append('no compose file')
+        return stack
+    try:
+        compose_dict = interpolate(load_compose_file(compose_file, cache), variables)
+    except (OSError, ValueError) as e:
+        stack.errors.append(f"unreadable compose file: {str(e)}")
+        return stack
+
+    for service_name, service in (compose_dict.get('services') or {}).items():
+        service = service or {}
+        stack.containers[service.get('container_name') or f"{project}-{service_name}-1"] = service_name
+        for host_port in _host_ports(service.get('ports') or []):
+            stack.ports.setdefault(host_port, service_name)
+    for network in (compose_dict.get('networks') or {}).values():
+        for pool in ((network or {}).get('ipam') or {}).get('config') or []:
+            try:
+                stack.subnets.append(ipaddress.ip_network(pool['subnet'], strict=False))
+            except (KeyError, ValueError) as e:
+                stack.errors.append(f"invalid subnet: {str(e)}")
+    return stack
+
+
+def collect_stacks(instances_dir: str, main_compose_file: Optional[str] = None, main_env_file: Optional[str] = None,
+                   main_instance_name: str = 'money4band') -> List[StackInfo]:
+    """
+    Read the main stack and every instance, the .env values come from the instance registry.
+
+    Args:
+        instances_dir (str): The directory containing the proxy instances.
+        main_compose_file (Optional[str]): The compose file of the main stack, None to leave it out.
+        main_env_file (Optional[str]): The .env file of the main stack.
+        main_instance_name (str): The name of the main stack.
+
+    Returns:
+        List[StackInfo]: The main stack first, then the instances by name.
+    """
+    extra = {main_instance_name: (main_env_file, main_compose_file)} if main_compose_file and main_env_file else None
+    with open_registry(instances_dir, extra) as registry:
+        records = registry.instances()
+    records.sort(key=lambda record: (record.name != main_instance_name, record.name))
+    cache: Dict[str, Any] = {}
+    return [read_stack(record.name, record.compose_file, record.env_file, record.env, record.app_ids, cache)
+            for record in records]
+
+
+def find_conflicts(stacks: List[StackInfo]) -> List[Conflict]:
+    """
+    Find every value shared by stacks in one pass over them, each value is looked up in a hash index.
+    Subnets are compared by overlap, after sorting them by address.
+
+    Args:
+        stacks (List[StackInfo]): The stacks, the first one using a value keeps it.
+
+    Returns:
+        List[Conflict]: The conflicts, ordered by kind.
+    """
+    owners: Dict[str, Dict[Any, List[str]]] = {kind: {} for kind in CONFLICT_KINDS if kind != 'subnet'}
+    intervals = []
+    for stack in stacks:
+        values = {
+            'device_name': [stack.device_name] if stack.device_name else [],
+            'project_name': [stack.project],
+            'container_name': list(stack.containers),
+            'host_port': list(stack.ports),
+            'app_id': sorted(set(stack.app_ids.values())),
+        }
+        for kind, keys in values.items():
+            for key in keys:
+                names = owners[kind].setdefault(key, [])
+                if stack.name not in names:
+                    names.append(stack.name)
+        intervals.extend((int(subnet.network_address), int(subnet.broadcast_address), str(subnet), stack.name)
+                         for subnet in stack.subnets)
+
+    conflicts = []
+    for kind in CONFLICT_KINDS:
+        if kind == 'subnet':
+            conflicts.extend(_subnet_conflicts(intervals))
+            continue
+        for key, names in owners[kind].items():
+            if len(names) > 1:
+                value = f"{key[0]}/{key[1]}" if kind == 'host_port' else str(key)
+                conflicts.append(Conflict(kind, value, names))
+    return conflicts
+
+
+def _subnet_conflicts(intervals: List[Tuple[int, int, str, str]]) -> List[Conflict]:
+    conflicts: Dict[str, Conflict] = {}
+    stack_order = {}
+    for _, _, _, name in intervals:
+        stack_order.setdefault(name, len(stack_order))
+    # Sweep the subnets by start address, each one is compared with the furthest reaching one before it
+    reach = None
+    for start, end, subnet, name in sorted(intervals):
+        if reach is not None and start <= reach[0] and reach[2] != name:
+            conflict = conflicts.setdefault(reach[1], Conflict('subnet', reach[1], [reach[2]]))
+            if name not in conflict.stacks:
+                conflict.stacks.append(name)
+        if reach is None or end > reach[0]:
+            reach = (end, subnet, name)
+    for conflict in conflicts.values():
+        conflict.stacks.sort(key=stack_order.get)
+    return list(conflicts.values())
+
+
+def find_live_conflicts(stacks: List[StackInfo], containers: List[Dict[str, Any]]) -> List[Conflict]:
+    """
+    Cross-check the stacks against the containers that exist, as returned by one containers(all=True) call.
+    A container named like a stack container but belonging to another project, or a running container
+    of another project publishing a port a stack needs, would make the stack fail to start.
+
+    Args:
+        stacks (List[StackInfo]): The stacks.
+        containers (List[Dict[str, Any]]): The containers of the engine.
+
+    Returns:
+        List[Conflict]: The conflicts, the container outside the fleet keeps the value.
+    """
+    container_owner = {}
+    port_owner = {}
+    for stack in stacks:
+        for container_name in stack.containers:
+            container_owner.setdefault(container_name, stack)
+        for host_port in stack.ports:
+            port_owner.setdefault(host_port, stack)
+
+    conflicts = []
+    for container in containers:
+        project = (container.get('Labels') or {}).get(COMPOSE_PROJECT_LABEL)
+        name = (container.get('Names') or ['/'])[0].lstrip('/')
+        stack = container_owner.get(name)
+        if stack and stack.project != project:
+            conflicts.append(Conflict('container_name', name, [f"docker ({project or 'no project'})", stack.name], live=True))
+        if container.get('State') != 'running':
+            continue
+        for port in container.get('Ports') or []:
+            host_port = (port.get('PublicPort'), port.get('Type', 'tcp'))
+            stack = port_owner.get(host_port)
+            if host_port[0] and stack and stack.project != project:
+                conflicts.append(Conflict('host_port', f"{host_port[0]}/{host_port[1]}",
+                                          [f"docker ({name})", stack.name], live=True))
+    return conflicts
+
+
+def validate_fleet(instances_dir: str, main_compose_file: Optional[str] = None, main_env_file: Optional[str] = None,
+                   main_instance_name: str = 'money4band', client: Optional[Any] = None,
+                   ) -> Tuple[List[StackInfo], List[Conflict]]:
+    """
+    Check the device names, project names, container names, host ports, subnets and app identities of the
+    whole fleet at once, and against the containers that exist when the engine API is reachable.
+
+    Args:
+        instances_dir (str): The directory containing the proxy instances.
+        main_compose_file (Optional[str]): The compose file of the main stack, None to leave it out.
+        main_env_file (Optional[str]): The .env file of the main stack.
+        main_instance_name (str): The name of the main stack.
+        client (Optional[Any]): A docker client, see teardown.connect_docker. One is created when not given.
+
+    Returns:
+        Tuple[List[StackInfo], List[Conflict]]: The stacks and every conflict found.
+    """
+    stacks = collect_stacks(instances_dir, main_compose_file, main_env_file, main_instance_name)
+    conflicts = find_conflicts(stacks)
+    client = client or connect_docker(1)
+    if client is None:
+        logging.warning("Docker engine API not reachable, only the files are validated")
+        return stacks, conflicts
+    try:
+        conflicts.extend(find_live_conflicts(stacks, client.api.containers(all=True)))
+    except Exception as e:
+        logging.error(f"Could not list the Docker containers: {str(e)}")
+    return stacks, conflicts
+
+
+def print_report(stacks: List[StackInfo], conflicts: List[Conflict]) -> None:
+    for stack in stacks:
+        for error in stack.errors:
+            print(f"{Fore.YELLOW}{stack.name}: {error}{Style.RESET_ALL}")
+    for conflict in conflicts:
+        print(f"{Fore.RED if conflict.blocking else Fore.YELLOW}{conflict.describe()}{Style.RESET_ALL}")
+    blocking = [conflict for conflict in conflicts if conflict.blocking]
+    if conflicts:
+        print(f"{Fore.RED if blocking else Fore.YELLOW}{len(conflicts)} conflicts found in {len(stacks)} stacks, "
+              f"{len(conflicts) - len(blocking)} of them only warnings.{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.GREEN}No conflicts found in {len(stacks)} stacks.{Style.RESET_ALL}")
+
+
+def _new_app_id(value: str) -> str:
+    # Keep the prefix of the existing identity, e.g. sdk-node-, and its length
+    prefix, separator, body = value.rpartition('-')
+    return f"{prefix}{separator}{generate_uuid(len(body))}" if separator else generate_uuid(len(value))
+
+
+def _port_app(apps: Dict[str, Any], port: int) -> Optional[Dict[str, Any]]:
+    for app in apps.values():
+        if isinstance(app, dict) and (app.get('ports') == port
+                                      or isinstance(app.get('ports'), list) and port in app['ports']):
+            return app
+    return None
+
+
+def fix_conflicts(instances_dir: str, stacks: List[StackInfo], conflicts: List[Conflict]) -> List[str]:
+    """
+    Resolve conflicts by changing the overlays of the instances that do not keep the value, then regenerate their files.
+    Device names, host ports, subnets and app identities are fixed. The main stack and instances without
+    an overlay are never changed.
+
+    Args:
+        instances_dir (str): The directory containing the proxy instances.
+        stacks (List[StackInfo]): The stacks, see validate_fleet.
+        conflicts (List[Conflict]): The conflicts, see validate_fleet.
+
+    Returns:
+        List[str]: The changed instances.
+    """
+    base_dir = os.path.join(instances_dir, INSTANCE_BASE_DIR)
+    if not os.path.isdir(base_dir):
+        return []
+    m4b_config, app_config, user_config = (loader.load_json_config(os.path.join(base_dir, filename))
+                                           for filename in INSTANCE_CONFIG_FILES.values())
+    by_name = {stack.name: stack for stack in stacks}
+    env_files = [stack.env_file for stack in stacks]
+    used_device_names = {stack.device_name for stack in stacks if stack.device_name}
+    # Which app flag each .env variable comes from, e.g. EARNAPP_UUID is the uuid flag of earnapp
+    app_flags = {f"{app['name'].upper()}_{flag.upper()}": (app['name'].lower(), flag)
+                 for category in ('apps', 'extra-apps') for app in app_config.get(category, [])
+                 for flag in app.get('flags', {})}
+
+    port_allocator = subnet_allocator = None
+    overlays: Dict[str, Dict[str, Any]] = {}
+    for conflict in conflicts:
+        if conflict.kind not in FIXABLE_KINDS:
+            continue
+        # The first stack keeps the value, containers outside the fleet always do
+        for name in conflict.stacks[1:]:
+            stack = by_name.get(name)
+            instance_dir = os.path.join(instances_dir, name)
+            if stack is None or not os.path.isfile(os.path.join(instance_dir, INSTANCE_OVERLAY_FILE)):
+                continue
+            if name not in overlays:
+                overlays[name] = loader.load_instance_overlay(instance_dir)
+            user_overrides = overlays[name].setdefault('user_config', {})
+            m4b_overrides = overlays[name].setdefault('m4b_config', {})
+
+            if conflict.kind == 'device_name':
+                base_device_name = user_config['device_info']['device_name']
+                device_name = f"{base_device_name}_{generate_uuid(4)}"
+                while device_name in used_device_names:
+                    device_name = f"{base_device_name}_{generate_uuid(4)}"
+                used_device_names.add(device_name)
+                user_overrides.setdefault('device_info', {})['device_name'] = device_name
+                print(f"{Fore.GREEN}{name}: device name {conflict.value} -> {device_name}{Style.RESET_ALL}")
+            elif conflict.kind == 'host_port':
+                port = int(conflict.value.split('/')[0])
+                app = _port_app(user_overrides.get('apps', {}), port)
+                if app is None:
+                    # The port comes from the base config, which every instance shares
+                    continue
+                if port_allocator is None:
+                    port_allocator = PortAllocator(os.path.join(instances_dir, PORT_RESERVATIONS_FILE), env_files=env_files)
+                new_port = port_allocator.allocate(port + 1, stack.project)
+                app['ports'] = [new_port if p == port else p for p in app['ports']] \
+                    if isinstance(app['ports'], list) else new_port
+                if port in port_allocator.reservations.get(stack.project, []):
+                    port_allocator.reservations[stack.project].remove(port)
+                print(f"{Fore.GREEN}{name}: host port {port} -> {new_port}{Style.RESET_ALL}")
+            elif conflict.kind == 'subnet':
+                if subnet_allocator is None:
+                    pool, prefixlen = instance_subnet_pool(m4b_config['network'])
+                    subnet_allocator = SubnetAllocator(pool, prefixlen, os.path.join(instances_dir, SUBNET_ASSIGNMENTS_FILE),
+                                                       env_files=env_files)
+                subnet_allocator.release(stack.project)
+                subnet = subnet_allocator.allocate(stack.project)
+                m4b_overrides.setdefault('network', {})['subnet'] = str(subnet.network_address)
+                print(f"{Fore.GREEN}{name}: subnet {conflict.value} -> {subnet}{Style.RESET_ALL}")
+            elif conflict.kind == 'app_id':
+                for variable, value in stack.app_ids.items():
+                    if value != conflict.value or variable not in app_flags:
+                        continue
+                    app_name, flag = app_flags[variable]
+                    new_value = _new_app_id(value)
+                    user_overrides.setdefault('apps', {}).setdefault(app_name, {})[flag] = new_value
+                    print(f"{Fore.GREEN}{name}: new {variable} {new_value}, register it in the {app_name} dashboard{Style.RESET_ALL}")
+
+    for name, overrides in overlays.items():
+        write_json({'overrides': overrides}, os.path.join(instances_dir, name, INSTANCE_OVERLAY_FILE))
+    if port_allocator:
+        port_allocator.save()
+    if subnet_allocator:
+        subnet_allocator.save()
+    if overlays:
+        regenerate_instances(instances_dir)
+    return sorted(overlays)
+
+
+def main(instances_dir: str, main_compose_file: str, main_env_file: str, main_instance_name: str, fix: bool) -> bool:
+    """
+    Validate the fleet, fix what can be fixed with fix, and report what is left.
+
+    Returns:
+        bool: True if no conflicts are left that stop the stacks from starting.
+    """
+    stacks, conflicts = validate_fleet(instances_dir, main_compose_file, main_env_file, main_instance_name)
+    print_report(stacks, conflicts)
+    if not fix or not conflicts:
+        return not any(conflict.blocking for conflict in conflicts)
+
+    changed = fix_conflicts(instances_dir, stacks, conflicts)
+    print(f"{Fore.GREEN}Changed {len(changed)} instances.{Style.RESET_ALL}")
+    if changed:
+        print(f"{Fore.YELLOW}Restart the changed instances to apply the fixes.{Style.RESET_ALL}")
+    stacks, conflicts = validate_fleet(instances_dir, main_compose_file, main_env_file, main_instance_name)
+    print_report(stacks, conflicts)
+    if conflicts:
+        print(f"{Fore.YELLOW}The remaining conflicts need a manual fix.{Style.RESET_ALL}")
+    return not any(conflict.blocking for conflict in conflicts)
+
+
+if __name__ == '__main__':
+    script_name = os.path.basename(__file__)
+
+    parser = argparse.ArgumentParser(
+        description='Check the main stack and all multi-proxy instances for conflicting names, ports, subnets and app identities.')
+    parser.add_argument('--instances-dir', default='m4b_proxy_instances',
+                        help='The directory containing the proxy instances')
+    parser.add_argument('--compose-file', default='./docker-compose.yaml',
+                        help='The compose file of the main stack')
+    parser.add_argument('--env-file', default='./.env',
+                        help='The .env file of the main stack')
+    parser.add_argument('--main-instance-name', default='money4band',
+                        help='The name of the main stack')
+    parser.add_argument('--fix', action='store_true',
+                        help='Give the instances that do not keep a conflicting value a new one and regenerate their files')
+    parser.add_argument('--log-dir', default=os.path.join(script_dir,
+                        'logs'), help='Set the logging directory')
+    parser.add_argument(
+        '--log-file', default=f"{script_name}.log", help='Set the logging file name')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING',
+                        'ERROR', 'CRITICAL'], default='INFO', help='Set the logging level')
+    args = parser.parse_args()
+
+    # Set logging level based on command-line arguments
+    log_level = getattr(logging, args.log_level.upper(), None)
+    if not isinstance(log_level, int):
+        raise ValueError(f'Invalid log level: {args.log_level}')
+
+    # Start logging
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(args.log_dir, args.log_file),
+        format='%(asctime)s - [%(levelname)s] - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=log_level
+    )
+
+    logging.info(f"Starting {script_name} script...")
+
+    try:
+        ok = main(args.instances_dir, args.compose_file if os.path.isfile(args.compose_file) else None,
+                  args.env_file, args.main_instance_name, args.fix)
+        logging.info(f"{script_name} script completed successfully")
+        sys.exit(0 if ok else 1)
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {str(e)}")
+        raise